@@ -12,4 +12,7 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 
 # Passo 3: Aplica as migrações do banco de dados para criar ou atualizar as tabelas.
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+# Passo 4: Cria as tabelas dos caches compartilhados (sinais de ciclo e cenários), se ainda não existirem.
+python manage.py createcachetable
@@ -3,6 +3,11 @@ ASGI config for meu_sistema_producao project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+O stream SSE do dashboard (api/gerenciamento/stream/) só funciona quando o
+projeto é servido por esta aplicação ASGI. O difusor de eventos é em
+memória, então use um único processo (ex: um worker ASGI); sob WSGI o
+dashboard volta automaticamente ao polling da API JSON.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
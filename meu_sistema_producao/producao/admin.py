@@ -1,11 +1,51 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 from import_export.admin import ImportExportModelAdmin
 from .models import Pn, Maquina, OrdemProducao, TipoParada, TipoRefugo, Refugo
 from .resources import PnResource
+from .forms import ImportacaoPlanilhaForm
+from .importacao import importar_pns, formato_do_arquivo, ErroImportacao
 
 @admin.register(Pn)
 class PnAdmin(ImportExportModelAdmin):
     resource_class = PnResource
+    # Acrescenta o link "Importar em lote" aos botões do import-export
+    change_list_template = 'admin/producao/pn/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('importar-em-lote/', self.admin_site.admin_view(self.importar_em_lote_view), name='producao_pn_importar_em_lote'),
+        ]
+        return urls + super().get_urls()
+
+    def importar_em_lote_view(self, request):
+        """
+        Importação do catálogo inteiro em streaming (producao/importacao.py).
+        O import padrão do import-export carrega a planilha toda em memória e
+        grava linha a linha.
+        """
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        relatorio = None
+        form = ImportacaoPlanilhaForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                relatorio = importar_pns(arquivo, formato_do_arquivo(arquivo.name), dry_run=form.cleaned_data['dry_run'])
+            except ErroImportacao as e:
+                form.add_error('arquivo', str(e))
+        contexto = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Importar PNs em lote",
+            'form': form,
+            'relatorio': relatorio,
+            'dry_run': form.is_bound and form.cleaned_data.get('dry_run'),
+        }
+        return TemplateResponse(request, 'admin/producao/pn/importar_em_lote.html', contexto)
+
     class Media:
         css = {
             'all': ('producao/admin_custom.css',)
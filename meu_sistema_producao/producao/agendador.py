@@ -0,0 +1,287 @@
+# meu_sistema_producao/producao/agendador.py
+
+"""
+Agendamento automático com capacidade finita.
+
+Coloca as OPs 'Disponível' (ainda sem agendamento) nas máquinas
+compatíveis, por ordem de data de entrega (EDD). Cada máquina tem dois
+lados (L e R, como no quadro de planejamento), e cada lado é uma fila
+independente. Um agendamento existente sem lado ocupa os dois.
+
+A OP vai para o lado compatível em que termina mais cedo, sempre
+começando em hora cheia (o quadro trabalha com horas inteiras). O
+planejamento em si (`planejar`) não acessa o banco; `auto_agendar`
+carrega os dados, planeja e grava tudo em uma única transação.
+"""
+
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .models import Maquina, OrdemProducao, Agendamento
+from .versoes import incrementar_versao, VERSAO_DASHBOARD
+from .planejamento import invalidar_agenda
+from .compatibilidade import mapa_compatibilidade
+
+
+LADOS = ('L', 'R')
+UMA_HORA = timedelta(hours=1)
+
+
+def compativel(pn, maquina):
+    """
+    O PN cabe na máquina: capacidade em litros e as três dimensões do
+    produto não passam das do molde. `pn` e `maquina` são dicts com os
+    campos dos modelos.
+    """
+    return (
+        pn['capacity_liters'] <= maquina['capacity_liters']
+        and pn['dim_c'] <= maquina['mold_dim_c']
+        and pn['dim_a'] <= maquina['mold_dim_a']
+        and pn['dim_l'] <= maquina['mold_dim_l']
+    )
+
+
+def _proxima_hora_cheia(momento):
+    cheia = momento.replace(minute=0, second=0, microsecond=0)
+    return cheia if cheia == momento else cheia + UMA_HORA
+
+
+class _Lado:
+    """
+    Ocupação de um lado de máquina: lacunas livres entre agendamentos já
+    existentes e o instante a partir do qual o lado fica livre de vez.
+    """
+    __slots__ = ('maquina_id', 'lado', 'lacunas', 'livre_a_partir')
+
+    def __init__(self, maquina_id, lado, inicio, ocupacoes):
+        self.maquina_id = maquina_id
+        self.lado = lado
+        self.lacunas = []
+        momento = inicio
+        for ocupado_inicio, ocupado_fim in sorted(ocupacoes):
+            if ocupado_inicio > momento:
+                self.lacunas.append((momento, ocupado_inicio))
+            momento = max(momento, ocupado_fim)
+        self.livre_a_partir = momento
+
+    def encaixe(self, duracao):
+        """Retorna (posição da lacuna ou None, início) do encaixe mais cedo."""
+        for posicao, (lacuna_inicio, lacuna_fim) in enumerate(self.lacunas):
+            inicio = _proxima_hora_cheia(lacuna_inicio)
+            if inicio + duracao <= lacuna_fim:
+                return posicao, inicio
+        return None, _proxima_hora_cheia(self.livre_a_partir)
+
+    def ocupar(self, posicao, inicio, fim):
+        if posicao is None:
+            # A sobra até a hora cheia (< 1h) não comporta outra OP
+            self.livre_a_partir = fim
+            return
+        lacuna_inicio, lacuna_fim = self.lacunas.pop(posicao)
+        if fim < lacuna_fim:
+            self.lacunas.insert(posicao, (fim, lacuna_fim))
+        if lacuna_inicio < inicio:
+            self.lacunas.insert(posicao, (lacuna_inicio, inicio))
+
+
+def planejar(ops, maquinas, ocupacoes, inicio, compatibilidade=None):
+    """
+    Planeja as OPs a partir de `inicio`.
+
+    - ops: dicts com id, delivery_date, duracao (timedelta) e pn (dict com
+      capacity_liters e dim_c/a/l);
+    - maquinas: dicts com id, capacity_liters e mold_dim_c/a/l;
+    - ocupacoes: tuplas (maquina_id, lado ou None, inicio, fim) dos
+      agendamentos existentes;
+    - compatibilidade: {pn_id: set(maquina_ids)} já calculado (ver
+      producao/compatibilidade.py). Sem ele, as medidas são comparadas aqui.
+
+    Retorna (planejados, sem_maquina): planejados é uma lista de dicts
+    (op_id, maquina_id, lado, start_datetime, end_datetime) e sem_maquina
+    a lista de ids de OPs sem nenhuma máquina compatível.
+    """
+    ocupacoes_por_lado = {}
+    for maquina_id, lado, ocupado_inicio, ocupado_fim in ocupacoes:
+        if ocupado_fim <= inicio:
+            continue
+        for lado_ocupado in ([lado] if lado in LADOS else LADOS):
+            ocupacoes_por_lado.setdefault((maquina_id, lado_ocupado), []).append((ocupado_inicio, ocupado_fim))
+
+    lados_por_maquina = {
+        maquina['id']: [
+            _Lado(maquina['id'], lado, inicio, ocupacoes_por_lado.get((maquina['id'], lado), ()))
+            for lado in LADOS
+        ]
+        for maquina in maquinas
+    }
+
+    # Lados compatíveis montados uma vez por PN (muitas OPs repetem o PN)
+    lados_compativeis = {}
+    planejados = []
+    sem_maquina = []
+    for op in sorted(ops, key=lambda op: (op['delivery_date'], op['id'])):
+        pn = op['pn']
+        if pn['id'] not in lados_compativeis:
+            if compatibilidade is not None:
+                cabe = lambda maquina: maquina['id'] in compatibilidade.get(pn['id'], ())
+            else:
+                cabe = lambda maquina: compativel(pn, maquina)
+            lados_compativeis[pn['id']] = [
+                lado for maquina in maquinas if cabe(maquina) for lado in lados_por_maquina[maquina['id']]
+            ]
+        candidatos = lados_compativeis[pn['id']]
+        if not candidatos:
+            sem_maquina.append(op['id'])
+            continue
+
+        duracao = op['duracao']
+        melhor = None
+        for lado in candidatos:
+            posicao, encaixe = lado.encaixe(duracao)
+            if melhor is None or encaixe < melhor[2]:
+                melhor = (lado, posicao, encaixe)
+        lado, posicao, encaixe = melhor
+        lado.ocupar(posicao, encaixe, encaixe + duracao)
+        planejados.append({
+            'op_id': op['id'],
+            'maquina_id': lado.maquina_id,
+            'lado': lado.lado,
+            'start_datetime': encaixe,
+            'end_datetime': encaixe + duracao,
+        })
+
+    return planejados, sem_maquina
+
+
+# =======================================================================
+# CARGA E GRAVAÇÃO
+# =======================================================================
+
+def _duracao(quantidade, ciclo_segundos):
+    # Mesma regra de OrdemProducao.get_duracao_horas()
+    if not ciclo_segundos or ciclo_segundos <= 0:
+        return UMA_HORA
+    return timedelta(seconds=quantidade * ciclo_segundos)
+
+
+def carregar_dados(inicio):
+    """Lê do banco (3 queries) as OPs a planejar, as máquinas e as ocupações."""
+    campos_pn = ('capacity_liters', 'dim_c', 'dim_a', 'dim_l')
+    ops = [
+        {
+            'id': op['id'],
+            'delivery_date': op['delivery_date'],
+            'duracao': _duracao(op['quantity'], op['pn__cycle_time_seconds']),
+            'pn': {'id': op['pn_id'], **{campo: op[f'pn__{campo}'] for campo in campos_pn}},
+        }
+        for op in OrdemProducao.objects.filter(status='Disponível', agendamento__isnull=True).values(
+            'id', 'quantity', 'delivery_date', 'pn_id', 'pn__cycle_time_seconds', *(f'pn__{campo}' for campo in campos_pn)
+        )
+    ]
+    maquinas = list(Maquina.objects.order_by('id').values(
+        'id', 'capacity_liters', 'mold_dim_c', 'mold_dim_a', 'mold_dim_l'
+    ))
+    ocupacoes = list(Agendamento.objects.filter(end_datetime__gt=inicio).exclude(
+        ordem_producao__status='Concluída'
+    ).values_list('maquina_id', 'lado', 'start_datetime', 'end_datetime'))
+    return ops, maquinas, ocupacoes
+
+
+def auto_agendar(inicio=None, simular=False):
+    """
+    Planeja todas as OPs 'Disponível' sem agendamento a partir de `inicio`
+    (padrão: próxima hora cheia) e, se `simular` for falso, cria os
+    agendamentos e marca as OPs como 'Planejada' em uma única transação.
+    Retorna (planejados, sem_maquina), como `planejar`.
+    """
+    if inicio is None:
+        inicio = _proxima_hora_cheia(timezone.now())
+
+    with transaction.atomic():
+        if not simular:
+            # Trava as OPs candidatas: um planejador arrastando uma OP ao
+            # mesmo tempo espera esta transação terminar.
+            list(OrdemProducao.objects.select_for_update().filter(
+                status='Disponível', agendamento__isnull=True
+            ).values_list('id'))
+        ops, maquinas, ocupacoes = carregar_dados(inicio)
+        compatibilidade = mapa_compatibilidade({op['pn']['id'] for op in ops})
+        planejados, sem_maquina = planejar(ops, maquinas, ocupacoes, inicio, compatibilidade)
+
+        if not simular and planejados:
+            Agendamento.objects.bulk_create(
+                [
+                    Agendamento(
+                        ordem_producao_id=item['op_id'],
+                        maquina_id=item['maquina_id'],
+                        lado=item['lado'],
+                        start_datetime=item['start_datetime'],
+                        end_datetime=item['end_datetime'],
+                    )
+                    for item in planejados
+                ],
+                batch_size=1000,
+            )
+            OrdemProducao.objects.filter(id__in=[item['op_id'] for item in planejados]).update(status='Planejada')
+            # bulk_create e update() não disparam os signals
+            incrementar_versao(VERSAO_DASHBOARD)
+            invalidar_agenda(
+                min(item['start_datetime'] for item in planejados),
+                max(item['end_datetime'] for item in planejados),
+            )
+
+    return planejados, sem_maquina
+
+
+# =======================================================================
+# DADOS SINTÉTICOS (BENCHMARK)
+# =======================================================================
+
+def dados_sinteticos(quantidade_ops, quantidade_maquinas, inicio, semente=0):
+    """Gera (ops, maquinas, ocupacoes) aleatórios, sem banco, para `planejar`."""
+    aleatorio = random.Random(semente)
+    medida = lambda minimo, maximo: Decimal(aleatorio.randint(minimo, maximo))
+
+    maquinas = [
+        {
+            'id': i,
+            'capacity_liters': medida(10, 60),
+            'mold_dim_c': medida(30, 80),
+            'mold_dim_a': medida(30, 80),
+            'mold_dim_l': medida(30, 80),
+        }
+        for i in range(1, quantidade_maquinas + 1)
+    ]
+    pns = [
+        {
+            'id': i,
+            'capacity_liters': medida(5, 50),
+            'dim_c': medida(10, 70),
+            'dim_a': medida(10, 70),
+            'dim_l': medida(10, 70),
+            'ciclo': aleatorio.choice([20, 30, 45, 60, 90]),
+        }
+        for i in range(1, 301)
+    ]
+    ops = []
+    for i in range(1, quantidade_ops + 1):
+        pn = aleatorio.choice(pns)
+        ops.append({
+            'id': i,
+            'delivery_date': (inicio + timedelta(days=aleatorio.randint(1, 60))).date(),
+            'duracao': _duracao(aleatorio.randint(50, 2000), pn['ciclo']),
+            'pn': pn,
+        })
+    ocupacoes = []
+    for maquina in maquinas:
+        for _ in range(aleatorio.randint(0, 4)):
+            ocupado_inicio = inicio + timedelta(hours=aleatorio.randint(0, 24 * 14))
+            ocupacoes.append((
+                maquina['id'],
+                aleatorio.choice(LADOS + (None,)),
+                ocupado_inicio,
+                ocupado_inicio + timedelta(hours=aleatorio.randint(2, 48)),
+            ))
+    return ops, maquinas, ocupacoes
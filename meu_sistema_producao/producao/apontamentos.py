@@ -0,0 +1,74 @@
+# meu_sistema_producao/producao/apontamentos.py
+
+"""
+Gravação de apontamentos de produção.
+
+Vários terminais apontam na mesma OP ao mesmo tempo, então o total
+produzido é somado no banco (`F('quantidade_produzida') + quantidade`),
+nunca lido, somado em Python e regravado. O apontamento, o consolidado
+horário e o total da OP são gravados na mesma transação curta; o UPDATE
+da OP, que é a linha mais disputada, fica por último para segurar a trava
+o menor tempo possível.
+
+Cada POST pode trazer uma chave de idempotência (única no banco). Se o
+terminal reenviar o mesmo apontamento (timeout, rede instável), a
+segunda gravação esbarra na chave e devolve o apontamento original sem
+somar de novo. A chave é única na tabela toda, então só conta como reenvio
+se o agendamento e a quantidade forem os mesmos; caso contrário é outro
+apontamento reaproveitando a chave, e ele é recusado (`ChaveReutilizada`).
+"""
+
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from .models import OrdemProducao, ApontamentoProducao
+from . import rollup
+
+
+TAMANHO_MAXIMO_CHAVE = ApontamentoProducao._meta.get_field('chave_idempotencia').max_length
+
+
+class ChaveReutilizada(Exception):
+    pass
+
+
+def _total_produzido(op_id):
+    return OrdemProducao.objects.filter(pk=op_id).values_list('quantidade_produzida', flat=True).first()
+
+
+def registrar_apontamento(agendamento, quantidade, operador=None, chave=None):
+    """
+    Grava `quantidade` peças no agendamento e soma no total da OP.
+    Retorna (apontamento, nova_quantidade_produzida, duplicado): com uma
+    `chave` já usada, `duplicado` é True e nada é somado. Levanta
+    `ChaveReutilizada` se a chave já foi usada em outro agendamento ou com
+    outra quantidade.
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                apontamento = ApontamentoProducao.objects.create(
+                    agendamento=agendamento,
+                    quantidade=quantidade,
+                    operador=operador,
+                    chave_idempotencia=chave or None,
+                )
+        except IntegrityError:
+            if not chave:
+                raise
+            apontamento = ApontamentoProducao.objects.get(chave_idempotencia=chave)
+            if apontamento.agendamento_id != agendamento.id or apontamento.quantidade != quantidade:
+                raise ChaveReutilizada(
+                    f"A chave de idempotência já foi usada em outro apontamento "
+                    f"(agendamento {apontamento.agendamento_id}, {apontamento.quantidade} peças)."
+                )
+            return apontamento, _total_produzido(apontamento.agendamento.ordem_producao_id), True
+
+        rollup.registrar_producao(apontamento)
+        OrdemProducao.objects.filter(pk=agendamento.ordem_producao_id).update(
+            quantidade_produzida=F('quantidade_produzida') + quantidade
+        )
+        # Lido dentro da transação, com a linha ainda travada: é o total
+        # logo depois deste apontamento
+        nova_quantidade = _total_produzido(agendamento.ordem_producao_id)
+
+    return apontamento, nova_quantidade, False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProducaoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'meu_sistema_producao.producao'
+
+    def ready(self):
+        from . import signals  # noqa: F401
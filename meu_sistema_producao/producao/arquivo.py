@@ -0,0 +1,155 @@
+# meu_sistema_producao/producao/arquivo.py
+
+"""
+Arquivamento dos eventos brutos (apontamentos, paradas e refugos) das OPs
+concluídas há mais de N meses.
+
+As tabelas de eventos só crescem, e as consultas do dia a dia (dashboard,
+tela de produção, cascata) só olham OPs em andamento. O comando
+`arquivar_eventos` move os eventos das OPs concluídas antigas para
+tabelas de arquivo com os mesmos campos e o mesmo id
+(`ApontamentoProducaoArquivado`, `ParadaArquivada`, `RefugoArquivado`),
+mantendo as tabelas vivas pequenas.
+
+A cópia é um INSERT ... SELECT seguido de DELETE, por lote de
+agendamentos e numa transação por lote: os eventos não passam pelo Python
+e não disparam signals. O consolidado por hora (`OeeRollupHora`) e o
+histórico de OEE não mudam, porque os eventos continuam existindo.
+
+Os relatórios que cobrem qualquer período (Pareto, exportação,
+reconstrução do consolidado, histórico de OEE) consultam a tabela viva e
+o arquivo com `com_arquivo` / `unir`; o resultado é o mesmo de antes do
+arquivamento.
+"""
+
+import calendar
+from datetime import date, datetime, time
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .models import (
+    Agendamento, OrdemProducao, ApontamentoProducao, Parada, Refugo,
+    ApontamentoProducaoArquivado, ParadaArquivada, RefugoArquivado,
+)
+
+
+# (tabela viva, arquivo)
+ARQUIVOS = (
+    (ApontamentoProducao, ApontamentoProducaoArquivado),
+    (Parada, ParadaArquivada),
+    (Refugo, RefugoArquivado),
+)
+_ARQUIVO_DE = dict(ARQUIVOS)
+
+
+def com_arquivo(modelo):
+    """Querysets da tabela viva e do arquivo do modelo, para somar resultados das duas."""
+    return modelo.objects.all(), _ARQUIVO_DE[modelo].objects.all()
+
+
+def unir(modelo, montar):
+    """
+    UNION ALL de `montar(qs)` aplicado à tabela viva e ao arquivo. `montar`
+    deve terminar em values/values_list e não ordenar; ordene o resultado.
+    """
+    vivo, arquivado = com_arquivo(modelo)
+    return montar(vivo).union(montar(arquivado), all=True)
+
+
+# =======================================================================
+# ARQUIVAMENTO
+# =======================================================================
+
+def data_de_corte(meses, agora=None):
+    """Meia-noite do mesmo dia, `meses` meses antes de `agora` (no fuso local)."""
+    hoje = timezone.localdate(agora)
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - meses, 12)
+    mes += 1
+    dia = min(hoje.day, calendar.monthrange(ano, mes)[1])
+    return timezone.make_aware(datetime.combine(date(ano, mes, dia), time.min))
+
+
+def _fim_do_agendamento():
+    """
+    Expressão com o fim de cada agendamento: `real_end_datetime` ou, nas
+    OPs concluídas antes desse campo existir (ver
+    historico.estimar_fins_reais), o último evento registrado. Um tipo de
+    evento que não existe conta como o fim planejado, para o GREATEST não
+    receber NULL.
+    """
+    def ultimo(modelo, campo):
+        return Coalesce(
+            Subquery(modelo.objects.filter(agendamento=OuterRef('pk')).order_by(f'-{campo}').values(campo)[:1]),
+            F('end_datetime'),
+        )
+    return Coalesce(
+        'real_end_datetime',
+        Greatest(
+            ultimo(ApontamentoProducao, 'data_apontamento'),
+            ultimo(Refugo, 'data_apontamento'),
+            ultimo(Parada, 'fim_parada'),
+        ),
+    )
+
+
+def agendamentos_para_arquivar(corte):
+    """
+    Ids dos agendamentos com eventos na tabela viva cujas OPs estão
+    concluídas e terminaram (todos os agendamentos) antes de `corte`.
+    """
+    recentes = Agendamento.objects.annotate(fim=_fim_do_agendamento()).filter(fim__gte=corte)
+    ops = OrdemProducao.objects.filter(status='Concluída').exclude(
+        pk__in=recentes.values('ordem_producao_id'),
+    )
+
+    com_eventos = None
+    for modelo, _ in ARQUIVOS:
+        existe = Exists(modelo.objects.filter(agendamento_id=OuterRef('pk')))
+        com_eventos = existe if com_eventos is None else com_eventos | existe
+    return list(
+        Agendamento.objects.filter(ordem_producao__in=ops).filter(com_eventos).order_by('id').values_list('id', flat=True)
+    )
+
+
+def _mover(modelo, arquivo, agendamento_ids):
+    """Copia os eventos dos agendamentos para o arquivo e os apaga da tabela viva. Retorna quantos."""
+    q = connection.ops.quote_name
+    colunas = ', '.join(q(campo.column) for campo in arquivo._meta.concrete_fields)
+    coluna_agendamento = q(modelo._meta.get_field('agendamento').column)
+    marcadores = ', '.join(['%s'] * len(agendamento_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {q(arquivo._meta.db_table)} ({colunas}) "
+            f"SELECT {colunas} FROM {q(modelo._meta.db_table)} WHERE {coluna_agendamento} IN ({marcadores})",
+            agendamento_ids,
+        )
+        cursor.execute(
+            f"DELETE FROM {q(modelo._meta.db_table)} WHERE {coluna_agendamento} IN ({marcadores})",
+            agendamento_ids,
+        )
+        return cursor.rowcount
+
+
+def arquivar(meses, tamanho_lote=200, dry_run=False, agora=None):
+    """
+    Move para o arquivo os eventos das OPs concluídas há mais de `meses`
+    meses, em lotes de `tamanho_lote` agendamentos (uma transação por
+    lote). Retorna {'agendamentos': n, <tabela viva>: eventos movidos}.
+    Com `dry_run`, só conta.
+    """
+    agendamento_ids = agendamentos_para_arquivar(data_de_corte(meses, agora))
+    resultado = {'agendamentos': len(agendamento_ids)}
+    for modelo, _ in ARQUIVOS:
+        resultado[modelo._meta.model_name] = 0
+
+    for posicao in range(0, len(agendamento_ids), tamanho_lote):
+        lote = agendamento_ids[posicao:posicao + tamanho_lote]
+        if dry_run:
+            for modelo, _ in ARQUIVOS:
+                resultado[modelo._meta.model_name] += modelo.objects.filter(agendamento_id__in=lote).count()
+            continue
+        with transaction.atomic():
+            for modelo, arquivo in ARQUIVOS:
+                resultado[modelo._meta.model_name] += _mover(modelo, arquivo, lote)
+    return resultado
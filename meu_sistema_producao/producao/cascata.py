@@ -0,0 +1,179 @@
+# meu_sistema_producao/producao/cascata.py
+
+"""
+Reprogramação em cascata quando uma OP em produção atrasa.
+
+O `end_datetime` de um agendamento é gravado uma única vez, quando a OP é
+colocada no quadro. Se a OP em produção anda mais devagar que o previsto,
+os agendamentos seguintes da máquina ficam com horários que não vão
+acontecer. Aqui o fim de cada OP em produção é projetado pela taxa real
+(peças apontadas desde `real_start_datetime` / tempo decorrido) e, se
+passar do fim gravado, os agendamentos seguintes do mesmo lado são
+empurrados para a primeira hora cheia livre, com um único bulk_update.
+
+`reprogramar_maquina` roda sob demanda (API do planejamento) e depois de
+cada apontamento de produção (ver settings.REPROGRAMAR_AO_APONTAR). No
+caminho do apontamento a projeção é feita sem travas; a máquina só é
+travada quando há algo a empurrar.
+"""
+
+from datetime import datetime, time as dt_time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Maquina, Agendamento, ApontamentoProducao
+from .conflitos import LADOS
+from .planejamento import STATUS_EM_ABERTO, invalidar_agenda
+from .versoes import incrementar_versao, VERSAO_DASHBOARD
+
+
+def _proxima_hora_cheia(momento):
+    cheia = momento.replace(minute=0, second=0, microsecond=0)
+    return cheia if cheia == momento else cheia + timedelta(hours=1)
+
+
+def _prazo(entrega):
+    """Fim do dia de entrega."""
+    return timezone.make_aware(datetime.combine(entrega + timedelta(days=1), dt_time.min))
+
+
+def fim_projetado(inicio_real, quantidade, produzido_total, produzido_desde_inicio, ciclo_segundos, agora):
+    """
+    Fim previsto de uma OP em produção. Com peças apontadas, usa a taxa
+    real desde o início; sem nenhuma, o ciclo nominal a partir de agora.
+    Retorna None se não há como projetar (ciclo zerado e nada apontado).
+    """
+    restante = max(quantidade - produzido_total, 0)
+    decorrido = (agora - inicio_real).total_seconds()
+    if produzido_desde_inicio > 0 and decorrido > 0:
+        return agora + timedelta(seconds=restante * decorrido / produzido_desde_inicio)
+    if ciclo_segundos and ciclo_segundos > 0:
+        return agora + timedelta(seconds=restante * ciclo_segundos)
+    return None
+
+
+def _em_producao(maquina_id, agora):
+    """Agendamentos em produção na máquina, com o fim projetado de cada um."""
+    rodando = list(Agendamento.objects.filter(
+        maquina_id=maquina_id,
+        ordem_producao__status='Em Produção',
+        real_start_datetime__isnull=False,
+        real_end_datetime__isnull=True,
+    ).values(
+        'id', 'ordem_producao_id', 'lado', 'start_datetime', 'end_datetime', 'real_start_datetime',
+        'ordem_producao__quantity', 'ordem_producao__quantidade_produzida', 'ordem_producao__delivery_date',
+        'ordem_producao__pn__cycle_time_seconds',
+    ))
+    if not rodando:
+        return []
+
+    produzido = dict(ApontamentoProducao.objects.filter(
+        agendamento_id__in=[ag['id'] for ag in rodando],
+        data_apontamento__gte=F('agendamento__real_start_datetime'),
+    ).values('agendamento_id').annotate(total=Sum('quantidade')).values_list('agendamento_id', 'total'))
+
+    for agendamento in rodando:
+        agendamento['fim_projetado'] = fim_projetado(
+            agendamento['real_start_datetime'],
+            agendamento['ordem_producao__quantity'],
+            agendamento['ordem_producao__quantidade_produzida'],
+            produzido.get(agendamento['id'], 0),
+            agendamento['ordem_producao__pn__cycle_time_seconds'],
+            agora,
+        )
+    return rodando
+
+
+def reprogramar_maquina(maquina_id, agora=None, tolerancia=None):
+    """
+    Projeta o fim das OPs em produção na máquina e empurra em cascata os
+    agendamentos em aberto que vêm depois delas, no mesmo lado (um
+    agendamento sem lado ocupa os dois). Só atrasos maiores que
+    `tolerancia` (padrão: settings.REPROGRAMAR_TOLERANCIA_MINUTOS) movem
+    o quadro; nada é adiantado.
+
+    Retorna um dict com:
+      - em_producao: [{agendamento_id, op_id, fim_gravado, fim_projetado}];
+      - deslocados: [{agendamento_id, op_id, inicio, fim}] com os novos horários;
+      - atrasadas: ids das OPs que agora terminam depois do dia de entrega.
+    """
+    agora = agora or timezone.now()
+    if tolerancia is None:
+        tolerancia = timedelta(minutes=settings.REPROGRAMAR_TOLERANCIA_MINUTOS)
+    resultado = {'em_producao': [], 'deslocados': [], 'atrasadas': []}
+
+    rodando = [ag for ag in _em_producao(maquina_id, agora) if ag['fim_projetado'] is not None]
+    resultado['em_producao'] = [
+        {
+            'agendamento_id': ag['id'],
+            'op_id': ag['ordem_producao_id'],
+            'fim_gravado': ag['end_datetime'],
+            'fim_projetado': ag['fim_projetado'],
+        }
+        for ag in rodando
+    ]
+    atrasados = [ag for ag in rodando if ag['fim_projetado'] > ag['end_datetime'] + tolerancia]
+    if not atrasados:
+        return resultado
+
+    with transaction.atomic():
+        # Mesma trava de salvar_agendamento_api e do lote: ninguém agenda
+        # nesta máquina enquanto a cascata roda
+        Maquina.objects.select_for_update().filter(pk=maquina_id).values_list('id').first()
+
+        alterados = []
+        livre = {}
+        for agendamento in atrasados:
+            lados = (agendamento['lado'],) if agendamento['lado'] in LADOS else LADOS
+            for lado in lados:
+                livre[lado] = max(livre.get(lado, agendamento['fim_projetado']), agendamento['fim_projetado'])
+            alterados.append(Agendamento(
+                id=agendamento['id'], start_datetime=agendamento['start_datetime'], end_datetime=agendamento['fim_projetado'],
+            ))
+            invalidar_agenda(agendamento['end_datetime'], agendamento['fim_projetado'])
+            if agendamento['fim_projetado'] > _prazo(agendamento['ordem_producao__delivery_date']):
+                resultado['atrasadas'].append(agendamento['ordem_producao_id'])
+
+        # Todos os lados: um agendamento sem lado empurrado pelo lado L
+        # passa a empurrar também o lado R
+        inicio_cascata = min(ag['start_datetime'] for ag in atrasados)
+        seguintes = Agendamento.objects.filter(
+            maquina_id=maquina_id,
+            ordem_producao__status__in=STATUS_EM_ABERTO,
+            start_datetime__gte=inicio_cascata,
+        ).order_by('start_datetime', 'id').values(
+            'id', 'ordem_producao_id', 'lado', 'start_datetime', 'end_datetime', 'ordem_producao__delivery_date',
+        )
+        for agendamento in seguintes:
+            lados = (agendamento['lado'],) if agendamento['lado'] in LADOS else LADOS
+            ocupado_ate = max((livre[lado] for lado in lados if lado in livre), default=None)
+            inicio = agendamento['start_datetime']
+            if ocupado_ate is not None and ocupado_ate > inicio:
+                inicio = _proxima_hora_cheia(ocupado_ate)
+            fim = inicio + (agendamento['end_datetime'] - agendamento['start_datetime'])
+            if inicio == agendamento['start_datetime']:
+                # Não foi empurrado: só ocupa os lados que já estão na cascata
+                for lado in lados:
+                    if lado in livre:
+                        livre[lado] = max(livre[lado], fim)
+                continue
+            for lado in lados:
+                livre[lado] = max(livre.get(lado, fim), fim)
+
+            alterados.append(Agendamento(id=agendamento['id'], start_datetime=inicio, end_datetime=fim))
+            invalidar_agenda(agendamento['start_datetime'], fim)
+            resultado['deslocados'].append({
+                'agendamento_id': agendamento['id'],
+                'op_id': agendamento['ordem_producao_id'],
+                'inicio': inicio,
+                'fim': fim,
+            })
+            if fim > _prazo(agendamento['ordem_producao__delivery_date']):
+                resultado['atrasadas'].append(agendamento['ordem_producao_id'])
+
+        Agendamento.objects.bulk_update(alterados, ['start_datetime', 'end_datetime'])
+        # bulk_update não dispara os signals
+        incrementar_versao(VERSAO_DASHBOARD)
+
+    return resultado
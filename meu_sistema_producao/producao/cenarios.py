@@ -0,0 +1,350 @@
+# meu_sistema_producao/producao/cenarios.py
+
+"""
+Cenários "e se" do quadro de planejamento.
+
+Um `Cenario` carrega os agendamentos em aberto para a memória
+(`Cenario.do_banco`, 2 queries) e aceita edições sem tocar na tabela `Agendamento`:
+
+- parada de máquina: a máquina fica indisponível em [inicio, fim);
+- quantidade: muda a quantidade de uma OP (e a duração do agendamento);
+- mover: leva a OP para outra máquina / lado / horário.
+
+Sem edições o cenário é igual ao quadro real. A cada edição só as
+máquinas afetadas são recalculadas. Em cada máquina os
+agendamentos mantêm a ordem original e são empurrados em cascata: começam
+no horário planejado ou, se o lado ainda estiver ocupado ou a máquina
+parada, na primeira hora cheia livre. Agendamentos de OPs já em produção
+não mudam de lugar; uma parada apenas estende o fim deles.
+
+A folga de cada OP é o tempo entre o fim do agendamento e o fim do dia de
+entrega. Um cenário aceito é gravado de uma vez com
+`planejamento.aplicar_lote`, na mesma transação que as novas quantidades.
+"""
+
+from datetime import datetime, time as dt_time, timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import OrdemProducao, Agendamento
+from .planejamento import aplicar_lote, STATUS_EM_ABERTO
+from .conflitos import LADOS
+
+
+TIPOS_EDICAO = ('parada_maquina', 'quantidade', 'mover')
+
+
+class ErroCenario(Exception):
+    pass
+
+
+def _proxima_hora_cheia(momento):
+    cheia = momento.replace(minute=0, second=0, microsecond=0)
+    return cheia if cheia == momento else cheia + timedelta(hours=1)
+
+
+def _sobreposicao(inicio, fim, outro_inicio, outro_fim):
+    return max(timedelta(0), min(fim, outro_fim) - max(inicio, outro_inicio))
+
+
+class _Reserva:
+    """Um agendamento do cenário: posição original e posição simulada."""
+    __slots__ = (
+        'id', 'op_id', 'fixa', 'maquina_id', 'lado', 'planejado', 'duracao',
+        'base_maquina_id', 'base_lado', 'base_inicio', 'base_fim', 'inicio', 'fim',
+    )
+
+    def __init__(self, agendamento, fixa):
+        self.id = agendamento['id']
+        self.op_id = agendamento['ordem_producao_id']
+        self.fixa = fixa
+        self.maquina_id = self.base_maquina_id = agendamento['maquina_id']
+        self.lado = self.base_lado = agendamento['lado'] if agendamento['lado'] in LADOS else None
+        self.planejado = self.inicio = self.base_inicio = agendamento['start_datetime']
+        self.fim = self.base_fim = agendamento['end_datetime']
+        self.duracao = self.base_fim - self.base_inicio
+
+    @property
+    def lados(self):
+        return (self.lado,) if self.lado else LADOS
+
+    def alterada(self):
+        return (self.maquina_id, self.lado, self.inicio, self.fim) != (
+            self.base_maquina_id, self.base_lado, self.base_inicio, self.base_fim
+        )
+
+
+def ler_edicao(dados):
+    """
+    Converte uma edição vinda do JSON: ids e quantidade como inteiros,
+    'inicio' e 'fim' em ISO (YYYY-MM-DDTHH:MM, hora local se sem fuso).
+    """
+    if not isinstance(dados, dict) or dados.get('tipo') not in TIPOS_EDICAO:
+        raise ErroCenario(f"Edição inválida: {dados}.")
+    edicao = dict(dados)
+    try:
+        for campo in ('maquina_id', 'op_id', 'quantidade'):
+            if campo in edicao:
+                edicao[campo] = int(edicao[campo])
+        for campo in ('inicio', 'fim'):
+            if campo in edicao:
+                momento = datetime.fromisoformat(edicao[campo])
+                edicao[campo] = timezone.make_aware(momento) if timezone.is_naive(momento) else momento
+    except (TypeError, ValueError):
+        raise ErroCenario(f"Valores inválidos na edição: {dados}.")
+    obrigatorios = {
+        'parada_maquina': ('maquina_id', 'inicio', 'fim'),
+        'quantidade': ('op_id', 'quantidade'),
+        'mover': ('op_id', 'maquina_id', 'inicio'),
+    }[edicao['tipo']]
+    faltando = [campo for campo in obrigatorios if edicao.get(campo) is None]
+    if faltando:
+        raise ErroCenario(f"Campos obrigatórios na edição '{edicao['tipo']}': {', '.join(faltando)}.")
+    return edicao
+
+
+class Cenario:
+    """
+    Cópia em memória do quadro. `editar` aplica uma edição e recalcula só
+    as máquinas afetadas; `resumo` e `agendamentos` descrevem o resultado.
+    """
+
+    def __init__(self, agendamentos, ops, agora=None):
+        """
+        `agendamentos`: dicts com id, ordem_producao_id, maquina_id, lado,
+        start_datetime e end_datetime; `ops`: dicts com id, quantity,
+        delivery_date e status. Use `Cenario.do_banco()` para o quadro real.
+        """
+        self.agora = agora or timezone.now()
+        self.edicoes = []
+        self._paradas = {}      # maquina_id -> [(inicio, fim)]
+        self._ops = {}          # op_id -> dict(quantidade, base_quantidade, entrega, prazo, fixa)
+        self._reservas = {}     # op_id -> _Reserva
+        self._por_maquina = {}  # maquina_id -> [_Reserva]
+        self._atrasos = {}      # maquina_id -> (ops atrasadas, horas de atraso)
+
+        for op in ops:
+            self._ops[op['id']] = {
+                'quantidade': op['quantity'],
+                'base_quantidade': op['quantity'],
+                'entrega': op['delivery_date'],
+                # Fim do dia de entrega
+                'prazo': timezone.make_aware(datetime.combine(op['delivery_date'] + timedelta(days=1), dt_time.min)),
+                'fixa': op['status'] not in STATUS_EM_ABERTO,
+            }
+        for agendamento in agendamentos:
+            op = self._ops.get(agendamento['ordem_producao_id'])
+            if op is None:
+                continue
+            reserva = _Reserva(agendamento, op['fixa'])
+            self._reservas[reserva.op_id] = reserva
+            self._por_maquina.setdefault(reserva.maquina_id, []).append(reserva)
+        # Sem edições o cenário é o próprio quadro: só calcula os atrasos
+        for maquina_id in self._por_maquina:
+            self._calcular_atrasos(maquina_id)
+
+    @classmethod
+    def do_banco(cls, agora=None):
+        """Cenário com os agendamentos do quadro que ainda não terminaram (2 queries)."""
+        agora = agora or timezone.now()
+        agendamentos = list(
+            Agendamento.objects.exclude(ordem_producao__status='Concluída')
+            .filter(end_datetime__gt=agora)
+            .values('id', 'ordem_producao_id', 'maquina_id', 'lado', 'start_datetime', 'end_datetime')
+        )
+        ops = OrdemProducao.objects.filter(id__in=[ag['ordem_producao_id'] for ag in agendamentos]).values(
+            'id', 'quantity', 'delivery_date', 'status'
+        )
+        return cls(agendamentos, ops, agora)
+
+    # -------------------------------------------------------------------
+    # Recalculo
+    # -------------------------------------------------------------------
+
+    def _recalcular_maquina(self, maquina_id):
+        reservas = self._por_maquina.get(maquina_id, [])
+        paradas = sorted(self._paradas.get(maquina_id, ()))
+
+        # Janelas bloqueadas por lado: paradas da máquina e agendamentos fixos
+        bloqueios = {lado: list(paradas) for lado in LADOS}
+        for reserva in reservas:
+            if not reserva.fixa:
+                continue
+            reserva.inicio = reserva.planejado
+            reserva.fim = reserva.inicio + reserva.duracao + sum(
+                (_sobreposicao(reserva.inicio, reserva.inicio + reserva.duracao, *parada) for parada in paradas),
+                timedelta(0),
+            )
+            for lado in reserva.lados:
+                bloqueios[lado].append((reserva.inicio, reserva.fim))
+        for lado in LADOS:
+            bloqueios[lado].sort()
+
+        livre = {}
+        for reserva in sorted(reservas, key=lambda r: (r.planejado, r.id)):
+            if reserva.fixa:
+                continue
+            inicio = max([reserva.planejado] + [livre[lado] for lado in reserva.lados if lado in livre])
+            if inicio != reserva.planejado:
+                inicio = _proxima_hora_cheia(inicio)
+            # Janelas ordenadas pelo início: uma passada basta, pois o
+            # início só anda para frente
+            janelas = bloqueios[reserva.lado] if reserva.lado else sorted(bloqueios['L'] + bloqueios['R'])
+            for bloqueio_inicio, bloqueio_fim in janelas:
+                if bloqueio_inicio < inicio + reserva.duracao and bloqueio_fim > inicio:
+                    inicio = _proxima_hora_cheia(bloqueio_fim)
+            reserva.inicio = inicio
+            reserva.fim = inicio + reserva.duracao
+            for lado in reserva.lados:
+                livre[lado] = reserva.fim
+
+        self._calcular_atrasos(maquina_id)
+
+    def _calcular_atrasos(self, maquina_id):
+        atrasadas, horas_atraso = 0, 0.0
+        for reserva in self._por_maquina.get(maquina_id, ()):
+            atraso = (reserva.fim - self._ops[reserva.op_id]['prazo']).total_seconds() / 3600
+            if atraso > 0:
+                atrasadas += 1
+                horas_atraso += atraso
+        self._atrasos[maquina_id] = (atrasadas, horas_atraso)
+
+    # -------------------------------------------------------------------
+    # Edições
+    # -------------------------------------------------------------------
+
+    def _reserva(self, op_id):
+        reserva = self._reservas.get(op_id)
+        if reserva is None:
+            raise ErroCenario(f"OP-{op_id} não tem agendamento em aberto.")
+        return reserva
+
+    def editar(self, edicao):
+        """
+        Aplica uma edição (dict com 'tipo' e os campos dele; datas já como
+        datetime aware) e recalcula as máquinas afetadas.
+        """
+        tipo = edicao.get('tipo')
+        if tipo == 'parada_maquina':
+            maquina_id, inicio, fim = edicao['maquina_id'], edicao['inicio'], edicao['fim']
+            if fim <= inicio:
+                raise ErroCenario("O fim da parada deve ser depois do início.")
+            self._paradas.setdefault(maquina_id, []).append((inicio, fim))
+            afetadas = {maquina_id}
+        elif tipo == 'quantidade':
+            quantidade = edicao['quantidade']
+            if quantidade <= 0:
+                raise ErroCenario("A quantidade deve ser positiva.")
+            reserva = self._reserva(edicao['op_id'])
+            op = self._ops[reserva.op_id]
+            if reserva.fixa:
+                raise ErroCenario(f"OP-{reserva.op_id} já está em produção.")
+            reserva.duracao = (reserva.base_fim - reserva.base_inicio) * quantidade / op['base_quantidade']
+            op['quantidade'] = quantidade
+            afetadas = {reserva.maquina_id}
+        elif tipo == 'mover':
+            reserva = self._reserva(edicao['op_id'])
+            if reserva.fixa:
+                raise ErroCenario(f"OP-{reserva.op_id} já está em produção.")
+            lado = edicao.get('lado')
+            if lado not in LADOS + (None,):
+                raise ErroCenario(f"Lado inválido: {lado}.")
+            afetadas = {reserva.maquina_id, edicao['maquina_id']}
+            self._por_maquina[reserva.maquina_id].remove(reserva)
+            reserva.maquina_id, reserva.lado = edicao['maquina_id'], lado
+            reserva.planejado = _proxima_hora_cheia(edicao['inicio'])
+            self._por_maquina.setdefault(reserva.maquina_id, []).append(reserva)
+        else:
+            raise ErroCenario(f"Edição inválida: {tipo}.")
+
+        for maquina_id in afetadas:
+            self._recalcular_maquina(maquina_id)
+        self.edicoes.append(edicao)
+
+    # -------------------------------------------------------------------
+    # Resultado
+    # -------------------------------------------------------------------
+
+    def _formatar(self, reserva):
+        op = self._ops[reserva.op_id]
+        return {
+            'agendamento_id': reserva.id,
+            'op_id': reserva.op_id,
+            'maquina_id': reserva.maquina_id,
+            'lado': reserva.lado,
+            'inicio': reserva.inicio,
+            'fim': reserva.fim,
+            'deslocamento_horas': round((reserva.fim - reserva.base_fim).total_seconds() / 3600, 2),
+            'quantidade': op['quantidade'],
+            'entrega': op['entrega'],
+            'folga_horas': round((op['prazo'] - reserva.fim).total_seconds() / 3600, 2),
+        }
+
+    def agendamentos(self, somente_alterados=False):
+        reservas = sorted(self._reservas.values(), key=lambda r: (r.maquina_id, r.inicio, r.id))
+        return [
+            self._formatar(reserva) for reserva in reservas
+            if not somente_alterados or reserva.alterada() or self._ops[reserva.op_id]['quantidade'] != self._ops[reserva.op_id]['base_quantidade']
+        ]
+
+    def resumo(self):
+        return {
+            'agendamentos': len(self._reservas),
+            'edicoes': len(self.edicoes),
+            'ops_atrasadas': sum(atrasadas for atrasadas, _ in self._atrasos.values()),
+            'horas_de_atraso': round(sum(horas for _, horas in self._atrasos.values()), 2),
+        }
+
+    # -------------------------------------------------------------------
+    # Gravação
+    # -------------------------------------------------------------------
+
+    def aplicar(self):
+        """
+        Grava o cenário em uma única transação: novas quantidades e as
+        remarcações (via `aplicar_lote`, que revalida os conflitos). Se o
+        quadro real mudou desde a carga, nada é gravado.
+        Retorna (ok, resultados) como `aplicar_lote`.
+        """
+        quantidades = {
+            op_id: op['quantidade'] for op_id, op in self._ops.items() if op['quantidade'] != op['base_quantidade']
+        }
+        alteradas = [r for r in self._reservas.values() if not r.fixa and (r.alterada() or r.op_id in quantidades)]
+        if not alteradas:
+            return True, []
+
+        with transaction.atomic():
+            atuais = {
+                ag['id']: ag for ag in Agendamento.objects.select_for_update().filter(
+                    id__in=[r.id for r in alteradas]
+                ).values('id', 'maquina_id', 'lado', 'start_datetime', 'end_datetime', 'ordem_producao__quantity')
+            }
+            for reserva in alteradas:
+                atual = atuais.get(reserva.id)
+                if atual is None or (
+                    atual['maquina_id'], atual['lado'] if atual['lado'] in LADOS else None,
+                    atual['start_datetime'], atual['end_datetime'], atual['ordem_producao__quantity'],
+                ) != (
+                    reserva.base_maquina_id, reserva.base_lado, reserva.base_inicio, reserva.base_fim,
+                    self._ops[reserva.op_id]['base_quantidade'],
+                ):
+                    raise ErroCenario(f"O agendamento da OP-{reserva.op_id} mudou desde que o cenário foi criado.")
+
+            for op in OrdemProducao.objects.filter(id__in=quantidades):
+                op.quantity = quantidades[op.id]
+                op.save()
+
+            operacoes = []
+            for reserva in alteradas:
+                inicio = timezone.localtime(reserva.inicio)
+                operacoes.append({
+                    'acao': 'mover',
+                    'op_id': reserva.op_id,
+                    'maquina_id': reserva.maquina_id,
+                    'lado': reserva.lado,
+                    'start_date': inicio.strftime('%Y-%m-%d'),
+                    'start_hour': inicio.hour,
+                })
+            ok, resultados = aplicar_lote(operacoes)
+            if not ok:
+                transaction.set_rollback(True)
+        return ok, resultados
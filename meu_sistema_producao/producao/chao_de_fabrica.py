@@ -0,0 +1,102 @@
+# meu_sistema_producao/producao/chao_de_fabrica.py
+
+"""
+Estado de todas as máquinas do chão de fábrica em uma única resposta.
+
+`get_dados_maquina_api` atende uma máquina por requisição; o tablet do
+supervisor, que mostra a fábrica inteira, faria uma requisição por
+`Maquina`. Aqui as OPs em produção e as próximas de todas as máquinas (ou
+de uma seleção) saem em três queries, qualquer que seja o número de
+máquinas: máquinas, agendamentos em produção e próximos agendamentos (os
+primeiros de cada máquina e lado, com uma window function).
+
+A resposta é orientada a colunas ({campo: [valores]}) e os PNs vão numa
+tabela à parte, referenciados pela posição, para não repetir descrição e
+medidas em cada OP. Só vão os campos do PN que a tela de produção mostra.
+"""
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .models import Maquina, Agendamento
+
+
+CAMPOS_PN = ('pn_code', 'description', 'capacity_liters', 'cycle_time_seconds', 'min_weight_kg', 'max_weight_kg')
+
+CAMPOS_OP = (
+    'agendamento_id', 'maquina_id', 'situacao', 'op_id', 'lado', 'pn',
+    'quantidade_total', 'quantidade_produzida', 'status', 'inicio_agendado',
+)
+
+EM_PRODUCAO = 'em_producao'
+PROXIMA = 'proxima'
+
+
+def _colunas(linhas, campos):
+    return {campo: [linha[campo] for linha in linhas] for campo in campos}
+
+
+def _agendamentos(qs):
+    return qs.values(
+        'id', 'maquina_id', 'lado', 'start_datetime', 'ordem_producao_id',
+        'ordem_producao__quantity', 'ordem_producao__quantidade_produzida', 'ordem_producao__status',
+        'ordem_producao__pn_id', *(f'ordem_producao__pn__{campo}' for campo in CAMPOS_PN),
+    )
+
+
+def estado_da_fabrica(maquina_ids=None, proximas_por_lado=1):
+    """
+    OPs em produção e as `proximas_por_lado` próximas OPs planejadas (a
+    partir de hoje) de cada lado das máquinas em `maquina_ids` (todas, se
+    None). Retorna {'maquinas', 'pns', 'ops'}, cada um com colunas de
+    mesmo tamanho; `ops['pn']` é a posição do PN em `pns`.
+    """
+    maquinas = Maquina.objects.order_by('number')
+    agendamentos = Agendamento.objects.all()
+    if maquina_ids is not None:
+        maquinas = maquinas.filter(id__in=maquina_ids)
+        agendamentos = agendamentos.filter(maquina_id__in=maquina_ids)
+
+    em_producao = _agendamentos(
+        agendamentos.filter(ordem_producao__status='Em Produção').order_by('maquina_id', 'start_datetime')
+    )
+    proximas = _agendamentos(
+        agendamentos.filter(
+            ordem_producao__status='Planejada',
+            start_datetime__date__gte=timezone.localdate(),
+        ).annotate(
+            posicao=Window(
+                RowNumber(),
+                partition_by=[F('maquina_id'), F('lado')],
+                order_by=[F('start_datetime').asc(), F('id').asc()],
+            )
+        ).filter(posicao__lte=proximas_por_lado).order_by('maquina_id', 'start_datetime')
+    )
+
+    pns = {}  # pn_id -> posição em 'pns'
+    linhas_pn = []
+    linhas_op = []
+    for situacao, linhas in ((EM_PRODUCAO, em_producao), (PROXIMA, proximas)):
+        for linha in linhas:
+            pn_id = linha['ordem_producao__pn_id']
+            if pn_id not in pns:
+                pns[pn_id] = len(linhas_pn)
+                linhas_pn.append({'id': pn_id, **{campo: linha[f'ordem_producao__pn__{campo}'] for campo in CAMPOS_PN}})
+            linhas_op.append({
+                'agendamento_id': linha['id'],
+                'maquina_id': linha['maquina_id'],
+                'situacao': situacao,
+                'op_id': linha['ordem_producao_id'],
+                'lado': linha['lado'],
+                'pn': pns[pn_id],
+                'quantidade_total': linha['ordem_producao__quantity'],
+                'quantidade_produzida': linha['ordem_producao__quantidade_produzida'],
+                'status': linha['ordem_producao__status'],
+                'inicio_agendado': timezone.localtime(linha['start_datetime']).strftime('%d/%m %H:%M'),
+            })
+
+    return {
+        'maquinas': _colunas(list(maquinas.values('id', 'number')), ('id', 'number')),
+        'pns': _colunas(linhas_pn, ('id',) + CAMPOS_PN),
+        'ops': _colunas(linhas_op, CAMPOS_OP),
+    }
@@ -0,0 +1,315 @@
+# meu_sistema_producao/producao/ciclos.py
+
+"""
+Sinais de fim de ciclo enviados pelas máquinas (ou por um gateway de CLPs).
+
+Com 80 máquinas e ciclos de poucos segundos, gravar um
+`ApontamentoProducao` por ciclo encheria a tabela e disputaria a linha da
+OP a cada sinal. O `Agregador` acumula os ciclos em memória por
+(agendamento em produção, hora) e grava tudo de uma vez a cada
+settings.CICLOS_DESCARGA_SEGUNDOS ou quando passam de
+settings.CICLOS_DESCARGA_MAXIMO ciclos pendentes, o que vier primeiro: um
+apontamento por balde, com o mesmo caminho da ingestão em lote
+(`ingestao.gravar_eventos`: bulk_create, um UPDATE por OP e por balde do
+consolidado).
+
+Cada apontamento guarda quantos ciclos somou, o tempo médio entre sinais
+seguidos e quantos intervalos entraram nessa média, para comparar com o `Pn.cycle_time_seconds` (ver
+`comparar_tempos_de_ciclo`). Intervalos maiores que FATOR_PARADA vezes o
+ciclo nominal são tratados como máquina parada e não entram na média.
+
+Com vários workers do gunicorn, os sinais de uma máquina se espalham entre
+os processos. Por isso o momento do último sinal de cada agendamento não
+fica na memória do processo, e sim no cache 'ciclos' (settings.CACHES),
+compartilhado: o intervalo é sempre medido contra o último sinal recebido
+por qualquer worker. São uma leitura e uma escrita no cache por lote de
+sinais (`registrar_varios`).
+
+As peças acumuladas, por outro lado, são de cada processo: o que ainda não
+foi descarregado se perde se o worker for morto com SIGKILL (timeout ou
+falta de memória), no máximo settings.CICLOS_DESCARGA_SEGUNDOS de sinais.
+Numa parada ou reinício normal (SIGTERM/SIGHUP do gunicorn) o pendente é
+gravado pelo `atexit`.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, DatabaseError
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from .models import Agendamento, ApontamentoProducao
+from .conflitos import LADOS
+from .ingestao import gravar_eventos, ler_momento, EventoInvalido
+from .cascata import reprogramar_maquina
+from . import rollup
+
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre sinais acima de FATOR_PARADA x ciclo nominal: a máquina parou
+FATOR_PARADA = 3
+
+# Uma máquina desconhecida só força nova leitura das OPs em produção depois
+# deste tempo (evita uma query por sinal de máquina parada)
+RELEITURA_MINIMA_SEGUNDOS = 1
+
+# Por quanto tempo o cache guarda o último sinal de um agendamento sem novos sinais
+VALIDADE_ULTIMO_SINAL = 24 * 3600
+
+
+def _chave_ultimo_sinal(agendamento_id):
+    return f'ciclos:ultimo:{agendamento_id}'
+
+
+def ler_sinal(sinal, agora):
+    """Valida um sinal {maquina_id, momento?, pecas?, lado?} e devolve (maquina_id, momento, pecas, lado)."""
+    if not isinstance(sinal, dict):
+        raise EventoInvalido("Sinal inválido.")
+    try:
+        maquina_id = int(sinal.get('maquina_id'))
+    except (TypeError, ValueError):
+        raise EventoInvalido("Sinal sem 'maquina_id'.")
+    momento = ler_momento(sinal['momento'], agora, 'momento') if sinal.get('momento') else agora
+    try:
+        pecas = int(sinal.get('pecas', 1))
+    except (TypeError, ValueError):
+        raise EventoInvalido("Quantidade de peças inválida.")
+    if pecas <= 0:
+        raise EventoInvalido("Quantidade de peças deve ser positiva.")
+    lado = sinal.get('lado')
+    if lado is not None and lado not in LADOS:
+        raise EventoInvalido(f"Lado inválido: {lado!r}.")
+    return maquina_id, momento, pecas, lado
+
+
+class _Acumulado:
+    __slots__ = ('agendamento', 'pecas', 'ciclos', 'soma_intervalos', 'intervalos', 'ultimo')
+
+    def __init__(self, agendamento):
+        self.agendamento = agendamento
+        self.pecas = 0
+        self.ciclos = 0
+        self.soma_intervalos = 0.0
+        self.intervalos = 0
+        self.ultimo = None
+
+    def juntar(self, outro):
+        self.pecas += outro.pecas
+        self.ciclos += outro.ciclos
+        self.soma_intervalos += outro.soma_intervalos
+        self.intervalos += outro.intervalos
+        self.ultimo = max(self.ultimo, outro.ultimo)
+
+    def apontamento(self):
+        return ApontamentoProducao(
+            agendamento=self.agendamento,
+            quantidade=self.pecas,
+            data_apontamento=self.ultimo,
+            ciclos=self.ciclos,
+            tempo_ciclo_real_segundos=self.soma_intervalos / self.intervalos if self.intervalos else None,
+            intervalos=self.intervalos,
+        )
+
+
+class Agregador:
+    """
+    Acumula sinais de ciclo e os grava em lote. Seguro para várias threads
+    do mesmo processo; `relogio` e `ultimos` (o cache do último sinal) só
+    existem para os testes.
+    """
+
+    def __init__(self, segundos=None, maximo=None, relogio=time.monotonic, ultimos=None):
+        self.segundos = segundos if segundos is not None else settings.CICLOS_DESCARGA_SEGUNDOS
+        self.maximo = maximo if maximo is not None else settings.CICLOS_DESCARGA_MAXIMO
+        self._relogio = relogio
+        self._ultimos = ultimos if ultimos is not None else caches['ciclos']
+        self._trava = threading.Lock()
+        self._pendentes = {}        # (agendamento_id, hora) -> _Acumulado
+        self._total = 0             # ciclos pendentes
+        self._rodando = {}          # maquina_id -> [(Agendamento, ciclo nominal)]
+        self._rodando_em = None
+        self._timer = None
+
+    # --- OPs em produção -------------------------------------------------
+
+    def _carregar_rodando(self):
+        rodando = {}
+        for linha in Agendamento.objects.filter(
+            ordem_producao__status='Em Produção',
+            real_start_datetime__isnull=False,
+            real_end_datetime__isnull=True,
+        ).values('id', 'maquina_id', 'lado', 'ordem_producao_id', 'ordem_producao__pn__cycle_time_seconds'):
+            agendamento = Agendamento(
+                id=linha['id'], maquina_id=linha['maquina_id'], lado=linha['lado'],
+                ordem_producao_id=linha['ordem_producao_id'],
+            )
+            rodando.setdefault(linha['maquina_id'], []).append((agendamento, linha['ordem_producao__pn__cycle_time_seconds']))
+        return rodando
+
+    def _alvos(self, maquina_id, lado):
+        """Agendamentos que recebem o ciclo: os do lado informado (ou sem lado); sem lado, todos da máquina."""
+        idade = None if self._rodando_em is None else self._relogio() - self._rodando_em
+        if idade is None or idade > self.segundos or (maquina_id not in self._rodando and idade > RELEITURA_MINIMA_SEGUNDOS):
+            self._rodando = self._carregar_rodando()
+            self._rodando_em = self._relogio()
+        alvos = self._rodando.get(maquina_id, [])
+        if lado is None:
+            return alvos
+        return [(agendamento, nominal) for agendamento, nominal in alvos if agendamento.lado in (lado, None)]
+
+    # --- Acúmulo ------------------------------------------------------------
+
+    def registrar(self, maquina_id, momento, pecas=1, lado=None):
+        """
+        Soma um ciclo de `pecas` peças às OPs em produção na máquina.
+        Retorna quantos agendamentos receberam o ciclo (0: nenhuma OP rodando).
+        """
+        return self.registrar_varios([(maquina_id, momento, pecas, lado)])[0]
+
+    def registrar_varios(self, sinais):
+        """
+        Como `registrar`, para uma lista de (maquina_id, momento, pecas, lado)
+        em ordem cronológica. Retorna a lista de agendamentos atingidos por
+        sinal. Os últimos sinais são lidos do cache compartilhado de uma vez
+        e regravados de uma vez.
+        """
+        with self._trava:
+            alvos_por_sinal = [self._alvos(maquina_id, lado) for maquina_id, _, _, lado in sinais]
+            chaves = {
+                agendamento.id: _chave_ultimo_sinal(agendamento.id)
+                for alvos in alvos_por_sinal for agendamento, _ in alvos
+            }
+            lidos = self._ultimos.get_many(list(chaves.values())) if chaves else {}
+            ultimos = {ag_id: lidos.get(chave) for ag_id, chave in chaves.items()}
+            novos = {}
+
+            for (_, momento, pecas, _), alvos in zip(sinais, alvos_por_sinal):
+                for agendamento, nominal in alvos:
+                    chave = (agendamento.id, rollup.inicio_da_hora(momento))
+                    acumulado = self._pendentes.get(chave)
+                    if acumulado is None:
+                        acumulado = self._pendentes[chave] = _Acumulado(agendamento)
+                    acumulado.pecas += pecas
+                    acumulado.ciclos += 1
+                    acumulado.ultimo = momento if acumulado.ultimo is None else max(acumulado.ultimo, momento)
+
+                    anterior = ultimos[agendamento.id]
+                    if anterior is None or momento > anterior:
+                        if anterior is not None:
+                            intervalo = (momento - anterior).total_seconds()
+                            if not nominal or intervalo <= FATOR_PARADA * nominal:
+                                acumulado.soma_intervalos += intervalo
+                                acumulado.intervalos += 1
+                        ultimos[agendamento.id] = novos[chaves[agendamento.id]] = momento
+                self._total += len(alvos)
+
+            if novos:
+                self._ultimos.set_many(novos, VALIDADE_ULTIMO_SINAL)
+            descarregar_agora = self._total >= self.maximo
+            if self._pendentes and not descarregar_agora and self._timer is None:
+                self._timer = threading.Timer(self.segundos, self._descarregar_no_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if descarregar_agora:
+            self.descarregar()
+        return [len(alvos) for alvos in alvos_por_sinal]
+
+    def _descarregar_no_timer(self):
+        try:
+            self.descarregar()
+        finally:
+            # A thread do timer abre a própria conexão
+            connection.close()
+
+    def descarregar(self):
+        """Grava os ciclos pendentes. Retorna o número de apontamentos criados."""
+        with self._trava:
+            pendentes, self._pendentes, self._total = self._pendentes, {}, 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pendentes:
+            return 0
+
+        try:
+            gravar_eventos([acumulado.apontamento() for acumulado in pendentes.values()])
+        except DatabaseError:
+            logger.exception("Falha ao gravar %s baldes de ciclos; nova tentativa na próxima descarga", len(pendentes))
+            with self._trava:
+                for chave, acumulado in pendentes.items():
+                    if chave in self._pendentes:
+                        acumulado.juntar(self._pendentes[chave])
+                    self._pendentes[chave] = acumulado
+                    self._total += acumulado.ciclos
+                if self._timer is None:
+                    self._timer = threading.Timer(self.segundos, self._descarregar_no_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+            return 0
+
+        if settings.REPROGRAMAR_AO_APONTAR:
+            for maquina_id in {acumulado.agendamento.maquina_id for acumulado in pendentes.values()}:
+                try:
+                    reprogramar_maquina(maquina_id)
+                except DatabaseError:
+                    logger.exception("Falha ao reprogramar a máquina %s", maquina_id)
+        return len(pendentes)
+
+
+agregador = Agregador()
+atexit.register(agregador.descarregar)
+
+
+# =======================================================================
+# CICLO NOMINAL x CICLO REAL
+# =======================================================================
+
+def comparar_tempos_de_ciclo(maquina_ids=None, desde=None):
+    """
+    Por agendamento, o ciclo nominal do PN e o ciclo real medido pelos
+    sinais: média dos apontamentos ponderada pelo número de intervalos
+    medidos em cada um, ou seja, a média de todos os intervalos. Pesar pelos
+    ciclos daria peso demais a um balde com muitos ciclos e quase todos os
+    intervalos descartados como parada. Apontamentos gravados antes do campo
+    `intervalos` usam os ciclos como peso.
+    `desvio_percentual` positivo: a máquina está mais lenta que o cadastro.
+    """
+    peso = Coalesce('intervalos', 'ciclos')
+    apontamentos = ApontamentoProducao.objects.filter(ciclos__isnull=False, tempo_ciclo_real_segundos__isnull=False)
+    if maquina_ids is not None:
+        apontamentos = apontamentos.filter(agendamento__maquina_id__in=maquina_ids)
+    if desde is not None:
+        apontamentos = apontamentos.filter(data_apontamento__gte=desde)
+
+    resultado = []
+    for linha in apontamentos.values(
+        'agendamento_id',
+        'agendamento__maquina_id',
+        'agendamento__maquina__number',
+        'agendamento__ordem_producao_id',
+        'agendamento__ordem_producao__pn__pn_code',
+        'agendamento__ordem_producao__pn__cycle_time_seconds',
+    ).annotate(
+        total_ciclos=Sum('ciclos'),
+        total_intervalos=Sum(peso),
+        soma_ponderada=Sum(peso * F('tempo_ciclo_real_segundos')),
+    ).order_by('agendamento__maquina__number', 'agendamento_id'):
+        nominal = linha['agendamento__ordem_producao__pn__cycle_time_seconds']
+        real = linha['soma_ponderada'] / linha['total_intervalos'] if linha['total_intervalos'] else None
+        resultado.append({
+            'agendamento_id': linha['agendamento_id'],
+            'maquina_id': linha['agendamento__maquina_id'],
+            'maquina': linha['agendamento__maquina__number'],
+            'op_id': linha['agendamento__ordem_producao_id'],
+            'pn': linha['agendamento__ordem_producao__pn__pn_code'],
+            'ciclos': linha['total_ciclos'],
+            'ciclo_nominal_segundos': nominal,
+            'ciclo_real_segundos': round(real, 2) if real is not None else None,
+            'desvio_percentual': round((real - nominal) / nominal * 100, 1) if real is not None and nominal else None,
+        })
+    return resultado
@@ -0,0 +1,140 @@
+# meu_sistema_producao/producao/compatibilidade.py
+
+"""
+Matriz de compatibilidade PN x máquina.
+
+Um PN cabe numa máquina quando a capacidade em litros e as três dimensões
+do produto não passam das do molde (mesma regra de
+`agendador.compativel`). A matriz é calculada de uma vez com NumPy para
+todos os pares e só os pares compatíveis são gravados em
+`CompatibilidadePnMaquina`, que o quadro de planejamento e o agendador
+consultam em vez de comparar medidas a cada OP.
+
+A tabela é recalculada depois do commit quando um PN ou uma máquina é
+gravado (ver producao/signals.py) e ao final de uma importação do
+`PnResource`. O comando `recalcular_compatibilidade` refaz tudo.
+"""
+
+import threading
+import numpy as np
+from django.db import transaction
+from .models import Pn, Maquina, CompatibilidadePnMaquina
+
+
+CAMPOS_PN = ('capacity_liters', 'dim_c', 'dim_a', 'dim_l')
+CAMPOS_MAQUINA = ('capacity_liters', 'mold_dim_c', 'mold_dim_a', 'mold_dim_l')
+
+
+# =======================================================================
+# CÁLCULO VETORIZADO
+# =======================================================================
+
+def _medidas(linhas, campos):
+    return np.array([[float(linha[campo]) for campo in campos] for linha in linhas], dtype=float).reshape(-1, len(campos))
+
+
+def matriz(pns, maquinas):
+    """
+    Matriz booleana (len(pns) x len(maquinas)): True quando o PN cabe na
+    máquina. `pns` e `maquinas` são dicts com os campos de CAMPOS_PN e
+    CAMPOS_MAQUINA.
+    """
+    medidas_pn = _medidas(pns, CAMPOS_PN)
+    medidas_maquina = _medidas(maquinas, CAMPOS_MAQUINA)
+    return (medidas_pn[:, np.newaxis, :] <= medidas_maquina[np.newaxis, :, :]).all(axis=2)
+
+
+def pares_compativeis(pns, maquinas):
+    """Lista de tuplas (pn_id, maquina_id) compatíveis."""
+    if not pns or not maquinas:
+        return []
+    linhas, colunas = np.nonzero(matriz(pns, maquinas))
+    return [(pns[i]['id'], maquinas[j]['id']) for i, j in zip(linhas.tolist(), colunas.tolist())]
+
+
+# =======================================================================
+# GRAVAÇÃO
+# =======================================================================
+
+def recalcular(pn_ids=None, maquina_ids=None):
+    """
+    Refaz os pares dos PNs em `pn_ids` (contra todas as máquinas) e das
+    máquinas em `maquina_ids` (contra todos os PNs). Sem nenhum dos dois,
+    refaz a tabela inteira. Retorna o número de pares gravados.
+    """
+    tudo = pn_ids is None and maquina_ids is None
+    pn_ids = set(pn_ids or ())
+    maquina_ids = set(maquina_ids or ())
+
+    todos_pns = Pn.objects.order_by('id').values('id', *CAMPOS_PN)
+    todas_maquinas = Maquina.objects.order_by('id').values('id', *CAMPOS_MAQUINA)
+
+    pares = set()
+    if tudo:
+        pares.update(pares_compativeis(list(todos_pns), list(todas_maquinas)))
+    else:
+        if pn_ids:
+            pares.update(pares_compativeis(list(todos_pns.filter(id__in=pn_ids)), list(todas_maquinas)))
+        if maquina_ids:
+            pares.update(pares_compativeis(list(todos_pns), list(todas_maquinas.filter(id__in=maquina_ids))))
+
+    with transaction.atomic():
+        antigos = CompatibilidadePnMaquina.objects.all()
+        if not tudo:
+            antigos = antigos.filter(pn_id__in=pn_ids) | antigos.filter(maquina_id__in=maquina_ids)
+        antigos.delete()
+        CompatibilidadePnMaquina.objects.bulk_create(
+            [CompatibilidadePnMaquina(pn_id=pn_id, maquina_id=maquina_id) for pn_id, maquina_id in sorted(pares)],
+            batch_size=1000,
+        )
+    return len(pares)
+
+
+_estado = threading.local()
+
+
+def _recalcular_pendentes():
+    pendentes = getattr(_estado, 'pendentes', None)
+    if not pendentes:
+        return
+    tudo = pendentes['tudo']
+    pn_ids, maquina_ids = set(pendentes['pns']), set(pendentes['maquinas'])
+    pendentes.update(tudo=False, pns=set(), maquinas=set())
+    if tudo:
+        recalcular()
+    elif pn_ids or maquina_ids:
+        recalcular(pn_ids, maquina_ids)
+
+
+def agendar_recalculo(pn_ids=(), maquina_ids=(), tudo=False):
+    """
+    Recalcula os pares quando a transação atual terminar. Várias escritas
+    na mesma transação (ex: uma importação de PNs) resultam em um único
+    recálculo.
+    """
+    if not hasattr(_estado, 'pendentes'):
+        _estado.pendentes = {'tudo': False, 'pns': set(), 'maquinas': set()}
+    _estado.pendentes['tudo'] |= tudo
+    _estado.pendentes['pns'].update(pn_ids)
+    _estado.pendentes['maquinas'].update(maquina_ids)
+    transaction.on_commit(_recalcular_pendentes)
+
+
+# =======================================================================
+# CONSULTA
+# =======================================================================
+
+def mapa_compatibilidade(pn_ids=None):
+    """{pn_id: set(maquina_ids)} em uma query; PNs sem máquina ficam de fora."""
+    qs = CompatibilidadePnMaquina.objects.all()
+    if pn_ids is not None:
+        qs = qs.filter(pn_id__in=pn_ids)
+    mapa = {}
+    for pn_id, maquina_id in qs.values_list('pn_id', 'maquina_id'):
+        mapa.setdefault(pn_id, set()).add(maquina_id)
+    return mapa
+
+
+def maquinas_compativeis(pn_id):
+    """Ids das máquinas em que o PN cabe, em ordem."""
+    return sorted(mapa_compatibilidade([pn_id]).get(pn_id, ()))
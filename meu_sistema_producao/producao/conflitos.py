@@ -0,0 +1,129 @@
+# meu_sistema_producao/producao/conflitos.py
+
+"""
+Detecção de conflitos de agendamento (mesma máquina, mesmo lado, horários
+sobrepostos).
+
+Um agendamento sem lado ocupa a máquina inteira, então conflita com os
+dois lados (mesma regra do agendador automático). Agendamentos de OPs
+concluídas não ocupam mais a máquina e são ignorados.
+
+- `conflitos_do_agendamento` checa um horário proposto com uma range query
+  coberta pelo índice (maquina, end_datetime).
+- `IndiceIntervalos` guarda os agendamentos de cada (máquina, lado)
+  ordenados pelo início, com o maior fim acumulado, e responde "quem cruza
+  [inicio, fim)?" com busca binária. O relatório de conflitos do horizonte
+  usa esse índice.
+"""
+
+from bisect import bisect_left, insort
+from django.db.models import Q
+from .models import Agendamento
+
+
+LADOS = ('L', 'R')
+
+CAMPOS = ('id', 'ordem_producao_id', 'maquina_id', 'lado', 'start_datetime', 'end_datetime')
+
+
+def _agendamentos_ativos():
+    return Agendamento.objects.exclude(ordem_producao__status='Concluída')
+
+
+def _lados_em_conflito(lado):
+    """Lados (incluindo None = máquina inteira) que conflitam com `lado`."""
+    return (lado, None) if lado in LADOS else LADOS + (None,)
+
+
+def conflitos_do_agendamento(maquina_id, lado, inicio, fim, ignorar_op_id=None):
+    """
+    Agendamentos que cruzam [inicio, fim) na máquina e no lado informados.
+    `ignorar_op_id` exclui a própria OP (quando ela está sendo remarcada).
+    Retorna uma lista de dicts com os campos de CAMPOS.
+    """
+    lados = _lados_em_conflito(lado)
+    filtro_lado = Q(lado__in=[l for l in lados if l is not None]) | Q(lado__isnull=True)
+    qs = _agendamentos_ativos().filter(
+        filtro_lado,
+        maquina_id=maquina_id,
+        end_datetime__gt=inicio,
+        start_datetime__lt=fim,
+    )
+    if ignorar_op_id is not None:
+        qs = qs.exclude(ordem_producao_id=ignorar_op_id)
+    return list(qs.order_by('start_datetime').values(*CAMPOS))
+
+
+class IndiceIntervalos:
+    """
+    Índice em memória dos agendamentos por (máquina, lado). Cada faixa é
+    uma lista ordenada por início; `maior_fim[i]` é o maior fim entre os
+    i+1 primeiros. Uma consulta acha por busca binária o último início
+    antes do fim pedido e volta enquanto o maior fim acumulado ainda
+    alcançar o início pedido: O(log n + k) quando os agendamentos de uma
+    faixa não se aninham.
+    """
+
+    def __init__(self, agendamentos=()):
+        self._faixas = {}
+        for agendamento in agendamentos:
+            self.adicionar(agendamento)
+
+    def adicionar(self, agendamento):
+        chave = (agendamento['maquina_id'], agendamento['lado'] if agendamento['lado'] in LADOS else None)
+        faixa = self._faixas.setdefault(chave, {'itens': [], 'maior_fim': None})
+        insort(faixa['itens'], (agendamento['start_datetime'], agendamento['id'], agendamento))
+        faixa['maior_fim'] = None # Recalculado na próxima consulta
+
+    def _maior_fim(self, faixa):
+        if faixa['maior_fim'] is None:
+            maior_fim = []
+            acumulado = None
+            for _, _, agendamento in faixa['itens']:
+                fim = agendamento['end_datetime']
+                acumulado = fim if acumulado is None or fim > acumulado else acumulado
+                maior_fim.append(acumulado)
+            faixa['maior_fim'] = maior_fim
+        return faixa['maior_fim']
+
+    def consultar(self, maquina_id, lado, inicio, fim):
+        """Agendamentos que cruzam [inicio, fim) na máquina e no lado."""
+        encontrados = []
+        for lado_faixa in _lados_em_conflito(lado):
+            faixa = self._faixas.get((maquina_id, lado_faixa))
+            if not faixa:
+                continue
+            itens = faixa['itens']
+            maior_fim = self._maior_fim(faixa)
+            # Primeiro item com início >= fim: todos antes dele começam antes do fim
+            posicao = bisect_left(itens, (fim,)) - 1
+            while posicao >= 0 and maior_fim[posicao] > inicio:
+                agendamento = itens[posicao][2]
+                if agendamento['end_datetime'] > inicio:
+                    encontrados.append(agendamento)
+                posicao -= 1
+        encontrados.sort(key=lambda agendamento: (agendamento['start_datetime'], agendamento['id']))
+        return encontrados
+
+
+def conflitos_no_horizonte(inicio, fim, maquina_ids=None):
+    """
+    Todos os pares de agendamentos em conflito que cruzam [inicio, fim).
+    Retorna uma lista de tuplas (agendamento, agendamento), cada par uma
+    única vez.
+    """
+    qs = _agendamentos_ativos().filter(end_datetime__gt=inicio, start_datetime__lt=fim)
+    if maquina_ids is not None:
+        qs = qs.filter(maquina_id__in=maquina_ids)
+    agendamentos = list(qs.values(*CAMPOS))
+
+    indice = IndiceIntervalos(agendamentos)
+    pares = []
+    for agendamento in agendamentos:
+        for outro in indice.consultar(
+            agendamento['maquina_id'], agendamento['lado'], agendamento['start_datetime'], agendamento['end_datetime']
+        ):
+            if outro['id'] > agendamento['id']:
+                pares.append((agendamento, outro))
+    pares.sort(key=lambda par: (par[0]['maquina_id'], par[0]['start_datetime'], par[1]['start_datetime']))
+    return pares
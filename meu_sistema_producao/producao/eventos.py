@@ -0,0 +1,89 @@
+# meu_sistema_producao/producao/eventos.py
+
+"""
+Difusor em memória para o stream SSE do dashboard.
+
+Cada conexão SSE assina o difusor com uma fila asyncio própria. Depois do
+commit de um apontamento, parada ou refugo, os KPIs da máquina afetada são
+recalculados e publicados para todas as conexões do processo.
+
+O difusor só alcança as conexões do próprio processo. Para as escritas
+atendidas por outro worker, cada stream confere a cada
+SSE_VERIFICACAO_SEGUNDOS o contador de versão do dashboard (no banco, ver
+producao/versoes.py) e, se ele mudou, envia os KPIs de todas as máquinas.
+Os clientes que não conseguem manter o stream voltam ao polling da API JSON.
+"""
+
+import asyncio
+import threading
+from django.db import transaction
+from .oee import calcular_kpis_maquinas
+
+
+TAMANHO_FILA = 100
+
+
+class Difusor:
+    def __init__(self):
+        self._assinantes = set()
+        self._lock = threading.Lock()
+
+    def assinar(self):
+        """Deve ser chamado de dentro do event loop da conexão SSE."""
+        assinatura = (asyncio.get_running_loop(), asyncio.Queue(maxsize=TAMANHO_FILA))
+        with self._lock:
+            self._assinantes.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            self._assinantes.discard(assinatura)
+
+    def tem_assinantes(self):
+        return bool(self._assinantes)
+
+    def publicar(self, mensagem):
+        """Pode ser chamado de qualquer thread (ex: views síncronas)."""
+        with self._lock:
+            assinantes = list(self._assinantes)
+        for loop, fila in assinantes:
+            try:
+                loop.call_soon_threadsafe(self._entregar, fila, mensagem)
+            except RuntimeError:
+                # Loop já encerrado: a conexão caiu sem cancelar a assinatura
+                self.cancelar((loop, fila))
+
+    @staticmethod
+    def _entregar(fila, mensagem):
+        if fila.full():
+            # Cliente lento: descarta a mensagem mais antiga
+            fila.get_nowait()
+        fila.put_nowait(mensagem)
+
+
+difusor = Difusor()
+
+_estado = threading.local()
+
+
+def _publicar_pendentes():
+    pendentes = getattr(_estado, 'maquinas_pendentes', None)
+    if not pendentes:
+        return
+    maquina_ids = list(pendentes)
+    pendentes.clear()
+    if difusor.tem_assinantes():
+        difusor.publicar({'maquinas': calcular_kpis_maquinas(maquina_ids)})
+
+
+def notificar_maquinas(maquina_ids):
+    """
+    Publica os KPIs atualizados das máquinas quando a transação atual for
+    confirmada. Não faz nada se nenhum dashboard estiver conectado.
+    """
+    if not difusor.tem_assinantes():
+        return
+    if not hasattr(_estado, 'maquinas_pendentes'):
+        _estado.maquinas_pendentes = set()
+    _estado.maquinas_pendentes.update(maquina_ids)
+    transaction.on_commit(_publicar_pendentes)
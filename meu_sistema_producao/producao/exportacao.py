@@ -0,0 +1,249 @@
+# meu_sistema_producao/producao/exportacao.py
+
+"""
+Exportação do histórico de apontamentos, paradas e refugos para análise.
+
+O export do admin monta a planilha inteira em memória; com meses de
+eventos isso derruba o worker. Aqui as linhas vêm do banco em blocos
+(`QuerySet.iterator(chunk_size=...)`, que no PostgreSQL usa um cursor do
+lado do servidor) e já saem desnormalizadas (máquina, OP, PN, cliente e
+operador), numa única query por exportação, que inclui os eventos
+arquivados. Cada formato consome o gerador bloco a bloco:
+
+  - CSV: gerado em streaming, um pedaço da resposta por bloco;
+  - Parquet (colunar, para os analistas): um row group por bloco, em
+    streaming, com o pyarrow (em requirements.txt);
+  - XLSX: o openpyxl em modo write_only grava em um arquivo temporário,
+    que é enviado no final; exige o openpyxl e fica limitado às linhas
+    que o Excel abre.
+
+Em todos os casos a memória usada depende do tamanho do bloco, não do
+número de linhas exportadas.
+"""
+
+import csv
+import io
+import tempfile
+from django.conf import settings
+from django.db.models import F, DurationField, ExpressionWrapper
+from django.utils import timezone
+from .models import ApontamentoProducao, Parada, Refugo
+from .importacao import em_lotes
+from .arquivo import unir
+
+
+TAMANHO_BLOCO = 5000
+FORMATOS = ('csv', 'xlsx', 'parquet')
+TIPOS_CONTEUDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+# Linhas de uma planilha do Excel, sem o cabeçalho
+MAX_LINHAS_XLSX = 1_048_575
+
+# Colunas comuns às três fontes: (coluna, lookup, tipo)
+_CONTEXTO = (
+    ('maquina', 'agendamento__maquina__number', 'texto'),
+    ('lado', 'agendamento__lado', 'texto'),
+    ('op_id', 'agendamento__ordem_producao_id', 'inteiro'),
+    ('pn', 'agendamento__ordem_producao__pn__pn_code', 'texto'),
+    ('cliente', 'agendamento__ordem_producao__pn__cliente', 'texto'),
+    ('operador', 'operador__username', 'texto'),
+)
+
+# fonte -> (modelo, campo de data do filtro, colunas)
+FONTES = {
+    'producao': (ApontamentoProducao, 'data_apontamento', (
+        ('id', 'id', 'inteiro'),
+        ('data_apontamento', 'data_apontamento', 'data_hora'),
+        ('quantidade', 'quantidade', 'inteiro'),
+        ('ciclos', 'ciclos', 'inteiro'),
+        ('tempo_ciclo_real_segundos', 'tempo_ciclo_real_segundos', 'decimal'),
+        ('intervalos', 'intervalos', 'inteiro'),
+    ) + _CONTEXTO),
+    'paradas': (Parada, 'inicio_parada', (
+        ('id', 'id', 'inteiro'),
+        ('inicio_parada', 'inicio_parada', 'data_hora'),
+        ('fim_parada', 'fim_parada', 'data_hora'),
+        ('duracao_minutos', 'duracao', 'minutos'),
+        ('tipo_codigo', 'tipo_parada__codigo', 'texto'),
+        ('tipo_descricao', 'tipo_parada__descricao', 'texto'),
+        ('classificacao', 'tipo_parada__classificacao_parada', 'texto'),
+    ) + _CONTEXTO),
+    'refugos': (Refugo, 'data_apontamento', (
+        ('id', 'id', 'inteiro'),
+        ('data_apontamento', 'data_apontamento', 'data_hora'),
+        ('quantidade', 'quantidade', 'inteiro'),
+        ('tipo_codigo', 'tipo_refugo__codigo', 'texto'),
+        ('tipo_descricao', 'tipo_refugo__descricao', 'texto'),
+    ) + _CONTEXTO),
+}
+
+
+class ErroExportacao(Exception):
+    pass
+
+
+def colunas(fonte):
+    return [coluna for coluna, _, _ in FONTES[fonte][2]]
+
+
+def consultar(fonte, inicio, fim, maquina_ids=None):
+    """
+    Queryset (values_list, na ordem de `colunas`) dos eventos com data em
+    [inicio, fim), da tabela viva e do arquivo (ver producao/arquivo.py).
+    """
+    modelo, campo_data, definicao = FONTES[fonte]
+
+    def montar(qs):
+        qs = qs.filter(**{f'{campo_data}__gte': inicio, f'{campo_data}__lt': fim})
+        if maquina_ids:
+            qs = qs.filter(agendamento__maquina_id__in=maquina_ids)
+        if fonte == 'paradas':
+            qs = qs.annotate(duracao=ExpressionWrapper(F('fim_parada') - F('inicio_parada'), output_field=DurationField()))
+        return qs.values_list(*(lookup for _, lookup, _ in definicao))
+
+    return unir(modelo, montar).order_by(campo_data, 'id')
+
+
+def linhas(fonte, inicio, fim, maquina_ids=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera as linhas da exportação, lidas do banco em blocos. Datas no fuso
+    local (com tzinfo) e durações em minutos.
+    """
+    tipos = [tipo for _, _, tipo in FONTES[fonte][2]]
+    datas = [i for i, tipo in enumerate(tipos) if tipo == 'data_hora']
+    minutos = [i for i, tipo in enumerate(tipos) if tipo == 'minutos']
+    for linha in consultar(fonte, inicio, fim, maquina_ids).iterator(chunk_size=tamanho_bloco):
+        linha = list(linha)
+        for i in datas:
+            if linha[i] is not None:
+                linha[i] = timezone.localtime(linha[i])
+        for i in minutos:
+            if linha[i] is not None:
+                linha[i] = round(linha[i].total_seconds() / 60, 2)
+        yield linha
+
+
+# =======================================================================
+# FORMATOS
+# =======================================================================
+
+def csv_em_streaming(fonte, linhas_exportadas, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera o CSV em pedaços (bytes), um por bloco de linhas. Com BOM, para o Excel reconhecer o UTF-8."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(colunas(fonte))
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    for bloco in em_lotes(linhas_exportadas, tamanho_bloco):
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows(
+            [valor.strftime('%Y-%m-%d %H:%M:%S') if hasattr(valor, 'strftime') else valor for valor in linha]
+            for linha in bloco
+        )
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _SaidaParquet:
+    """
+    Destino só de escrita para o ParquetWriter: guarda os bytes escritos
+    até serem retirados, mas mantém a posição total (o rodapé do Parquet
+    registra a posição de cada row group).
+    """
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self.partes.append(dados)
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self):
+        dados = b''.join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ErroExportacao("A exportação em Parquet exige o pyarrow (pip install pyarrow). Use CSV.")
+    return pyarrow
+
+
+def parquet_em_streaming(fonte, linhas_exportadas, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera o arquivo Parquet em pedaços (bytes), um row group por bloco de linhas."""
+    pa = _pyarrow()
+    tipos = {
+        'inteiro': pa.int64(),
+        'decimal': pa.float64(),
+        'minutos': pa.float64(),
+        'texto': pa.string(),
+        'data_hora': pa.timestamp('us', tz=settings.TIME_ZONE),
+    }
+    esquema = pa.schema([(coluna, tipos[tipo]) for coluna, _, tipo in FONTES[fonte][2]])
+    saida = _SaidaParquet()
+    escritor = pa.parquet.ParquetWriter(saida, esquema, compression='snappy')
+    try:
+        for bloco in em_lotes(linhas_exportadas, tamanho_bloco):
+            valores = list(zip(*bloco))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(coluna, type=campo.type) for coluna, campo in zip(valores, esquema)],
+                schema=esquema,
+            ))
+            yield saida.retirar()
+    finally:
+        escritor.close()
+    yield saida.retirar()
+
+
+def _openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise ErroExportacao("A exportação em XLSX exige o openpyxl (pip install openpyxl). Use CSV.")
+    return openpyxl
+
+
+def xlsx_em_arquivo(fonte, linhas_exportadas):
+    """Grava a planilha em um arquivo temporário (aberto, no início) com o openpyxl em modo write_only."""
+    planilha = _openpyxl().Workbook(write_only=True)
+    aba = planilha.create_sheet(fonte)
+    aba.append(colunas(fonte))
+    for linha in linhas_exportadas:
+        # O openpyxl não aceita datas com fuso
+        aba.append([valor.replace(tzinfo=None) if getattr(valor, 'tzinfo', None) else valor for valor in linha])
+    arquivo = tempfile.TemporaryFile()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def verificar_formato(formato):
+    """Falha antes de a resposta começar, se a dependência do formato não estiver instalada."""
+    if formato not in FORMATOS:
+        raise ErroExportacao(f"Formato inválido. Use {', '.join(FORMATOS)}.")
+    if formato == 'parquet':
+        _pyarrow()
+    elif formato == 'xlsx':
+        _openpyxl()
@@ -11,4 +11,9 @@ class CustomLoginForm(AuthenticationForm):
 class OrdemProducaoForm(forms.ModelForm):
     class Meta:
         model = OrdemProducao
-        fields = ['pn', 'quantity', 'delivery_date'] # Escolha os campos que você quer exibir
\ No newline at end of file
+        fields = ['pn', 'quantity', 'delivery_date'] # Escolha os campos que você quer exibir
+
+class ImportacaoPlanilhaForm(forms.Form):
+    """Upload de planilha para a importação em lote (ver producao/importacao.py)."""
+    arquivo = forms.FileField(label="Planilha (CSV ou XLSX)")
+    dry_run = forms.BooleanField(label="Só validar (não grava nada)", required=False)
@@ -0,0 +1,367 @@
+# meu_sistema_producao/producao/historico.py
+
+"""
+Histórico de OEE por máquina, servido a partir de baldes pré-calculados
+(`OeeHistorico`) por hora e por turno. Dias e semanas são somas de turnos.
+
+Diferente do dashboard (que só olha OPs 'Em Produção' até agora), aqui
+cada agendamento contribui com a sua janela real de execução:
+`real_start_datetime` até `real_end_datetime` (ou até agora, se ainda
+está rodando). Paradas são mescladas (sem dupla contagem), recortadas à
+janela e divididas entre as horas que ocupam. Peças boas e refugo vêm do consolidado horário (`OeeRollupHora`).
+
+Cada apontamento, parada ou refugo gravado refaz, depois do commit, só os
+baldes das horas que o evento toca e os dos turnos que contêm essas horas
+(`atualizar_periodo`, chamado pelos signals e pela ingestão em lote). As
+horas sem nenhum evento (uma OP rodando sem apontar) são preenchidas pelo
+comando `backfill_oee_historico`, agendado periodicamente (sem argumentos,
+refaz os últimos 2 dias); ele também serve para cargas iniciais e
+reprocessamentos completos.
+"""
+
+import threading
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Count, Sum, OuterRef, Subquery
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+from .models import Agendamento, ApontamentoProducao, Parada, Refugo, OeeRollupHora, OeeHistorico
+from .oee import kpis_a_partir_de_totais
+from .paradas import mesclar_paradas, PLANEJADA as PARADA_PLANEJADA
+from .rollup import inicio_da_hora, horas_do_intervalo, UMA_HORA
+from .arquivo import unir
+
+
+# Índices das posições no acumulador de cada balde
+BRUTO, PLANEJADA, NAO_PLANEJADA, BOAS, REFUGO, TEORICAS = range(6)
+
+GRANULARIDADES = ('hora', 'turno', 'dia', 'semana')
+
+
+# =======================================================================
+# TURNOS
+# =======================================================================
+
+def turno_da_hora(hora):
+    """
+    Retorna (nome do turno, início do turno) para o balde horário `hora`,
+    de acordo com settings.TURNOS_PRODUCAO (em hora local).
+    """
+    local = timezone.localtime(hora)
+    for nome, inicio, fim in settings.TURNOS_PRODUCAO:
+        if inicio < fim:
+            if inicio <= local.hour < fim:
+                return nome, local.replace(hour=inicio)
+        elif local.hour >= inicio:
+            return nome, local.replace(hour=inicio)
+        elif local.hour < fim:
+            return nome, (local - timedelta(days=1)).replace(hour=inicio)
+    return '', local
+
+
+def _duracao_turno(inicio_turno):
+    nome, _ = turno_da_hora(inicio_turno)
+    for nome_turno, inicio, fim in settings.TURNOS_PRODUCAO:
+        if nome_turno == nome:
+            return timedelta(hours=(fim - inicio) % 24 or 24)
+    return UMA_HORA
+
+
+def _alinhar_aos_turnos(inicio, fim):
+    """Expande [inicio, fim) para começar e terminar em viradas de turno."""
+    _, inicio_alinhado = turno_da_hora(inicio_da_hora(inicio))
+    _, ultimo_turno = turno_da_hora(inicio_da_hora(fim - timedelta(microseconds=1)))
+    return inicio_alinhado, ultimo_turno + _duracao_turno(ultimo_turno)
+
+
+def _horas(inicio, fim):
+    """Gera (hora, segundos) da sobreposição de [inicio, fim) com cada hora."""
+    for hora, trecho_inicio, trecho_fim in horas_do_intervalo(inicio, fim):
+        yield hora, (trecho_fim - trecho_inicio).total_seconds()
+
+
+# =======================================================================
+# CONSOLIDAÇÃO
+# =======================================================================
+
+def estimar_fins_reais():
+    """
+    Preenche `real_end_datetime` das OPs concluídas antes deste campo existir,
+    usando o último evento registrado (apontamento, refugo ou fim de parada).
+    Retorna o número de agendamentos atualizados.
+    """
+    ultimo = lambda qs, campo: Subquery(
+        qs.filter(agendamento=OuterRef('pk')).order_by(f'-{campo}').values(campo)[:1]
+    )
+    agendamentos = Agendamento.objects.filter(
+        ordem_producao__status='Concluída',
+        real_start_datetime__isnull=False,
+        real_end_datetime__isnull=True,
+    ).annotate(
+        ultimo_apontamento=ultimo(ApontamentoProducao.objects, 'data_apontamento'),
+        ultimo_refugo=ultimo(Refugo.objects, 'data_apontamento'),
+        ultima_parada=ultimo(Parada.objects, 'fim_parada'),
+    )
+
+    atualizados = []
+    for ag in agendamentos:
+        candidatos = [ag.real_start_datetime, ag.ultimo_apontamento, ag.ultimo_refugo, ag.ultima_parada]
+        ag.real_end_datetime = max(c for c in candidatos if c)
+        atualizados.append(ag)
+    Agendamento.objects.bulk_update(atualizados, ['real_end_datetime'], batch_size=1000)
+    return len(atualizados)
+
+
+def _baldes_horarios(inicio, fim, maquina_ids, agora):
+    """
+    Acumuladores dos baldes horários de [inicio, fim), que deve começar e
+    terminar em horas cheias: {(maquina_id, hora): [valores]}.
+    """
+    baldes = defaultdict(lambda: [0.0, 0.0, 0.0, 0, 0, 0.0])
+
+    # 1. Agendamentos cuja janela real de execução cruza o período
+    agendamentos_qs = Agendamento.objects.filter(
+        real_start_datetime__isnull=False,
+        real_start_datetime__lt=fim,
+    ).filter(
+        Q(real_end_datetime__gt=inicio) |
+        Q(real_end_datetime__isnull=True, ordem_producao__status='Em Produção')
+    )
+    if maquina_ids is not None:
+        agendamentos_qs = agendamentos_qs.filter(maquina_id__in=maquina_ids)
+
+    janelas = {}
+    for ag_id, maquina_id, real_start, real_end, ciclo in agendamentos_qs.values_list(
+        'id', 'maquina_id', 'real_start_datetime', 'real_end_datetime', 'ordem_producao__pn__cycle_time_seconds'
+    ):
+        if not ciclo or ciclo <= 0:
+            continue # Sem ciclo não há tempo teórico (mesma regra do dashboard)
+        janela_inicio = max(real_start, inicio)
+        janela_fim = min(real_end or agora, fim)
+        if janela_fim <= janela_inicio:
+            continue
+        janelas[ag_id] = (maquina_id, janela_inicio, janela_fim, ciclo)
+        for hora, segundos in _horas(janela_inicio, janela_fim):
+            balde = baldes[(maquina_id, hora)]
+            balde[BRUTO] += segundos
+            balde[TEORICAS] += segundos / ciclo
+
+    # 2. Paradas classificadas: mescladas por agendamento, recortadas à
+    #    janela e divididas por hora (tabela viva e arquivo, ver producao/arquivo.py)
+    paradas = unir(Parada, lambda objetos: objetos.filter(
+        agendamento_id__in=list(janelas),
+        inicio_parada__lt=fim,
+        fim_parada__gt=inicio,
+        tipo_parada__classificacao_parada__isnull=False,
+    ).values_list('agendamento_id', 'inicio_parada', 'fim_parada', 'tipo_parada__classificacao_parada')).order_by('agendamento_id')
+    for ag_id, grupo in groupby(paradas.iterator(chunk_size=2000), key=itemgetter(0)):
+        maquina_id, janela_inicio, janela_fim, ciclo = janelas[ag_id]
+        segmentos = mesclar_paradas((linha[1:] for linha in grupo), janela_inicio, janela_fim)
+        for segmento_inicio, segmento_fim, classificacao in segmentos:
+            posicao = PLANEJADA if classificacao == PARADA_PLANEJADA else NAO_PLANEJADA
+            for hora, segundos in _horas(segmento_inicio, segmento_fim):
+                balde = baldes[(maquina_id, hora)]
+                balde[posicao] += segundos
+                balde[TEORICAS] -= segundos / ciclo
+
+    # 3. Peças boas e refugo do consolidado horário
+    rollups = OeeRollupHora.objects.filter(hora__gte=inicio, hora__lt=fim)
+    if maquina_ids is not None:
+        rollups = rollups.filter(maquina_id__in=maquina_ids)
+    rollups = rollups.values('maquina_id', 'hora').annotate(boas=Sum('pecas_boas'), refugo=Sum('pecas_refugo'))
+    for linha in rollups.filter(Q(boas__gt=0) | Q(refugo__gt=0)):
+        balde = baldes[(linha['maquina_id'], linha['hora'])]
+        balde[BOAS] += linha['boas']
+        balde[REFUGO] += linha['refugo']
+
+    return baldes
+
+
+def _registro(granularidade, maquina_id, momento, valores, turno=''):
+    return OeeHistorico(
+        maquina_id=maquina_id,
+        granularidade=granularidade,
+        inicio=momento,
+        turno=turno,
+        tempo_bruto_segundos=valores[BRUTO],
+        parada_planejada_segundos=valores[PLANEJADA],
+        parada_nao_planejada_segundos=valores[NAO_PLANEJADA],
+        pecas_boas=valores[BOAS],
+        pecas_refugo=valores[REFUGO],
+        pecas_teoricas=valores[TEORICAS],
+    )
+
+
+def consolidar_historico(inicio, fim, maquina_ids=None, agora=None):
+    """
+    Recalcula os baldes de hora e de turno de [inicio, fim) (expandido para
+    viradas de turno). Retorna o número de baldes horários gravados.
+    """
+    if agora is None:
+        agora = timezone.now()
+    inicio, fim = _alinhar_aos_turnos(inicio, fim)
+    baldes = _baldes_horarios(inicio, fim, maquina_ids, agora)
+
+    # Baldes de turno = soma dos baldes horários
+    turnos = defaultdict(lambda: [0.0, 0.0, 0.0, 0, 0, 0.0])
+    nomes_turno = {}
+    for (maquina_id, hora), valores in baldes.items():
+        nome, inicio_turno = turno_da_hora(hora)
+        chave = (maquina_id, inicio_turno)
+        nomes_turno[chave] = nome
+        acumulado = turnos[chave]
+        for i, valor in enumerate(valores):
+            acumulado[i] += valor
+
+    existentes = OeeHistorico.objects.filter(inicio__gte=inicio, inicio__lt=fim)
+    if maquina_ids is not None:
+        existentes = existentes.filter(maquina_id__in=maquina_ids)
+
+    with transaction.atomic():
+        existentes.delete()
+        OeeHistorico.objects.bulk_create(
+            [_registro('HORA', maquina_id, hora, valores) for (maquina_id, hora), valores in baldes.items()],
+            batch_size=2000,
+        )
+        OeeHistorico.objects.bulk_create(
+            [_registro('TURNO', maquina_id, momento, valores, nomes_turno[(maquina_id, momento)])
+             for (maquina_id, momento), valores in turnos.items()],
+            batch_size=2000,
+        )
+
+    return len(baldes)
+
+
+def consolidar_horas(maquina_id, horas, agora=None):
+    """
+    Refaz só os baldes horários `horas` (inícios de hora em UTC) da máquina
+    e os baldes dos turnos que contêm essas horas, somando os baldes
+    horários já gravados do turno. Retorna o número de baldes horários gravados.
+    """
+    if agora is None:
+        agora = timezone.now()
+    horas = sorted(set(horas))
+    baldes = {}
+    # Horas consecutivas são calculadas juntas (uma parada longa é um trecho só)
+    trecho_inicio = None
+    for i, hora in enumerate(horas):
+        if trecho_inicio is None:
+            trecho_inicio = hora
+        if i + 1 == len(horas) or horas[i + 1] != hora + UMA_HORA:
+            baldes.update(_baldes_horarios(trecho_inicio, hora + UMA_HORA, [maquina_id], agora))
+            trecho_inicio = None
+    turnos = {turno_da_hora(hora) for hora in horas}
+
+    with transaction.atomic():
+        OeeHistorico.objects.filter(maquina_id=maquina_id, granularidade='HORA', inicio__in=horas).delete()
+        OeeHistorico.objects.bulk_create(
+            [_registro('HORA', maquina_id, hora, valores) for (_, hora), valores in baldes.items()]
+        )
+        campos = ('tempo_bruto_segundos', 'parada_planejada_segundos', 'parada_nao_planejada_segundos',
+                  'pecas_boas', 'pecas_refugo', 'pecas_teoricas')
+        for nome, inicio_turno in turnos:
+            OeeHistorico.objects.filter(maquina_id=maquina_id, granularidade='TURNO', inicio=inicio_turno).delete()
+            horarios = OeeHistorico.objects.filter(
+                maquina_id=maquina_id, granularidade='HORA',
+                inicio__gte=inicio_turno, inicio__lt=inicio_turno + _duracao_turno(inicio_turno),
+            )
+            totais = horarios.aggregate(quantidade=Count('id'), **{campo: Sum(campo) for campo in campos})
+            if totais.pop('quantidade'):
+                OeeHistorico.objects.create(
+                    maquina_id=maquina_id, granularidade='TURNO', inicio=inicio_turno, turno=nome, **totais
+                )
+
+    return len(baldes)
+
+
+# =======================================================================
+# ATUALIZAÇÃO A PARTIR DAS ESCRITAS
+# =======================================================================
+
+_estado = threading.local()
+
+
+def _consolidar_pendentes():
+    pendentes = getattr(_estado, 'horas_pendentes', None)
+    if not pendentes:
+        return
+    horas_por_maquina = dict(pendentes)
+    pendentes.clear()
+    for maquina_id, horas in horas_por_maquina.items():
+        consolidar_horas(maquina_id, horas)
+
+
+def atualizar_periodo(maquina_id, inicio, fim=None):
+    """
+    Refaz os baldes da máquina das horas que [inicio, fim] toca (e os dos
+    turnos delas) quando a transação atual for confirmada; um evento
+    pontual só tem `inicio`. Várias escritas da mesma máquina na transação
+    resultam em uma única consolidação, só das horas tocadas.
+    """
+    fim = (fim or inicio) + timedelta(microseconds=1)
+    if not hasattr(_estado, 'horas_pendentes'):
+        _estado.horas_pendentes = {}
+    horas = _estado.horas_pendentes.setdefault(maquina_id, set())
+    horas.update(hora for hora, _, _ in horas_do_intervalo(inicio, fim))
+    transaction.on_commit(_consolidar_pendentes)
+
+
+# =======================================================================
+# CONSULTA
+# =======================================================================
+
+def _kpis_do_balde(linha):
+    pecas_boas = linha['pecas_boas'] or 0
+    kpis = kpis_a_partir_de_totais(
+        pecas_boas,
+        pecas_boas + (linha['pecas_refugo'] or 0),
+        linha['tempo_bruto_segundos'] or 0,
+        linha['parada_planejada_segundos'] or 0,
+        linha['parada_nao_planejada_segundos'] or 0,
+        max(linha['pecas_teoricas'] or 0, 0),
+    )
+    kpis['pecas_boas'] = pecas_boas
+    kpis['pecas_refugo'] = linha['pecas_refugo'] or 0
+    kpis['tempo_bruto_horas'] = (linha['tempo_bruto_segundos'] or 0) / 3600.0
+    return kpis
+
+
+def serie_historica(inicio, fim, granularidade='dia', maquina_ids=None):
+    """
+    Retorna {maquina_id: [pontos]} com os KPIs de cada balde em [inicio, fim).
+    'hora' e 'turno' são lidos diretamente; 'dia' e 'semana' somam os turnos
+    no banco (GROUP BY máquina, dia/semana local).
+    """
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+
+    qs = OeeHistorico.objects.filter(
+        granularidade='HORA' if granularidade == 'hora' else 'TURNO',
+        inicio__gte=inicio,
+        inicio__lt=fim,
+    )
+    if maquina_ids is not None:
+        qs = qs.filter(maquina_id__in=maquina_ids)
+
+    campos_soma = ('tempo_bruto_segundos', 'parada_planejada_segundos', 'parada_nao_planejada_segundos',
+                   'pecas_boas', 'pecas_refugo', 'pecas_teoricas')
+    if granularidade in ('hora', 'turno'):
+        linhas = qs.values('maquina_id', 'turno', *campos_soma, periodo=F('inicio'))
+    else:
+        truncar = TruncDay if granularidade == 'dia' else TruncWeek
+        linhas = qs.annotate(periodo=truncar('inicio')).values('maquina_id', 'periodo').annotate(
+            **{campo: Sum(campo) for campo in campos_soma}
+        )
+
+    series = defaultdict(list)
+    for linha in linhas.order_by('maquina_id', 'periodo'):
+        ponto = {'inicio': timezone.localtime(linha['periodo']).isoformat()}
+        if linha.get('turno'):
+            ponto['turno'] = linha['turno']
+        ponto.update(_kpis_do_balde(linha))
+        series[linha['maquina_id']].append(ponto)
+    return series
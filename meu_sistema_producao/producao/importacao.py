@@ -0,0 +1,418 @@
+# meu_sistema_producao/producao/importacao.py
+
+"""
+Importação em lote de planilhas de cadastro.
+
+O import do `PnAdmin` (django-import-export) carrega o arquivo inteiro em
+memória e grava linha a linha, com uma consulta por linha; com o catálogo
+completo estoura o tempo do worker. Aqui o arquivo é lido em streaming
+(CSV com o módulo `csv`; XLSX com openpyxl em modo read_only, se estiver
+instalado) e processado em lotes de `tamanho_lote` linhas. Para cada lote:
+
+  1. as linhas são validadas com os próprios campos do modelo; uma linha
+     inválida entra no relatório de erros e não interrompe a importação;
+  2. os PNs existentes são buscados numa única query pelo `pn_code`;
+  3. os novos vão num bulk_create (com upsert no `pn_code`, caso outro
+     processo crie o mesmo PN ao mesmo tempo) e os alterados num
+     bulk_update; PNs idênticos ao arquivo não são regravados.
+
+Cada lote é gravado na sua transação, então a memória fica constante e um
+erro de banco perde só o lote atual. bulk_create/bulk_update não disparam
+os signals do `Pn`: os caches e a matriz de compatibilidade são
+invalidados uma vez, no final.
+
+As OPs vêm da exportação diária do ERP (algumas centenas de linhas), então
+o arquivo é carregado de uma vez com tablib e validado por colunas: os
+códigos de PN são resolvidos numa única query, quantidades e datas viram
+arrays do numpy e cada regra é uma máscara sobre o arquivo inteiro. OPs
+iguais (PN, quantidade e entrega) a uma OP ainda não concluída são
+rejeitadas, o que torna seguro reimportar o mesmo arquivo.
+"""
+
+import csv
+import io
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import numpy as np
+import tablib
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from .models import Pn, OrdemProducao
+from .compatibilidade import agendar_recalculo
+from .planejamento import invalidar_agenda_toda
+from .versoes import incrementar_versao, VERSAO_DASHBOARD
+from . import pareto, referencias
+
+
+CAMPOS_PN = (
+    'cliente', 'pn_code', 'description', 'type_piece', 'property',
+    'capacity_liters', 'min_weight_kg', 'max_weight_kg', 'sold_weight_kg',
+    'cycle_time_seconds', 'cavity', 'dim_c', 'dim_a', 'dim_l',
+)
+CAMPOS_ATUALIZAVEIS = tuple(campo for campo in CAMPOS_PN if campo != 'pn_code')
+
+CAMPOS_OP = ('pn', 'quantity', 'delivery_date')
+# Cabeçalhos usuais da exportação do ERP, além do nome e do verbose_name do campo
+APELIDOS_OP = {
+    'pn_code': 'pn', 'codigo': 'pn', 'código': 'pn',
+    'quantidade': 'quantity', 'qtd': 'quantity',
+    'data_entrega': 'delivery_date', 'entrega': 'delivery_date',
+}
+# Limite do IntegerField `quantity`
+QUANTIDADE_MAXIMA = 2 ** 31 - 1
+
+FORMATOS = ('csv', 'xlsx')
+
+# Erros guardados no relatório; os demais só são contados
+MAX_ERROS_RELATORIO = 1000
+
+
+class ErroImportacao(Exception):
+    pass
+
+
+# =======================================================================
+# LEITURA EM STREAMING
+# =======================================================================
+
+def formato_do_arquivo(nome):
+    extensao = nome.rsplit('.', 1)[-1].lower() if '.' in nome else ''
+    if extensao not in FORMATOS:
+        raise ErroImportacao(f"Formato não suportado: '{extensao}'. Use {' ou '.join(FORMATOS)}.")
+    return extensao
+
+
+def _mapa_cabecalho(modelo, campos, cabecalho, apelidos=None):
+    """Posição de cada campo no cabeçalho; aceita o nome do campo, o verbose_name ou um apelido."""
+    nomes = dict(apelidos or {})
+    for campo in campos:
+        field = modelo._meta.get_field(campo)
+        nomes[campo.lower()] = campo
+        nomes[str(field.verbose_name).strip().lower()] = campo
+    mapa = {}
+    for posicao, titulo in enumerate(cabecalho):
+        campo = nomes.get(str(titulo or '').strip().lower())
+        if campo and campo not in mapa:
+            mapa[campo] = posicao
+    faltando = [campo for campo in campos if campo not in mapa]
+    if faltando:
+        raise ErroImportacao(f"Colunas ausentes na planilha: {', '.join(faltando)}.")
+    return mapa
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+    except csv.Error:
+        dialeto = csv.excel
+    try:
+        yield from csv.reader(texto, dialeto)
+    finally:
+        # Não fecha o arquivo de quem chamou
+        texto.detach()
+
+
+def _linhas_xlsx(arquivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErroImportacao("Para importar XLSX instale o openpyxl (pip install openpyxl) ou salve a planilha em CSV.")
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from planilha.active.iter_rows(values_only=True)
+    finally:
+        planilha.close()
+
+
+def ler_planilha(arquivo, formato, modelo, campos):
+    """
+    Gera (número da linha, {campo: valor}) lendo o arquivo (binário) aos
+    poucos. A linha 1 é o cabeçalho.
+    """
+    linhas = _linhas_csv(arquivo) if formato == 'csv' else _linhas_xlsx(arquivo)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        raise ErroImportacao("Planilha vazia.")
+    mapa = _mapa_cabecalho(modelo, campos, cabecalho)
+    for numero, linha in enumerate(linhas, start=2):
+        if not any(valor not in (None, '') for valor in linha):
+            continue
+        yield numero, {
+            campo: linha[posicao] if posicao < len(linha) else None
+            for campo, posicao in mapa.items()
+        }
+
+
+def em_lotes(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while True:
+        lote = list(islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def _valor_numerico(field, valor):
+    """
+    Prepara um número para o `field.clean`: o float do XLSX vira Decimal
+    pelo texto (2.3 e não 2.2999...), o texto aceita vírgula decimal e
+    separador de milhar como em `_numero`, e um campo inteiro recusa frações
+    em vez de truncar.
+    """
+    if isinstance(valor, bool) or not isinstance(field, (models.DecimalField, models.IntegerField)):
+        return valor
+    if isinstance(valor, float):
+        valor = Decimal(str(valor))
+    elif isinstance(valor, str) and valor:
+        try:
+            valor = Decimal(_texto_numerico(valor))
+        except InvalidOperation:
+            return valor  # O clean do campo dá a mensagem de valor inválido
+    if isinstance(field, models.IntegerField) and isinstance(valor, Decimal) and valor.is_finite():
+        if valor != valor.to_integral_value():
+            raise ValidationError("Informe um número inteiro.")
+        valor = int(valor)
+    return valor
+
+
+def limpar_linha(modelo, dados):
+    """Converte e valida os valores com os campos do modelo. Retorna (valores, erros)."""
+    valores, erros = {}, []
+    for campo, valor in dados.items():
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor is None:
+            valor = ''
+        field = modelo._meta.get_field(campo)
+        try:
+            valores[campo] = field.clean(_valor_numerico(field, valor), None)
+        except ValidationError as e:
+            erros.append(f"{field.verbose_name}: {' '.join(e.messages)}")
+    return valores, erros
+
+
+# =======================================================================
+# IMPORTAÇÃO DE PNs
+# =======================================================================
+
+class Relatorio:
+    """Contagens e erros por linha de uma importação."""
+
+    def __init__(self):
+        self.linhas = 0
+        self.criados = 0
+        self.atualizados = 0
+        self.sem_alteracao = 0
+        self.total_erros = 0
+        self.erros = []
+
+    def erro(self, numero, identificador, mensagens):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_RELATORIO:
+            self.erros.append({'linha': numero, 'identificador': identificador, 'mensagens': mensagens})
+
+    def como_dict(self):
+        return {
+            'linhas': self.linhas,
+            'criados': self.criados,
+            'atualizados': self.atualizados,
+            'sem_alteracao': self.sem_alteracao,
+            'total_erros': self.total_erros,
+            'erros': self.erros,
+        }
+
+
+def _gravar_lote_pns(lote, relatorio, dry_run):
+    validos = {}  # pn_code -> (número da linha, valores)
+    for numero, dados in lote:
+        relatorio.linhas += 1
+        valores, erros = limpar_linha(Pn, dados)
+        codigo = valores.get('pn_code') or dados.get('pn_code')
+        if erros:
+            relatorio.erro(numero, codigo, erros)
+            continue
+        if codigo in validos:
+            relatorio.erro(validos[codigo][0], codigo, [f"PN repetido no arquivo; vale a linha {numero}."])
+        validos[codigo] = (numero, valores)
+
+    existentes = Pn.objects.in_bulk(list(validos), field_name='pn_code')
+    novos, alterados = [], []
+    for codigo, (_, valores) in validos.items():
+        atual = existentes.get(codigo)
+        if atual is None:
+            novos.append(Pn(**valores))
+        elif any(getattr(atual, campo) != valores[campo] for campo in CAMPOS_ATUALIZAVEIS):
+            for campo in CAMPOS_ATUALIZAVEIS:
+                setattr(atual, campo, valores[campo])
+            alterados.append(atual)
+        else:
+            relatorio.sem_alteracao += 1
+
+    if not dry_run:
+        with transaction.atomic():
+            # update_conflicts: se outro processo criou o PN depois da
+            # consulta acima, a linha vira um UPDATE em vez de um erro
+            Pn.objects.bulk_create(
+                novos, update_conflicts=True, unique_fields=['pn_code'], update_fields=list(CAMPOS_ATUALIZAVEIS),
+            )
+            Pn.objects.bulk_update(alterados, list(CAMPOS_ATUALIZAVEIS))
+    relatorio.criados += len(novos)
+    relatorio.atualizados += len(alterados)
+
+
+def importar_pns(arquivo, formato, tamanho_lote=1000, dry_run=False):
+    """
+    Importa (cria ou atualiza pelo `pn_code`) os PNs da planilha. Retorna
+    o `Relatorio`. Com `dry_run`, valida e conta sem gravar.
+    """
+    relatorio = Relatorio()
+    for lote in em_lotes(ler_planilha(arquivo, formato, Pn, CAMPOS_PN), tamanho_lote):
+        _gravar_lote_pns(lote, relatorio, dry_run)
+
+    if not dry_run and (relatorio.criados or relatorio.atualizados):
+        referencias.invalidar('pns')
+        agendar_recalculo(tudo=True)
+        pareto.invalidar_tudo()
+        if relatorio.atualizados:
+            # O ciclo do PN muda a duração das OPs no quadro
+            invalidar_agenda_toda()
+    return relatorio
+
+
+# =======================================================================
+# IMPORTAÇÃO DE OPs
+# =======================================================================
+
+def carregar_dataset(conteudo, formato):
+    """Carrega o arquivo (bytes) inteiro num `tablib.Dataset`."""
+    try:
+        if formato == 'csv':
+            texto = conteudo.decode('utf-8-sig')
+            try:
+                delimitador = csv.Sniffer().sniff(texto[:4096], delimiters=',;\t').delimiter
+            except csv.Error:
+                delimitador = ','
+            return tablib.Dataset().load(texto, format='csv', delimiter=delimitador)
+        return tablib.Dataset().load(conteudo, format='xlsx')
+    except UnicodeDecodeError:
+        raise ErroImportacao("O CSV precisa estar em UTF-8.")
+    except tablib.UnsupportedFormat:
+        raise ErroImportacao("Para importar XLSX instale o openpyxl (pip install openpyxl) ou salve a planilha em CSV.")
+    except tablib.InvalidDimensions:
+        raise ErroImportacao("As linhas da planilha não têm todas o mesmo número de colunas.")
+
+
+def _texto_numerico(texto):
+    """'1.500' / '1,500' (milhar) viram '1500' e '2,5' vira '2.5'."""
+    if re.fullmatch(r'\d{1,3}([.,]\d{3})+', texto):
+        return re.sub(r'[.,]', '', texto)
+    return texto.replace(',', '.')
+
+
+def _numero(valor):
+    """float ou NaN; aceita '1.500' / '1,500' como milhar e '2,5' como decimal."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    try:
+        return float(_texto_numerico(str(valor or '').strip()))
+    except ValueError:
+        return np.nan
+
+
+def _data_iso(valor):
+    """'AAAA-MM-DD' ou 'NaT'; aceita datas do XLSX, ISO e DD/MM/AAAA."""
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    texto = str(valor or '').strip()
+    for leitor in (lambda t: date.fromisoformat(t[:10]), lambda t: datetime.strptime(t, '%d/%m/%Y').date()):
+        try:
+            return leitor(texto).isoformat()
+        except ValueError:
+            continue
+    return 'NaT'
+
+
+def importar_ops(conteudo, formato, dry_run=False, maximo_linhas=None):
+    """
+    Cria as OPs (status 'Disponível') do arquivo exportado pelo ERP, com as
+    colunas PN (código), quantidade e data de entrega. Retorna o
+    `Relatorio`: `criados` são as linhas aceitas; linhas inválidas ou
+    repetidas ficam nos erros. Com `dry_run`, valida sem gravar.
+    """
+    dataset = carregar_dataset(conteudo, formato)
+    if not dataset.headers:
+        raise ErroImportacao("Planilha vazia.")
+    mapa = _mapa_cabecalho(OrdemProducao, CAMPOS_OP, dataset.headers, APELIDOS_OP)
+
+    numeros, codigos, quantidades_brutas, datas_brutas = [], [], [], []
+    for indice, linha in enumerate(dataset):
+        if not any(valor not in (None, '') for valor in linha):
+            continue
+        numeros.append(indice + 2)  # a linha 1 é o cabeçalho
+        codigos.append(str(linha[mapa['pn']] or '').strip())
+        quantidades_brutas.append(linha[mapa['quantity']])
+        datas_brutas.append(linha[mapa['delivery_date']])
+    if maximo_linhas is not None and len(numeros) > maximo_linhas:
+        raise ErroImportacao(f"Envie no máximo {maximo_linhas} OPs por arquivo.")
+
+    relatorio = Relatorio()
+    relatorio.linhas = len(numeros)
+    if not numeros:
+        return relatorio
+
+    # Validação por colunas: cada regra é uma máscara sobre todas as linhas
+    ids_por_codigo = dict(Pn.objects.filter(pn_code__in=set(codigos)).values_list('pn_code', 'id'))
+    pn_ids = np.array([ids_por_codigo.get(codigo, 0) for codigo in codigos], dtype=np.int64)
+    quantidades = np.array([_numero(valor) for valor in quantidades_brutas], dtype=np.float64)
+    datas = np.array([_data_iso(valor) for valor in datas_brutas], dtype='datetime64[D]')
+
+    with np.errstate(invalid='ignore'):
+        regras = (
+            (pn_ids == 0, "PN não cadastrado."),
+            (~np.isfinite(quantidades) | (quantidades <= 0) | (quantidades > QUANTIDADE_MAXIMA)
+             | (quantidades != np.floor(quantidades)), "Quantidade deve ser um inteiro positivo."),
+            (np.isnat(datas), "Data de entrega inválida (use AAAA-MM-DD ou DD/MM/AAAA)."),
+        )
+    invalidas = np.zeros(len(numeros), dtype=bool)
+    for mascara, _ in regras:
+        invalidas |= mascara
+    for i in np.flatnonzero(invalidas):
+        relatorio.erro(numeros[i], codigos[i] or None, [mensagem for mascara, mensagem in regras if mascara[i]])
+
+    validas = np.flatnonzero(~invalidas)
+    chaves = [(int(pn_ids[i]), int(quantidades[i]), datas[i].item()) for i in validas]
+
+    # OPs ainda não concluídas com o mesmo PN, quantidade e entrega
+    em_aberto = {}
+    if chaves:
+        for op_id, pn_id, quantidade, entrega in OrdemProducao.objects.exclude(status='Concluída').filter(
+            pn_id__in={chave[0] for chave in chaves},
+            delivery_date__in={chave[2] for chave in chaves},
+        ).values_list('id', 'pn_id', 'quantity', 'delivery_date'):
+            em_aberto.setdefault((pn_id, quantidade, entrega), op_id)
+
+    novas, linhas_por_chave = [], {}
+    for i, chave in zip(validas, chaves):
+        if chave in em_aberto:
+            relatorio.erro(numeros[i], codigos[i], [f"Já existe a OP {em_aberto[chave]} em aberto com este PN, quantidade e entrega."])
+        elif chave in linhas_por_chave:
+            relatorio.erro(numeros[i], codigos[i], [f"Repete a linha {linhas_por_chave[chave]} do arquivo."])
+        else:
+            linhas_por_chave[chave] = numeros[i]
+            novas.append(OrdemProducao(pn_id=chave[0], quantity=chave[1], delivery_date=chave[2], status='Disponível'))
+
+    if novas and not dry_run:
+        with transaction.atomic():
+            OrdemProducao.objects.bulk_create(novas, batch_size=500)
+        # bulk_create não dispara os signals
+        incrementar_versao(VERSAO_DASHBOARD)
+    relatorio.criados = len(novas)
+    relatorio.erros.sort(key=lambda erro: erro['linha'])
+    return relatorio
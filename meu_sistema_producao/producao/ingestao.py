@@ -0,0 +1,275 @@
+# meu_sistema_producao/producao/ingestao.py
+
+"""
+Ingestão em lote dos eventos dos terminais de chão de fábrica.
+
+Os terminais perdem o Wi-Fi com frequência. Em vez de um POST síncrono
+por apontamento, parada ou refugo, o terminal guarda os eventos numa fila
+local e os envia em lote, cada um com um UUID e o horário em que
+aconteceu. Aqui o lote é:
+
+  1. deduplicado pelo UUID (dentro do lote e contra o que já foi gravado:
+     o UUID vai na `chave_idempotencia` de cada tabela);
+  2. validado de uma vez, com os agendamentos e tipos buscados em poucas
+     queries;
+  3. gravado com um bulk_create por tabela, numa única transação;
+  4. somado no total de cada OP com um único UPDATE (F()) por OP e no
+     consolidado de OEE com um UPDATE por balde de hora.
+
+bulk_create não dispara os signals, então a versão do dashboard, o cache
+do Pareto e o stream SSE são atualizados aqui mesmo.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from .models import OrdemProducao, Agendamento, ApontamentoProducao, Parada, Refugo, TipoParada, TipoRefugo
+from . import rollup, pareto, historico
+from .apontamentos import TAMANHO_MAXIMO_CHAVE
+from .eventos import notificar_maquinas
+from .versoes import incrementar_versao, VERSAO_DASHBOARD
+
+
+TIPOS_EVENTO = ('producao', 'parada', 'refugo')
+
+# Relógio do terminal adiantado em relação ao servidor
+TOLERANCIA_FUTURO = timedelta(minutes=5)
+
+GRAVADO = 'gravado'
+DUPLICADO = 'duplicado'
+ERRO = 'erro'
+
+
+class EventoInvalido(ValueError):
+    pass
+
+
+def ler_momento(texto, agora, campo):
+    """Lê um horário ISO 8601 do terminal; sem fuso, usa o do servidor."""
+    if not texto:
+        raise EventoInvalido(f"Campo '{campo}' é obrigatório.")
+    try:
+        momento = datetime.fromisoformat(str(texto))
+    except ValueError:
+        raise EventoInvalido(f"Data inválida em '{campo}'.")
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    if momento > agora + TOLERANCIA_FUTURO:
+        raise EventoInvalido(f"'{campo}' está no futuro.")
+    return momento
+
+
+def _ler_quantidade(valor):
+    try:
+        quantidade = int(valor)
+    except (TypeError, ValueError):
+        raise EventoInvalido("Quantidade inválida.")
+    if quantidade <= 0:
+        raise EventoInvalido("Quantidade deve ser positiva.")
+    return quantidade
+
+
+def _chave(evento):
+    chave = evento.get('uuid') if isinstance(evento, dict) else None
+    if not chave or not isinstance(chave, str):
+        raise EventoInvalido("Evento sem 'uuid'.")
+    if len(chave) > TAMANHO_MAXIMO_CHAVE:
+        raise EventoInvalido(f"'uuid' com mais de {TAMANHO_MAXIMO_CHAVE} caracteres.")
+    return chave
+
+
+def _id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _chaves_gravadas(chaves):
+    """UUIDs do lote que já estão no banco, em qualquer das três tabelas."""
+    gravadas = set()
+    for modelo in (ApontamentoProducao, Parada, Refugo):
+        gravadas.update(modelo.objects.filter(chave_idempotencia__in=chaves).values_list('chave_idempotencia', flat=True))
+    return gravadas
+
+
+def _montar(evento, agendamentos, tipos_parada, tipos_refugo, operador, agora):
+    """Valida um evento e devolve a instância (ainda não gravada)."""
+    tipo = evento.get('tipo')
+    if tipo not in TIPOS_EVENTO:
+        raise EventoInvalido(f"Tipo de evento inválido: {tipo!r}.")
+    agendamento = agendamentos.get(_id(evento.get('agendamento_id')))
+    if agendamento is None:
+        raise EventoInvalido("Agendamento não encontrado.")
+
+    if tipo == 'producao':
+        return ApontamentoProducao(
+            agendamento=agendamento,
+            quantidade=_ler_quantidade(evento.get('quantidade')),
+            data_apontamento=ler_momento(evento.get('momento'), agora, 'momento'),
+            operador=operador,
+            chave_idempotencia=evento['uuid'],
+        )
+
+    if tipo == 'refugo':
+        tipo_refugo_id = _id(evento.get('tipo_refugo_id'))
+        if tipo_refugo_id not in tipos_refugo:
+            raise EventoInvalido("Tipo de refugo não encontrado.")
+        return Refugo(
+            agendamento=agendamento,
+            tipo_refugo_id=tipo_refugo_id,
+            quantidade=_ler_quantidade(evento.get('quantidade')),
+            data_apontamento=ler_momento(evento.get('momento'), agora, 'momento'),
+            operador=operador,
+            chave_idempotencia=evento['uuid'],
+        )
+
+    tipo_parada_id = _id(evento.get('tipo_parada_id'))
+    if tipo_parada_id not in tipos_parada:
+        raise EventoInvalido("Tipo de parada não encontrado.")
+    inicio = ler_momento(evento.get('inicio_parada'), agora, 'inicio_parada')
+    fim = ler_momento(evento.get('fim_parada'), agora, 'fim_parada')
+    if fim <= inicio:
+        raise EventoInvalido("O horário de fim deve ser posterior ao de início.")
+    return Parada(
+        agendamento=agendamento,
+        tipo_parada_id=tipo_parada_id,
+        inicio_parada=inicio,
+        fim_parada=fim,
+        operador=operador,
+        chave_idempotencia=evento['uuid'],
+    )
+
+
+def gravar_eventos(instancias):
+    """
+    Grava eventos já validados (instâncias com `agendamento` carregado) e
+    aplica os totais; tudo ou nada. Usado também pelo agregador de sinais
+    de ciclo (producao/ciclos.py).
+    """
+    if not instancias:
+        return
+    por_modelo = defaultdict(list)
+    for instancia in instancias:
+        por_modelo[type(instancia)].append(instancia)
+    apontamentos = por_modelo[ApontamentoProducao]
+    paradas = por_modelo[Parada]
+    refugos = por_modelo[Refugo]
+
+    incrementos = defaultdict(lambda: defaultdict(int))
+    por_op = defaultdict(int)
+    for apontamento in apontamentos:
+        incrementos[(apontamento.agendamento, rollup.inicio_da_hora(apontamento.data_apontamento))]['pecas_boas'] += apontamento.quantidade
+        por_op[apontamento.agendamento.ordem_producao_id] += apontamento.quantidade
+    for refugo in refugos:
+        incrementos[(refugo.agendamento, rollup.inicio_da_hora(refugo.data_apontamento))]['pecas_refugo'] += refugo.quantidade
+
+    with transaction.atomic():
+        for modelo, lote in por_modelo.items():
+            modelo.objects.bulk_create(lote, batch_size=500)
+        rollup.somar_lote(incrementos)
+        rollup.registrar_paradas(paradas)
+        # Ordem fixa de ids: dois lotes simultâneos não travam as OPs em ordens diferentes
+        for op_id in sorted(por_op):
+            OrdemProducao.objects.filter(pk=op_id).update(quantidade_produzida=F('quantidade_produzida') + por_op[op_id])
+
+        incrementar_versao(VERSAO_DASHBOARD)
+        for parada in paradas:
+            pareto.invalidar_periodo('paradas', parada.inicio_parada, parada.fim_parada)
+        for refugo in refugos:
+            pareto.invalidar_periodo('refugos', refugo.data_apontamento, refugo.data_apontamento)
+        for instancia in instancias:
+            inicio, fim = (
+                (instancia.inicio_parada, instancia.fim_parada) if isinstance(instancia, Parada)
+                else (instancia.data_apontamento, None)
+            )
+            historico.atualizar_periodo(instancia.agendamento.maquina_id, inicio, fim)
+        notificar_maquinas({instancia.agendamento.maquina_id for instancia in instancias})
+
+
+def ingerir_lote(eventos, operador=None, agora=None):
+    """
+    Grava uma lista ordenada de eventos mistos. Cada evento é um dict com
+    'uuid', 'tipo' ('producao', 'parada' ou 'refugo') e 'agendamento_id',
+    mais:
+      - producao: 'quantidade' e 'momento' (ISO 8601);
+      - refugo: 'quantidade', 'tipo_refugo_id' e 'momento';
+      - parada: 'tipo_parada_id', 'inicio_parada' e 'fim_parada'.
+
+    Um evento inválido não impede a gravação dos outros. Retorna um dict com:
+      - resultados: [{uuid, status, mensagem?}] na ordem recebida, com
+        status 'gravado', 'duplicado' (UUID já recebido) ou 'erro';
+      - quantidades_produzidas: {agendamento_id: total da OP} dos
+        agendamentos com produção no lote;
+      - maquinas_com_producao: ids das máquinas que receberam peças.
+    """
+    agora = agora or timezone.now()
+    resultados = [None] * len(eventos)
+    validos = []  # (posição, evento)
+    vistos = set()
+    for posicao, evento in enumerate(eventos):
+        try:
+            chave = _chave(evento)
+        except EventoInvalido as e:
+            resultados[posicao] = {'uuid': evento.get('uuid') if isinstance(evento, dict) else None, 'status': ERRO, 'mensagem': str(e)}
+            continue
+        if chave in vistos:
+            resultados[posicao] = {'uuid': chave, 'status': DUPLICADO}
+            continue
+        vistos.add(chave)
+        validos.append((posicao, evento))
+
+    agendamentos = Agendamento.objects.only('id', 'maquina_id', 'ordem_producao_id').in_bulk(
+        {_id(evento.get('agendamento_id')) for _, evento in validos} - {None}
+    )
+    tipos_parada = set(TipoParada.objects.values_list('id', flat=True))
+    tipos_refugo = set(TipoRefugo.objects.values_list('id', flat=True))
+
+    montados = []  # (posição, instância)
+    for posicao, evento in validos:
+        try:
+            montados.append((posicao, _montar(evento, agendamentos, tipos_parada, tipos_refugo, operador, agora)))
+        except EventoInvalido as e:
+            resultados[posicao] = {'uuid': evento['uuid'], 'status': ERRO, 'mensagem': str(e)}
+
+    # Duas tentativas: se outro envio do mesmo terminal gravou algum UUID
+    # entre a consulta e o INSERT, a chave única recusa o lote e ele é
+    # refeito sem os eventos já gravados
+    for tentativa in range(2):
+        gravadas = _chaves_gravadas([instancia.chave_idempotencia for _, instancia in montados])
+        novos = [(posicao, instancia) for posicao, instancia in montados if instancia.chave_idempotencia not in gravadas]
+        try:
+            gravar_eventos([instancia for _, instancia in novos])
+            break
+        except IntegrityError:
+            if tentativa:
+                raise
+            for _, instancia in novos:
+                instancia.pk = None
+
+    for posicao, instancia in montados:
+        status = DUPLICADO if instancia.chave_idempotencia in gravadas else GRAVADO
+        resultados[posicao] = {'uuid': instancia.chave_idempotencia, 'status': status}
+
+    com_producao = {
+        instancia.agendamento.id: instancia.agendamento
+        for _, instancia in montados
+        if isinstance(instancia, ApontamentoProducao)
+    }
+    totais = dict(OrdemProducao.objects.filter(
+        pk__in={agendamento.ordem_producao_id for agendamento in com_producao.values()}
+    ).values_list('pk', 'quantidade_produzida'))
+    return {
+        'resultados': resultados,
+        'quantidades_produzidas': {
+            agendamento_id: totais.get(agendamento.ordem_producao_id)
+            for agendamento_id, agendamento in com_producao.items()
+        },
+        'maquinas_com_producao': sorted({
+            instancia.agendamento.maquina_id
+            for posicao, instancia in montados
+            if isinstance(instancia, ApontamentoProducao) and resultados[posicao]['status'] == GRAVADO
+        }),
+    }
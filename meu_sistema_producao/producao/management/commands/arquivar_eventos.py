@@ -0,0 +1,32 @@
+# meu_sistema_producao/producao/management/commands/arquivar_eventos.py
+
+import time as cronometro
+from django.core.management.base import BaseCommand, CommandError
+from meu_sistema_producao.producao.arquivo import arquivar, data_de_corte
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os apontamentos, paradas e refugos das OPs concluídas há mais de N meses para as tabelas "
+        "de arquivo. O fim da OP é o real_end_datetime dos agendamentos ou, se ele estiver vazio, o último "
+        "evento registrado. Relatórios históricos continuam vendo esses eventos; o consolidado de OEE não muda."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=6, help="Idade mínima (fim da OP) em meses (padrão: 6).")
+        parser.add_argument('--lote', type=int, default=200, help="Agendamentos por transação (padrão: 200).")
+        parser.add_argument('--dry-run', action='store_true', help="Só conta o que seria arquivado.")
+
+    def handle(self, *args, **options):
+        if options['meses'] < 1 or options['lote'] <= 0:
+            raise CommandError("Informe --meses >= 1 e --lote positivo.")
+        comeco = cronometro.perf_counter()
+        resultado = arquivar(options['meses'], options['lote'], options['dry_run'])
+        duracao = cronometro.perf_counter() - comeco
+
+        prefixo = "Simulação (nada movido)" if options['dry_run'] else "Arquivamento concluído"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixo} em {duracao:.1f} s: OPs concluídas antes de {data_de_corte(options['meses']):%d/%m/%Y}, "
+            f"{resultado['agendamentos']} agendamentos, {resultado['apontamentoproducao']} apontamentos, "
+            f"{resultado['parada']} paradas, {resultado['refugo']} refugos."
+        ))
@@ -0,0 +1,55 @@
+# meu_sistema_producao/producao/management/commands/auto_agendar.py
+
+import time as cronometro
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from meu_sistema_producao.producao.agendador import auto_agendar, planejar, dados_sinteticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Agenda automaticamente as OPs 'Disponível' nas máquinas compatíveis, por data de entrega. "
+        "Com --benchmark, mede o planejamento sobre dados sintéticos (sem tocar no banco)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help="Mostra o resultado sem gravar.")
+        parser.add_argument('--benchmark', action='store_true', help="Planeja dados sintéticos e mede o tempo.")
+        parser.add_argument('--ops', type=int, default=2000, help="OPs sintéticas do benchmark (padrão: 2000).")
+        parser.add_argument('--maquinas', type=int, default=80, help="Máquinas sintéticas do benchmark (padrão: 80).")
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self._benchmark(options['ops'], options['maquinas'])
+
+        planejados, sem_maquina = auto_agendar(simular=options['simular'])
+        for item in planejados:
+            self.stdout.write(
+                f"OP-{item['op_id']}: máquina {item['maquina_id']} ({item['lado']}) "
+                f"{timezone.localtime(item['start_datetime']):%d/%m/%Y %H:%M} - "
+                f"{timezone.localtime(item['end_datetime']):%d/%m/%Y %H:%M}"
+            )
+        if sem_maquina:
+            self.stdout.write(self.style.WARNING(
+                f"Sem máquina compatível: {', '.join(f'OP-{op_id}' for op_id in sem_maquina)}"
+            ))
+        acao = 'seriam agendadas' if options['simular'] else 'agendadas'
+        self.stdout.write(self.style.SUCCESS(f"{len(planejados)} OPs {acao}."))
+
+    def _benchmark(self, quantidade_ops, quantidade_maquinas):
+        if quantidade_ops <= 0 or quantidade_maquinas <= 0:
+            raise CommandError("Informe quantidades positivas de OPs e máquinas.")
+        inicio = timezone.now().replace(minute=0, second=0, microsecond=0)
+        ops, maquinas, ocupacoes = dados_sinteticos(quantidade_ops, quantidade_maquinas, inicio)
+
+        comeco = cronometro.perf_counter()
+        planejados, sem_maquina = planejar(ops, maquinas, ocupacoes, inicio)
+        duracao = cronometro.perf_counter() - comeco
+
+        fim = max((item['end_datetime'] for item in planejados), default=inicio)
+        self.stdout.write(
+            f"{quantidade_ops} OPs em {quantidade_maquinas} máquinas ({len(ocupacoes)} agendamentos existentes): "
+            f"{len(planejados)} agendadas, {len(sem_maquina)} sem máquina compatível, "
+            f"horizonte de {(fim - inicio).days} dias."
+        )
+        self.stdout.write(self.style.SUCCESS(f"Planejamento em {duracao:.2f} s."))
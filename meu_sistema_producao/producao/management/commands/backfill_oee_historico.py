@@ -0,0 +1,65 @@
+# meu_sistema_producao/producao/management/commands/backfill_oee_historico.py
+
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from meu_sistema_producao.producao.models import Agendamento
+from meu_sistema_producao.producao.historico import consolidar_historico, estimar_fins_reais
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula os baldes de hora e turno do histórico de OEE (OeeHistorico). "
+        "Sem argumentos, recalcula os últimos 2 dias (uso periódico); "
+        "com --tudo, refaz todo o histórico a partir do primeiro agendamento iniciado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help="Data inicial (YYYY-MM-DD).")
+        parser.add_argument('--fim', help="Data final, inclusiva (YYYY-MM-DD). Padrão: hoje.")
+        parser.add_argument('--dias', type=int, default=2, help="Quantidade de dias até hoje, se --inicio não for informado.")
+        parser.add_argument('--tudo', action='store_true', help="Processa todo o histórico.")
+        parser.add_argument('--maquina', type=int, action='append', dest='maquinas', help="Restringe a uma máquina (pode ser repetido).")
+        parser.add_argument('--bloco-dias', type=int, default=7, help="Tamanho de cada bloco processado (padrão: 7 dias).")
+
+    def _data(self, valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Data inválida: {valor} (use YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        estimados = estimar_fins_reais()
+        if estimados:
+            self.stdout.write(f'{estimados} OPs concluídas tiveram o fim real estimado pelo último evento.')
+
+        hoje = timezone.localdate()
+        fim = self._data(options['fim']) if options['fim'] else hoje
+        if options['tudo']:
+            primeiro = Agendamento.objects.aggregate(primeiro=Min('real_start_datetime'))['primeiro']
+            if not primeiro:
+                self.stdout.write('Nenhum agendamento iniciado: nada a calcular.')
+                return
+            inicio = timezone.localtime(primeiro).date()
+        elif options['inicio']:
+            inicio = self._data(options['inicio'])
+        else:
+            inicio = hoje - timedelta(days=options['dias'] - 1)
+
+        if fim < inicio:
+            raise CommandError("A data final deve ser igual ou posterior à inicial.")
+
+        # Processa em blocos para manter a memória limitada em históricos longos
+        total = 0
+        bloco = timedelta(days=options['bloco_dias'])
+        momento = timezone.make_aware(datetime.combine(inicio, time.min))
+        limite = timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min))
+        while momento < limite:
+            proximo = min(momento + bloco, limite)
+            total += consolidar_historico(momento, proximo, options['maquinas'])
+            momento = proximo
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Histórico de OEE calculado de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}: {total} baldes horários.'
+        ))
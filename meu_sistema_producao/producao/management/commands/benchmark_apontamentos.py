@@ -0,0 +1,107 @@
+# meu_sistema_producao/producao/management/commands/benchmark_apontamentos.py
+
+import threading
+import time as cronometro
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from meu_sistema_producao.producao.models import Pn, Maquina, OrdemProducao, Agendamento, ApontamentoProducao
+from meu_sistema_producao.producao.apontamentos import registrar_apontamento
+from meu_sistema_producao.producao import rollup
+
+
+def _apontar_antigo(agendamento_id, quantidade, operador):
+    """O caminho antigo de apontar_producao_api: lê o total, soma em Python e dá save()."""
+    agendamento = Agendamento.objects.get(id=agendamento_id)
+    with transaction.atomic():
+        apontamento = ApontamentoProducao.objects.create(agendamento=agendamento, quantidade=quantidade, operador=operador)
+        rollup.registrar_producao(apontamento)
+        op = agendamento.ordem_producao
+        op.quantidade_produzida += quantidade
+        op.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o apontamento de produção com vários terminais apontando na mesma OP ao mesmo tempo: "
+        "peças perdidas, reenvios com a mesma chave de idempotência e apontamentos por segundo. "
+        "Cria uma OP temporária e a remove no final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=50, help="Terminais simultâneos (padrão: 50).")
+        parser.add_argument('--apontamentos', type=int, default=20, help="Apontamentos por terminal (padrão: 20).")
+        parser.add_argument(
+            '--modo', choices=('atomico', 'antigo'), default='atomico',
+            help="'atomico' usa registrar_apontamento; 'antigo' repete o save() da versão anterior."
+        )
+
+    def handle(self, *args, **options):
+        escritores, por_escritor, modo = options['escritores'], options['apontamentos'], options['modo']
+        if escritores <= 0 or por_escritor <= 0:
+            raise CommandError("Informe quantidades positivas.")
+
+        operador = get_user_model().objects.order_by('id').first()
+        pn = Pn.objects.order_by('id').first()
+        if pn is None:
+            raise CommandError("Cadastre ao menos um PN antes de rodar o benchmark.")
+        maquina = Maquina.objects.create(
+            number=f"BENCH-{uuid.uuid4().hex[:8]}", capacity_liters=0, mold_dim_c=0, mold_dim_a=0, mold_dim_l=0,
+        )
+        op = OrdemProducao.objects.create(
+            pn=pn, quantity=escritores * por_escritor, delivery_date=timezone.localdate(), status='Em Produção',
+        )
+        agora = timezone.now()
+        agendamento = Agendamento.objects.create(
+            ordem_producao=op, maquina=maquina, start_datetime=agora, end_datetime=agora, real_start_datetime=agora,
+        )
+
+        erros = []
+        duplicados = []
+
+        def terminal(indice):
+            try:
+                for i in range(por_escritor):
+                    if modo == 'antigo':
+                        _apontar_antigo(agendamento.id, 1, operador)
+                        continue
+                    chave = f"{indice}-{i}-{agendamento.id}"
+                    registrar_apontamento(agendamento, 1, operador, chave)
+                    # Metade dos apontamentos é reenviada, como depois de um timeout
+                    if i % 2 == 0:
+                        _, _, duplicado = registrar_apontamento(agendamento, 1, operador, chave)
+                        duplicados.append(duplicado)
+            except Exception as e:
+                erros.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=terminal, args=(indice,)) for indice in range(escritores)]
+        comeco = cronometro.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = cronometro.perf_counter() - comeco
+
+        try:
+            apontados = ApontamentoProducao.objects.filter(agendamento=agendamento).count()
+            total = OrdemProducao.objects.get(pk=op.pk).quantidade_produzida
+            self.stdout.write(
+                f"Modo {modo}: {escritores} terminais x {por_escritor} apontamentos em {duracao:.2f} s "
+                f"({apontados / duracao:.0f} apontamentos/s)."
+            )
+            self.stdout.write(f"Apontamentos gravados: {apontados}; total da OP: {total}; peças perdidas: {apontados - total}.")
+            if duplicados:
+                self.stdout.write(f"Reenvios com a mesma chave: {len(duplicados)}, ignorados: {sum(duplicados)}.")
+            if erros:
+                self.stdout.write(self.style.WARNING(f"{len(erros)} terminais com erro; primeiro: {erros[0]!r}"))
+            if apontados == total and not erros:
+                self.stdout.write(self.style.SUCCESS("Nenhuma peça perdida."))
+            elif apontados != total:
+                self.stdout.write(self.style.ERROR("Houve peças perdidas."))
+        finally:
+            maquina.delete()
+            op.delete()
@@ -0,0 +1,64 @@
+# meu_sistema_producao/producao/management/commands/exportar_eventos.py
+
+import resource
+import time as cronometro
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from meu_sistema_producao.producao import exportacao
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta o histórico de apontamentos, paradas ou refugos para um arquivo CSV, XLSX ou Parquet, "
+        "lendo o banco em blocos (memória constante). Usa o mesmo código da API de exportação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fonte', choices=list(exportacao.FONTES))
+        parser.add_argument('saida', help="Arquivo de saída.")
+        parser.add_argument('--inicio', required=True, help="Data inicial (YYYY-MM-DD).")
+        parser.add_argument('--fim', required=True, help="Data final, inclusiva (YYYY-MM-DD).")
+        parser.add_argument('--formato', choices=exportacao.FORMATOS, default='csv', help="Formato (padrão: csv).")
+        parser.add_argument('--maquina', type=int, action='append', default=[], help="Id da máquina (pode ser repetido).")
+        parser.add_argument('--bloco', type=int, default=exportacao.TAMANHO_BLOCO, help="Linhas lidas do banco por vez.")
+
+    def handle(self, *args, **options):
+        try:
+            inicio = timezone.make_aware(datetime.strptime(options['inicio'], '%Y-%m-%d'))
+            fim = timezone.make_aware(datetime.strptime(options['fim'], '%Y-%m-%d') + timedelta(days=1))
+        except ValueError:
+            raise CommandError("Datas no formato YYYY-MM-DD.")
+        if options['bloco'] <= 0:
+            raise CommandError("O tamanho do bloco deve ser positivo.")
+
+        comeco = cronometro.perf_counter()
+        contagem = {'linhas': 0}
+
+        def contadas(linhas):
+            for linha in linhas:
+                contagem['linhas'] += 1
+                yield linha
+
+        fonte, formato = options['fonte'], options['formato']
+        linhas = contadas(exportacao.linhas(fonte, inicio, fim, options['maquina'], options['bloco']))
+        try:
+            exportacao.verificar_formato(formato)
+            with open(options['saida'], 'wb') as saida:
+                if formato == 'xlsx':
+                    with exportacao.xlsx_em_arquivo(fonte, linhas) as planilha:
+                        while pedaco := planilha.read(1 << 20):
+                            saida.write(pedaco)
+                else:
+                    gerador = exportacao.csv_em_streaming if formato == 'csv' else exportacao.parquet_em_streaming
+                    for pedaco in gerador(fonte, linhas, options['bloco']):
+                        saida.write(pedaco)
+        except (exportacao.ErroExportacao, OSError) as e:
+            raise CommandError(str(e))
+
+        duracao = cronometro.perf_counter() - comeco
+        pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"{contagem['linhas']} linhas exportadas em {duracao:.1f} s ({contagem['linhas'] / max(duracao, 1e-9):.0f}/s); "
+            f"pico de memória do processo: {pico_mb:.0f} MB."
+        ))
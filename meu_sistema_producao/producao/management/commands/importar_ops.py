@@ -0,0 +1,41 @@
+# meu_sistema_producao/producao/management/commands/importar_ops.py
+
+import time as cronometro
+from django.core.management.base import BaseCommand, CommandError
+from meu_sistema_producao.producao.importacao import importar_ops, formato_do_arquivo, ErroImportacao, FORMATOS
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria as OPs da exportação do ERP (CSV ou XLSX com as colunas PN, quantidade e data de entrega). "
+        "Linhas inválidas ou repetidas de OPs em aberto são relatadas e não interrompem a importação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho da planilha.")
+        parser.add_argument('--formato', choices=FORMATOS, help="Formato do arquivo (padrão: pela extensão).")
+        parser.add_argument('--dry-run', action='store_true', help="Valida e conta sem gravar nada.")
+        parser.add_argument('--max-erros', type=int, default=20, help="Erros listados na saída (padrão: 20).")
+
+    def handle(self, *args, **options):
+        comeco = cronometro.perf_counter()
+        try:
+            formato = options['formato'] or formato_do_arquivo(options['arquivo'])
+            with open(options['arquivo'], 'rb') as arquivo:
+                relatorio = importar_ops(arquivo.read(), formato, options['dry_run'])
+        except (ErroImportacao, OSError) as e:
+            raise CommandError(str(e))
+        duracao = cronometro.perf_counter() - comeco
+
+        for erro in relatorio.erros[:options['max_erros']]:
+            self.stdout.write(self.style.WARNING(
+                f"Linha {erro['linha']} ({erro['identificador'] or 'sem PN'}): {'; '.join(erro['mensagens'])}"
+            ))
+        if relatorio.total_erros > options['max_erros']:
+            self.stdout.write(self.style.WARNING(f"... e mais {relatorio.total_erros - options['max_erros']} erros."))
+
+        prefixo = "Simulação (nada gravado)" if options['dry_run'] else "Importação concluída"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixo} em {duracao:.1f} s: {relatorio.linhas} linhas, {relatorio.criados} OPs aceitas, "
+            f"{relatorio.total_erros} rejeitadas."
+        ))
@@ -0,0 +1,44 @@
+# meu_sistema_producao/producao/management/commands/importar_pns.py
+
+import time as cronometro
+from django.core.management.base import BaseCommand, CommandError
+from meu_sistema_producao.producao.importacao import importar_pns, formato_do_arquivo, ErroImportacao, FORMATOS
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa PNs de uma planilha CSV ou XLSX em streaming e em lotes, criando ou atualizando "
+        "pelo pn_code. Linhas com erro são relatadas e não interrompem a importação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho da planilha.")
+        parser.add_argument('--formato', choices=FORMATOS, help="Formato do arquivo (padrão: pela extensão).")
+        parser.add_argument('--lote', type=int, default=1000, help="Linhas por lote (padrão: 1000).")
+        parser.add_argument('--dry-run', action='store_true', help="Valida e conta sem gravar nada.")
+        parser.add_argument('--max-erros', type=int, default=20, help="Erros listados na saída (padrão: 20).")
+
+    def handle(self, *args, **options):
+        if options['lote'] <= 0:
+            raise CommandError("O tamanho do lote deve ser positivo.")
+        comeco = cronometro.perf_counter()
+        try:
+            formato = options['formato'] or formato_do_arquivo(options['arquivo'])
+            with open(options['arquivo'], 'rb') as arquivo:
+                relatorio = importar_pns(arquivo, formato, options['lote'], options['dry_run'])
+        except (ErroImportacao, OSError) as e:
+            raise CommandError(str(e))
+        duracao = cronometro.perf_counter() - comeco
+
+        for erro in relatorio.erros[:options['max_erros']]:
+            self.stdout.write(self.style.WARNING(
+                f"Linha {erro['linha']} ({erro['identificador'] or 'sem PN'}): {'; '.join(erro['mensagens'])}"
+            ))
+        if relatorio.total_erros > options['max_erros']:
+            self.stdout.write(self.style.WARNING(f"... e mais {relatorio.total_erros - options['max_erros']} erros."))
+
+        prefixo = "Simulação (nada gravado)" if options['dry_run'] else "Importação concluída"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixo} em {duracao:.1f} s: {relatorio.linhas} linhas, {relatorio.criados} criados, "
+            f"{relatorio.atualizados} atualizados, {relatorio.sem_alteracao} sem alteração, {relatorio.total_erros} com erro."
+        ))
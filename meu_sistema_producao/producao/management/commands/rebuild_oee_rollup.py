@@ -0,0 +1,22 @@
+# meu_sistema_producao/producao/management/commands/rebuild_oee_rollup.py
+
+from django.core.management.base import BaseCommand
+from meu_sistema_producao.producao.rollup import reconstruir_rollup
+
+
+class Command(BaseCommand):
+    help = "Reconstrói do zero o consolidado horário de OEE (OeeRollupHora) a partir dos apontamentos, paradas e refugos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--agendamento', type=int, action='append', dest='agendamentos',
+            help="Reconstrói apenas o agendamento informado (pode ser repetido)."
+        )
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help="Tamanho do lote do bulk_create (padrão: 1000)."
+        )
+
+    def handle(self, *args, **options):
+        total = reconstruir_rollup(options['agendamentos'], tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Consolidado OEE reconstruído: {total} baldes horários gravados.'))
@@ -0,0 +1,22 @@
+# meu_sistema_producao/producao/management/commands/recalcular_compatibilidade.py
+
+from django.core.management.base import BaseCommand
+from meu_sistema_producao.producao.compatibilidade import recalcular
+
+
+class Command(BaseCommand):
+    help = "Recalcula a matriz de compatibilidade PN x máquina (CompatibilidadePnMaquina)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pn', type=int, action='append', dest='pns',
+            help="Recalcula apenas o PN informado (pode ser repetido)."
+        )
+        parser.add_argument(
+            '--maquina', type=int, action='append', dest='maquinas',
+            help="Recalcula apenas a máquina informada (pode ser repetido)."
+        )
+
+    def handle(self, *args, **options):
+        total = recalcular(options['pns'], options['maquinas'])
+        self.stdout.write(self.style.SUCCESS(f'Compatibilidade recalculada: {total} pares PN x máquina compatíveis.'))
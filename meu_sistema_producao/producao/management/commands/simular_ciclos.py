@@ -0,0 +1,122 @@
+# meu_sistema_producao/producao/management/commands/simular_ciclos.py
+
+import json
+import random
+import statistics
+import threading
+import time as cronometro
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from meu_sistema_producao.producao.models import Agendamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulador local do gateway das máquinas para teste de carga: envia sinais de fim de ciclo "
+        "das máquinas com OP em produção para a API de ciclos de um servidor em execução "
+        "(ex: python manage.py runserver) e mede a latência das requisições."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/maquinas/ciclos/', help="Endereço da API de ciclos.")
+        parser.add_argument('--token', default=None, help="Token do gateway (padrão: settings.CICLOS_TOKEN).")
+        parser.add_argument('--maquinas', type=int, default=80, help="Máximo de máquinas simuladas (padrão: 80).")
+        parser.add_argument('--ciclo', type=float, default=3.0, help="Tempo de ciclo simulado em segundos (padrão: 3).")
+        parser.add_argument('--variacao', type=float, default=0.1, help="Variação aleatória do ciclo, em fração (padrão: 0.1).")
+        parser.add_argument('--duracao', type=float, default=60.0, help="Duração da simulação em segundos (padrão: 60).")
+        parser.add_argument('--gateways', type=int, default=4, help="Gateways simultâneos; as máquinas são divididas entre eles (padrão: 4).")
+        parser.add_argument('--envio', type=float, default=1.0, help="Intervalo entre envios de cada gateway em segundos (padrão: 1).")
+
+    def handle(self, *args, **options):
+        token = options['token'] or settings.CICLOS_TOKEN
+        if not token:
+            raise CommandError("Defina CICLOS_TOKEN (ou use --token) no servidor e no simulador.")
+        if options['ciclo'] <= 0 or options['duracao'] <= 0 or options['gateways'] <= 0:
+            raise CommandError("Informe valores positivos.")
+
+        # Só máquinas com OP em produção: as outras teriam os sinais ignorados
+        maquina_ids = sorted(set(Agendamento.objects.filter(
+            ordem_producao__status='Em Produção',
+            real_start_datetime__isnull=False,
+            real_end_datetime__isnull=True,
+        ).values_list('maquina_id', flat=True)))[:options['maquinas']]
+        if not maquina_ids:
+            raise CommandError("Nenhuma máquina com OP em produção. Inicie alguma OP antes de simular.")
+        if len(maquina_ids) < options['maquinas']:
+            self.stdout.write(self.style.WARNING(f"Só {len(maquina_ids)} máquinas com OP em produção."))
+
+        latencias, erros = [], []
+        contagem = {'sinais': 0, 'aceitos': 0}
+        trava = threading.Lock()
+        fim = cronometro.monotonic() + options['duracao']
+
+        def gateway(maquinas):
+            proximo = {maquina_id: cronometro.monotonic() + random.uniform(0, options['ciclo']) for maquina_id in maquinas}
+            while cronometro.monotonic() < fim:
+                cronometro.sleep(options['envio'])
+                agora_mono, agora = cronometro.monotonic(), timezone.now()
+                sinais = []
+                for maquina_id, quando in proximo.items():
+                    while quando <= agora_mono:
+                        # Horário real do ciclo, não o do envio
+                        sinais.append({
+                            'maquina_id': maquina_id,
+                            'momento': (agora - timedelta(seconds=agora_mono - quando)).isoformat(),
+                        })
+                        quando += options['ciclo'] * random.uniform(1 - options['variacao'], 1 + options['variacao'])
+                    proximo[maquina_id] = quando
+                if not sinais:
+                    continue
+
+                requisicao = urllib.request.Request(
+                    options['url'],
+                    data=json.dumps({'sinais': sinais}).encode(),
+                    headers={'Content-Type': 'application/json', 'X-Token-Ciclos': token},
+                    method='POST',
+                )
+                comeco = cronometro.perf_counter()
+                try:
+                    with urllib.request.urlopen(requisicao, timeout=30) as resposta:
+                        aceitos = json.loads(resposta.read())['aceitos']
+                except (urllib.error.URLError, OSError, ValueError, KeyError) as e:
+                    with trava:
+                        erros.append(e)
+                    continue
+                with trava:
+                    latencias.append(cronometro.perf_counter() - comeco)
+                    contagem['sinais'] += len(sinais)
+                    contagem['aceitos'] += aceitos
+
+        grupos = [maquina_ids[i::options['gateways']] for i in range(options['gateways'])]
+        threads = [threading.Thread(target=gateway, args=(grupo,)) for grupo in grupos if grupo]
+        comeco = cronometro.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = cronometro.perf_counter() - comeco
+
+        self.stdout.write(
+            f"{len(maquina_ids)} máquinas, ciclo de {options['ciclo']:.1f} s, {len(threads)} gateways, {duracao:.1f} s."
+        )
+        self.stdout.write(
+            f"Sinais enviados: {contagem['sinais']} ({contagem['sinais'] / duracao:.0f}/s); aceitos: {contagem['aceitos']}; "
+            f"requisições: {len(latencias)}."
+        )
+        if latencias:
+            ordenadas = sorted(latencias)
+            p95 = ordenadas[int(0.95 * (len(ordenadas) - 1))]
+            self.stdout.write(
+                f"Latência: média {statistics.mean(latencias) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, "
+                f"máxima {ordenadas[-1] * 1000:.1f} ms."
+            )
+        if erros:
+            self.stdout.write(self.style.WARNING(f"{len(erros)} envios com erro; primeiro: {erros[0]!r}"))
+        self.stdout.write(
+            f"Os ciclos são gravados a cada {settings.CICLOS_DESCARGA_SEGUNDOS} s pelo servidor; "
+            "compare os tempos em /api/maquinas/ciclos/comparativo/."
+        )
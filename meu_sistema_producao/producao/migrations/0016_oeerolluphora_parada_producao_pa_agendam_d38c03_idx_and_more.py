@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:34
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0015_tipoparada_classificacao_parada'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OeeRollupHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(verbose_name='Hora (início do intervalo)')),
+                ('pecas_boas', models.IntegerField(default=0, verbose_name='Peças Boas')),
+                ('pecas_refugo', models.IntegerField(default=0, verbose_name='Peças Refugadas')),
+                ('parada_planejada', models.DurationField(default=datetime.timedelta(0), verbose_name='Parada Planejada')),
+                ('parada_nao_planejada', models.DurationField(default=datetime.timedelta(0), verbose_name='Parada Não Planejada')),
+            ],
+            options={
+                'verbose_name': 'Consolidado OEE por Hora',
+                'verbose_name_plural': 'Consolidados OEE por Hora',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='parada',
+            index=models.Index(fields=['agendamento', 'inicio_parada'], name='producao_pa_agendam_d38c03_idx'),
+        ),
+        migrations.AddField(
+            model_name='oeerolluphora',
+            name='agendamento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups_oee', to='producao.agendamento'),
+        ),
+        migrations.AddField(
+            model_name='oeerolluphora',
+            name='maquina',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups_oee', to='producao.maquina'),
+        ),
+        migrations.AddIndex(
+            model_name='oeerolluphora',
+            index=models.Index(fields=['agendamento', 'hora'], name='producao_oe_agendam_e8489a_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='oeerolluphora',
+            unique_together={('maquina', 'agendamento', 'hora')},
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0016_oeerolluphora_parada_producao_pa_agendam_d38c03_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorVersao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=50, unique=True, verbose_name='Chave')),
+                ('versao', models.BigIntegerField(default=0, verbose_name='Versão')),
+            ],
+            options={
+                'verbose_name': 'Contador de Versão',
+                'verbose_name_plural': 'Contadores de Versão',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0017_contadorversao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendamento',
+            name='real_end_datetime',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fim Real da Produção'),
+        ),
+        migrations.CreateModel(
+            name='OeeHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidade', models.CharField(choices=[('HORA', 'Hora'), ('TURNO', 'Turno')], max_length=5, verbose_name='Granularidade')),
+                ('inicio', models.DateTimeField(verbose_name='Início do Balde')),
+                ('turno', models.CharField(blank=True, default='', max_length=20, verbose_name='Turno')),
+                ('tempo_bruto_segundos', models.FloatField(default=0, verbose_name='Tempo Bruto (s)')),
+                ('parada_planejada_segundos', models.FloatField(default=0, verbose_name='Parada Planejada (s)')),
+                ('parada_nao_planejada_segundos', models.FloatField(default=0, verbose_name='Parada Não Planejada (s)')),
+                ('pecas_boas', models.IntegerField(default=0, verbose_name='Peças Boas')),
+                ('pecas_refugo', models.IntegerField(default=0, verbose_name='Peças Refugadas')),
+                ('pecas_teoricas', models.FloatField(default=0, verbose_name='Peças Teóricas')),
+                ('maquina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_oee', to='producao.maquina')),
+            ],
+            options={
+                'verbose_name': 'Histórico de OEE',
+                'verbose_name_plural': 'Histórico de OEE',
+                'indexes': [models.Index(fields=['granularidade', 'inicio', 'maquina'], name='producao_oe_granula_24d1b4_idx')],
+                'unique_together': {('maquina', 'granularidade', 'inicio')},
+            },
+        ),
+    ]
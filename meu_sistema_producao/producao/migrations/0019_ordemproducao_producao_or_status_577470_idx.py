@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0018_agendamento_real_end_datetime_oeehistorico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordemproducao',
+            index=models.Index(fields=['status', 'delivery_date'], name='producao_or_status_577470_idx'),
+        ),
+    ]
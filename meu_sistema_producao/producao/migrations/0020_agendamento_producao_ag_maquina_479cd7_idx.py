@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0019_ordemproducao_producao_or_status_577470_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['maquina', 'end_datetime'], name='producao_ag_maquina_479cd7_idx'),
+        ),
+    ]
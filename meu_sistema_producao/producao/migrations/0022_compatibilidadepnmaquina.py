@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0021_agendamento_producao_ag_maquina_fbe3f3_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompatibilidadePnMaquina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('maquina', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pns_compativeis', to='producao.maquina', verbose_name='Máquina')),
+                ('pn', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='maquinas_compativeis', to='producao.pn', verbose_name='PN')),
+            ],
+            options={
+                'verbose_name': 'Compatibilidade PN x Máquina',
+                'verbose_name_plural': 'Compatibilidades PN x Máquina',
+                'unique_together': {('pn', 'maquina')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0022_compatibilidadepnmaquina'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apontamentoproducao',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Chave de Idempotência'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0023_apontamentoproducao_chave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parada',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Chave de Idempotência'),
+        ),
+        migrations.AddField(
+            model_name='refugo',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Chave de Idempotência'),
+        ),
+        migrations.AlterField(
+            model_name='apontamentoproducao',
+            name='data_apontamento',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data do Apontamento'),
+        ),
+        migrations.AlterField(
+            model_name='refugo',
+            name='data_apontamento',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data do Apontamento'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0024_parada_chave_idempotencia_refugo_chave_idempotencia_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apontamentoproducao',
+            name='ciclos',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Ciclos'),
+        ),
+        migrations.AddField(
+            model_name='apontamentoproducao',
+            name='tempo_ciclo_real_segundos',
+            field=models.FloatField(blank=True, null=True, verbose_name='Tempo de Ciclo Real (segundos)'),
+        ),
+    ]
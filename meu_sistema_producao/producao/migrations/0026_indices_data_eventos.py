@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0025_apontamentoproducao_ciclos_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apontamentoproducao',
+            index=models.Index(fields=['data_apontamento'], name='producao_ap_data_ap_3ec444_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parada',
+            index=models.Index(fields=['inicio_parada'], name='producao_pa_inicio__d87e33_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refugo',
+            index=models.Index(fields=['data_apontamento'], name='producao_re_data_ap_7582b3_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0026_indices_data_eventos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApontamentoProducaoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantidade', models.IntegerField(verbose_name='Quantidade Apontada')),
+                ('data_apontamento', models.DateTimeField(verbose_name='Data do Apontamento')),
+                ('chave_idempotencia', models.CharField(blank=True, max_length=64, null=True, verbose_name='Chave de Idempotência')),
+                ('ciclos', models.PositiveIntegerField(blank=True, null=True, verbose_name='Ciclos')),
+                ('tempo_ciclo_real_segundos', models.FloatField(blank=True, null=True, verbose_name='Tempo de Ciclo Real (segundos)')),
+                ('agendamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='apontamentos_arquivados', to='producao.agendamento')),
+                ('operador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Apontamento Arquivado',
+                'verbose_name_plural': 'Apontamentos Arquivados',
+                'indexes': [models.Index(fields=['data_apontamento'], name='producao_ap_data_ap_3ce2e7_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ParadaArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('inicio_parada', models.DateTimeField(verbose_name='Início da Parada')),
+                ('fim_parada', models.DateTimeField(verbose_name='Fim da Parada')),
+                ('chave_idempotencia', models.CharField(blank=True, max_length=64, null=True, verbose_name='Chave de Idempotência')),
+                ('agendamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paradas_arquivadas', to='producao.agendamento')),
+                ('operador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('tipo_parada', models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='producao.tipoparada', verbose_name='Tipo de Parada')),
+            ],
+            options={
+                'verbose_name': 'Parada Arquivada',
+                'verbose_name_plural': 'Paradas Arquivadas',
+                'indexes': [models.Index(fields=['agendamento', 'inicio_parada'], name='producao_pa_agendam_e70cf1_idx'), models.Index(fields=['inicio_parada'], name='producao_pa_inicio__3971ab_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RefugoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantidade', models.IntegerField(verbose_name='Quantidade Refugada')),
+                ('data_apontamento', models.DateTimeField(verbose_name='Data do Apontamento')),
+                ('chave_idempotencia', models.CharField(blank=True, max_length=64, null=True, verbose_name='Chave de Idempotência')),
+                ('agendamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refugos_arquivados', to='producao.agendamento')),
+                ('operador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('tipo_refugo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='producao.tiporefugo', verbose_name='Tipo de Refugo')),
+            ],
+            options={
+                'verbose_name': 'Refugo Arquivado',
+                'verbose_name_plural': 'Refugos Arquivados',
+                'indexes': [models.Index(fields=['data_apontamento'], name='producao_re_data_ap_92e063_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Preenche o consolidado horário de OEE (OeeRollupHora) a partir dos
+# eventos já gravados. A tabela foi criada vazia na 0016 e só recebe os
+# eventos novos; sem isto o dashboard mostraria zero para todo o histórico.
+# Mesmo cálculo de rollup.reconstruir_rollup, com os modelos históricos.
+
+from datetime import timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import itemgetter
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import TruncHour
+from meu_sistema_producao.producao.paradas import mesclar_paradas, PLANEJADA
+
+
+UMA_HORA = timedelta(hours=1)
+
+
+def preencher_rollup(apps, schema_editor):
+    OeeRollupHora = apps.get_model('producao', 'OeeRollupHora')
+    utc = dt_timezone.utc
+    baldes = {}
+
+    def balde(agendamento_id, maquina_id, hora):
+        chave = (agendamento_id, hora)
+        if chave not in baldes:
+            baldes[chave] = OeeRollupHora(
+                agendamento_id=agendamento_id,
+                maquina_id=maquina_id,
+                hora=hora,
+                parada_planejada=timedelta(0),
+                parada_nao_planejada=timedelta(0),
+            )
+        return baldes[chave]
+
+    # 1. Peças boas e 2. refugo, da tabela viva e do arquivo
+    for nomes, campo in (
+        (('ApontamentoProducao', 'ApontamentoProducaoArquivado'), 'pecas_boas'),
+        (('Refugo', 'RefugoArquivado'), 'pecas_refugo'),
+    ):
+        for nome in nomes:
+            for linha in apps.get_model('producao', nome).objects.values(
+                'agendamento_id', 'agendamento__maquina_id', hora=TruncHour('data_apontamento', tzinfo=utc)
+            ).annotate(total=Sum('quantidade')).order_by():
+                rollup = balde(linha['agendamento_id'], linha['agendamento__maquina_id'], linha['hora'])
+                setattr(rollup, campo, getattr(rollup, campo) + linha['total'])
+
+    # 3. Paradas classificadas, mescladas por agendamento e divididas por hora
+    paradas = []
+    for nome in ('Parada', 'ParadaArquivada'):
+        paradas += apps.get_model('producao', nome).objects.filter(
+            tipo_parada__classificacao_parada__isnull=False,
+        ).values_list(
+            'agendamento_id', 'agendamento__maquina_id', 'inicio_parada', 'fim_parada', 'tipo_parada__classificacao_parada'
+        )
+    paradas.sort(key=itemgetter(0))
+    for (agendamento_id, maquina_id), grupo in groupby(paradas, key=itemgetter(0, 1)):
+        for inicio, fim, classificacao in mesclar_paradas(linha[2:] for linha in grupo):
+            hora = inicio.astimezone(utc).replace(minute=0, second=0, microsecond=0)
+            while hora < fim:
+                trecho = min(fim, hora + UMA_HORA) - max(inicio, hora)
+                rollup = balde(agendamento_id, maquina_id, hora)
+                if classificacao == PLANEJADA:
+                    rollup.parada_planejada += trecho
+                else:
+                    rollup.parada_nao_planejada += trecho
+                hora += UMA_HORA
+
+    OeeRollupHora.objects.all().delete()
+    OeeRollupHora.objects.bulk_create(baldes.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0027_arquivo_eventos'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Preenche a matriz de compatibilidade PN x máquina com os cadastros já
+# existentes. A tabela foi criada vazia na 0022 e só é recalculada quando um
+# PN ou uma máquina é gravado; vazia, o quadro recusa todo agendamento e o
+# agendador automático não encontra máquina para nenhuma OP.
+# Mesmo cálculo de compatibilidade.recalcular, com os modelos históricos.
+
+from django.db import migrations
+from meu_sistema_producao.producao.compatibilidade import pares_compativeis, CAMPOS_PN, CAMPOS_MAQUINA
+
+
+def preencher_compatibilidade(apps, schema_editor):
+    Pn = apps.get_model('producao', 'Pn')
+    Maquina = apps.get_model('producao', 'Maquina')
+    CompatibilidadePnMaquina = apps.get_model('producao', 'CompatibilidadePnMaquina')
+
+    pares = pares_compativeis(
+        list(Pn.objects.order_by('id').values('id', *CAMPOS_PN)),
+        list(Maquina.objects.order_by('id').values('id', *CAMPOS_MAQUINA)),
+    )
+    CompatibilidadePnMaquina.objects.all().delete()
+    CompatibilidadePnMaquina.objects.bulk_create(
+        [CompatibilidadePnMaquina(pn_id=pn_id, maquina_id=maquina_id) for pn_id, maquina_id in pares],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0028_preencher_oee_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_compatibilidade, migrations.RunPython.noop),
+    ]
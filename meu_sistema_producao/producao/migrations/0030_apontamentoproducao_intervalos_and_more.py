@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('producao', '0029_preencher_compatibilidade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apontamentoproducao',
+            name='intervalos',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Intervalos Medidos'),
+        ),
+        migrations.AddField(
+            model_name='apontamentoproducaoarquivado',
+            name='intervalos',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Intervalos Medidos'),
+        ),
+    ]
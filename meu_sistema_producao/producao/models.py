@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 
 class Pn(models.Model):
     """
@@ -94,6 +96,8 @@ class OrdemProducao(models.Model):
     class Meta:
         verbose_name = 'Ordem de Produção'
         verbose_name_plural = 'Ordens de Produção'
+        # Quadro de planejamento: OPs em aberto por data de entrega
+        indexes = [models.Index(fields=['status', 'delivery_date'])]
 
 class Agendamento(models.Model):
     """
@@ -108,6 +112,11 @@ class Agendamento(models.Model):
         null=True,  # Permite que o valor seja NULO no banco (para OPs antigas ou não iniciadas)
         blank=True  # Permite que o campo seja vazio no Django Admin
     )
+    real_end_datetime = models.DateTimeField(
+        verbose_name="Fim Real da Produção",
+        null=True,  # Preenchido ao finalizar a OP
+        blank=True
+    )
     LADO_CHOICES = (
         ('L', 'Esquerdo'),
         ('R', 'Direito'),
@@ -125,17 +134,41 @@ class Agendamento(models.Model):
         verbose_name_plural = 'Agendamentos'
         # Garante que uma mesma OP não possa ser agendada duas vezes.
         unique_together = ('ordem_producao',)
+        # Detecção de conflitos: agendamentos da máquina que terminam depois
+        # do início proposto (producao/conflitos.py)
+        indexes = [
+            models.Index(fields=['maquina', 'end_datetime']),
+            models.Index(fields=['maquina', 'start_datetime', 'end_datetime']),
+        ]
 
 # NOVO MODELO: Para registrar cada apontamento de produção
 class ApontamentoProducao(models.Model):
     agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name="apontamentos")
     quantidade = models.IntegerField(verbose_name="Quantidade Apontada")
-    data_apontamento = models.DateTimeField(auto_now_add=True, verbose_name="Data do Apontamento")
+    # Com default (e não auto_now_add) para aceitar o horário do terminal
+    # nos eventos enviados em lote depois de uma queda de rede
+    data_apontamento = models.DateTimeField(default=timezone.now, verbose_name="Data do Apontamento")
     operador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    # Gerada pelo terminal a cada apontamento: um POST repetido com a mesma
+    # chave não conta as peças de novo (ver producao/apontamentos.py)
+    chave_idempotencia = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Chave de Idempotência")
+    # Preenchidos só nos apontamentos gerados pelos sinais de ciclo das
+    # máquinas (ver producao/ciclos.py); vazios nos apontamentos manuais
+    ciclos = models.PositiveIntegerField(null=True, blank=True, verbose_name="Ciclos")
+    tempo_ciclo_real_segundos = models.FloatField(null=True, blank=True, verbose_name="Tempo de Ciclo Real (segundos)")
+    # Quantos intervalos entre sinais entraram na média acima (os de parada
+    # ficam de fora); é o peso do apontamento em comparar_tempos_de_ciclo
+    intervalos = models.PositiveIntegerField(null=True, blank=True, verbose_name="Intervalos Medidos")
 
     def __str__(self):
         return f"{self.quantidade} un. na OP {self.agendamento.ordem_producao.id} em {self.data_apontamento}"
 
+    class Meta:
+        # Exportação e relatórios filtram pelo período
+        indexes = [
+            models.Index(fields=['data_apontamento']),
+        ]
+
 class TipoParada(models.Model):
     codigo = models.CharField(max_length=20, unique=True, verbose_name="Código da Parada")
     descricao = models.CharField(max_length=255, verbose_name="Descrição")
@@ -166,12 +199,20 @@ class Parada(models.Model):
     inicio_parada = models.DateTimeField(verbose_name="Início da Parada")
     fim_parada = models.DateTimeField(verbose_name="Fim da Parada")
     operador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    # UUID do evento gerado pelo terminal (ver producao/ingestao.py)
+    chave_idempotencia = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Chave de Idempotência")
 
     def __str__(self):
         if self.tipo_parada:
             return f"Parada na OP {self.agendamento.ordem_producao.id}: {self.tipo_parada.descricao}"
         return f"Parada na OP {self.agendamento.ordem_producao.id}: (Tipo não definido)"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['agendamento', 'inicio_parada']),
+            models.Index(fields=['inicio_parada']),
+        ]
+
 class TipoRefugo(models.Model):
     codigo = models.CharField(max_length=20, unique=True, verbose_name="Código do Refugo")
     descricao = models.CharField(max_length=255, verbose_name="Descrição")
@@ -187,12 +228,175 @@ class Refugo(models.Model):
     agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name="refugos")
     tipo_refugo = models.ForeignKey(TipoRefugo, on_delete=models.PROTECT, verbose_name="Tipo de Refugo") # PROTECT evita excluir um tipo se ele já foi usado
     quantidade = models.IntegerField(verbose_name="Quantidade Refugada")
-    data_apontamento = models.DateTimeField(auto_now_add=True, verbose_name="Data do Apontamento")
+    data_apontamento = models.DateTimeField(default=timezone.now, verbose_name="Data do Apontamento")
     operador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    # UUID do evento gerado pelo terminal (ver producao/ingestao.py)
+    chave_idempotencia = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Chave de Idempotência")
 
     def __str__(self):
         return f"{self.quantidade} un. refugo ({self.tipo_refugo.codigo}) na OP {self.agendamento.ordem_producao.id}"
 
     class Meta:
         verbose_name = "Apontamento de Refugo"
-        verbose_name_plural = "Apontamentos de Refugo"
\ No newline at end of file
+        verbose_name_plural = "Apontamentos de Refugo"
+        indexes = [
+            models.Index(fields=['data_apontamento']),
+        ]
+class OeeRollupHora(models.Model):
+    """
+    Consolidado por hora (máquina, agendamento, hora) dos eventos que
+    alimentam o OEE. É atualizado de forma incremental pelas APIs de
+    apontamento, parada e refugo e pode ser reconstruído com o comando
+    `rebuild_oee_rollup`.
+    """
+    maquina = models.ForeignKey(Maquina, on_delete=models.CASCADE, related_name="rollups_oee")
+    agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name="rollups_oee")
+    hora = models.DateTimeField(verbose_name="Hora (início do intervalo)")
+    pecas_boas = models.IntegerField(default=0, verbose_name="Peças Boas")
+    pecas_refugo = models.IntegerField(default=0, verbose_name="Peças Refugadas")
+    parada_planejada = models.DurationField(default=timedelta(0), verbose_name="Parada Planejada")
+    parada_nao_planejada = models.DurationField(default=timedelta(0), verbose_name="Parada Não Planejada")
+
+    def __str__(self):
+        return f"Rollup OEE {self.maquina} / agendamento {self.agendamento_id} em {self.hora}"
+
+    class Meta:
+        verbose_name = "Consolidado OEE por Hora"
+        verbose_name_plural = "Consolidados OEE por Hora"
+        unique_together = ('maquina', 'agendamento', 'hora')
+        indexes = [
+            models.Index(fields=['agendamento', 'hora']),
+        ]
+
+class ContadorVersao(models.Model):
+    """
+    Contador de versão por assunto (ex: 'dashboard'), incrementado a cada
+    alteração relevante. Serve de base para ETags compartilhadas entre
+    todos os processos do servidor.
+    """
+    chave = models.CharField(max_length=50, unique=True, verbose_name="Chave")
+    versao = models.BigIntegerField(default=0, verbose_name="Versão")
+
+    def __str__(self):
+        return f"{self.chave} v{self.versao}"
+
+    class Meta:
+        verbose_name = "Contador de Versão"
+        verbose_name_plural = "Contadores de Versão"
+
+class OeeHistorico(models.Model):
+    """
+    Baldes pré-calculados do histórico de OEE por máquina, em granularidade
+    de hora ou de turno. Guardam os totais (não os percentuais), para que
+    dias e semanas sejam obtidos somando turnos. Preenchidos pelo comando
+    `backfill_oee_historico`.
+    """
+    GRANULARIDADE_CHOICES = [
+        ('HORA', 'Hora'),
+        ('TURNO', 'Turno'),
+    ]
+    maquina = models.ForeignKey(Maquina, on_delete=models.CASCADE, related_name="historico_oee")
+    granularidade = models.CharField(max_length=5, choices=GRANULARIDADE_CHOICES, verbose_name="Granularidade")
+    inicio = models.DateTimeField(verbose_name="Início do Balde")
+    turno = models.CharField(max_length=20, blank=True, default='', verbose_name="Turno")
+    tempo_bruto_segundos = models.FloatField(default=0, verbose_name="Tempo Bruto (s)")
+    parada_planejada_segundos = models.FloatField(default=0, verbose_name="Parada Planejada (s)")
+    parada_nao_planejada_segundos = models.FloatField(default=0, verbose_name="Parada Não Planejada (s)")
+    pecas_boas = models.IntegerField(default=0, verbose_name="Peças Boas")
+    pecas_refugo = models.IntegerField(default=0, verbose_name="Peças Refugadas")
+    pecas_teoricas = models.FloatField(default=0, verbose_name="Peças Teóricas")
+
+    def __str__(self):
+        return f"Histórico OEE {self.maquina} ({self.granularidade}) em {self.inicio}"
+
+    class Meta:
+        verbose_name = "Histórico de OEE"
+        verbose_name_plural = "Histórico de OEE"
+        unique_together = ('maquina', 'granularidade', 'inicio')
+        indexes = [
+            models.Index(fields=['granularidade', 'inicio', 'maquina']),
+        ]
+
+class CompatibilidadePnMaquina(models.Model):
+    """
+    Par (PN, máquina) em que o PN cabe na máquina (capacidade e dimensões
+    do molde). Só os pares compatíveis são gravados. Mantida por
+    producao/compatibilidade.py.
+    """
+    pn = models.ForeignKey(Pn, on_delete=models.CASCADE, related_name="maquinas_compativeis", verbose_name="PN")
+    maquina = models.ForeignKey(Maquina, on_delete=models.CASCADE, related_name="pns_compativeis", verbose_name="Máquina")
+
+    def __str__(self):
+        return f"{self.pn} -> {self.maquina}"
+
+    class Meta:
+        verbose_name = "Compatibilidade PN x Máquina"
+        verbose_name_plural = "Compatibilidades PN x Máquina"
+        unique_together = ('pn', 'maquina')
+
+# =======================================================================
+# ARQUIVO DOS EVENTOS
+# Eventos das OPs concluídas há mais de N meses, movidos pelo comando
+# `arquivar_eventos` (ver producao/arquivo.py). Mesmos campos e mesmo id
+# das tabelas vivas; os relatórios históricos consultam as duas.
+# =======================================================================
+
+class ApontamentoProducaoArquivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name="apontamentos_arquivados")
+    quantidade = models.IntegerField(verbose_name="Quantidade Apontada")
+    data_apontamento = models.DateTimeField(verbose_name="Data do Apontamento")
+    operador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    chave_idempotencia = models.CharField(max_length=64, null=True, blank=True, verbose_name="Chave de Idempotência")
+    ciclos = models.PositiveIntegerField(null=True, blank=True, verbose_name="Ciclos")
+    tempo_ciclo_real_segundos = models.FloatField(null=True, blank=True, verbose_name="Tempo de Ciclo Real (segundos)")
+    intervalos = models.PositiveIntegerField(null=True, blank=True, verbose_name="Intervalos Medidos")
+
+    def __str__(self):
+        return f"{self.quantidade} un. na OP {self.agendamento.ordem_producao_id} em {self.data_apontamento} (arquivado)"
+
+    class Meta:
+        verbose_name = "Apontamento Arquivado"
+        verbose_name_plural = "Apontamentos Arquivados"
+        indexes = [
+            models.Index(fields=['data_apontamento']),
+        ]
+
+class ParadaArquivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name="paradas_arquivadas")
+    tipo_parada = models.ForeignKey(TipoParada, on_delete=models.PROTECT, verbose_name="Tipo de Parada", null=True, related_name='+')
+    inicio_parada = models.DateTimeField(verbose_name="Início da Parada")
+    fim_parada = models.DateTimeField(verbose_name="Fim da Parada")
+    operador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    chave_idempotencia = models.CharField(max_length=64, null=True, blank=True, verbose_name="Chave de Idempotência")
+
+    def __str__(self):
+        return f"Parada na OP {self.agendamento.ordem_producao_id} em {self.inicio_parada} (arquivada)"
+
+    class Meta:
+        verbose_name = "Parada Arquivada"
+        verbose_name_plural = "Paradas Arquivadas"
+        indexes = [
+            models.Index(fields=['agendamento', 'inicio_parada']),
+            models.Index(fields=['inicio_parada']),
+        ]
+
+class RefugoArquivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    agendamento = models.ForeignKey(Agendamento, on_delete=models.CASCADE, related_name="refugos_arquivados")
+    tipo_refugo = models.ForeignKey(TipoRefugo, on_delete=models.PROTECT, verbose_name="Tipo de Refugo", related_name='+')
+    quantidade = models.IntegerField(verbose_name="Quantidade Refugada")
+    data_apontamento = models.DateTimeField(verbose_name="Data do Apontamento")
+    operador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    chave_idempotencia = models.CharField(max_length=64, null=True, blank=True, verbose_name="Chave de Idempotência")
+
+    def __str__(self):
+        return f"{self.quantidade} un. refugo na OP {self.agendamento.ordem_producao_id} (arquivado)"
+
+    class Meta:
+        verbose_name = "Refugo Arquivado"
+        verbose_name_plural = "Refugos Arquivados"
+        indexes = [
+            models.Index(fields=['data_apontamento']),
+        ]
@@ -0,0 +1,263 @@
+# meu_sistema_producao/producao/oee.py
+
+"""
+Motor de cálculo de OEE (Disponibilidade x Eficiência x Qualidade).
+
+Busca os insumos de TODAS as máquinas em um número constante de queries
+agrupadas (por agendamento), em vez de uma query de refugo e uma de paradas
+para cada agendamento ativo. Refugo e paradas são lidos do consolidado
+horário (`OeeRollupHora`), então o custo acompanha o número de horas
+ativas e não o número de eventos. Paradas sobrepostas são mescladas e
+recortadas ao período medido (ver producao/paradas.py).
+"""
+
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from django.db.models import Q, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from .models import Maquina, Agendamento, Parada, OeeRollupHora
+from .paradas import tempos_de_parada
+from .rollup import inicio_da_hora
+
+
+STATUS_ATIVO = 'Em Produção'
+
+
+def buscar_insumos_agendamentos(agora, maquina_ids=None):
+    """
+    Retorna uma lista de dicts (um por agendamento 'Em Produção') com os
+    insumos do OEE: peças boas, refugo e paradas planejadas / não planejadas
+    (em segundos) até `agora`. Usa 4 queries, independente do número de
+    máquinas.
+    """
+    agendamentos_qs = Agendamento.objects.filter(ordem_producao__status=STATUS_ATIVO)
+    if maquina_ids is not None:
+        agendamentos_qs = agendamentos_qs.filter(maquina_id__in=maquina_ids)
+
+    agendamentos = list(agendamentos_qs.values(
+        'id',
+        'maquina_id',
+        'real_start_datetime',
+        pecas_boas=F('ordem_producao__quantidade_produzida'),
+        ciclo_segundos=F('ordem_producao__pn__cycle_time_seconds'),
+    ).order_by('maquina_id', 'id'))
+
+    if not agendamentos:
+        return []
+
+    ids_ativos = [ag['id'] for ag in agendamentos]
+    hora_inicio_real = TruncHour('agendamento__real_start_datetime', tzinfo=dt_timezone.utc)
+
+    # 1. Refugo: soma dos baldes horários do consolidado, por agendamento
+    refugo_por_ag = dict(
+        OeeRollupHora.objects.filter(agendamento_id__in=ids_ativos)
+        .values('agendamento_id').annotate(total=Sum('pecas_refugo'))
+        .values_list('agendamento_id', 'total')
+    )
+
+    # 2. Paradas classificadas, mescladas e recortadas ao período medido
+    #    [real_start_datetime, agora).
+    #    2.1. Horas cheias entre a hora do início real e a hora atual vêm
+    #    do consolidado (que já guarda o tempo mesclado de cada hora)...
+    hora_atual = inicio_da_hora(agora)
+    paradas_por_ag = {
+        linha['agendamento_id']: [linha['soma_planejadas'], linha['soma_nao_planejadas']]
+        for linha in OeeRollupHora.objects.filter(
+            agendamento_id__in=ids_ativos,
+            agendamento__real_start_datetime__isnull=False,
+            hora__gt=hora_inicio_real,
+            hora__lt=hora_atual,
+        ).values('agendamento_id').annotate(
+            soma_planejadas=Sum('parada_planejada'),
+            soma_nao_planejadas=Sum('parada_nao_planejada'),
+        )
+    }
+
+    #    2.2. ...e as duas horas parciais (a do início real e a atual) vêm
+    #    das paradas brutas que as cruzam.
+    paradas_brutas = defaultdict(list)
+    for ag_id, inicio, fim, classificacao in Parada.objects.filter(
+        agendamento_id__in=ids_ativos,
+        agendamento__real_start_datetime__isnull=False,
+    ).filter(
+        Q(inicio_parada__lt=hora_inicio_real + timedelta(hours=1), fim_parada__gt=F('agendamento__real_start_datetime')) |
+        Q(inicio_parada__lt=agora, fim_parada__gt=hora_atual)
+    ).values_list('agendamento_id', 'inicio_parada', 'fim_parada', 'tipo_parada__classificacao_parada'):
+        paradas_brutas[ag_id].append((inicio, fim, classificacao))
+
+    for ag in agendamentos:
+        inicio_real = ag['real_start_datetime']
+        if ag['id'] not in paradas_brutas or not inicio_real or inicio_real >= agora:
+            continue
+        fim_primeira_hora = inicio_da_hora(inicio_real) + timedelta(hours=1)
+        trechos = [(inicio_real, min(fim_primeira_hora, agora))]
+        if hora_atual >= fim_primeira_hora:
+            trechos.append((hora_atual, agora))
+        somas = paradas_por_ag.setdefault(ag['id'], [timedelta(0), timedelta(0)])
+        for trecho_inicio, trecho_fim in trechos:
+            planejada, nao_planejada = tempos_de_parada(paradas_brutas[ag['id']], trecho_inicio, trecho_fim)
+            somas[0] += planejada
+            somas[1] += nao_planejada
+
+    for ag in agendamentos:
+        ag['pecas_ruins'] = refugo_por_ag.get(ag['id']) or 0
+        paradas = paradas_por_ag.get(ag['id'])
+        if paradas:
+            ag['parada_planejada_segundos'] = (paradas[0] or timedelta(0)).total_seconds()
+            ag['parada_nao_planejada_segundos'] = (paradas[1] or timedelta(0)).total_seconds()
+        else:
+            ag['parada_planejada_segundos'] = 0.0
+            ag['parada_nao_planejada_segundos'] = 0.0
+
+    return agendamentos
+
+
+def calcular_kpis(agendamentos, agora):
+    """
+    Aplica as fórmulas de OEE sobre os insumos dos agendamentos ativos de
+    UMA máquina. Retorna um dict com oee, disponibilidade, eficiencia e
+    qualidade (em %).
+    """
+    total_pecas_boas = 0
+    total_pecas_ruins = 0
+    total_produzido_bruto = 0
+    total_pecas_teoricas = 0 # Denominador da Eficiência
+
+    total_tempo_bruto_maquina_segundos = 0
+    total_paradas_planejadas_maquina_segundos = 0
+    total_paradas_nao_planejadas_maquina_segundos = 0
+
+    for ag in agendamentos:
+        # --- 1. QUALIDADE (Peças) ---
+        pecas_boas_ag = ag['pecas_boas']
+        pecas_ruins_ag = ag['pecas_ruins']
+
+        total_pecas_boas += pecas_boas_ag
+        total_pecas_ruins += pecas_ruins_ag
+        total_produzido_bruto += (pecas_boas_ag + pecas_ruins_ag)
+
+        # --- 2. TEMPO (Base para Disponibilidade e Eficiência) ---
+        inicio_real_da_op = ag['real_start_datetime']
+        ciclo_teorico_segundos = ag['ciclo_segundos']
+
+        if not inicio_real_da_op or not ciclo_teorico_segundos or ciclo_teorico_segundos <= 0:
+            continue # Pula se não iniciou ou não tem ciclo
+
+        # 2.1. Tempo Bruto Medido (desde o início real)
+        tempo_total_bruto_segundos = (agora - inicio_real_da_op).total_seconds()
+        if tempo_total_bruto_segundos < 0:
+            tempo_total_bruto_segundos = 0
+
+        total_tempo_bruto_maquina_segundos += tempo_total_bruto_segundos
+
+        # 2.2. Paradas (Classificadas)
+        tempo_parado_planejado_segundos = ag['parada_planejada_segundos']
+        tempo_parado_nao_planejado_segundos = ag['parada_nao_planejada_segundos']
+
+        total_paradas_planejadas_maquina_segundos += tempo_parado_planejado_segundos
+        total_paradas_nao_planejadas_maquina_segundos += tempo_parado_nao_planejado_segundos
+
+        # --- 3. EFICIÊNCIA ---
+        # 3.1. TPP (Tempo Programado) deste agendamento
+        tpp_segundos_ag = tempo_total_bruto_segundos - tempo_parado_planejado_segundos
+
+        # 3.2. TO (Tempo Operando) deste agendamento
+        tempo_operando_segundos_ag = tpp_segundos_ag - tempo_parado_nao_planejado_segundos
+        if tempo_operando_segundos_ag < 0:
+            tempo_operando_segundos_ag = 0
+
+        # 3.3. Qtd Teórica = Tempo Operando / Ciclo Teórico
+        total_pecas_teoricas += tempo_operando_segundos_ag / ciclo_teorico_segundos
+
+    return kpis_a_partir_de_totais(
+        total_pecas_boas,
+        total_produzido_bruto,
+        total_tempo_bruto_maquina_segundos,
+        total_paradas_planejadas_maquina_segundos,
+        total_paradas_nao_planejadas_maquina_segundos,
+        total_pecas_teoricas,
+    )
+
+
+def kpis_a_partir_de_totais(pecas_boas, produzido_bruto, tempo_bruto_segundos,
+                            paradas_planejadas_segundos, paradas_nao_planejadas_segundos,
+                            pecas_teoricas):
+    """
+    Fórmulas finais do OEE a partir dos totais já acumulados de uma máquina
+    (ou de um balde de tempo do histórico).
+    """
+    # A. QUALIDADE (Peças Boas / Peças Brutas)
+    if produzido_bruto > 0:
+        qualidade = (pecas_boas / produzido_bruto) * 100
+    else:
+        qualidade = 100.0
+
+    # B. DISPONIBILIDADE (Tempo Operando / Tempo Programado)
+    tpp_maquina_segundos = tempo_bruto_segundos - paradas_planejadas_segundos
+    tempo_operando_maquina_segundos = tpp_maquina_segundos - paradas_nao_planejadas_segundos
+
+    if tpp_maquina_segundos > 0:
+        disponibilidade = (tempo_operando_maquina_segundos / tpp_maquina_segundos) * 100
+    else:
+        # Se o TPP foi 0 (ex: máquina ligada e imediatamente parada para almoço)
+        disponibilidade = 100.0 if tempo_operando_maquina_segundos >= 0 else 0.0
+
+    # C. EFICIÊNCIA (Peças Brutas / Peças Teóricas)
+    if pecas_teoricas > 0:
+        eficiencia = (produzido_bruto / pecas_teoricas) * 100
+    else:
+        # Se o tempo operando foi 0, a meta era 0 peças.
+        eficiencia = 100.0 if produzido_bruto == 0 else 200.0 # (Produziu sem tempo)
+
+    # D. OEE
+    oee = (disponibilidade / 100) * (eficiencia / 100) * (qualidade / 100) * 100
+
+    return {
+        'oee': oee,
+        'disponibilidade': disponibilidade,
+        'eficiencia': eficiencia,
+        'qualidade': qualidade,
+    }
+
+
+def calcular_kpis_maquinas(maquina_ids=None, agora=None):
+    """
+    Retorna a lista de KPIs por máquina (mesmo formato usado pelo template
+    de gerenciamento), ordenada pelo id da máquina.
+    """
+    if agora is None:
+        agora = timezone.now()
+
+    maquinas_qs = Maquina.objects.all()
+    if maquina_ids is not None:
+        maquinas_qs = maquinas_qs.filter(id__in=maquina_ids)
+    maquinas = list(maquinas_qs.order_by('id').values_list('id', 'number'))
+
+    agendamentos_por_maquina = {}
+    for ag in buscar_insumos_agendamentos(agora, maquina_ids):
+        agendamentos_por_maquina.setdefault(ag['maquina_id'], []).append(ag)
+
+    maquinas_com_kpi = []
+    for maquina_id, number in maquinas:
+        agendamentos = agendamentos_por_maquina.get(maquina_id)
+        if agendamentos:
+            kpis = calcular_kpis(agendamentos, agora)
+            maquinas_com_kpi.append({
+                'id': maquina_id,
+                'status': 'Ativa',
+                'nome': number,
+                **kpis,
+            })
+        else:
+            maquinas_com_kpi.append({
+                'id': maquina_id,
+                'status': 'Inativa',
+                'nome': number,
+                'oee': 0.0,
+                'disponibilidade': 0.0,
+                'eficiencia': 0.0,
+                'qualidade': 0.0,
+            })
+
+    return maquinas_com_kpi
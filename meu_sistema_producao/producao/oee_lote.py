@@ -0,0 +1,241 @@
+# meu_sistema_producao/producao/oee_lote.py
+
+"""
+OEE em lote (vetorizado com NumPy) para revisões de capacidade.
+
+Carrega os insumos de milhares de agendamentos já iniciados em arrays
+colunares (um elemento por agendamento) e aplica as mesmas fórmulas do
+dashboard de gerenciamento (`producao/oee.py`) de uma vez só, inclusive
+com tempos de ciclo hipotéticos ("e se o ciclo do PN caísse 5%?").
+
+Cada agendamento contribui com a sua janela real de execução
+(`real_start_datetime` até `real_end_datetime`, ou até agora se ainda
+está rodando). Peças boas, refugo e paradas (já mescladas) vêm do
+consolidado horário (`OeeRollupHora`).
+"""
+
+import math
+from datetime import timedelta
+import numpy as np
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import Agendamento, OeeRollupHora
+from .oee import calcular_kpis, STATUS_ATIVO
+
+
+# Faixa aceita para o fator de ciclo da simulação (fora dela não é um cenário real)
+FATOR_CICLO_MINIMO = 0.1
+FATOR_CICLO_MAXIMO = 10
+
+
+COLUNAS = (
+    'agendamento_id', 'maquina_id', 'pn_id', 'ciclo_segundos', 'tempo_bruto_segundos',
+    'parada_planejada_segundos', 'parada_nao_planejada_segundos', 'pecas_boas', 'pecas_refugo',
+)
+
+
+def fator_ciclo_valido(fator_ciclo):
+    """Falso para NaN, infinito ou fora de [FATOR_CICLO_MINIMO, FATOR_CICLO_MAXIMO]."""
+    return math.isfinite(fator_ciclo) and FATOR_CICLO_MINIMO <= fator_ciclo <= FATOR_CICLO_MAXIMO
+
+
+# =======================================================================
+# CARGA DOS INSUMOS
+# =======================================================================
+
+def carregar_insumos(inicio, fim, maquina_ids=None, agora=None):
+    """
+    Retorna um dict {coluna: np.ndarray} com os agendamentos iniciados em
+    [inicio, fim). Usa 2 queries, independente do número de agendamentos.
+    """
+    if agora is None:
+        agora = timezone.now()
+
+    agendamentos_qs = Agendamento.objects.filter(
+        real_start_datetime__gte=inicio,
+        real_start_datetime__lt=fim,
+    ).filter(
+        Q(real_end_datetime__isnull=False) |
+        Q(ordem_producao__status=STATUS_ATIVO)
+    )
+    if maquina_ids is not None:
+        agendamentos_qs = agendamentos_qs.filter(maquina_id__in=maquina_ids)
+
+    linhas = list(agendamentos_qs.order_by('id').values_list(
+        'id', 'maquina_id', 'ordem_producao__pn_id', 'ordem_producao__pn__cycle_time_seconds',
+        'real_start_datetime', 'real_end_datetime',
+    ))
+    if not linhas:
+        return {coluna: np.zeros(0) for coluna in COLUNAS}
+
+    ids, maquinas, pns, ciclos, inicios, fins = zip(*linhas)
+    insumos = {
+        'agendamento_id': np.array(ids, dtype=np.int64),
+        'maquina_id': np.array(maquinas, dtype=np.int64),
+        'pn_id': np.array(pns, dtype=np.int64),
+        'ciclo_segundos': np.array([ciclo or 0 for ciclo in ciclos], dtype=np.float64),
+        'tempo_bruto_segundos': np.array(
+            [((fim_real or agora) - inicio_real).total_seconds() for inicio_real, fim_real in zip(inicios, fins)],
+            dtype=np.float64,
+        ).clip(min=0),
+    }
+
+    # Somas do consolidado por agendamento, alinhadas à ordem dos ids
+    somas = OeeRollupHora.objects.filter(agendamento_id__in=agendamentos_qs.values('id')).values(
+        'agendamento_id'
+    ).annotate(
+        boas=Sum('pecas_boas'),
+        refugo=Sum('pecas_refugo'),
+        planejada=Sum('parada_planejada'),
+        nao_planejada=Sum('parada_nao_planejada'),
+    ).values_list('agendamento_id', 'boas', 'refugo', 'planejada', 'nao_planejada')
+
+    posicao = {ag_id: i for i, ag_id in enumerate(ids)}
+    for coluna in ('pecas_boas', 'pecas_refugo', 'parada_planejada_segundos', 'parada_nao_planejada_segundos'):
+        insumos[coluna] = np.zeros(len(ids), dtype=np.float64)
+    for ag_id, boas, refugo, planejada, nao_planejada in somas:
+        i = posicao[ag_id]
+        insumos['pecas_boas'][i] = boas or 0
+        insumos['pecas_refugo'][i] = refugo or 0
+        insumos['parada_planejada_segundos'][i] = (planejada or timedelta(0)).total_seconds()
+        insumos['parada_nao_planejada_segundos'][i] = (nao_planejada or timedelta(0)).total_seconds()
+
+    return insumos
+
+
+# =======================================================================
+# CÁLCULO VETORIZADO
+# =======================================================================
+
+def _dividir(numerador, denominador):
+    return np.divide(numerador, denominador, out=np.zeros_like(numerador, dtype=np.float64), where=denominador > 0)
+
+
+def kpis_vetorizados(pecas_boas, produzido_bruto, tempo_bruto_segundos,
+                     paradas_planejadas_segundos, paradas_nao_planejadas_segundos, pecas_teoricas):
+    """
+    Versão vetorizada de `oee.kpis_a_partir_de_totais`: cada argumento é
+    um array (um elemento por máquina, agendamento etc.) e o retorno é um
+    dict de arrays com oee, disponibilidade, eficiencia e qualidade (em %).
+    """
+    qualidade = np.where(produzido_bruto > 0, _dividir(pecas_boas, produzido_bruto) * 100, 100.0)
+
+    tpp = tempo_bruto_segundos - paradas_planejadas_segundos
+    tempo_operando = tpp - paradas_nao_planejadas_segundos
+    disponibilidade = np.where(
+        tpp > 0,
+        _dividir(tempo_operando, tpp) * 100,
+        np.where(tempo_operando >= 0, 100.0, 0.0),
+    )
+
+    eficiencia = np.where(
+        pecas_teoricas > 0,
+        _dividir(produzido_bruto, pecas_teoricas) * 100,
+        np.where(produzido_bruto == 0, 100.0, 200.0),
+    )
+
+    oee = (disponibilidade / 100) * (eficiencia / 100) * (qualidade / 100) * 100
+    return {
+        'oee': oee,
+        'disponibilidade': disponibilidade,
+        'eficiencia': eficiencia,
+        'qualidade': qualidade,
+    }
+
+
+def _ciclos(insumos, fator_ciclo, pn_ids):
+    ciclos = insumos['ciclo_segundos']
+    if fator_ciclo == 1.0:
+        return ciclos
+    if pn_ids:
+        return np.where(np.isin(insumos['pn_id'], list(pn_ids)), ciclos * fator_ciclo, ciclos)
+    return ciclos * fator_ciclo
+
+
+def calcular_kpis_lote(insumos, fator_ciclo=1.0, pn_ids=None):
+    """
+    Calcula os KPIs por máquina sobre os insumos carregados. `fator_ciclo`
+    multiplica o tempo de ciclo (todos os PNs, ou só os de `pn_ids`).
+    Retorna um dict com 'maquina_id' (array) e os totais e KPIs por máquina.
+
+    Segue `oee.calcular_kpis`: agendamentos sem ciclo somam peças, mas não
+    tempo nem peças teóricas.
+    """
+    ciclos = _ciclos(insumos, fator_ciclo, pn_ids)
+    com_ciclo = ciclos > 0
+
+    tempo_bruto = np.where(com_ciclo, insumos['tempo_bruto_segundos'], 0.0)
+    planejada = np.where(com_ciclo, insumos['parada_planejada_segundos'], 0.0)
+    nao_planejada = np.where(com_ciclo, insumos['parada_nao_planejada_segundos'], 0.0)
+    tempo_operando = (tempo_bruto - planejada - nao_planejada).clip(min=0)
+    teoricas = _dividir(tempo_operando, ciclos)
+    produzido_bruto = insumos['pecas_boas'] + insumos['pecas_refugo']
+
+    maquina_ids, grupo = np.unique(insumos['maquina_id'], return_inverse=True)
+    somar = lambda valores: np.bincount(grupo, weights=valores, minlength=len(maquina_ids))
+
+    totais = {
+        'pecas_boas': somar(insumos['pecas_boas']),
+        'produzido_bruto': somar(produzido_bruto),
+        'tempo_bruto_segundos': somar(tempo_bruto),
+        'parada_planejada_segundos': somar(planejada),
+        'parada_nao_planejada_segundos': somar(nao_planejada),
+        'pecas_teoricas': somar(teoricas),
+    }
+    kpis = kpis_vetorizados(
+        totais['pecas_boas'],
+        totais['produzido_bruto'],
+        totais['tempo_bruto_segundos'],
+        totais['parada_planejada_segundos'],
+        totais['parada_nao_planejada_segundos'],
+        totais['pecas_teoricas'],
+    )
+    return {'maquina_id': maquina_ids, **totais, **kpis}
+
+
+def calcular_kpis_linha_a_linha(insumos, fator_ciclo=1.0, pn_ids=None):
+    """
+    Caminho escalar de referência: monta os dicts de cada agendamento e
+    chama `oee.calcular_kpis` máquina a máquina, como o dashboard faz.
+    Usado para conferir e medir `calcular_kpis_lote`.
+    """
+    agora = timezone.now()
+    ciclos = _ciclos(insumos, fator_ciclo, pn_ids)
+    por_maquina = {}
+    for i in range(len(insumos['agendamento_id'])):
+        por_maquina.setdefault(int(insumos['maquina_id'][i]), []).append({
+            'pecas_boas': insumos['pecas_boas'][i],
+            'pecas_ruins': insumos['pecas_refugo'][i],
+            'real_start_datetime': agora - timedelta(seconds=float(insumos['tempo_bruto_segundos'][i])),
+            'ciclo_segundos': ciclos[i],
+            'parada_planejada_segundos': insumos['parada_planejada_segundos'][i],
+            'parada_nao_planejada_segundos': insumos['parada_nao_planejada_segundos'][i],
+        })
+    return {maquina_id: calcular_kpis(agendamentos, agora) for maquina_id, agendamentos in sorted(por_maquina.items())}
+
+
+def resumo_por_maquina(resultado):
+    """Converte o resultado de `calcular_kpis_lote` em uma lista de dicts (para JSON)."""
+    campos = [campo for campo in resultado if campo != 'maquina_id']
+    return [
+        {'maquina_id': int(maquina_id), **{campo: float(resultado[campo][i]) for campo in campos}}
+        for i, maquina_id in enumerate(resultado['maquina_id'])
+    ]
+
+
+def insumos_sinteticos(quantidade, maquinas=50, semente=0):
+    """Insumos aleatórios (sem banco) para testes e benchmarks."""
+    gerador = np.random.default_rng(semente)
+    tempo_bruto = gerador.uniform(0, 48 * 3600, quantidade)
+    planejada = tempo_bruto * gerador.uniform(0, 0.3, quantidade)
+    return {
+        'agendamento_id': np.arange(1, quantidade + 1, dtype=np.int64),
+        'maquina_id': gerador.integers(1, maquinas + 1, quantidade),
+        'pn_id': gerador.integers(1, 200, quantidade),
+        'ciclo_segundos': gerador.choice([0, 20, 30, 45, 60, 90], quantidade).astype(np.float64),
+        'tempo_bruto_segundos': tempo_bruto,
+        'parada_planejada_segundos': planejada,
+        'parada_nao_planejada_segundos': (tempo_bruto - planejada) * gerador.uniform(0, 0.4, quantidade),
+        'pecas_boas': gerador.integers(0, 3000, quantidade).astype(np.float64),
+        'pecas_refugo': gerador.integers(0, 100, quantidade).astype(np.float64),
+    }
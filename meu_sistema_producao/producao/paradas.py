@@ -0,0 +1,96 @@
+# meu_sistema_producao/producao/paradas.py
+
+"""
+Cálculo de tempo parado a partir dos intervalos de `Parada`.
+
+Operadores às vezes registram paradas sobrepostas ou duplicadas; somar
+`fim_parada - inicio_parada` conta o mesmo tempo duas vezes e pode deixar a
+disponibilidade negativa. Aqui os intervalos são recortados à janela
+medida, ordenados e mesclados (O(n log n)). Onde uma parada planejada e
+uma não planejada se sobrepõem, vale a planejada.
+"""
+
+from datetime import timedelta
+
+
+PLANEJADA = 'PLANEJADA'
+NAO_PLANEJADA = 'NÃO PLANEJADA'
+
+
+def _mesclar(intervalos):
+    """Une intervalos [inicio, fim) que se tocam ou se sobrepõem."""
+    mesclados = []
+    for inicio, fim in sorted(intervalos):
+        if mesclados and inicio <= mesclados[-1][1]:
+            if fim > mesclados[-1][1]:
+                mesclados[-1][1] = fim
+        else:
+            mesclados.append([inicio, fim])
+    return mesclados
+
+
+def _subtrair(intervalos, cobertos):
+    """
+    Remove de `intervalos` os trechos cobertos por `cobertos`. As duas
+    listas devem estar mescladas e ordenadas; percorre ambas uma única vez.
+    """
+    resultado = []
+    j = 0
+    for inicio, fim in intervalos:
+        while j < len(cobertos) and cobertos[j][1] <= inicio:
+            j += 1
+        k = j
+        while k < len(cobertos) and cobertos[k][0] < fim:
+            if cobertos[k][0] > inicio:
+                resultado.append([inicio, cobertos[k][0]])
+            inicio = max(inicio, cobertos[k][1])
+            k += 1
+        if inicio < fim:
+            resultado.append([inicio, fim])
+    return resultado
+
+
+def mesclar_paradas(paradas, inicio_janela=None, fim_janela=None):
+    """
+    Recebe um iterável de (inicio, fim, classificacao) e retorna a lista de
+    segmentos disjuntos (inicio, fim, classificacao), ordenada por início.
+    Paradas sem classificação são ignoradas, como no cálculo do OEE.
+    """
+    planejadas = []
+    nao_planejadas = []
+    for inicio, fim, classificacao in paradas:
+        if inicio_janela is not None and inicio < inicio_janela:
+            inicio = inicio_janela
+        if fim_janela is not None and fim > fim_janela:
+            fim = fim_janela
+        if fim <= inicio:
+            continue
+        if classificacao == PLANEJADA:
+            planejadas.append((inicio, fim))
+        elif classificacao == NAO_PLANEJADA:
+            nao_planejadas.append((inicio, fim))
+
+    planejadas = _mesclar(planejadas)
+    nao_planejadas = _subtrair(_mesclar(nao_planejadas), planejadas)
+
+    segmentos = [(inicio, fim, PLANEJADA) for inicio, fim in planejadas]
+    segmentos += [(inicio, fim, NAO_PLANEJADA) for inicio, fim in nao_planejadas]
+    segmentos.sort()
+    return segmentos
+
+
+def totalizar(segmentos):
+    """Retorna (tempo planejado, tempo não planejado) dos segmentos, como timedelta."""
+    planejada = timedelta(0)
+    nao_planejada = timedelta(0)
+    for inicio, fim, classificacao in segmentos:
+        if classificacao == PLANEJADA:
+            planejada += fim - inicio
+        else:
+            nao_planejada += fim - inicio
+    return planejada, nao_planejada
+
+
+def tempos_de_parada(paradas, inicio_janela=None, fim_janela=None):
+    """Atalho: mescla e totaliza. Retorna (planejada, não planejada) como timedelta."""
+    return totalizar(mesclar_paradas(paradas, inicio_janela, fim_janela))
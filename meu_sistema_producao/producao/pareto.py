@@ -0,0 +1,165 @@
+# meu_sistema_producao/producao/pareto.py
+
+"""
+Relatórios de Pareto de paradas (por `TipoParada`, em tempo) e de refugo
+(por `TipoRefugo`, em peças), com drill-down por máquina, PN ou cliente.
+
+Cada relatório é uma única query agrupada. O resultado fica em cache por
+combinação de filtros; a chave inclui a soma dos contadores de versão dos
+dias do período (ver producao/versoes.py), que são incrementados quando
+um evento daquele dia é gravado ou excluído. Assim, um relatório do mês
+passado continua em cache enquanto o turno de hoje aponta paradas.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum, Value, DurationField, ExpressionWrapper
+from django.db.models.functions import Greatest, Least
+from .models import Parada, Refugo
+from .versoes import incrementar_versao, obter_soma_versoes, chaves_por_dia
+from .arquivo import com_arquivo
+
+
+FONTES = ('paradas', 'refugos')
+
+# Versão geral: mudanças de cadastro (tipos, máquinas, PNs) e edições de
+# eventos, em que não sabemos mais a data antiga do evento.
+VERSAO_PARETO = 'pareto'
+
+# Campos de agrupamento de cada dimensão: (id, rótulo, descrição)
+DIMENSOES = {
+    'paradas': {
+        'tipo': ('tipo_parada_id', 'tipo_parada__codigo', 'tipo_parada__descricao'),
+        'maquina': ('agendamento__maquina_id', 'agendamento__maquina__number', None),
+        'pn': ('agendamento__ordem_producao__pn_id', 'agendamento__ordem_producao__pn__pn_code', 'agendamento__ordem_producao__pn__description'),
+        'cliente': ('agendamento__ordem_producao__pn__cliente', 'agendamento__ordem_producao__pn__cliente', None),
+    },
+    'refugos': {
+        'tipo': ('tipo_refugo_id', 'tipo_refugo__codigo', 'tipo_refugo__descricao'),
+        'maquina': ('agendamento__maquina_id', 'agendamento__maquina__number', None),
+        'pn': ('agendamento__ordem_producao__pn_id', 'agendamento__ordem_producao__pn__pn_code', 'agendamento__ordem_producao__pn__description'),
+        'cliente': ('agendamento__ordem_producao__pn__cliente', 'agendamento__ordem_producao__pn__cliente', None),
+    },
+}
+
+
+# =======================================================================
+# INVALIDAÇÃO
+# =======================================================================
+
+def _chaves_dos_dias(fonte, inicio, fim):
+    return chaves_por_dia(f'pareto:{fonte}', inicio, fim)
+
+
+def invalidar_periodo(fonte, inicio, fim):
+    """Invalida, após o commit, os relatórios que cobrem algum dia de [inicio, fim]."""
+    for chave in _chaves_dos_dias(fonte, inicio, fim):
+        incrementar_versao(chave)
+
+
+def invalidar_tudo():
+    incrementar_versao(VERSAO_PARETO)
+
+
+# =======================================================================
+# CONSULTA
+# =======================================================================
+
+def _paradas(objetos, inicio, fim):
+    """Paradas que cruzam [inicio, fim) e o tempo de cada uma dentro do período."""
+    qs = objetos.filter(inicio_parada__lt=fim, fim_parada__gt=inicio)
+    duracao = ExpressionWrapper(
+        Least(F('fim_parada'), Value(fim)) - Greatest(F('inicio_parada'), Value(inicio)),
+        output_field=DurationField(),
+    )
+    return qs, Sum(duracao)
+
+
+def _refugos(objetos, inicio, fim):
+    qs = objetos.filter(data_apontamento__gte=inicio, data_apontamento__lt=fim)
+    return qs, Sum('quantidade')
+
+
+def _calcular(fonte, inicio, fim, dimensao, maquina_ids, clientes, pn_ids, tipo_id):
+    campo_id, campo_rotulo, campo_descricao = DIMENSOES[fonte][dimensao]
+    campos = [campo_id, campo_rotulo] + ([campo_descricao] if campo_descricao else [])
+
+    # Tabela viva e arquivo (producao/arquivo.py), somados por item
+    somas = {}
+    for objetos in com_arquivo(Parada if fonte == 'paradas' else Refugo):
+        qs, valor = _paradas(objetos, inicio, fim) if fonte == 'paradas' else _refugos(objetos, inicio, fim)
+        if maquina_ids:
+            qs = qs.filter(agendamento__maquina_id__in=maquina_ids)
+        if clientes:
+            qs = qs.filter(agendamento__ordem_producao__pn__cliente__in=clientes)
+        if pn_ids:
+            qs = qs.filter(agendamento__ordem_producao__pn_id__in=pn_ids)
+        if tipo_id:
+            campo_tipo = DIMENSOES[fonte]['tipo'][0]
+            qs = qs.filter(**{campo_tipo: tipo_id})
+        for linha in qs.values(*campos).annotate(valor=valor).order_by():
+            if linha['valor'] is None:
+                continue
+            if linha[campo_id] in somas:
+                somas[linha[campo_id]]['valor'] += linha['valor']
+            else:
+                somas[linha[campo_id]] = linha
+    linhas = sorted(somas.values(), key=lambda linha: linha['valor'], reverse=True)
+
+    itens = []
+    for linha in linhas:
+        valor_linha = linha['valor']
+        if isinstance(valor_linha, timedelta):
+            valor_linha = valor_linha.total_seconds() / 60.0
+        if not valor_linha:
+            continue
+        itens.append({
+            'id': linha[campo_id],
+            'rotulo': linha[campo_rotulo] or 'Sem tipo',
+            'descricao': linha[campo_descricao] if campo_descricao else '',
+            'valor': round(valor_linha, 2),
+        })
+
+    total = sum(item['valor'] for item in itens)
+    acumulado = 0
+    for item in itens:
+        acumulado += item['valor']
+        item['percentual'] = round(item['valor'] / total * 100, 2) if total else 0
+        item['acumulado'] = round(acumulado / total * 100, 2) if total else 0
+
+    return {
+        'fonte': fonte,
+        'dimensao': dimensao,
+        'unidade': 'minutos' if fonte == 'paradas' else 'pecas',
+        'total': round(total, 2),
+        'itens': itens,
+    }
+
+
+def pareto(fonte, inicio, fim, dimensao='tipo', maquina_ids=None, clientes=None, pn_ids=None, tipo_id=None):
+    """
+    Retorna o Pareto de `fonte` ('paradas' ou 'refugos') em [inicio, fim),
+    agrupado por `dimensao` ('tipo', 'maquina', 'pn' ou 'cliente'). Com
+    `tipo_id`, faz o drill-down de um único tipo de parada / refugo.
+    Paradas são medidas em minutos (recortadas ao período) e refugo em peças.
+    """
+    if fonte not in FONTES:
+        raise ValueError(f"Fonte inválida: {fonte}")
+    if dimensao not in DIMENSOES[fonte]:
+        raise ValueError(f"Dimensão inválida: {dimensao}")
+
+    filtros = json.dumps(
+        [fonte, dimensao, inicio, fim, sorted(maquina_ids or []), sorted(clientes or []), sorted(pn_ids or []), tipo_id],
+        default=str,
+    )
+    versao = obter_soma_versoes([VERSAO_PARETO] + _chaves_dos_dias(fonte, inicio, fim - timedelta(microseconds=1)))
+    chave = f"pareto:{versao}:{hashlib.md5(filtros.encode()).hexdigest()}"
+
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = _calcular(fonte, inicio, fim, dimensao, maquina_ids, clientes, pn_ids, tipo_id)
+        cache.set(chave, resultado, settings.PARETO_CACHE_SEGUNDOS)
+    return resultado
@@ -0,0 +1,359 @@
+# meu_sistema_producao/producao/planejamento.py
+
+"""
+Snapshot do quadro de planejamento: máquinas, OPs em aberto (com as
+máquinas compatíveis com o PN) e os agendamentos dessas OPs, em 4 queries
+filtradas no banco. A duração de
+cada OP (quantidade x ciclo, a mesma regra de
+`OrdemProducao.get_duracao_horas`) também é calculada no SQL.
+
+`semana` monta os agendamentos de uma semana do quadro, incluindo os que
+começaram na semana anterior e ainda estão rodando, com cache invalidado
+por dia (ver producao/versoes.py).
+
+`aplicar_lote` aplica várias criações, remarcações e remoções de uma vez
+(ex: replanejar o quadro depois da quebra de uma máquina).
+"""
+
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast
+from django.utils import timezone
+from .models import Maquina, OrdemProducao, Agendamento, OeeRollupHora
+from .conflitos import IndiceIntervalos, CAMPOS, LADOS
+from .compatibilidade import mapa_compatibilidade
+from .pareto import invalidar_tudo as invalidar_pareto
+from .versoes import incrementar_versao, obter_soma_versoes, chaves_por_dia, VERSAO_DASHBOARD
+
+
+STATUS_EM_ABERTO = ('Disponível', 'Planejada')
+
+# Versão geral da agenda: mudanças que afetam todas as semanas (ex: o
+# ciclo de um PN, que muda a duração de todas as suas OPs).
+VERSAO_AGENDA = 'agenda'
+
+
+def duracao_horas(prefixo=''):
+    """
+    Expressão SQL equivalente a `OrdemProducao.get_duracao_horas()`.
+    `prefixo` é o caminho até a OP (ex: 'ordem_producao__').
+    """
+    ciclo = f'{prefixo}pn__cycle_time_seconds'
+    return Case(
+        When(**{f'{ciclo}__gt': 0}, then=Cast(F(f'{prefixo}quantity') * F(ciclo), FloatField()) / Value(3600.0)),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+
+
+def formatar_agendamento(agendamento):
+    """Formato usado pelo JavaScript do quadro (dia da semana e hora locais)."""
+    local_start_time = timezone.localtime(agendamento['start_datetime'])
+    return {
+        'id': agendamento['id'],
+        'opId': agendamento['ordem_producao_id'],
+        'maquinaId': agendamento['maquina_id'],
+        'day': local_start_time.weekday(),
+        'hour': local_start_time.hour,
+        'duration': agendamento['duracao'],
+        'lado': agendamento['lado'],
+    }
+
+
+def snapshot_quadro():
+    """
+    Retorna um dict com:
+      - maquinas: id, number e capacity_liters;
+      - ordens: OPs 'Disponível' ou 'Planejada' por data de entrega, com a
+        duração em horas, os dados do PN e os ids das máquinas compatíveis;
+      - agendamentos: os agendamentos dessas OPs, já no formato do quadro.
+    """
+    maquinas = list(Maquina.objects.values('id', 'number', 'capacity_liters'))
+
+    ops = list(OrdemProducao.objects.filter(status__in=STATUS_EM_ABERTO).order_by('delivery_date').values(
+        'id', 'quantity', 'delivery_date', 'status', 'pn_id', 'pn__pn_code', 'pn__capacity_liters',
+        duracao=duracao_horas(),
+    ))
+    compatibilidade = mapa_compatibilidade({op['pn_id'] for op in ops})
+
+    ordens = []
+    for op in ops:
+        ordens.append({
+            'id': op['id'],
+            'quantity': op['quantity'],
+            'delivery_date': op['delivery_date'],
+            'status': op['status'],
+            'pn': {'id': op['pn_id'], 'pn_code': op['pn__pn_code'], 'capacity_liters': op['pn__capacity_liters']},
+            'tempo_producao_horas': op['duracao'],
+            'maquinas_compativeis': sorted(compatibilidade.get(op['pn_id'], ())),
+        })
+
+    agendamentos = [
+        formatar_agendamento(agendamento)
+        for agendamento in Agendamento.objects.filter(ordem_producao__status__in=STATUS_EM_ABERTO).values(
+            'id', 'ordem_producao_id', 'maquina_id', 'start_datetime', 'lado',
+            duracao=duracao_horas('ordem_producao__'),
+        )
+    ]
+
+    return {'maquinas': maquinas, 'ordens': ordens, 'agendamentos': agendamentos}
+
+
+# =======================================================================
+# SEMANA DO QUADRO
+# =======================================================================
+
+def invalidar_agenda(inicio, fim):
+    """Invalida, após o commit, as semanas em cache que cobrem algum dia de [inicio, fim]."""
+    for chave in chaves_por_dia('agenda', inicio, fim):
+        incrementar_versao(chave)
+
+
+def invalidar_agenda_toda():
+    incrementar_versao(VERSAO_AGENDA)
+
+
+def _calcular_semana(inicio, fim, maquina_id):
+    # Sobreposição com [inicio, fim): duas comparações simples, cobertas
+    # pelo índice (maquina, start_datetime, end_datetime)
+    qs = Agendamento.objects.filter(start_datetime__lt=fim, end_datetime__gt=inicio)
+    if maquina_id is not None:
+        qs = qs.filter(maquina_id=maquina_id)
+
+    agendamentos = []
+    for agendamento in qs.order_by('start_datetime', 'id').values(
+        'id', 'ordem_producao_id', 'maquina_id', 'start_datetime', 'end_datetime', 'lado',
+        duracao=duracao_horas('ordem_producao__'),
+    ):
+        if agendamento['start_datetime'] >= inicio:
+            agendamentos.append(formatar_agendamento(agendamento))
+            continue
+        # Começou na semana anterior: aparece na segunda-feira às 00h,
+        # só com as horas que restam nesta semana
+        agendamentos.append({
+            **formatar_agendamento({**agendamento, 'start_datetime': inicio}),
+            'duration': (agendamento['end_datetime'] - inicio).total_seconds() / 3600,
+            'continuacao': True,
+        })
+    return agendamentos
+
+
+def semana(inicio_semana, maquina_id=None):
+    """
+    Agendamentos que cruzam a semana que começa no dia `inicio_semana`
+    (date, normalmente uma segunda-feira), no formato do quadro. Os que
+    começaram antes vêm com `continuacao: True`.
+
+    O resultado fica em cache; a chave inclui as versões dos 7 dias da
+    semana, incrementadas quando um agendamento que cruza aquele dia é
+    gravado ou excluído.
+    """
+    inicio = timezone.make_aware(datetime.combine(inicio_semana, datetime.min.time()))
+    fim = timezone.make_aware(datetime.combine(inicio_semana + timedelta(days=7), datetime.min.time()))
+
+    versao = obter_soma_versoes([VERSAO_AGENDA] + chaves_por_dia('agenda', inicio, fim - timedelta(microseconds=1)))
+    chave = f"agenda:{versao}:{inicio_semana.isoformat()}:{maquina_id or ''}"
+
+    agendamentos = cache.get(chave)
+    if agendamentos is None:
+        agendamentos = _calcular_semana(inicio, fim, maquina_id)
+        cache.set(chave, agendamentos, settings.AGENDA_CACHE_SEGUNDOS)
+    return agendamentos
+
+
+# =======================================================================
+# ALTERAÇÕES EM LOTE NO QUADRO
+# =======================================================================
+
+ACOES_LOTE = ('criar', 'mover', 'remover')
+
+
+class ErroOperacao(Exception):
+    pass
+
+
+def _janela(op, start_date, start_hour):
+    """Início e fim do agendamento, com a mesma regra de salvar_agendamento_api."""
+    try:
+        dia = datetime.strptime(start_date, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ErroOperacao(f"Data inválida: {start_date!r} (use start_date YYYY-MM-DD).")
+    try:
+        hora = int(start_hour)
+    except (TypeError, ValueError):
+        hora = None
+    if hora is None or not 0 <= hora <= 23:
+        raise ErroOperacao(f"Hora inválida: {start_hour!r} (use start_hour 0-23).")
+    if not op.pn.cycle_time_seconds or op.pn.cycle_time_seconds <= 0:
+        raise ErroOperacao(f"OP-{op.id}: o PN {op.pn.pn_code} não tem tempo de ciclo cadastrado.")
+
+    duracao_horas = (op.quantity * op.pn.cycle_time_seconds) / 3600
+    inicio = timezone.make_aware(dia.replace(hour=hora))
+    return inicio, inicio + timedelta(hours=duracao_horas), duracao_horas
+
+
+def aplicar_lote(operacoes):
+    """
+    Valida e aplica, em uma única transação, uma lista de operações:
+      - {'acao': 'criar', 'op_id', 'maquina_id', 'start_date', 'start_hour', 'lado'}
+      - {'acao': 'mover', mesmos campos} (a OP já tem agendamento)
+      - {'acao': 'remover', 'agendamento_id'}
+
+    As operações são validadas juntas: os horários são checados contra os
+    agendamentos que ficam no quadro e contra os das outras operações do
+    lote. Se qualquer uma falhar, nada é gravado.
+    Retorna (ok, resultados), com um resultado por operação, na ordem.
+    """
+    resultados = [{'indice': i, 'status': 'sucesso'} for i in range(len(operacoes))]
+    erros = False
+
+    def falhar(i, mensagem):
+        nonlocal erros
+        erros = True
+        resultados[i] = {'indice': i, 'status': 'erro', 'mensagem': mensagem}
+
+    # Ids podem chegar como texto; um id inválido vira None e falha abaixo
+    normalizadas = []
+    for operacao in operacoes:
+        operacao = dict(operacao) if isinstance(operacao, dict) else {}
+        for campo in ('op_id', 'maquina_id', 'agendamento_id'):
+            try:
+                operacao[campo] = int(operacao[campo]) if operacao.get(campo) is not None else None
+            except (TypeError, ValueError):
+                operacao[campo] = None
+        normalizadas.append(operacao)
+    operacoes = normalizadas
+
+    op_ids = {op['op_id'] for op in operacoes if op.get('acao') in ('criar', 'mover') and op.get('op_id')}
+    maquina_ids = {op['maquina_id'] for op in operacoes if op.get('acao') in ('criar', 'mover') and op.get('maquina_id')}
+    remover_ids = {op['agendamento_id'] for op in operacoes if op.get('acao') == 'remover' and op.get('agendamento_id')}
+
+    with transaction.atomic():
+        # 1. Uma query para cada tipo de objeto referenciado
+        maquinas = {m.id: m for m in Maquina.objects.select_for_update().filter(id__in=maquina_ids).order_by('id')}
+        ops = {op.id: op for op in OrdemProducao.objects.select_related('pn').filter(id__in=op_ids)}
+        existentes = {
+            ag.id: ag for ag in Agendamento.objects.select_related('ordem_producao').filter(
+                Q(id__in=remover_ids) | Q(ordem_producao_id__in=op_ids)
+            )
+        }
+        agendamento_da_op = {ag.ordem_producao_id: ag for ag in existentes.values()}
+
+        # 2. Valida cada operação isoladamente
+        novos = {} # índice -> (op, maquina, inicio, fim, duração, lado)
+        removidos = set()
+        ops_vistas = set()
+        for i, operacao in enumerate(operacoes):
+            acao = operacao.get('acao')
+            try:
+                if acao not in ACOES_LOTE:
+                    raise ErroOperacao(f"Ação inválida: {acao}.")
+                if acao == 'remover':
+                    agendamento = existentes.get(operacao.get('agendamento_id'))
+                    if agendamento is None:
+                        raise ErroOperacao("Agendamento não encontrado.")
+                    if agendamento.ordem_producao.status not in STATUS_EM_ABERTO:
+                        raise ErroOperacao(f"OP-{agendamento.ordem_producao_id} já está {agendamento.ordem_producao.status}.")
+                    if agendamento.ordem_producao_id in ops_vistas:
+                        raise ErroOperacao(f"OP-{agendamento.ordem_producao_id} aparece mais de uma vez no lote.")
+                    ops_vistas.add(agendamento.ordem_producao_id)
+                    removidos.add(agendamento.id)
+                    continue
+
+                op = ops.get(operacao.get('op_id'))
+                maquina = maquinas.get(operacao.get('maquina_id'))
+                if op is None or maquina is None:
+                    raise ErroOperacao("OP ou máquina não encontrada.")
+                if op.status not in STATUS_EM_ABERTO:
+                    raise ErroOperacao(f"OP-{op.id} já está {op.status}.")
+                if op.id in ops_vistas:
+                    raise ErroOperacao(f"OP-{op.id} aparece mais de uma vez no lote.")
+                ops_vistas.add(op.id)
+                if acao == 'criar' and op.id in agendamento_da_op:
+                    raise ErroOperacao(f"OP-{op.id} já está agendada; use 'mover'.")
+                if acao == 'mover' and op.id not in agendamento_da_op:
+                    raise ErroOperacao(f"OP-{op.id} não está agendada; use 'criar'.")
+                lado = operacao.get('lado')
+                if lado not in LADOS + (None,):
+                    raise ErroOperacao(f"Lado inválido: {lado}.")
+                inicio, fim, duracao_horas = _janela(op, operacao.get('start_date'), operacao.get('start_hour'))
+                novos[i] = (op, maquina, inicio, fim, duracao_horas, lado)
+            except ErroOperacao as e:
+                falhar(i, str(e))
+
+        # 3. Conflitos contra o quadro (sem os agendamentos que saem ou
+        #    mudam de lugar) e entre as próprias operações do lote
+        if novos:
+            saindo = removidos | {agendamento_da_op[op.id].id for op, *_ in novos.values() if op.id in agendamento_da_op}
+            inicio_lote = min(inicio for _, _, inicio, *_ in novos.values())
+            fim_lote = max(fim for _, _, _, fim, *_ in novos.values())
+            indice = IndiceIntervalos(
+                Agendamento.objects.exclude(ordem_producao__status='Concluída').exclude(id__in=saindo).filter(
+                    maquina_id__in=maquina_ids, end_datetime__gt=inicio_lote, start_datetime__lt=fim_lote,
+                ).values(*CAMPOS)
+            )
+            for i, (op, maquina, inicio, fim, _, lado) in sorted(novos.items()):
+                conflitos = indice.consultar(maquina.id, lado, inicio, fim)
+                if conflitos:
+                    falhar(i, 'Horário em conflito com ' + ', '.join(f"OP-{c['ordem_producao_id']}" for c in conflitos) + '.')
+                    continue
+                indice.adicionar({
+                    'id': -i - 1, 'ordem_producao_id': op.id, 'maquina_id': maquina.id, 'lado': lado,
+                    'start_datetime': inicio, 'end_datetime': fim,
+                })
+
+        if erros:
+            for resultado in resultados:
+                if resultado['status'] == 'sucesso':
+                    resultado.update(status='nao_aplicado', mensagem='Lote não aplicado por erro em outra operação.')
+            return False, resultados
+
+        # 4. Aplica tudo em lote
+        criar, mover = [], []
+        for agendamento_id in removidos:
+            invalidar_agenda(existentes[agendamento_id].start_datetime, existentes[agendamento_id].end_datetime)
+        for i, (op, maquina, inicio, fim, duracao_horas, lado) in novos.items():
+            agendamento = agendamento_da_op.get(op.id) or Agendamento(ordem_producao=op)
+            if agendamento.pk:
+                invalidar_agenda(agendamento.start_datetime, agendamento.end_datetime)
+            invalidar_agenda(inicio, fim)
+            agendamento.maquina = maquina
+            agendamento.start_datetime = inicio
+            agendamento.end_datetime = fim
+            agendamento.lado = lado
+            agendamento.real_start_datetime = None
+            (mover if agendamento.pk else criar).append(agendamento)
+
+        Agendamento.objects.bulk_create(criar)
+        Agendamento.objects.bulk_update(mover, ['maquina', 'start_datetime', 'end_datetime', 'lado', 'real_start_datetime'])
+        if mover:
+            # Mantém o consolidado de OEE apontando para a máquina atual
+            OeeRollupHora.objects.filter(agendamento_id__in=[ag.id for ag in mover]).update(
+                maquina_id=Subquery(Agendamento.objects.filter(pk=OuterRef('agendamento_id')).values('maquina_id')[:1])
+            )
+        if removidos:
+            OrdemProducao.objects.filter(agendamento__id__in=removidos).update(status='Disponível')
+            Agendamento.objects.filter(id__in=removidos).delete()
+        OrdemProducao.objects.filter(id__in=[op.id for op, *_ in novos.values()]).update(status='Planejada')
+
+        # bulk_create, bulk_update e update() não disparam os signals
+        incrementar_versao(VERSAO_DASHBOARD)
+        if mover:
+            invalidar_pareto()
+
+    for i, (op, maquina, inicio, fim, duracao_horas, lado) in novos.items():
+        agendamento = agendamento_da_op.get(op.id) or next(ag for ag in criar if ag.ordem_producao_id == op.id)
+        local = timezone.localtime(inicio)
+        resultados[i]['agendamento'] = {
+            'id': agendamento.id,
+            'opId': op.id,
+            'maquinaId': maquina.id,
+            'day': local.weekday(),
+            'hour': local.hour,
+            'duration': round(duracao_horas, 4),
+            'lado': lado,
+        }
+    return True, resultados
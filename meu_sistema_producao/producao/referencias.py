@@ -0,0 +1,64 @@
+# meu_sistema_producao/producao/referencias.py
+
+"""
+Cache versionado dos cadastros de referência (PNs, tipos de parada e
+tipos de refugo).
+
+Essas tabelas mudam poucas vezes por mês, mas as listas eram lidas do
+banco e serializadas a cada abertura de modal. Cada cadastro tem um
+contador em `ContadorVersao` (ver producao/versoes.py), incrementado pelos
+signals de gravação/exclusão e ao final de uma importação do `PnResource`.
+A lista fica no cache do Django com a versão na chave, então uma escrita
+invalida tudo sem apagar nada.
+
+As APIs respondem com ETag (304 quando nada mudou) e as páginas pedem as
+listas com `?v=<versão>`: com a versão atual na URL a resposta pode ficar
+no cache do navegador por tempo indeterminado, e uma versão nova vira uma
+URL nova.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from .models import Pn, TipoParada, TipoRefugo, ContadorVersao
+from .versoes import incrementar_versao
+
+
+# nome -> (modelo, campos devolvidos pela API)
+CADASTROS = {
+    'pns': (Pn, ('id', 'pn_code', 'capacity_liters')),
+    'tipos_parada': (TipoParada, ('id', 'codigo', 'descricao')),
+    'tipos_refugo': (TipoRefugo, ('id', 'codigo', 'descricao')),
+}
+
+
+def _chave_versao(nome):
+    return f'referencia:{nome}'
+
+
+def invalidar(nome):
+    """Nova versão do cadastro depois do commit."""
+    incrementar_versao(_chave_versao(nome))
+
+
+def versoes(nomes=None):
+    """{nome: versão} dos cadastros (todos, se `nomes` for None) em uma query."""
+    nomes = list(nomes or CADASTROS)
+    por_chave = dict(ContadorVersao.objects.filter(
+        chave__in=[_chave_versao(nome) for nome in nomes]
+    ).values_list('chave', 'versao'))
+    return {nome: por_chave.get(_chave_versao(nome), 0) for nome in nomes}
+
+
+def versao(nome):
+    return versoes([nome])[nome]
+
+
+def lista(nome, versao_atual):
+    """Linhas do cadastro na versão informada, do cache ou do banco."""
+    chave = f'referencia:{nome}:v{versao_atual}'
+    linhas = cache.get(chave)
+    if linhas is None:
+        modelo, campos = CADASTROS[nome]
+        linhas = list(modelo.objects.order_by('id').values(*campos))
+        cache.set(chave, linhas, settings.REFERENCIA_CACHE_SEGUNDOS)
+    return linhas
@@ -2,6 +2,8 @@
 
 from import_export import resources
 from .models import Pn
+from .compatibilidade import agendar_recalculo
+from . import referencias
 
 class PnResource(resources.ModelResource):
     class Meta:
@@ -12,5 +14,14 @@ class PnResource(resources.ModelResource):
                   'capacity_liters', 'min_weight_kg', 'max_weight_kg',
                   'sold_weight_kg', 'cycle_time_seconds', 'cavity',
                   'dim_c', 'dim_a', 'dim_l',)
+        # A planilha não tem a coluna 'id': a linha é identificada pelo código do PN
+        import_id_fields = ('pn_code',)
         # A sua planilha já está no formato certo, então não precisa de um mapeamento
-        # complexo, mas é bom ter em mente essa funcionalidade.
\ No newline at end of file
+        # complexo, mas é bom ter em mente essa funcionalidade.
+
+    def after_import(self, dataset, result, **kwargs):
+        # Com use_bulk os signals não disparam; um recálculo só no final
+        super().after_import(dataset, result, **kwargs)
+        if not kwargs.get('dry_run'):
+            agendar_recalculo(tudo=True)
+            referencias.invalidar('pns')
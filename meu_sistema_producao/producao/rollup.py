@@ -0,0 +1,191 @@
+# meu_sistema_producao/producao/rollup.py
+
+"""
+Manutenção do consolidado horário de OEE (`OeeRollupHora`).
+
+As APIs de apontamento, parada e refugo chamam as funções `registrar_*`
+logo após gravar o evento. Peças são somadas no balde da hora com um
+UPDATE atômico (F() + valor). O tempo parado de cada hora é o das paradas
+do agendamento recortadas à hora e mescladas (ver producao/paradas.py),
+então cada nova parada recalcula as horas que ocupa. O comando
+`rebuild_oee_rollup` usa `reconstruir_rollup` para recalcular tudo a
+partir dos eventos brutos (inclusive os arquivados, ver producao/arquivo.py).
+"""
+
+from datetime import timedelta, timezone as dt_timezone
+from itertools import groupby
+from operator import itemgetter
+from django.db import transaction
+from django.db.models import Sum, F
+from django.db.models.functions import TruncHour
+from .models import ApontamentoProducao, Parada, Refugo, OeeRollupHora
+from .paradas import mesclar_paradas, tempos_de_parada, PLANEJADA
+from .versoes import incrementar_versao, VERSAO_DASHBOARD
+from .arquivo import com_arquivo, unir
+
+
+UMA_HORA = timedelta(hours=1)
+
+
+def inicio_da_hora(momento):
+    """Trunca um datetime para o início da hora (em UTC, como no banco)."""
+    return momento.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def horas_do_intervalo(inicio, fim):
+    """Gera (hora, inicio, fim) com o trecho de [inicio, fim) dentro de cada hora."""
+    hora = inicio_da_hora(inicio)
+    while hora < fim:
+        proxima = hora + UMA_HORA
+        trecho_inicio = max(inicio, hora)
+        trecho_fim = min(fim, proxima)
+        if trecho_fim > trecho_inicio:
+            yield hora, trecho_inicio, trecho_fim
+        hora = proxima
+
+
+def _somar(agendamento, momento, **incrementos):
+    hora = inicio_da_hora(momento)
+    rollup, _ = OeeRollupHora.objects.get_or_create(
+        maquina_id=agendamento.maquina_id,
+        agendamento_id=agendamento.id,
+        hora=hora,
+    )
+    OeeRollupHora.objects.filter(pk=rollup.pk).update(
+        **{campo: F(campo) + valor for campo, valor in incrementos.items()}
+    )
+
+
+def registrar_producao(apontamento):
+    _somar(apontamento.agendamento, apontamento.data_apontamento, pecas_boas=apontamento.quantidade)
+
+
+def registrar_refugo(refugo):
+    _somar(refugo.agendamento, refugo.data_apontamento, pecas_refugo=refugo.quantidade)
+
+
+def somar_lote(incrementos):
+    """
+    Soma vários eventos de uma vez (ingestão em lote). `incrementos` é
+    {(agendamento, hora): {campo: valor}}, com `hora` já truncada: os
+    baldes que faltam são criados com um único bulk_create e cada balde
+    recebe um único UPDATE atômico, não um por evento.
+    """
+    if not incrementos:
+        return
+    OeeRollupHora.objects.bulk_create(
+        [
+            OeeRollupHora(maquina_id=agendamento.maquina_id, agendamento_id=agendamento.id, hora=hora)
+            for agendamento, hora in incrementos
+        ],
+        ignore_conflicts=True,
+    )
+    for (agendamento, hora), campos in incrementos.items():
+        OeeRollupHora.objects.filter(
+            maquina_id=agendamento.maquina_id, agendamento_id=agendamento.id, hora=hora,
+        ).update(**{campo: F(campo) + valor for campo, valor in campos.items()})
+
+
+def paradas_do_agendamento(agendamento_id, inicio, fim):
+    """Intervalos (inicio, fim, classificacao) das paradas que cruzam [inicio, fim)."""
+    return Parada.objects.filter(
+        agendamento_id=agendamento_id,
+        inicio_parada__lt=fim,
+        fim_parada__gt=inicio,
+    ).values_list('inicio_parada', 'fim_parada', 'tipo_parada__classificacao_parada')
+
+
+def _recalcular_paradas_hora(agendamento, hora):
+    with transaction.atomic():
+        rollup, _ = OeeRollupHora.objects.get_or_create(
+            maquina_id=agendamento.maquina_id,
+            agendamento_id=agendamento.id,
+            hora=hora,
+        )
+        # Trava o balde: paradas simultâneas na mesma hora são recalculadas em fila
+        list(OeeRollupHora.objects.select_for_update().filter(pk=rollup.pk).values_list('pk'))
+        planejada, nao_planejada = tempos_de_parada(
+            paradas_do_agendamento(agendamento.id, hora, hora + UMA_HORA), hora, hora + UMA_HORA
+        )
+        OeeRollupHora.objects.filter(pk=rollup.pk).update(
+            parada_planejada=planejada,
+            parada_nao_planejada=nao_planejada,
+        )
+
+
+def registrar_parada(parada):
+    """Recalcula (com mesclagem) cada hora ocupada pela parada."""
+    for hora, _, _ in horas_do_intervalo(parada.inicio_parada, parada.fim_parada):
+        _recalcular_paradas_hora(parada.agendamento, hora)
+
+
+def registrar_paradas(paradas):
+    """Como `registrar_parada`, mas recalcula cada hora uma única vez para o lote todo."""
+    horas = {}
+    for parada in paradas:
+        for hora, _, _ in horas_do_intervalo(parada.inicio_parada, parada.fim_parada):
+            horas.setdefault((parada.agendamento_id, hora), parada.agendamento)
+    for (_, hora), agendamento in sorted(horas.items(), key=itemgetter(0)):
+        _recalcular_paradas_hora(agendamento, hora)
+
+
+def reconstruir_rollup(agendamento_ids=None, tamanho_lote=1000):
+    """
+    Recalcula o consolidado a partir dos eventos brutos: peças com queries
+    agrupadas por (agendamento, hora) e paradas lidas em lotes, ordenadas
+    por agendamento, para a mesclagem. Se `agendamento_ids` for informado,
+    apenas esses agendamentos são refeitos.
+    Retorna o número de baldes gravados.
+    """
+    utc = dt_timezone.utc
+    rollups = OeeRollupHora.objects.all()
+    if agendamento_ids is not None:
+        rollups = rollups.filter(agendamento_id__in=agendamento_ids)
+
+    def dos_agendamentos(qs):
+        return qs if agendamento_ids is None else qs.filter(agendamento_id__in=agendamento_ids)
+
+    baldes = {}
+
+    def balde(agendamento_id, maquina_id, hora):
+        chave = (agendamento_id, hora)
+        if chave not in baldes:
+            baldes[chave] = OeeRollupHora(
+                agendamento_id=agendamento_id,
+                maquina_id=maquina_id,
+                hora=hora,
+                parada_planejada=timedelta(0),
+                parada_nao_planejada=timedelta(0),
+            )
+        return baldes[chave]
+
+    # 1. Produção (peças boas) e 2. refugo, da tabela viva e do arquivo
+    for modelo, campo in ((ApontamentoProducao, 'pecas_boas'), (Refugo, 'pecas_refugo')):
+        for objetos in com_arquivo(modelo):
+            for linha in dos_agendamentos(objetos).values(
+                'agendamento_id', 'agendamento__maquina_id', hora=TruncHour('data_apontamento', tzinfo=utc)
+            ).annotate(total=Sum('quantidade')):
+                rollup = balde(linha['agendamento_id'], linha['agendamento__maquina_id'], linha['hora'])
+                setattr(rollup, campo, getattr(rollup, campo) + linha['total'])
+
+    # 3. Paradas classificadas: mescladas por agendamento e divididas por hora
+    paradas = unir(Parada, lambda objetos: dos_agendamentos(objetos).filter(
+        tipo_parada__classificacao_parada__isnull=False,
+    ).values_list(
+        'agendamento_id', 'agendamento__maquina_id', 'inicio_parada', 'fim_parada', 'tipo_parada__classificacao_parada'
+    )).order_by('agendamento_id')
+    for (agendamento_id, maquina_id), grupo in groupby(paradas.iterator(chunk_size=2000), key=itemgetter(0, 1)):
+        for inicio, fim, classificacao in mesclar_paradas(linha[2:] for linha in grupo):
+            for hora, trecho_inicio, trecho_fim in horas_do_intervalo(inicio, fim):
+                rollup = balde(agendamento_id, maquina_id, hora)
+                if classificacao == PLANEJADA:
+                    rollup.parada_planejada += trecho_fim - trecho_inicio
+                else:
+                    rollup.parada_nao_planejada += trecho_fim - trecho_inicio
+
+    with transaction.atomic():
+        rollups.delete()
+        OeeRollupHora.objects.bulk_create(baldes.values(), batch_size=tamanho_lote)
+        incrementar_versao(VERSAO_DASHBOARD)
+
+    return len(baldes)
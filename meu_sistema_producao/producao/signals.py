@@ -0,0 +1,296 @@
+# meu_sistema_producao/producao/signals.py
+
+import threading
+from django.db import transaction
+from django.db.models import Min, Max
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Pn, Maquina, OrdemProducao, Agendamento, ApontamentoProducao, Parada, Refugo, TipoParada, TipoRefugo
+from .rollup import reconstruir_rollup
+from .versoes import incrementar_versao, VERSAO_DASHBOARD
+from .eventos import difusor, notificar_maquinas
+from . import pareto
+from .planejamento import invalidar_agenda, invalidar_agenda_toda
+from .compatibilidade import agendar_recalculo
+from . import referencias
+from . import historico
+from .arquivo import com_arquivo
+
+
+# =======================================================================
+# CONSOLIDADO DE OEE
+# As criações são somadas pelas próprias APIs (producao/rollup.py).
+# Aqui tratamos apenas edições e exclusões (ex: pelo admin), refazendo
+# o consolidado somente dos agendamentos afetados, depois do commit.
+# =======================================================================
+
+_estado = threading.local()
+
+
+def _reconstruir_pendentes():
+    pendentes = getattr(_estado, 'agendamentos_pendentes', None)
+    if not pendentes:
+        return
+    agendamento_ids = list(pendentes)
+    pendentes.clear()
+    reconstruir_rollup(agendamento_ids)
+
+
+def agendar_reconstrucao_rollup(agendamento_ids):
+    """
+    Marca agendamentos para terem o consolidado refeito quando a transação
+    atual terminar. Vários eventos do mesmo agendamento (ex: exclusão em
+    cascata) resultam em uma única reconstrução.
+    """
+    if not hasattr(_estado, 'agendamentos_pendentes'):
+        _estado.agendamentos_pendentes = set()
+    _estado.agendamentos_pendentes.update(agendamento_ids)
+    transaction.on_commit(_reconstruir_pendentes)
+
+
+@receiver(post_save, sender=ApontamentoProducao)
+@receiver(post_save, sender=Parada)
+@receiver(post_save, sender=Refugo)
+def refazer_rollup_ao_editar_evento(sender, instance, created, **kwargs):
+    if not created:
+        agendar_reconstrucao_rollup([instance.agendamento_id])
+
+
+@receiver(post_delete, sender=ApontamentoProducao)
+@receiver(post_delete, sender=Parada)
+@receiver(post_delete, sender=Refugo)
+def refazer_rollup_ao_excluir_evento(sender, instance, **kwargs):
+    agendar_reconstrucao_rollup([instance.agendamento_id])
+
+
+@receiver(post_save, sender=TipoParada)
+def refazer_rollup_ao_reclassificar_parada(sender, instance, created, **kwargs):
+    """Uma mudança de classificação muda em qual coluna as paradas somam."""
+    if created:
+        return
+    agendamento_ids = set()
+    for objetos in com_arquivo(Parada):
+        agendamento_ids.update(objetos.filter(tipo_parada=instance).values_list('agendamento_id', flat=True).distinct())
+    agendar_reconstrucao_rollup(agendamento_ids)
+
+
+# =======================================================================
+# HISTÓRICO DE OEE
+# Um evento refaz só os baldes das horas que ele toca (e os dos turnos
+# delas), depois do commit e depois do consolidado horário. Numa edição,
+# as horas antigas do evento também.
+# =======================================================================
+
+def _periodo_do_evento(sender, agendamento_id, valores):
+    maquina_id = Agendamento.objects.filter(pk=agendamento_id).values_list('maquina_id', flat=True).first()
+    if sender is Parada:
+        return maquina_id, valores['inicio_parada'], valores['fim_parada']
+    return maquina_id, valores['data_apontamento'], None
+
+
+@receiver(pre_save, sender=ApontamentoProducao)
+@receiver(pre_save, sender=Parada)
+@receiver(pre_save, sender=Refugo)
+def guardar_periodo_antigo_evento(sender, instance, **kwargs):
+    instance._periodo_antigo = None
+    if instance.pk:
+        campos = ('inicio_parada', 'fim_parada') if sender is Parada else ('data_apontamento',)
+        antigo = sender.objects.filter(pk=instance.pk).values('agendamento_id', *campos).first()
+        if antigo:
+            instance._periodo_antigo = _periodo_do_evento(sender, antigo['agendamento_id'], antigo)
+
+
+@receiver(post_save, sender=ApontamentoProducao)
+@receiver(post_save, sender=Parada)
+@receiver(post_save, sender=Refugo)
+@receiver(post_delete, sender=ApontamentoProducao)
+@receiver(post_delete, sender=Parada)
+@receiver(post_delete, sender=Refugo)
+def atualizar_historico_oee(sender, instance, **kwargs):
+    periodos = [_periodo_do_evento(sender, instance.agendamento_id, vars(instance))]
+    if getattr(instance, '_periodo_antigo', None):
+        periodos.append(instance._periodo_antigo)
+    for maquina_id, inicio, fim in periodos:
+        if maquina_id is not None and inicio is not None:
+            historico.atualizar_periodo(maquina_id, inicio, fim)
+
+
+# =======================================================================
+# VERSÃO DO DASHBOARD DE GERENCIAMENTO
+# Qualquer escrita que possa mudar um KPI invalida a ETag do dashboard.
+# (Escritas feitas com queryset.update() incrementam a versão na própria view.)
+# =======================================================================
+
+@receiver(post_save, sender=Maquina)
+@receiver(post_save, sender=OrdemProducao)
+@receiver(post_save, sender=Agendamento)
+@receiver(post_save, sender=ApontamentoProducao)
+@receiver(post_save, sender=Parada)
+@receiver(post_save, sender=Refugo)
+@receiver(post_save, sender=TipoParada)
+@receiver(post_delete, sender=Maquina)
+@receiver(post_delete, sender=OrdemProducao)
+@receiver(post_delete, sender=Agendamento)
+@receiver(post_delete, sender=ApontamentoProducao)
+@receiver(post_delete, sender=Parada)
+@receiver(post_delete, sender=Refugo)
+def invalidar_dashboard(sender, **kwargs):
+    incrementar_versao(VERSAO_DASHBOARD)
+
+
+# =======================================================================
+# STREAM SSE DO DASHBOARD
+# Publica os KPIs apenas da máquina afetada pelo evento.
+# =======================================================================
+
+@receiver(post_save, sender=ApontamentoProducao)
+@receiver(post_save, sender=Parada)
+@receiver(post_save, sender=Refugo)
+@receiver(post_delete, sender=ApontamentoProducao)
+@receiver(post_delete, sender=Parada)
+@receiver(post_delete, sender=Refugo)
+def notificar_stream_dashboard(sender, instance, **kwargs):
+    if not difusor.tem_assinantes():
+        return
+    maquina_id = Agendamento.objects.filter(pk=instance.agendamento_id).values_list('maquina_id', flat=True).first()
+    if maquina_id:
+        notificar_maquinas([maquina_id])
+
+
+# =======================================================================
+# CACHE DOS RELATÓRIOS DE PARETO
+# Um evento novo invalida apenas os relatórios que cobrem o seu dia.
+# =======================================================================
+
+@receiver(post_save, sender=Parada)
+@receiver(post_delete, sender=Parada)
+def invalidar_pareto_paradas(sender, instance, created=False, **kwargs):
+    if kwargs.get('signal') is post_save and not created:
+        # Edição: as datas antigas podem ser outras
+        pareto.invalidar_tudo()
+    pareto.invalidar_periodo('paradas', instance.inicio_parada, instance.fim_parada)
+
+
+@receiver(post_save, sender=Refugo)
+@receiver(post_delete, sender=Refugo)
+def invalidar_pareto_refugos(sender, instance, created=False, **kwargs):
+    if kwargs.get('signal') is post_save and not created:
+        pareto.invalidar_tudo()
+    pareto.invalidar_periodo('refugos', instance.data_apontamento, instance.data_apontamento)
+
+
+@receiver(post_save, sender=TipoParada)
+@receiver(post_save, sender=TipoRefugo)
+@receiver(post_save, sender=Maquina)
+@receiver(post_save, sender=Pn)
+@receiver(post_delete, sender=TipoParada)
+@receiver(post_delete, sender=TipoRefugo)
+@receiver(post_delete, sender=Maquina)
+@receiver(post_delete, sender=Pn)
+def invalidar_pareto_cadastros(sender, **kwargs):
+    pareto.invalidar_tudo()
+
+
+@receiver(post_save, sender=Agendamento)
+def invalidar_pareto_agendamento(sender, instance, created, **kwargs):
+    """
+    Os eventos entram no Pareto pela máquina e pelo PN do agendamento: só
+    uma troca de máquina ou de OP muda relatórios, e só os dos dias em que
+    o agendamento tem eventos.
+    """
+    antigo = getattr(instance, '_agrupamento_antigo', None)
+    if created or antigo is None or antigo == (instance.maquina_id, instance.ordem_producao_id):
+        return
+    for fonte, modelo, campo_inicio, campo_fim in (
+        ('paradas', Parada, 'inicio_parada', 'fim_parada'),
+        ('refugos', Refugo, 'data_apontamento', 'data_apontamento'),
+    ):
+        for objetos in com_arquivo(modelo):
+            periodo = objetos.filter(agendamento_id=instance.pk).aggregate(inicio=Min(campo_inicio), fim=Max(campo_fim))
+            if periodo['inicio']:
+                pareto.invalidar_periodo(fonte, periodo['inicio'], periodo['fim'] or periodo['inicio'])
+
+
+
+# =======================================================================
+# CACHE DA SEMANA DO QUADRO DE PLANEJAMENTO
+# Um agendamento invalida os dias da sua janela antiga e da nova.
+# =======================================================================
+
+@receiver(pre_save, sender=Agendamento)
+def guardar_janela_antiga_agendamento(sender, instance, **kwargs):
+    """Guarda a janela (agenda) e a máquina e OP (Pareto) de antes da edição."""
+    instance._janela_antiga = instance._agrupamento_antigo = None
+    if instance.pk:
+        antigo = Agendamento.objects.filter(pk=instance.pk).values_list(
+            'start_datetime', 'end_datetime', 'maquina_id', 'ordem_producao_id'
+        ).first()
+        if antigo:
+            instance._janela_antiga, instance._agrupamento_antigo = antigo[:2], antigo[2:]
+
+
+@receiver(post_save, sender=Agendamento)
+@receiver(post_delete, sender=Agendamento)
+def invalidar_agenda_agendamento(sender, instance, **kwargs):
+    janela_antiga = getattr(instance, '_janela_antiga', None)
+    if janela_antiga:
+        invalidar_agenda(*janela_antiga)
+    if instance.start_datetime and instance.end_datetime:
+        invalidar_agenda(instance.start_datetime, instance.end_datetime)
+
+
+@receiver(post_save, sender=OrdemProducao)
+def invalidar_agenda_op(sender, instance, created, **kwargs):
+    # Quantidade e PN definem a duração mostrada no quadro
+    if created:
+        return
+    janela = Agendamento.objects.filter(ordem_producao_id=instance.pk).values_list(
+        'start_datetime', 'end_datetime'
+    ).first()
+    if janela:
+        invalidar_agenda(*janela)
+
+
+@receiver(post_save, sender=Pn)
+def invalidar_agenda_pn(sender, created, **kwargs):
+    # O ciclo do PN muda a duração de todas as suas OPs
+    if not created:
+        invalidar_agenda_toda()
+
+
+# =======================================================================
+# MATRIZ DE COMPATIBILIDADE PN x MÁQUINA
+# Exclusões saem da tabela em cascata; aqui só as gravações.
+# =======================================================================
+
+@receiver(post_save, sender=Pn)
+def recalcular_compatibilidade_pn(sender, instance, **kwargs):
+    agendar_recalculo(pn_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Maquina)
+def recalcular_compatibilidade_maquina(sender, instance, **kwargs):
+    agendar_recalculo(maquina_ids=[instance.pk])
+
+
+# =======================================================================
+# CACHE DOS CADASTROS DE REFERÊNCIA
+# Importações do PnResource invalidam no after_import (bulk, sem signals).
+# =======================================================================
+
+@receiver(post_save, sender=Pn)
+@receiver(post_delete, sender=Pn)
+def invalidar_referencia_pns(sender, **kwargs):
+    referencias.invalidar('pns')
+
+
+@receiver(post_save, sender=TipoParada)
+@receiver(post_delete, sender=TipoParada)
+def invalidar_referencia_tipos_parada(sender, **kwargs):
+    referencias.invalidar('tipos_parada')
+
+
+@receiver(post_save, sender=TipoRefugo)
+@receiver(post_delete, sender=TipoRefugo)
+def invalidar_referencia_tipos_refugo(sender, **kwargs):
+    referencias.invalidar('tipos_refugo')
@@ -1,3 +1,1753 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import importlib.util
+import io
+import json
+import math
+import random
+import time
+from unittest import mock, skipUnless
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import tablib
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.db import DatabaseError
+from django.db.models import Sum
+from django.utils import timezone
 
-# Create your tests here.
+from .paradas import mesclar_paradas, tempos_de_parada, PLANEJADA, NAO_PLANEJADA
+from .agendador import planejar, compativel, dados_sinteticos
+from .cascata import fim_projetado
+from .cenarios import Cenario, ErroCenario, ler_edicao
+from .compatibilidade import pares_compativeis
+from .conflitos import IndiceIntervalos
+from .ingestao import _montar, gravar_eventos, EventoInvalido
+from .ciclos import Agregador, ler_sinal, comparar_tempos_de_ciclo
+from .importacao import importar_pns, importar_ops, ler_planilha, limpar_linha, em_lotes, carregar_dataset, _numero, _data_iso, ErroImportacao, CAMPOS_PN
+from .planejamento import snapshot_quadro, aplicar_lote
+from .resources import PnResource
+from .chao_de_fabrica import estado_da_fabrica
+from .exportacao import csv_em_streaming, parquet_em_streaming, colunas, consultar, FONTES as FONTES_EXPORTACAO, _SaidaParquet
+from .arquivo import ARQUIVOS, data_de_corte, agendamentos_para_arquivar, arquivar, com_arquivo, unir
+from .models import (
+    Agendamento, ApontamentoProducao, Parada, Pn, Maquina, OrdemProducao, Refugo,
+    TipoParada, TipoRefugo, OeeRollupHora, OeeHistorico, ContadorVersao, CompatibilidadePnMaquina,
+)
+from .oee import calcular_kpis, calcular_kpis_maquinas
+from .rollup import reconstruir_rollup, inicio_da_hora
+from .historico import consolidar_historico
+from .views import _stream_kpis
+from .pareto import _calcular as calcular_pareto
+from .versoes import obter_versao, incrementar_versao, VERSAO_DASHBOARD, PARTES
+from .oee_lote import calcular_kpis_lote, calcular_kpis_linha_a_linha, insumos_sinteticos
+
+
+BASE = datetime(2026, 1, 1, 8, 0)
+
+
+def _min(minutos):
+    return BASE + timedelta(minutes=minutos)
+
+
+def _criar_pn(pn_code='PN-1', cycle_time_seconds=36):
+    return Pn.objects.create(
+        cliente='Cliente', pn_code=pn_code, description='Peça de teste', type_piece='Tampa',
+        property='Própria', capacity_liters=5, min_weight_kg=1, max_weight_kg=2, sold_weight_kg=1.5,
+        cycle_time_seconds=cycle_time_seconds, cavity=1, dim_c=10, dim_a=10, dim_l=10,
+    )
+
+
+def _criar_maquina(number='M-01'):
+    return Maquina.objects.create(number=number, capacity_liters=10, mold_dim_c=20, mold_dim_a=20, mold_dim_l=20)
+
+
+def _post_json(client, nome_url, dados, **extra):
+    return client.post(reverse(nome_url), json.dumps(dados), content_type='application/json', **extra)
+
+
+class MesclagemParadasTests(SimpleTestCase):
+
+    def test_paradas_duplicadas_nao_contam_duas_vezes(self):
+        paradas = [
+            (_min(0), _min(30), NAO_PLANEJADA),
+            (_min(0), _min(30), NAO_PLANEJADA),
+        ]
+        self.assertEqual(tempos_de_parada(paradas), (timedelta(0), timedelta(minutes=30)))
+
+    def test_paradas_sobrepostas_sao_unidas(self):
+        paradas = [
+            (_min(0), _min(20), NAO_PLANEJADA),
+            (_min(10), _min(40), NAO_PLANEJADA),
+            (_min(40), _min(50), NAO_PLANEJADA),
+        ]
+        self.assertEqual(mesclar_paradas(paradas), [(_min(0), _min(50), NAO_PLANEJADA)])
+
+    def test_planejada_prevalece_sobre_nao_planejada(self):
+        paradas = [
+            (_min(0), _min(60), NAO_PLANEJADA),
+            (_min(20), _min(30), PLANEJADA),
+        ]
+        self.assertEqual(mesclar_paradas(paradas), [
+            (_min(0), _min(20), NAO_PLANEJADA),
+            (_min(20), _min(30), PLANEJADA),
+            (_min(30), _min(60), NAO_PLANEJADA),
+        ])
+        self.assertEqual(tempos_de_parada(paradas), (timedelta(minutes=10), timedelta(minutes=50)))
+
+    def test_recorta_a_janela_medida(self):
+        paradas = [
+            (_min(-30), _min(10), PLANEJADA),
+            (_min(50), _min(90), NAO_PLANEJADA),
+            (_min(100), _min(120), NAO_PLANEJADA),
+        ]
+        self.assertEqual(
+            tempos_de_parada(paradas, _min(0), _min(60)),
+            (timedelta(minutes=10), timedelta(minutes=10)),
+        )
+
+    def test_ignora_paradas_sem_classificacao(self):
+        paradas = [(_min(0), _min(30), None)]
+        self.assertEqual(mesclar_paradas(paradas), [])
+
+    def test_total_nunca_passa_da_janela(self):
+        aleatorio = random.Random(7)
+        for _ in range(200):
+            paradas = []
+            for _ in range(aleatorio.randint(0, 15)):
+                inicio = aleatorio.randint(-20, 120)
+                paradas.append((_min(inicio), _min(inicio + aleatorio.randint(1, 45)),
+                                aleatorio.choice([PLANEJADA, NAO_PLANEJADA])))
+            planejada, nao_planejada = tempos_de_parada(paradas, _min(0), _min(100))
+            self.assertLessEqual(planejada + nao_planejada, timedelta(minutes=100))
+
+    def test_benchmark_milhares_de_paradas(self):
+        aleatorio = random.Random(11)
+        paradas = []
+        for _ in range(20000):
+            inicio = aleatorio.randint(0, 60 * 24 * 30)
+            paradas.append((_min(inicio), _min(inicio + aleatorio.randint(1, 90)),
+                            aleatorio.choice([PLANEJADA, NAO_PLANEJADA])))
+
+        inicio = time.perf_counter()
+        segmentos = mesclar_paradas(paradas, _min(0), _min(60 * 24 * 30))
+        duracao = time.perf_counter() - inicio
+
+        for anterior, seguinte in zip(segmentos, segmentos[1:]):
+            self.assertLessEqual(anterior[1], seguinte[0])
+        # 20 mil paradas de uma máquina num mês: folga grande para máquinas lentas de CI
+        self.assertLess(duracao, 2.0)
+
+
+class OeeLoteTests(SimpleTestCase):
+
+    def _comparar(self, insumos, fator_ciclo=1.0, pn_ids=None):
+        vetorizado = calcular_kpis_lote(insumos, fator_ciclo, pn_ids)
+        linha_a_linha = calcular_kpis_linha_a_linha(insumos, fator_ciclo, pn_ids)
+        self.assertEqual([int(m) for m in vetorizado['maquina_id']], list(linha_a_linha))
+        for i, maquina_id in enumerate(vetorizado['maquina_id']):
+            for kpi, valor in linha_a_linha[int(maquina_id)].items():
+                self.assertAlmostEqual(vetorizado[kpi][i], valor, places=6)
+
+    def test_igual_ao_calculo_do_dashboard(self):
+        self._comparar(insumos_sinteticos(3000, maquinas=40, semente=3))
+
+    def test_simulacao_de_ciclo(self):
+        insumos = insumos_sinteticos(2000, semente=5)
+        self._comparar(insumos, fator_ciclo=0.95)
+        self._comparar(insumos, fator_ciclo=1.2, pn_ids=[1, 2, 3, 50])
+
+    def test_casos_limite(self):
+        insumos = insumos_sinteticos(6, maquinas=3, semente=1)
+        insumos['ciclo_segundos'][:] = [0, 30, 30, 0, 60, 60]
+        insumos['pecas_boas'][:] = [10, 0, 0, 0, 5, 0]
+        insumos['pecas_refugo'][:] = 0
+        insumos['parada_planejada_segundos'][:2] = insumos['tempo_bruto_segundos'][:2]
+        self._comparar(insumos)
+
+
+class AgendadorTests(SimpleTestCase):
+    inicio = datetime(2026, 1, 5, 8, 0, tzinfo=dt_timezone.utc)
+
+    def _maquina(self, id, capacidade=30, molde=50):
+        return {'id': id, 'capacity_liters': capacidade, 'mold_dim_c': molde, 'mold_dim_a': molde, 'mold_dim_l': molde}
+
+    def _op(self, id, horas, entrega, capacidade=10, dimensao=20):
+        pn = {'id': id, 'capacity_liters': capacidade, 'dim_c': dimensao, 'dim_a': dimensao, 'dim_l': dimensao}
+        return {'id': id, 'delivery_date': entrega, 'duracao': timedelta(hours=horas), 'pn': pn}
+
+    def test_respeita_compatibilidade(self):
+        maquinas = [self._maquina(1, capacidade=10), self._maquina(2, capacidade=40)]
+        planejados, sem_maquina = planejar(
+            [self._op(1, 2, date(2026, 1, 9), capacidade=30), self._op(2, 2, date(2026, 1, 9), capacidade=60)],
+            maquinas, [], self.inicio,
+        )
+        self.assertEqual([(p['op_id'], p['maquina_id']) for p in planejados], [(1, 2)])
+        self.assertEqual(sem_maquina, [2])
+
+    def test_prioriza_data_de_entrega_e_usa_lacunas(self):
+        maquinas = [self._maquina(1)]
+        # Máquina ocupada dos dois lados das 10h às 20h: sobra uma lacuna de 2h
+        ocupacoes = [(1, None, self.inicio + timedelta(hours=2), self.inicio + timedelta(hours=12))]
+        ops = [
+            self._op(1, 5, date(2026, 1, 20)),
+            self._op(2, 2, date(2026, 1, 6)),
+            self._op(3, 1, date(2026, 1, 7)),
+        ]
+        planejados, _ = planejar(ops, maquinas, ocupacoes, self.inicio)
+        por_op = {p['op_id']: p for p in planejados}
+        self.assertEqual(por_op[2]['start_datetime'], self.inicio)
+        self.assertEqual(por_op[3]['start_datetime'], self.inicio)
+        self.assertNotEqual(por_op[2]['lado'], por_op[3]['lado'])
+        self.assertEqual(por_op[1]['start_datetime'], self.inicio + timedelta(hours=12))
+
+    def test_sem_sobreposicao_em_dados_sinteticos(self):
+        ops, maquinas, ocupacoes = dados_sinteticos(2000, 80, self.inicio, semente=4)
+
+        comeco = time.perf_counter()
+        planejados, sem_maquina = planejar(ops, maquinas, ocupacoes, self.inicio)
+        self.assertLess(time.perf_counter() - comeco, 10.0)
+        self.assertEqual(len(planejados) + len(sem_maquina), len(ops))
+
+        pns = {op['id']: op['pn'] for op in ops}
+        maquinas_por_id = {maquina['id']: maquina for maquina in maquinas}
+        faixas = {}
+        for maquina_id, lado, inicio, fim in ocupacoes:
+            for lado_ocupado in ([lado] if lado else ['L', 'R']):
+                faixas.setdefault((maquina_id, lado_ocupado), []).append((inicio, fim, False))
+        for item in planejados:
+            self.assertTrue(compativel(pns[item['op_id']], maquinas_por_id[item['maquina_id']]))
+            self.assertEqual(item['start_datetime'].minute, 0)
+            faixas.setdefault((item['maquina_id'], item['lado']), []).append((item['start_datetime'], item['end_datetime'], True))
+        for intervalos in faixas.values():
+            intervalos.sort()
+            for anterior, seguinte in zip(intervalos, intervalos[1:]):
+                if anterior[2] or seguinte[2]:
+                    self.assertLessEqual(anterior[1], seguinte[0])
+
+
+class FimProjetadoTests(SimpleTestCase):
+    inicio = datetime(2026, 1, 5, 8, 0, tzinfo=dt_timezone.utc)
+
+    def test_usa_a_taxa_real(self):
+        # 100 peças em 2h: faltam 300, então mais 6h
+        agora = self.inicio + timedelta(hours=2)
+        self.assertEqual(fim_projetado(self.inicio, 400, 100, 100, 30, agora), agora + timedelta(hours=6))
+
+    def test_sem_apontamento_usa_o_ciclo_nominal(self):
+        agora = self.inicio + timedelta(hours=1)
+        self.assertEqual(fim_projetado(self.inicio, 120, 0, 0, 60, agora), agora + timedelta(hours=2))
+        self.assertIsNone(fim_projetado(self.inicio, 120, 0, 0, 0, agora))
+
+    def test_op_completa_termina_agora(self):
+        agora = self.inicio + timedelta(hours=3)
+        self.assertEqual(fim_projetado(self.inicio, 100, 120, 120, 30, agora), agora)
+
+
+class CompatibilidadeTests(SimpleTestCase):
+    inicio = datetime(2026, 1, 5, 8, 0, tzinfo=dt_timezone.utc)
+
+    def test_matriz_igual_a_comparacao_par_a_par(self):
+        ops, maquinas, _ = dados_sinteticos(500, 40, self.inicio, semente=7)
+        pns = list({op['pn']['id']: op['pn'] for op in ops}.values())
+        esperado = {(pn['id'], maquina['id']) for pn in pns for maquina in maquinas if compativel(pn, maquina)}
+        self.assertEqual(set(pares_compativeis(pns, maquinas)), esperado)
+        self.assertEqual(pares_compativeis([], maquinas), [])
+
+    def test_agendador_com_matriz_pre_calculada(self):
+        ops, maquinas, ocupacoes = dados_sinteticos(300, 20, self.inicio, semente=2)
+        pns = list({op['pn']['id']: op['pn'] for op in ops}.values())
+        mapa = {}
+        for pn_id, maquina_id in pares_compativeis(pns, maquinas):
+            mapa.setdefault(pn_id, set()).add(maquina_id)
+        self.assertEqual(
+            planejar(ops, maquinas, ocupacoes, self.inicio, mapa),
+            planejar(ops, maquinas, ocupacoes, self.inicio),
+        )
+
+
+class IndiceIntervalosTests(SimpleTestCase):
+    base = datetime(2026, 1, 5, 0, 0, tzinfo=dt_timezone.utc)
+
+    def _agendamento(self, id, maquina_id, lado, inicio_horas, duracao_horas):
+        inicio = self.base + timedelta(hours=inicio_horas)
+        return {
+            'id': id, 'ordem_producao_id': id, 'maquina_id': maquina_id, 'lado': lado,
+            'start_datetime': inicio, 'end_datetime': inicio + timedelta(hours=duracao_horas),
+        }
+
+    def test_lado_vazio_ocupa_a_maquina_inteira(self):
+        indice = IndiceIntervalos([
+            self._agendamento(1, 1, 'L', 0, 4),
+            self._agendamento(2, 1, None, 10, 4),
+            self._agendamento(3, 2, 'R', 0, 4),
+        ])
+        consultar = lambda lado, inicio, fim: [a['id'] for a in indice.consultar(1, lado, self.base + timedelta(hours=inicio), self.base + timedelta(hours=fim))]
+        self.assertEqual(consultar('L', 2, 12), [1, 2])
+        self.assertEqual(consultar('R', 2, 12), [2])
+        self.assertEqual(consultar(None, 0, 1), [1])
+        # Intervalos semiabertos: encostar não é conflito
+        self.assertEqual(consultar('L', 4, 10), [])
+
+    def test_igual_a_busca_exaustiva(self):
+        aleatorio = random.Random(9)
+        agendamentos = [
+            self._agendamento(i, aleatorio.randint(1, 4), aleatorio.choice(['L', 'R', None]),
+                              aleatorio.randint(0, 1500), aleatorio.randint(1, 40))
+            for i in range(2000)
+        ]
+        indice = IndiceIntervalos(agendamentos)
+        for _ in range(300):
+            maquina_id = aleatorio.randint(1, 4)
+            lado = aleatorio.choice(['L', 'R', None])
+            inicio = self.base + timedelta(hours=aleatorio.randint(0, 1500))
+            fim = inicio + timedelta(hours=aleatorio.randint(1, 60))
+            esperado = sorted(
+                a['id'] for a in agendamentos
+                if a['maquina_id'] == maquina_id
+                and (lado is None or a['lado'] is None or a['lado'] == lado)
+                and a['start_datetime'] < fim and a['end_datetime'] > inicio
+            )
+            self.assertEqual(sorted(a['id'] for a in indice.consultar(maquina_id, lado, inicio, fim)), esperado)
+
+
+class CenarioTests(SimpleTestCase):
+    inicio = datetime(2026, 1, 5, 8, 0, tzinfo=dt_timezone.utc)
+
+    def _quadro(self, maquinas=80, por_lado=13, semente=0):
+        """Agendamentos sequenciais em cada lado, com folgas aleatórias."""
+        aleatorio = random.Random(semente)
+        agendamentos, ops = [], []
+        for maquina_id in range(1, maquinas + 1):
+            for lado in ('L', 'R'):
+                momento = self.inicio
+                for _ in range(por_lado):
+                    momento += timedelta(hours=aleatorio.randint(0, 3))
+                    fim = momento + timedelta(hours=aleatorio.randint(2, 10))
+                    op_id = len(ops) + 1
+                    agendamentos.append({
+                        'id': op_id, 'ordem_producao_id': op_id, 'maquina_id': maquina_id, 'lado': lado,
+                        'start_datetime': momento, 'end_datetime': fim,
+                    })
+                    ops.append({
+                        'id': op_id, 'quantity': 100, 'status': 'Planejada',
+                        'delivery_date': (fim + timedelta(days=aleatorio.randint(0, 3))).date(),
+                    })
+                    momento = fim
+        return agendamentos, ops
+
+    def _sem_sobreposicao(self, agendamentos):
+        por_lado = {}
+        for agendamento in agendamentos:
+            por_lado.setdefault((agendamento['maquina_id'], agendamento['lado']), []).append(agendamento)
+        for itens in por_lado.values():
+            itens.sort(key=lambda item: item['inicio'])
+            for anterior, seguinte in zip(itens, itens[1:]):
+                self.assertLessEqual(anterior['fim'], seguinte['inicio'])
+
+    def test_sem_edicoes_nada_muda(self):
+        cenario = Cenario(*self._quadro(maquinas=5), agora=self.inicio)
+        self.assertEqual(cenario.agendamentos(somente_alterados=True), [])
+        self.assertEqual(cenario.resumo()['ops_atrasadas'], 0)
+
+    def test_parada_de_maquina_empurra_em_cascata(self):
+        agendamentos, ops = self._quadro(maquinas=3)
+        cenario = Cenario(agendamentos, ops, agora=self.inicio)
+        parada = (self.inicio + timedelta(hours=5), self.inicio + timedelta(days=2))
+        cenario.editar({'tipo': 'parada_maquina', 'maquina_id': 2, 'inicio': parada[0], 'fim': parada[1]})
+
+        resultado = cenario.agendamentos()
+        alterados = cenario.agendamentos(somente_alterados=True)
+        self.assertTrue(alterados)
+        self.assertEqual({item['maquina_id'] for item in alterados}, {2})
+        self._sem_sobreposicao(resultado)
+        for item in resultado:
+            if item['maquina_id'] == 2:
+                self.assertTrue(item['fim'] <= parada[0] or item['inicio'] >= parada[1])
+                self.assertGreaterEqual(item['deslocamento_horas'], 0)
+        self.assertGreater(cenario.resumo()['horas_de_atraso'], 0)
+
+    def test_quantidade_dobrada_aumenta_a_duracao(self):
+        agendamentos, ops = self._quadro(maquinas=1, por_lado=4)
+        cenario = Cenario(agendamentos, ops, agora=self.inicio)
+        cenario.editar({'tipo': 'quantidade', 'op_id': 1, 'quantidade': 200})
+        por_op = {item['op_id']: item for item in cenario.agendamentos()}
+        original = agendamentos[0]
+        self.assertEqual(por_op[1]['fim'] - por_op[1]['inicio'], 2 * (original['end_datetime'] - original['start_datetime']))
+        self.assertGreaterEqual(por_op[2]['inicio'], por_op[1]['fim'])
+        self._sem_sobreposicao(list(por_op.values()))
+
+    def test_recalculo_em_milissegundos(self):
+        agendamentos, ops = self._quadro()
+        self.assertGreaterEqual(len(agendamentos), 2000)
+        cenario = Cenario(agendamentos, ops, agora=self.inicio)
+
+        comeco = time.perf_counter()
+        for maquina_id in range(1, 81):
+            cenario.editar({
+                'tipo': 'parada_maquina', 'maquina_id': maquina_id,
+                'inicio': self.inicio + timedelta(hours=maquina_id), 'fim': self.inicio + timedelta(hours=maquina_id + 24),
+            })
+        por_edicao = (time.perf_counter() - comeco) / 80
+        self.assertLess(por_edicao, 0.05)
+        self._sem_sobreposicao(cenario.agendamentos())
+
+
+
+class IngestaoTests(SimpleTestCase):
+    """Validação dos eventos da fila offline (sem banco: só _montar)."""
+
+    def setUp(self):
+        self.agora = datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+        self.agendamentos = {7: Agendamento(id=7, maquina_id=1, ordem_producao_id=3)}
+
+    def _montar(self, **evento):
+        evento.setdefault('uuid', 'a')
+        evento.setdefault('agendamento_id', 7)
+        return _montar(evento, self.agendamentos, {1}, {2}, None, self.agora)
+
+    def test_producao_guarda_o_horario_do_terminal(self):
+        apontamento = self._montar(tipo='producao', quantidade='5', momento='2026-01-01T09:30:00+00:00')
+        self.assertIsInstance(apontamento, ApontamentoProducao)
+        self.assertEqual(apontamento.quantidade, 5)
+        self.assertEqual(apontamento.data_apontamento, datetime(2026, 1, 1, 9, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(apontamento.chave_idempotencia, 'a')
+
+    def test_parada(self):
+        parada = self._montar(
+            tipo='parada', tipo_parada_id=1,
+            inicio_parada='2026-01-01T10:00:00+00:00', fim_parada='2026-01-01T10:20:00+00:00',
+        )
+        self.assertIsInstance(parada, Parada)
+        self.assertEqual(parada.fim_parada - parada.inicio_parada, timedelta(minutes=20))
+
+    def test_eventos_invalidos(self):
+        invalidos = [
+            {'tipo': 'outro'},
+            {'tipo': 'producao', 'agendamento_id': 99, 'quantidade': 1, 'momento': '2026-01-01T09:00:00+00:00'},
+            {'tipo': 'producao', 'quantidade': 0, 'momento': '2026-01-01T09:00:00+00:00'},
+            {'tipo': 'producao', 'quantidade': 1, 'momento': 'ontem'},
+            {'tipo': 'producao', 'quantidade': 1, 'momento': '2026-01-01T13:00:00+00:00'},
+            {'tipo': 'refugo', 'tipo_refugo_id': 9, 'quantidade': 1, 'momento': '2026-01-01T09:00:00+00:00'},
+            {'tipo': 'parada', 'tipo_parada_id': 1, 'inicio_parada': '2026-01-01T10:00:00+00:00', 'fim_parada': '2026-01-01T10:00:00+00:00'},
+        ]
+        for evento in invalidos:
+            with self.subTest(evento=evento), self.assertRaises(EventoInvalido):
+                self._montar(**evento)
+
+
+class AgregadorCiclosTests(SimpleTestCase):
+    """Acúmulo dos sinais de ciclo em memória (a descarga no banco não é exercitada)."""
+
+    def setUp(self):
+        self.inicio = datetime(2026, 1, 1, 9, 58, tzinfo=dt_timezone.utc)
+        # Faz o papel do cache compartilhado entre os workers
+        self.ultimos = LocMemCache('ciclos-testes', {})
+        self.ultimos.clear()
+        self.agregadores = []
+        self.agregador = self._novo_agregador()
+
+    def _novo_agregador(self):
+        agregador = Agregador(segundos=3600, maximo=10 ** 6, relogio=lambda: 0, ultimos=self.ultimos)
+        agregador._rodando = {
+            1: [
+                (Agendamento(id=10, maquina_id=1, lado='L', ordem_producao_id=100), 30),
+                (Agendamento(id=11, maquina_id=1, lado='R', ordem_producao_id=101), 30),
+            ],
+        }
+        agregador._rodando_em = 0
+        self.agregadores.append(agregador)
+        return agregador
+
+    def tearDown(self):
+        for agregador in self.agregadores:
+            if agregador._timer is not None:
+                agregador._timer.cancel()
+
+    def test_acumula_por_agendamento_e_hora(self):
+        # Ciclos a cada 30 s, atravessando a virada das 10h, só no lado L
+        for i in range(8):
+            self.assertEqual(self.agregador.registrar(1, self.inicio + timedelta(seconds=30 * i), pecas=2, lado='L'), 1)
+        pendentes = {(ag_id, hora.hour): acumulado for (ag_id, hora), acumulado in self.agregador._pendentes.items()}
+        self.assertEqual(set(pendentes), {(10, 9), (10, 10)})
+        self.assertEqual(pendentes[(10, 9)].pecas + pendentes[(10, 10)].pecas, 16)
+
+        apontamento = pendentes[(10, 10)].apontamento()
+        self.assertEqual(apontamento.ciclos, 4)
+        self.assertEqual(apontamento.intervalos, 4)
+        self.assertEqual(apontamento.tempo_ciclo_real_segundos, 30)
+        self.assertEqual(apontamento.data_apontamento, self.inicio + timedelta(seconds=210))
+
+    def test_intervalo_de_parada_fica_fora_da_media(self):
+        self.agregador.registrar(1, self.inicio, lado='R')
+        self.agregador.registrar(1, self.inicio + timedelta(seconds=40), lado='R')
+        self.agregador.registrar(1, self.inicio + timedelta(minutes=30), lado='R')
+        acumulados = [a for (ag_id, _), a in self.agregador._pendentes.items() if ag_id == 11]
+        self.assertEqual(sum(a.ciclos for a in acumulados), 3)
+        self.assertEqual(sum(a.intervalos for a in acumulados), 1)
+
+    def test_workers_medem_o_intervalo_contra_o_ultimo_sinal_de_qualquer_um(self):
+        # Sinais a cada 30 s distribuídos entre dois workers: cada um vê
+        # sinais a cada 60 s, mas o ciclo medido continua sendo 30 s
+        outro = self._novo_agregador()
+        for i in range(10):
+            (self.agregador, outro)[i % 2].registrar(1, self.inicio + timedelta(seconds=30 * i), lado='L')
+        acumulados = [a for agregador in (self.agregador, outro) for (ag_id, _), a in agregador._pendentes.items() if ag_id == 10]
+        self.assertEqual(sum(a.ciclos for a in acumulados), 10)
+        self.assertEqual(sum(a.intervalos for a in acumulados), 9)
+        self.assertEqual(sum(a.soma_intervalos for a in acumulados), 9 * 30)
+
+    def test_lote_de_sinais(self):
+        sinais = [(1, self.inicio + timedelta(seconds=30 * i), 1, 'R') for i in range(3)] + [(2, self.inicio, 1, None)]
+        self.assertEqual(self.agregador.registrar_varios(sinais), [1, 1, 1, 0])
+        acumulados = [a for (ag_id, _), a in self.agregador._pendentes.items() if ag_id == 11]
+        self.assertEqual(sum(a.intervalos for a in acumulados), 2)
+
+    def test_sinal_sem_lado_vale_para_os_dois_lados_e_maquina_parada_e_ignorada(self):
+        self.assertEqual(self.agregador.registrar(1, self.inicio), 2)
+        self.assertEqual(self.agregador.registrar(1, self.inicio, lado='L'), 1)
+        self.assertEqual(self.agregador.registrar(2, self.inicio), 0)
+
+    def test_sinais_invalidos(self):
+        agora = self.inicio
+        self.assertEqual(ler_sinal({'maquina_id': '3'}, agora), (3, agora, 1, None))
+        for sinal in ({}, {'maquina_id': 1, 'pecas': 0}, {'maquina_id': 1, 'lado': 'X'}, {'maquina_id': 1, 'momento': '2026-01-02T00:00:00+00:00'}):
+            with self.subTest(sinal=sinal), self.assertRaises(EventoInvalido):
+                ler_sinal(sinal, agora)
+
+
+class ImportacaoPlanilhaTests(SimpleTestCase):
+    def _csv(self, texto):
+        return io.BytesIO(texto.encode('utf-8-sig'))
+
+    def test_le_csv_com_ponto_e_virgula_e_rotulos_no_cabecalho(self):
+        cabecalho = ';'.join(CAMPOS_PN).replace('pn_code', 'PN')
+        linha = 'Cliente A;PN-1;Tampa;Tampa;Própria;5;10;12;11;30;2;1;2;3'
+        linhas = list(ler_planilha(self._csv(f"{cabecalho}\n{linha}\n;;;;;;;;;;;;;\n"), 'csv', Pn, CAMPOS_PN))
+        self.assertEqual(len(linhas), 1)
+        numero, dados = linhas[0]
+        self.assertEqual(numero, 2)
+        self.assertEqual(dados['pn_code'], 'PN-1')
+        self.assertEqual(dados['cycle_time_seconds'], '30')
+
+    def test_coluna_ausente(self):
+        with self.assertRaises(ErroImportacao):
+            list(ler_planilha(self._csv("pn_code,description\nPN-1,Tampa\n"), 'csv', Pn, CAMPOS_PN))
+
+    def test_limpar_linha_converte_e_relata_erros(self):
+        valores, erros = limpar_linha(Pn, {'pn_code': ' PN-1 ', 'cavity': '4', 'capacity_liters': '2.5'})
+        self.assertEqual(erros, [])
+        self.assertEqual(valores['pn_code'], 'PN-1')
+        self.assertEqual(valores['cavity'], 4)
+
+        _, erros = limpar_linha(Pn, {'pn_code': '', 'cavity': 'quatro'})
+        self.assertEqual(len(erros), 2)
+
+    def test_limpar_linha_normaliza_numeros(self):
+        # Float do XLSX, vírgula decimal do CSV e milhar
+        valores, erros = limpar_linha(Pn, {'capacity_liters': 2.3, 'dim_c': '1,5', 'dim_a': '1.500', 'cavity': 4.0, 'cycle_time_seconds': '30'})
+        self.assertEqual(erros, [])
+        self.assertEqual(valores['capacity_liters'], Decimal('2.3'))
+        self.assertEqual(valores['dim_c'], Decimal('1.5'))
+        self.assertEqual(valores['dim_a'], Decimal('1500'))
+        self.assertEqual((valores['cavity'], valores['cycle_time_seconds']), (4, 30))
+
+        # Campo inteiro recusa fração em vez de truncar
+        for valor in (30.5, '30,5'):
+            with self.subTest(valor=valor):
+                valores, erros = limpar_linha(Pn, {'cycle_time_seconds': valor})
+                self.assertNotIn('cycle_time_seconds', valores)
+                self.assertEqual(len(erros), 1)
+        _, erros = limpar_linha(Pn, {'capacity_liters': 2.345, 'dim_c': float('nan')})
+        self.assertEqual(len(erros), 2)
+
+    def test_em_lotes(self):
+        self.assertEqual([len(lote) for lote in em_lotes(range(7), 3)], [3, 3, 1])
+
+    def test_numeros_e_datas_do_erp(self):
+        self.assertEqual(_numero('1.500'), 1500)
+        self.assertEqual(_numero('2,5'), 2.5)
+        self.assertEqual(_numero(300), 300)
+        self.assertTrue(math.isnan(_numero('dez')))
+        self.assertEqual(_data_iso('05/11/2026'), '2026-11-05')
+        self.assertEqual(_data_iso('2026-11-05 00:00:00'), '2026-11-05')
+        self.assertEqual(_data_iso(datetime(2026, 11, 5, 8)), '2026-11-05')
+        self.assertEqual(_data_iso('31/02/2026'), 'NaT')
+
+    def test_dataset_das_ops(self):
+        dataset = carregar_dataset('PN;Quantidade;Entrega\nPN-1;100;05/11/2026\n'.encode('utf-8-sig'), 'csv')
+        self.assertEqual(dataset.headers, ['PN', 'Quantidade', 'Entrega'])
+        self.assertEqual(dataset[0], ('PN-1', '100', '05/11/2026'))
+        with self.assertRaises(ErroImportacao):
+            carregar_dataset('a,b\n1,2,3\n'.encode(), 'csv')
+
+
+class ExportacaoTests(SimpleTestCase):
+    def test_csv_em_pedacos_com_cabecalho_e_datas_locais(self):
+        momento = datetime(2026, 3, 2, 8, 30, tzinfo=dt_timezone(timedelta(hours=-3)))
+        linhas = ([i, momento, 5, None, None, None, 'M1', 'L', 7, 'PN-1', 'C', 'op'] for i in range(5))
+        pedacos = list(csv_em_streaming('producao', linhas, tamanho_bloco=2))
+        self.assertEqual(len(pedacos), 4)  # cabeçalho + 3 blocos
+        texto = b''.join(pedacos).decode('utf-8-sig').splitlines()
+        self.assertEqual(texto[0].split(','), colunas('producao'))
+        self.assertEqual(texto[1], '0,2026-03-02 08:30:00,5,,,,M1,L,7,PN-1,C,op')
+        self.assertEqual(len(texto), 6)
+
+    def test_colunas_tem_tipos_conhecidos(self):
+        for fonte, (_, _, definicao) in FONTES_EXPORTACAO.items():
+            with self.subTest(fonte=fonte):
+                self.assertEqual(len(set(colunas(fonte))), len(definicao))
+                self.assertTrue({tipo for _, _, tipo in definicao} <= {'inteiro', 'decimal', 'minutos', 'texto', 'data_hora'})
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow não instalado')
+    def test_parquet_gerado_e_lido_de_volta(self):
+        import pyarrow.parquet as pq
+        momento = datetime(2026, 3, 2, 8, 30, tzinfo=dt_timezone(timedelta(hours=-3)))
+        linhas = [[i, momento, 5, 3, 12.5, 2, 'M1', 'L', 7, 'PN-1', 'C', None] for i in range(5)]
+        arquivo = b''.join(parquet_em_streaming('producao', iter(linhas), tamanho_bloco=2))
+        tabela = pq.read_table(io.BytesIO(arquivo))
+        self.assertEqual(tabela.column_names, colunas('producao'))
+        self.assertEqual(pq.ParquetFile(io.BytesIO(arquivo)).num_row_groups, 3)
+        lidas = tabela.to_pylist()
+        self.assertEqual([linha['id'] for linha in lidas], list(range(5)))
+        self.assertEqual(lidas[0]['data_apontamento'], momento)
+        self.assertEqual(
+            {k: lidas[0][k] for k in ('quantidade', 'ciclos', 'tempo_ciclo_real_segundos', 'intervalos', 'maquina', 'operador')},
+            {'quantidade': 5, 'ciclos': 3, 'tempo_ciclo_real_segundos': 12.5, 'intervalos': 2, 'maquina': 'M1', 'operador': None},
+        )
+
+    def test_saida_parquet_mantem_posicao_ao_retirar(self):
+        saida = _SaidaParquet()
+        saida.write(b'PAR1')
+        self.assertEqual(saida.retirar(), b'PAR1')
+        saida.write(memoryview(b'abc'))
+        self.assertEqual(saida.tell(), 7)
+        self.assertEqual(saida.retirar(), b'abc')
+
+
+class ArquivoTests(SimpleTestCase):
+    def test_data_de_corte_respeita_o_fim_do_mes(self):
+        agora = datetime(2026, 3, 31, 15, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(data_de_corte(1, agora).date(), date(2026, 2, 28))
+        self.assertEqual(data_de_corte(6, agora).date(), date(2025, 9, 30))
+        self.assertEqual(data_de_corte(15, agora).date(), date(2024, 12, 31))
+
+    def test_arquivo_tem_as_colunas_da_tabela_viva(self):
+        # O INSERT ... SELECT usa as colunas do arquivo nas duas tabelas
+        for modelo, arquivo in ARQUIVOS:
+            with self.subTest(modelo=modelo.__name__):
+                vivas = {campo.column for campo in modelo._meta.concrete_fields}
+                arquivadas = {campo.column for campo in arquivo._meta.concrete_fields}
+                self.assertEqual(vivas, arquivadas)
+
+
+class ComparacaoCiclosTests(TestCase):
+
+    def test_ciclo_real_e_a_media_de_todos_os_intervalos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            op = OrdemProducao.objects.create(pn=_criar_pn(cycle_time_seconds=40), quantity=1000, delivery_date=date(2026, 12, 1), status='Em Produção')
+            inicio = timezone.now() - timedelta(hours=3)
+            agendamento = Agendamento.objects.create(
+                ordem_producao=op, maquina=_criar_maquina(), lado='L',
+                start_datetime=inicio, end_datetime=inicio + timedelta(hours=10), real_start_datetime=inicio,
+            )
+            ApontamentoProducao.objects.bulk_create([
+                # Hora com paradas: 10 ciclos, só 1 intervalo na média
+                ApontamentoProducao(agendamento=agendamento, quantidade=10, data_apontamento=inicio + timedelta(hours=1),
+                                    ciclos=10, intervalos=1, tempo_ciclo_real_segundos=100),
+                ApontamentoProducao(agendamento=agendamento, quantidade=10, data_apontamento=inicio + timedelta(hours=2),
+                                    ciclos=10, intervalos=9, tempo_ciclo_real_segundos=40),
+                # Gravado antes do campo intervalos: pesa pelos ciclos
+                ApontamentoProducao(agendamento=agendamento, quantidade=10, data_apontamento=inicio + timedelta(hours=3),
+                                    ciclos=10, tempo_ciclo_real_segundos=40),
+                # Apontamento manual, fora da comparação
+                ApontamentoProducao(agendamento=agendamento, quantidade=50, data_apontamento=inicio + timedelta(hours=3)),
+            ])
+
+        [linha] = comparar_tempos_de_ciclo()
+        # (1 x 100 + 9 x 40 + 10 x 40) / 20; pesando pelos ciclos daria 60
+        self.assertEqual(linha['ciclo_real_segundos'], 43)
+        self.assertEqual(linha['ciclos'], 30)
+        self.assertEqual(linha['desvio_percentual'], 7.5)
+
+
+class AgendamentoApiTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.maquina = _criar_maquina()
+        # 100 peças de 36 s: uma hora de produção
+        self.op = OrdemProducao.objects.create(pn=_criar_pn(), quantity=100, delivery_date=date(2026, 12, 1))
+
+    def test_salvar_agendamento_grava_datas_com_fuso(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = _post_json(self.client, 'salvar_agendamento_api', {
+                'op_id': self.op.id, 'maquina_id': self.maquina.id,
+                'start_date': '2026-11-02', 'start_hour': 8, 'lado': 'L',
+            })
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+
+        agendamento = Agendamento.objects.get(ordem_producao=self.op)
+        self.assertTrue(timezone.is_aware(agendamento.start_datetime))
+        self.assertEqual(timezone.localtime(agendamento.start_datetime).replace(tzinfo=None), datetime(2026, 11, 2, 8))
+        self.assertEqual(agendamento.end_datetime - agendamento.start_datetime, timedelta(hours=1))
+        self.op.refresh_from_db()
+        self.assertEqual(self.op.status, 'Planejada')
+
+    def test_op_agendada_pela_api_pode_ser_iniciada_e_apontada(self):
+        _post_json(self.client, 'salvar_agendamento_api', {
+            'op_id': self.op.id, 'maquina_id': self.maquina.id,
+            'start_date': '2026-11-02', 'start_hour': 8, 'lado': 'R',
+        })
+        agendamento = Agendamento.objects.get(ordem_producao=self.op)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = _post_json(self.client, 'iniciar_op_api', {'maquina_id': self.maquina.id})
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = _post_json(self.client, 'apontar_producao_api', {'agendamento_id': agendamento.id, 'quantidade': 10})
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        self.assertEqual(resposta.json()['nova_quantidade_produzida'], 10)
+
+
+class PreenchimentoRollupTests(TestCase):
+    """O consolidado preenchido pela migração 0028 dá o mesmo OEE que os eventos brutos."""
+
+    def setUp(self):
+        self.agora = timezone.make_aware(datetime(2026, 3, 2, 14, 25))
+        self.inicio_real = self.agora - timedelta(hours=5, minutes=20)
+        maquina = _criar_maquina()
+        op = OrdemProducao.objects.create(
+            pn=_criar_pn(), quantity=1000, delivery_date=date(2026, 3, 10),
+            status='Em Produção', quantidade_produzida=400,
+        )
+        self.agendamento = Agendamento.objects.create(
+            ordem_producao=op, maquina=maquina, lado='L',
+            start_datetime=self.inicio_real, end_datetime=self.agora + timedelta(hours=5),
+            real_start_datetime=self.inicio_real,
+        )
+        almoco = TipoParada.objects.create(codigo='P01', descricao='Almoço', classificacao_parada='PLANEJADA')
+        quebra = TipoParada.objects.create(codigo='N01', descricao='Quebra', classificacao_parada='NÃO PLANEJADA')
+        rebarba = TipoRefugo.objects.create(codigo='R01', descricao='Rebarba')
+
+        # Eventos gravados antes do consolidado existir (bulk_create não passa pelos signals)
+        def em(minutos):
+            return self.inicio_real + timedelta(minutes=minutos)
+        self.paradas = [
+            (em(50), em(110), almoco),
+            (em(100), em(130), quebra),
+            (em(200), em(215), quebra),
+            (em(310), em(318), quebra),
+        ]
+        Parada.objects.bulk_create(
+            Parada(agendamento=self.agendamento, tipo_parada=tipo, inicio_parada=inicio, fim_parada=fim)
+            for inicio, fim, tipo in self.paradas
+        )
+        Refugo.objects.bulk_create(
+            Refugo(agendamento=self.agendamento, tipo_refugo=rebarba, quantidade=quantidade, data_apontamento=em(minutos))
+            for minutos, quantidade in ((10, 3), (140, 5), (305, 2))
+        )
+
+    def _preencher_pela_migracao(self):
+        migracao = importlib.import_module('meu_sistema_producao.producao.migrations.0028_preencher_oee_rollup')
+        migracao.preencher_rollup(apps, None)
+
+    def _kpis_dos_eventos_brutos(self):
+        planejada, nao_planejada = tempos_de_parada(
+            [(inicio, fim, tipo.classificacao_parada) for inicio, fim, tipo in self.paradas],
+            self.inicio_real, self.agora,
+        )
+        return calcular_kpis([{
+            'pecas_boas': 400,
+            'pecas_ruins': 10,
+            'real_start_datetime': self.inicio_real,
+            'ciclo_segundos': 36,
+            'parada_planejada_segundos': planejada.total_seconds(),
+            'parada_nao_planejada_segundos': nao_planejada.total_seconds(),
+        }], self.agora)
+
+    def test_oee_do_consolidado_preenchido_igual_ao_dos_eventos(self):
+        self.assertFalse(OeeRollupHora.objects.exists())
+        self._preencher_pela_migracao()
+
+        kpis = calcular_kpis_maquinas(agora=self.agora)[0]
+        esperado = self._kpis_dos_eventos_brutos()
+        for indicador in ('oee', 'disponibilidade', 'eficiencia', 'qualidade'):
+            self.assertAlmostEqual(kpis[indicador], esperado[indicador], places=6)
+        self.assertLess(kpis['qualidade'], 100)
+
+    def test_migracao_grava_os_mesmos_baldes_da_reconstrucao(self):
+        def baldes():
+            return list(OeeRollupHora.objects.order_by('hora').values_list(
+                'maquina_id', 'agendamento_id', 'hora', 'pecas_boas', 'pecas_refugo', 'parada_planejada', 'parada_nao_planejada',
+            ))
+        ApontamentoProducao.objects.bulk_create(
+            ApontamentoProducao(agendamento=self.agendamento, quantidade=50, data_apontamento=self.inicio_real + timedelta(minutes=m))
+            for m in (20, 80, 260)
+        )
+        self._preencher_pela_migracao()
+        pela_migracao = baldes()
+        reconstruir_rollup()
+        self.assertEqual(pela_migracao, baldes())
+
+
+class KpisMaquinasTests(TestCase):
+    """OEE por máquina conferido com valores calculados à mão."""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('gerente', password='x'))
+        self.agora = timezone.make_aware(datetime(2026, 3, 2, 14, 30))
+
+        def em(hora, minuto=0):
+            return timezone.make_aware(datetime(2026, 3, 2, hora, minuto))
+
+        def agendamento(maquina, lado, pn, inicio, boas):
+            op = OrdemProducao.objects.create(
+                pn=pn, quantity=1000, delivery_date=date(2026, 3, 10), status='Em Produção', quantidade_produzida=boas,
+            )
+            return Agendamento.objects.create(
+                ordem_producao=op, maquina=maquina, lado=lado,
+                start_datetime=inicio, end_datetime=inicio + timedelta(hours=10), real_start_datetime=inicio,
+            )
+
+        almoco = TipoParada.objects.create(codigo='P01', descricao='Almoço', classificacao_parada='PLANEJADA')
+        quebra = TipoParada.objects.create(codigo='N01', descricao='Quebra', classificacao_parada='NÃO PLANEJADA')
+        sem_classificacao = TipoParada.objects.create(codigo='X01', descricao='Outros')
+        rebarba = TipoRefugo.objects.create(codigo='R01', descricao='Rebarba')
+        pn_36 = _criar_pn('PN-36', cycle_time_seconds=36)
+        pn_60 = _criar_pn('PN-60', cycle_time_seconds=60)
+        self.m1, self.m2, self.m3 = (_criar_maquina(f'M-0{i}') for i in (1, 2, 3))
+
+        # M-01: um agendamento desde 08:30 (6 h até agora)
+        a1 = agendamento(self.m1, 'L', pn_36, em(8, 30), boas=252)
+        # M-02: lado L desde 12:30 (2 h) e lado R desde 13:30 (1 h)
+        a2 = agendamento(self.m2, 'L', pn_36, em(12, 30), boas=135)
+        a3 = agendamento(self.m2, 'R', pn_60, em(13, 30), boas=27)
+        # M-03: só uma OP planejada, sem produção
+        OrdemProducao.objects.create(pn=pn_36, quantity=100, delivery_date=date(2026, 3, 10), status='Planejada')
+
+        Parada.objects.bulk_create(
+            Parada(agendamento=ag, tipo_parada=tipo, inicio_parada=inicio, fim_parada=fim)
+            for ag, tipo, inicio, fim in (
+                (a1, quebra, em(8), em(8, 45)),          # antes do início real: conta 08:30-08:45
+                (a1, almoco, em(11), em(12)),
+                (a1, quebra, em(11, 30), em(12, 30)),    # sob o almoço até 12:00
+                (a1, quebra, em(12, 15), em(12, 45)),    # duplicada: mescla até 12:45
+                (a1, sem_classificacao, em(13), em(13, 30)),  # fora do OEE
+                (a1, quebra, em(14), em(15)),            # ainda aberta: conta até agora
+                (a2, quebra, em(13), em(13, 30)),
+                (a3, almoco, em(14), em(14, 30)),
+            )
+        )
+        Refugo.objects.bulk_create(
+            Refugo(agendamento=ag, tipo_refugo=rebarba, quantidade=quantidade, data_apontamento=momento)
+            for ag, quantidade, momento in ((a1, 20, em(9, 10)), (a1, 8, em(14, 5)), (a2, 15, em(13, 40)), (a3, 3, em(14, 10)))
+        )
+        reconstruir_rollup()
+
+        # M-01: bruto 21600 s; planejada 3600 s; não planejada 15 + 45 + 30 min = 5400 s
+        #   TPP 18000 s, TO 12600 s -> disponibilidade 70 %
+        #   teóricas 12600 / 36 = 350; brutas 252 + 28 = 280 -> eficiência 80 %
+        #   qualidade 252 / 280 = 90 %; OEE 0,7 x 0,8 x 0,9 = 50,4 %
+        # M-02: bruto 7200 + 3600 s; planejada 1800 s; não planejada 1800 s
+        #   TPP 9000 s, TO 7200 s -> disponibilidade 80 %
+        #   teóricas 5400 / 36 + 1800 / 60 = 180; brutas 150 + 30 = 180 -> eficiência 100 %
+        #   qualidade 162 / 180 = 90 %; OEE 0,8 x 1 x 0,9 = 72 %
+        self.esperado = [
+            {'id': self.m1.id, 'status': 'Ativa', 'nome': 'M-01', 'oee': 50.4, 'disponibilidade': 70, 'eficiencia': 80, 'qualidade': 90},
+            {'id': self.m2.id, 'status': 'Ativa', 'nome': 'M-02', 'oee': 72, 'disponibilidade': 80, 'eficiencia': 100, 'qualidade': 90},
+            {'id': self.m3.id, 'status': 'Inativa', 'nome': 'M-03', 'oee': 0, 'disponibilidade': 0, 'eficiencia': 0, 'qualidade': 0},
+        ]
+
+    def _conferir(self, maquinas_com_kpi):
+        self.assertEqual(len(maquinas_com_kpi), len(self.esperado))
+        for kpis, esperado in zip(maquinas_com_kpi, self.esperado):
+            with self.subTest(maquina=esperado['nome']):
+                for chave in ('id', 'status', 'nome'):
+                    self.assertEqual(kpis[chave], esperado[chave])
+                for indicador in ('oee', 'disponibilidade', 'eficiencia', 'qualidade'):
+                    self.assertAlmostEqual(kpis[indicador], esperado[indicador], places=6)
+
+    def test_kpis_por_maquina(self):
+        self._conferir(calcular_kpis_maquinas(agora=self.agora))
+
+    def test_tela_de_gerenciamento(self):
+        with mock.patch('meu_sistema_producao.producao.oee.timezone', mock.Mock(now=lambda: self.agora)):
+            resposta = self.client.get(reverse('gerenciamento_view'))
+        self.assertEqual(resposta.status_code, 200)
+        self._conferir(resposta.context['maquinas_com_kpi'])
+
+
+class ApontamentoIdempotenteTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('operador', password='x'))
+        maquina = _criar_maquina()
+        pn = _criar_pn()
+        self.agendamentos = []
+        for lado in ('L', 'R'):
+            op = OrdemProducao.objects.create(pn=pn, quantity=100, delivery_date=date(2026, 12, 1), status='Em Produção')
+            inicio = timezone.now() - timedelta(hours=1)
+            self.agendamentos.append(Agendamento.objects.create(
+                ordem_producao=op, maquina=maquina, lado=lado,
+                start_datetime=inicio, end_datetime=inicio + timedelta(hours=2), real_start_datetime=inicio,
+            ))
+
+    def _apontar(self, agendamento, quantidade, chave):
+        with self.captureOnCommitCallbacks(execute=True):
+            return _post_json(self.client, 'apontar_producao_api', {
+                'agendamento_id': agendamento.id, 'quantidade': quantidade, 'chave_idempotencia': chave,
+            })
+
+    def test_reenvio_com_a_mesma_chave_nao_soma_de_novo(self):
+        agendamento = self.agendamentos[0]
+        primeira = self._apontar(agendamento, 7, 'terminal-1:0001')
+        segunda = self._apontar(agendamento, 7, 'terminal-1:0001')
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertTrue(segunda.json()['duplicado'])
+        self.assertEqual(segunda.json()['nova_quantidade_produzida'], 7)
+        self.assertEqual(ApontamentoProducao.objects.filter(agendamento=agendamento).count(), 1)
+
+    def test_chave_reaproveitada_com_outros_dados_e_recusada(self):
+        self._apontar(self.agendamentos[0], 7, 'terminal-1:0002')
+        for agendamento, quantidade in ((self.agendamentos[0], 8), (self.agendamentos[1], 7)):
+            with self.subTest(agendamento=agendamento.id, quantidade=quantidade):
+                resposta = self._apontar(agendamento, quantidade, 'terminal-1:0002')
+                self.assertEqual(resposta.status_code, 409)
+        self.assertEqual(ApontamentoProducao.objects.count(), 1)
+        self.assertEqual(
+            list(OrdemProducao.objects.order_by('id').values_list('quantidade_produzida', flat=True)), [7, 0],
+        )
+
+    def test_chave_que_nao_e_texto_e_recusada(self):
+        for chave in (123, ['a'], {'a': 1}):
+            with self.subTest(chave=chave):
+                self.assertEqual(self._apontar(self.agendamentos[0], 1, chave).status_code, 400)
+        self.assertEqual(self._apontar(self.agendamentos[0], 'muitas', 'terminal-1:0003').status_code, 400)
+        self.assertFalse(ApontamentoProducao.objects.exists())
+
+
+class HistoricoAoGravarEventosTests(TestCase):
+    """O balde do turno atual é reconsolidado depois do commit de cada evento."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('operador', password='x'))
+        self.maquina = _criar_maquina()
+        op = OrdemProducao.objects.create(pn=_criar_pn(), quantity=1000, delivery_date=date(2026, 12, 1), status='Em Produção')
+        inicio = timezone.now() - timedelta(hours=2)
+        self.agendamento = Agendamento.objects.create(
+            ordem_producao=op, maquina=self.maquina, lado='L',
+            start_datetime=inicio, end_datetime=inicio + timedelta(hours=10), real_start_datetime=inicio,
+        )
+
+    def _totais(self):
+        return OeeHistorico.objects.filter(maquina=self.maquina, granularidade='HORA').aggregate(
+            boas=Sum('pecas_boas'), nao_planejada=Sum('parada_nao_planejada_segundos'),
+        )
+
+    def test_apontamento_e_parada_pela_api(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _post_json(self.client, 'apontar_producao_api', {'agendamento_id': self.agendamento.id, 'quantidade': 12})
+        self.assertEqual(self._totais()['boas'], 12)
+
+        tipo = TipoParada.objects.create(codigo='N01', descricao='Quebra', classificacao_parada='NÃO PLANEJADA')
+        fim = timezone.localtime().replace(second=0, microsecond=0, tzinfo=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = _post_json(self.client, 'registrar_parada_api', {
+                'agendamento_id': self.agendamento.id, 'tipo_parada_id': tipo.id,
+                'inicio_parada': (fim - timedelta(minutes=20)).isoformat(), 'fim_parada': fim.isoformat(),
+            })
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        self.assertEqual(self._totais()['nao_planejada'], 20 * 60)
+
+    def test_ingestao_em_lote(self):
+        agendamento = Agendamento.objects.select_related('ordem_producao').get(pk=self.agendamento.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            gravar_eventos([
+                ApontamentoProducao(agendamento=agendamento, quantidade=5, data_apontamento=timezone.now() - timedelta(minutes=m))
+                for m in (5, 65)
+            ])
+        self.assertEqual(self._totais()['boas'], 10)
+
+
+class HistoricoIncrementalTests(TestCase):
+    """Uma escrita refaz só os baldes das horas tocadas, com o mesmo resultado da consolidação completa."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('operador', password='x'))
+        self.maquina = _criar_maquina()
+        self.op = OrdemProducao.objects.create(pn=_criar_pn(), quantity=1000, delivery_date=date(2026, 3, 10), status='Em Produção')
+        self.inicio = timezone.make_aware(datetime(2026, 3, 2, 7, 0))
+        self.fim = timezone.make_aware(datetime(2026, 3, 2, 17, 0))
+        self.agendamento = Agendamento.objects.create(
+            ordem_producao=self.op, maquina=self.maquina, lado='L',
+            start_datetime=self.inicio, end_datetime=self.fim,
+            real_start_datetime=self.inicio, real_end_datetime=self.fim,
+        )
+        quebra = TipoParada.objects.create(codigo='N01', descricao='Quebra', classificacao_parada='NÃO PLANEJADA')
+        ApontamentoProducao.objects.bulk_create(
+            ApontamentoProducao(agendamento=self.agendamento, quantidade=10, data_apontamento=self.inicio + timedelta(minutes=m))
+            for m in (30, 150, 400)
+        )
+        Parada.objects.bulk_create([Parada(
+            agendamento=self.agendamento, tipo_parada=quebra,
+            inicio_parada=self.inicio + timedelta(minutes=200), fim_parada=self.inicio + timedelta(minutes=250),
+        )])
+        reconstruir_rollup()
+        consolidar_historico(self.inicio, self.fim)
+
+    def _baldes(self):
+        return {
+            (linha.pop('granularidade'), linha.pop('inicio')): linha
+            for linha in OeeHistorico.objects.values(
+                'id', 'granularidade', 'inicio', 'turno', 'tempo_bruto_segundos', 'parada_planejada_segundos',
+                'parada_nao_planejada_segundos', 'pecas_boas', 'pecas_refugo', 'pecas_teoricas',
+            )
+        }
+
+    def _sem_ids(self, baldes):
+        return {chave: {k: v for k, v in valores.items() if k != 'id'} for chave, valores in baldes.items()}
+
+    def test_edicao_refaz_so_as_horas_antiga_e_nova(self):
+        antes = self._baldes()
+        apontamento = ApontamentoProducao.objects.get(data_apontamento=self.inicio + timedelta(minutes=30))
+        with self.captureOnCommitCallbacks(execute=True):
+            apontamento.data_apontamento = self.inicio + timedelta(minutes=520)  # 07:30 -> 15:40, outro turno
+            apontamento.save()
+        depois = self._baldes()
+
+        hora_antiga = inicio_da_hora(self.inicio)
+        hora_nova = inicio_da_hora(self.inicio + timedelta(minutes=520))
+        self.assertEqual(depois[('HORA', hora_antiga)]['pecas_boas'], 0)
+        self.assertEqual(depois[('HORA', hora_nova)]['pecas_boas'], 10)
+        # As outras horas não foram regravadas
+        for (granularidade, momento), valores in antes.items():
+            if granularidade == 'HORA' and momento not in (hora_antiga, hora_nova):
+                self.assertEqual(depois[(granularidade, momento)]['id'], valores['id'])
+
+        consolidar_historico(self.inicio, self.fim)
+        self.assertEqual(self._sem_ids(depois), self._sem_ids(self._baldes()))
+
+    def test_exclusao_de_parada_refaz_as_horas_dela(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Parada.objects.get().delete()
+        incremental = self._sem_ids(self._baldes())
+        consolidar_historico(self.inicio, self.fim)
+        self.assertEqual(incremental, self._sem_ids(self._baldes()))
+        self.assertFalse(OeeHistorico.objects.filter(parada_nao_planejada_segundos__gt=0).exists())
+
+    def test_finalizar_op_nao_refaz_a_execucao_inteira(self):
+        antes = self._baldes()
+        Agendamento.objects.filter(pk=self.agendamento.pk).update(real_end_datetime=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = _post_json(self.client, 'finalizar_op_api', {'op_id': self.op.id})
+        self.assertEqual(resposta.status_code, 200)
+        depois = self._baldes()
+        for chave, valores in antes.items():
+            if chave[0] == 'HORA':
+                self.assertEqual(depois[chave]['id'], valores['id'])
+
+    def test_api_valida_maquina_id(self):
+        url = reverse('get_oee_historico_api')
+        periodo = {'inicio': '2026-03-02', 'fim': '2026-03-02', 'granularidade': 'turno'}
+        self.assertEqual(self.client.get(url, {**periodo, 'maquina_id': 'abc'}).status_code, 400)
+        resposta = self.client.get(url, {**periodo, 'maquina_id': [self.maquina.id]})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([serie['maquina_id'] for serie in resposta.json()['series']], [self.maquina.id])
+
+
+class EtagDashboardTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('gerente', password='x'))
+        maquina = _criar_maquina()
+        op = OrdemProducao.objects.create(pn=_criar_pn(), quantity=100, delivery_date=date(2026, 12, 1), status='Em Produção')
+        inicio = timezone.now() - timedelta(hours=1)
+        self.agendamento = Agendamento.objects.create(
+            ordem_producao=op, maquina=maquina, lado='L',
+            start_datetime=inicio, end_datetime=inicio + timedelta(hours=2), real_start_datetime=inicio,
+        )
+
+    def test_get_condicional_responde_304_ate_uma_escrita(self):
+        primeira = self.client.get(reverse('get_gerenciamento_data_api'))
+        self.assertEqual(primeira.status_code, 200)
+        etag = primeira['ETag']
+
+        repetida = self.client.get(reverse('get_gerenciamento_data_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repetida.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _post_json(self.client, 'apontar_producao_api', {'agendamento_id': self.agendamento.id, 'quantidade': 5})
+        depois = self.client.get(reverse('get_gerenciamento_data_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(depois.status_code, 200)
+        self.assertNotEqual(depois['ETag'], etag)
+
+    def test_contador_do_dashboard_e_dividido_em_partes(self):
+        ContadorVersao.objects.create(chave=VERSAO_DASHBOARD, versao=7)
+        for _ in range(40):
+            with self.captureOnCommitCallbacks(execute=True):
+                incrementar_versao(VERSAO_DASHBOARD)
+        self.assertEqual(obter_versao(VERSAO_DASHBOARD), 47)
+        partes = ContadorVersao.objects.filter(chave__startswith=f'{VERSAO_DASHBOARD}:')
+        self.assertGreater(partes.count(), 1)
+        self.assertLessEqual(partes.count(), PARTES[VERSAO_DASHBOARD])
+
+
+class StreamDashboardTests(TestCase):
+    """O stream SSE também recebe as escritas atendidas por outro worker."""
+
+    def setUp(self):
+        cache.clear()
+        self.maquina = _criar_maquina()
+
+    def _ler(self, antes_do_evento):
+        async def ler():
+            fila = asyncio.Queue()
+            stream = _stream_kpis((None, fila))
+            try:
+                self.assertEqual(await stream.__anext__(), 'retry: 5000\n\n')
+                await antes_do_evento(fila)
+                return await asyncio.wait_for(stream.__anext__(), timeout=5)
+            finally:
+                await stream.aclose()
+        evento = async_to_sync(ler)()
+        self.assertTrue(evento.startswith('event: kpis\ndata: '), evento)
+        return json.loads(evento.split('data: ', 1)[1])
+
+    @override_settings(SSE_VERIFICACAO_SEGUNDOS=0.01, SSE_KEEPALIVE_SEGUNDOS=3600)
+    def test_escrita_de_outro_worker_chega_pelo_contador_de_versao(self):
+        async def escrita_em_outro_processo(fila):
+            # Só o contador do banco muda: o difusor deste processo não publica nada
+            await sync_to_async(ContadorVersao.objects.create)(chave=f'{VERSAO_DASHBOARD}:3', versao=1)
+        dados = self._ler(escrita_em_outro_processo)
+        self.assertEqual([maquina['id'] for maquina in dados['maquinas']], [self.maquina.id])
+
+    @override_settings(SSE_VERIFICACAO_SEGUNDOS=3600)
+    def test_publicacao_local_e_repassada(self):
+        async def publicar(fila):
+            fila.put_nowait({'maquinas': [{'id': self.maquina.id, 'oee': 50}]})
+        self.assertEqual(self._ler(publicar), {'maquinas': [{'id': self.maquina.id, 'oee': 50}]})
+
+
+class ArquivamentoTests(TestCase):
+    """Movimentação para as tabelas de arquivo e leitura das duas tabelas juntas."""
+
+    def setUp(self):
+        self.agora = timezone.make_aware(datetime(2026, 10, 18, 12, 0))
+        self.maquina = _criar_maquina()
+        self.pn = _criar_pn()
+        self.tipo_parada = TipoParada.objects.create(codigo='N01', descricao='Quebra', classificacao_parada='NÃO PLANEJADA')
+        self.tipo_refugo = TipoRefugo.objects.create(codigo='R01', descricao='Rebarba')
+        # Concluída em janeiro, antes de real_end_datetime existir
+        self.antigo = self._agendamento_concluido(datetime(2026, 1, 10, 8), fim_real=None)
+        # Concluída em janeiro, com o fim real preenchido
+        self.antigo_com_fim = self._agendamento_concluido(datetime(2026, 1, 20, 8), fim_real=datetime(2026, 1, 20, 12))
+        # Concluída, sem fim real, mas com eventos recentes: fica na tabela viva
+        self.recente = self._agendamento_concluido(datetime(2026, 9, 1, 8), fim_real=None)
+
+    def _agendamento_concluido(self, inicio, fim_real):
+        inicio = timezone.make_aware(inicio)
+        op = OrdemProducao.objects.create(pn=self.pn, quantity=100, delivery_date=inicio.date(), status='Concluída')
+        agendamento = Agendamento.objects.create(
+            ordem_producao=op, maquina=self.maquina, lado='L',
+            start_datetime=inicio, end_datetime=inicio + timedelta(hours=1), real_start_datetime=inicio,
+            real_end_datetime=timezone.make_aware(fim_real) if fim_real else None,
+        )
+        # bulk_create: sem signals, como uma carga antiga
+        ApontamentoProducao.objects.bulk_create(
+            ApontamentoProducao(agendamento=agendamento, quantidade=10, data_apontamento=inicio + timedelta(hours=h))
+            for h in (1, 2, 3)
+        )
+        Parada.objects.bulk_create([Parada(
+            agendamento=agendamento, tipo_parada=self.tipo_parada,
+            inicio_parada=inicio + timedelta(minutes=30), fim_parada=inicio + timedelta(minutes=50),
+        )])
+        Refugo.objects.bulk_create([Refugo(
+            agendamento=agendamento, tipo_refugo=self.tipo_refugo, quantidade=2, data_apontamento=inicio + timedelta(hours=2),
+        )])
+        return agendamento
+
+    def _leituras(self):
+        inicio, fim = timezone.make_aware(datetime(2025, 12, 1)), self.agora
+        return {
+            'exportacao': {fonte: sorted(consultar(fonte, inicio, fim)) for fonte in FONTES_EXPORTACAO},
+            'pareto': [calcular_pareto(fonte, inicio, fim, 'tipo', None, None, None, None) for fonte in ('paradas', 'refugos')],
+            'unir': sorted(unir(ApontamentoProducao, lambda objetos: objetos.values_list('id', 'quantidade'))),
+        }
+
+    def test_seleciona_pelo_ultimo_evento_quando_nao_ha_fim_real(self):
+        corte = data_de_corte(6, self.agora)
+        self.assertEqual(agendamentos_para_arquivar(corte), [self.antigo.id, self.antigo_com_fim.id])
+
+    def test_move_os_eventos_e_os_relatorios_nao_mudam(self):
+        antes = self._leituras()
+        reconstruir_rollup()
+        rollup_antes = sorted(OeeRollupHora.objects.values_list('agendamento_id', 'hora', 'pecas_boas', 'pecas_refugo', 'parada_nao_planejada'))
+
+        simulacao = arquivar(6, tamanho_lote=1, dry_run=True, agora=self.agora)
+        self.assertEqual(ApontamentoProducao.objects.count(), 9)
+        resultado = arquivar(6, tamanho_lote=1, agora=self.agora)
+        self.assertEqual(resultado, simulacao)
+        self.assertEqual(resultado, {'agendamentos': 2, 'apontamentoproducao': 6, 'parada': 2, 'refugo': 2})
+
+        for modelo, _ in ARQUIVOS:
+            vivo, arquivado = com_arquivo(modelo)
+            with self.subTest(modelo=modelo.__name__):
+                self.assertEqual(set(vivo.values_list('agendamento_id', flat=True)), {self.recente.id})
+                self.assertEqual(set(arquivado.values_list('agendamento_id', flat=True)), {self.antigo.id, self.antigo_com_fim.id})
+
+        self.assertEqual(self._leituras(), antes)
+        reconstruir_rollup()
+        rollup_depois = sorted(OeeRollupHora.objects.values_list('agendamento_id', 'hora', 'pecas_boas', 'pecas_refugo', 'parada_nao_planejada'))
+        self.assertEqual(rollup_depois, rollup_antes)
+
+        # Uma segunda execução não encontra mais nada
+        self.assertEqual(arquivar(6, agora=self.agora)['agendamentos'], 0)
+
+
+class SnapshotQuadroTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('planejador', password='x'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.maquina = _criar_maquina()
+            self.pn = _criar_pn(cycle_time_seconds=36)
+            self.pn_sem_ciclo = _criar_pn('PN-SEM-CICLO', cycle_time_seconds=0)
+
+    def _op(self, status='Disponível', pn=None, quantity=100):
+        return OrdemProducao.objects.create(pn=pn or self.pn, quantity=quantity, delivery_date=date(2026, 11, 30), status=status)
+
+    def _agendar(self, op, inicio):
+        inicio = timezone.make_aware(inicio)
+        return Agendamento.objects.create(
+            ordem_producao=op, maquina=self.maquina, lado='L', start_datetime=inicio, end_datetime=inicio + timedelta(hours=1),
+        )
+
+    def test_numero_fixo_de_queries(self):
+        for i in range(3):
+            self._agendar(self._op('Planejada'), datetime(2026, 11, 2, 8 + i))
+        with self.assertNumQueries(4):
+            snapshot_quadro()
+        for i in range(10):
+            self._agendar(self._op('Planejada'), datetime(2026, 11, 3, 8 + i))
+            self._op()
+        with self.assertNumQueries(4):
+            snapshot_quadro()
+
+    def test_so_ops_em_aberto_com_duracao_calculada_no_banco(self):
+        disponivel = self._op(quantity=250)
+        sem_ciclo = self._op(pn=self.pn_sem_ciclo)
+        planejada = self._op('Planejada')
+        agendamento = self._agendar(planejada, datetime(2026, 11, 4, 14))
+        self._agendar(self._op('Concluída'), datetime(2026, 10, 1, 8))
+        self._agendar(self._op('Em Produção'), datetime(2026, 10, 20, 8))
+
+        quadro = self.client.get(reverse('get_quadro_planejamento_api')).json()
+        ordens = {ordem['id']: ordem for ordem in quadro['ordens']}
+        self.assertEqual(set(ordens), {disponivel.id, sem_ciclo.id, planejada.id})
+        for op in (disponivel, sem_ciclo, planejada):
+            with self.subTest(op=op.id):
+                self.assertAlmostEqual(ordens[op.id]['tempo_producao_horas'], op.get_duracao_horas())
+        self.assertEqual(ordens[disponivel.id]['maquinas_compativeis'], [self.maquina.id])
+
+        self.assertEqual(quadro['agendamentos'], [{
+            'id': agendamento.id, 'opId': planejada.id, 'maquinaId': self.maquina.id,
+            'day': 2, 'hour': 14, 'duration': 1.0, 'lado': 'L',
+        }])
+
+
+class AgendamentosLoteTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('planejador', password='x'))
+        self.maquina = _criar_maquina()
+        self.pn = _criar_pn(cycle_time_seconds=36)
+        self.ops = [
+            OrdemProducao.objects.create(pn=self.pn, quantity=100, delivery_date=date(2026, 11, 30), status='Planejada')
+            for _ in range(3)
+        ]
+        # Agendamentos de uma hora, das 8h às 11h do mesmo dia
+        self.agendamentos = [
+            Agendamento.objects.create(
+                ordem_producao=op, maquina=self.maquina, lado='L',
+                start_datetime=timezone.make_aware(datetime(2026, 11, 2, 8 + i)),
+                end_datetime=timezone.make_aware(datetime(2026, 11, 2, 9 + i)),
+            )
+            for i, op in enumerate(self.ops)
+        ]
+        self.nova_op = OrdemProducao.objects.create(pn=self.pn, quantity=100, delivery_date=date(2026, 11, 30))
+
+    def _quadro(self):
+        return (
+            list(Agendamento.objects.order_by('id').values_list('id', 'ordem_producao_id', 'maquina_id', 'start_datetime', 'lado')),
+            list(OrdemProducao.objects.order_by('id').values_list('id', 'status')),
+        )
+
+    def _mover(self, op, hora, data='2026-11-03'):
+        return {'acao': 'mover', 'op_id': op.id, 'maquina_id': self.maquina.id, 'start_date': data, 'start_hour': hora, 'lado': 'L'}
+
+    def test_lote_valido_e_aplicado(self):
+        resposta = _post_json(self.client, 'agendamentos_lote_api', {'operacoes': [
+            self._mover(self.ops[0], 8),
+            {'acao': 'remover', 'agendamento_id': self.agendamentos[1].id},
+            {'acao': 'criar', 'op_id': self.nova_op.id, 'maquina_id': self.maquina.id, 'start_date': '2026-11-02', 'start_hour': 8, 'lado': 'L'},
+        ]})
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        self.assertEqual(timezone.localtime(Agendamento.objects.get(ordem_producao=self.ops[0]).start_datetime).day, 3)
+        self.assertFalse(Agendamento.objects.filter(pk=self.agendamentos[1].pk).exists())
+        self.ops[1].refresh_from_db()
+        self.assertEqual(self.ops[1].status, 'Disponível')
+        self.assertTrue(Agendamento.objects.filter(ordem_producao=self.nova_op).exists())
+
+    def test_conflito_em_uma_operacao_nao_grava_nenhuma(self):
+        antes = self._quadro()
+        resposta = _post_json(self.client, 'agendamentos_lote_api', {'operacoes': [
+            self._mover(self.ops[0], 8),
+            # Cai em cima da OP 0 já movida no mesmo lote
+            self._mover(self.ops[1], 8),
+        ]})
+        self.assertEqual(resposta.status_code, 409)
+        resultados = resposta.json()['resultados']
+        self.assertEqual([r['status'] for r in resultados], ['nao_aplicado', 'erro'])
+        self.assertIn(f'OP-{self.ops[0].id}', resultados[1]['mensagem'])
+        self.assertEqual(self._quadro(), antes)
+
+    def test_falha_do_banco_no_meio_da_gravacao_desfaz_tudo(self):
+        antes = self._quadro()
+        operacoes = [
+            self._mover(self.ops[0], 8),
+            {'acao': 'remover', 'agendamento_id': self.agendamentos[1].id},
+            {'acao': 'criar', 'op_id': self.nova_op.id, 'maquina_id': self.maquina.id, 'start_date': '2026-11-04', 'start_hour': 8, 'lado': 'R'},
+        ]
+        # A invalidação do Pareto roda depois de todos os bulk_create/bulk_update/delete
+        with mock.patch('meu_sistema_producao.producao.planejamento.invalidar_pareto', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                aplicar_lote(operacoes)
+        self.assertEqual(self._quadro(), antes)
+
+    def test_mensagens_de_data_hora_e_ciclo(self):
+        pn_sem_ciclo = _criar_pn('PN-SEM-CICLO', cycle_time_seconds=0)
+        op_sem_ciclo = OrdemProducao.objects.create(pn=pn_sem_ciclo, quantity=10, delivery_date=date(2026, 11, 30))
+        ok, resultados = aplicar_lote([
+            self._mover(self.ops[0], 8, data='03/11/2026'),
+            self._mover(self.ops[1], 24),
+            self._mover(self.ops[2], None),
+            {'acao': 'criar', 'op_id': op_sem_ciclo.id, 'maquina_id': self.maquina.id, 'start_date': '2026-11-05', 'start_hour': 8},
+        ])
+        self.assertFalse(ok)
+        mensagens = [resultado['mensagem'] for resultado in resultados]
+        self.assertTrue(mensagens[0].startswith('Data inválida'), mensagens[0])
+        self.assertTrue(mensagens[1].startswith('Hora inválida'), mensagens[1])
+        self.assertTrue(mensagens[2].startswith('Hora inválida'), mensagens[2])
+        self.assertIn('tempo de ciclo', mensagens[3])
+
+
+class EstadoDaFabricaTests(TestCase):
+
+    def setUp(self):
+        self.m1 = _criar_maquina('M-01')
+        self.m2 = _criar_maquina('M-02')
+        self.pn = _criar_pn()
+        amanha = timezone.localdate() + timedelta(days=1)
+        self.amanha = lambda hora: timezone.make_aware(datetime.combine(amanha, datetime.min.time()).replace(hour=hora))
+
+        self.rodando = self._agendar(self.m1, 'L', timezone.now() - timedelta(hours=2), 'Em Produção')
+        self.proxima_l = self._agendar(self.m1, 'L', self.amanha(8))
+        self.segunda_l = self._agendar(self.m1, 'L', self.amanha(10))
+        self._agendar(self.m1, 'L', self.amanha(10) + timedelta(days=1))
+        self.proxima_r = self._agendar(self.m1, 'R', self.amanha(9))
+        self.proxima_m2 = self._agendar(self.m2, 'L', self.amanha(7))
+        # Planejada para ontem (atrasada) e concluída: fora da janela
+        self._agendar(self.m1, 'L', self.amanha(8) - timedelta(days=2))
+        self._agendar(self.m1, 'R', self.amanha(6), 'Concluída')
+
+    def _agendar(self, maquina, lado, inicio, status='Planejada'):
+        op = OrdemProducao.objects.create(pn=self.pn, quantity=100, delivery_date=date(2026, 12, 1), status=status)
+        return Agendamento.objects.create(
+            ordem_producao=op, maquina=maquina, lado=lado, start_datetime=inicio, end_datetime=inicio + timedelta(hours=1),
+        )
+
+    def _por_situacao(self, estado):
+        ops = estado['ops']
+        resultado = {}
+        for situacao, agendamento_id in zip(ops['situacao'], ops['agendamento_id']):
+            resultado.setdefault(situacao, []).append(agendamento_id)
+        return resultado
+
+    def test_proximas_por_maquina_e_lado_em_tres_queries(self):
+        with self.assertNumQueries(3):
+            estado = estado_da_fabrica()
+        self.assertEqual(self._por_situacao(estado), {
+            'em_producao': [self.rodando.id],
+            'proxima': [self.proxima_l.id, self.proxima_r.id, self.proxima_m2.id],
+        })
+        self.assertEqual(estado['maquinas']['number'], ['M-01', 'M-02'])
+        # Um PN só, referenciado pela posição
+        self.assertEqual(estado['pns']['id'], [self.pn.id])
+        self.assertEqual(set(estado['ops']['pn']), {0})
+
+    def test_mais_proximas_e_selecao_de_maquinas(self):
+        estado = estado_da_fabrica([self.m1.id], proximas_por_lado=2)
+        self.assertEqual(self._por_situacao(estado)['proxima'], [self.proxima_l.id, self.proxima_r.id, self.segunda_l.id])
+        self.assertEqual(estado['maquinas']['id'], [self.m1.id])
+        self.assertEqual(estado_da_fabrica([self.m2.id], proximas_por_lado=0)['ops']['agendamento_id'], [])
+
+
+class ReferenciasCacheTests(TestCase):
+
+    def setUp(self):
+        # Os contadores voltam a zero a cada teste, o cache local do processo não
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('operador', password='x'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pn = _criar_pn('PN-A')
+            self.tipo_parada = TipoParada.objects.create(codigo='P01', descricao='Almoço', classificacao_parada='PLANEJADA')
+            self.tipo_refugo = TipoRefugo.objects.create(codigo='R01', descricao='Rebarba')
+
+    def _get(self, nome_url, **extra):
+        return self.client.get(reverse(nome_url), **extra)
+
+    def test_edicao_de_pn_invalida_a_etag_e_a_lista(self):
+        primeira = self._get('get_pns_api')
+        self.assertEqual([pn['pn_code'] for pn in primeira.json()], ['PN-A'])
+        self.assertEqual(self._get('get_pns_api', HTTP_IF_NONE_MATCH=primeira['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pn.pn_code = 'PN-B'
+            self.pn.save()
+        depois = self._get('get_pns_api', HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(depois.status_code, 200)
+        self.assertEqual([pn['pn_code'] for pn in depois.json()], ['PN-B'])
+
+    def test_importacao_em_lote_de_pns_invalida_a_lista(self):
+        etag = self._get('get_pns_api')['ETag']
+        cabecalho = ','.join(CAMPOS_PN)
+        linha = 'Cliente,PN-C,Peça,Tampa,Própria,5,1,2,1.5,30,1,10,10,10'
+        with self.captureOnCommitCallbacks(execute=True):
+            importar_pns(io.BytesIO(f'{cabecalho}\n{linha}\n'.encode('utf-8')), 'csv')
+        depois = self._get('get_pns_api', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(depois.status_code, 200)
+        self.assertEqual([pn['pn_code'] for pn in depois.json()], ['PN-A', 'PN-C'])
+
+    def test_cada_cadastro_tem_a_sua_versao(self):
+        etag_pns = self._get('get_pns_api')['ETag']
+        etag_refugos = self._get('get_tipos_refugo_api')['ETag']
+        etag_paradas = self._get('get_tipos_parada_api')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipo_parada.descricao = 'Almoço e janta'
+            self.tipo_parada.save()
+        paradas = self._get('get_tipos_parada_api', HTTP_IF_NONE_MATCH=etag_paradas)
+        self.assertEqual(paradas.status_code, 200)
+        self.assertEqual(paradas.json()[0]['descricao'], 'Almoço e janta')
+        self.assertEqual(self._get('get_pns_api', HTTP_IF_NONE_MATCH=etag_pns).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipo_refugo.delete()
+        refugos = self._get('get_tipos_refugo_api', HTTP_IF_NONE_MATCH=etag_refugos)
+        self.assertEqual(refugos.status_code, 200)
+        self.assertEqual(refugos.json(), [])
+
+    def test_versao_na_url_libera_o_cache_do_navegador(self):
+        versao = self._get('get_pns_api')['ETag'].strip('"').rsplit('-', 1)[1]
+        atual = self.client.get(reverse('get_pns_api'), {'v': versao})
+        self.assertIn('immutable', atual['Cache-Control'])
+        antiga = self.client.get(reverse('get_pns_api'), {'v': int(versao) - 1})
+        self.assertIn('no-cache', antiga['Cache-Control'])
+
+
+class CenarioApiTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('planejador', password='x'))
+        self.maquina = _criar_maquina()
+        pn = _criar_pn(cycle_time_seconds=36)
+        self.ops = [
+            OrdemProducao.objects.create(pn=pn, quantity=100, delivery_date=date(2030, 11, 30), status='Planejada')
+            for _ in range(2)
+        ]
+        self.agendamentos = [
+            Agendamento.objects.create(
+                ordem_producao=op, maquina=self.maquina, lado='L',
+                start_datetime=timezone.make_aware(datetime(2030, 11, 2, 8 + i)),
+                end_datetime=timezone.make_aware(datetime(2030, 11, 2, 9 + i)),
+            )
+            for i, op in enumerate(self.ops)
+        ]
+
+    def _mover(self, op, dia=3):
+        return {'tipo': 'mover', 'op_id': op.id, 'maquina_id': self.maquina.id, 'inicio': f'2030-11-{dia:02d}T08:00', 'lado': 'L'}
+
+    def test_criar_editar_e_aplicar(self):
+        resposta = self.client.post(reverse('criar_cenario_api'))
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        cenario_id = resposta.json()['cenario_id']
+        self.assertEqual(resposta.json()['resumo']['agendamentos'], 2)
+        # O próximo pedido pode cair em outro worker: nada pode depender do cache local
+        cache.clear()
+
+        resposta = self.client.post(
+            reverse('cenario_api', args=[cenario_id]), json.dumps({'edicoes': [self._mover(self.ops[0])]}),
+            content_type='application/json',
+        )
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        self.assertEqual([ag['op_id'] for ag in resposta.json()['agendamentos']], [self.ops[0].id])
+        self.assertEqual(Agendamento.objects.get(pk=self.agendamentos[0].pk).start_datetime.day, 2)
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(reverse('aplicar_cenario_api', args=[cenario_id]))
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        inicio = timezone.localtime(Agendamento.objects.get(pk=self.agendamentos[0].pk).start_datetime)
+        self.assertEqual((inicio.day, inicio.hour), (3, 8))
+        # Aplicado, o cenário sai do cache
+        resposta = self.client.post(reverse('aplicar_cenario_api', args=[cenario_id]))
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_cenario_de_outro_usuario_nao_e_encontrado(self):
+        cenario_id = self.client.post(reverse('criar_cenario_api')).json()['cenario_id']
+        self.client.force_login(User.objects.create_superuser('outro', password='x'))
+        self.assertEqual(self.client.get(reverse('cenario_api', args=[cenario_id])).status_code, 404)
+
+    def test_aplicar_recusa_quadro_alterado_desde_a_carga(self):
+        cenario = Cenario.do_banco(agora=timezone.make_aware(datetime(2030, 11, 1)))
+        cenario.editar(ler_edicao(self._mover(self.ops[0])))
+        cenario.editar({'tipo': 'quantidade', 'op_id': self.ops[1].id, 'quantidade': 200})
+        # Outro usuário remarca a OP depois que o cenário foi carregado
+        Agendamento.objects.filter(pk=self.agendamentos[0].pk).update(
+            start_datetime=timezone.make_aware(datetime(2030, 11, 5, 8)),
+            end_datetime=timezone.make_aware(datetime(2030, 11, 5, 9)),
+        )
+        with self.assertRaisesMessage(ErroCenario, f'OP-{self.ops[0].id} mudou'):
+            cenario.aplicar()
+        # Nada foi gravado, nem a nova quantidade
+        self.ops[1].refresh_from_db()
+        self.assertEqual(self.ops[1].quantity, 100)
+        self.assertEqual(timezone.localtime(Agendamento.objects.get(pk=self.agendamentos[1].pk).start_datetime).hour, 9)
+
+    def test_aplicar_sem_conflito_grava_quantidade_e_remarcacao(self):
+        cenario = Cenario.do_banco(agora=timezone.make_aware(datetime(2030, 11, 1)))
+        cenario.editar({'tipo': 'quantidade', 'op_id': self.ops[1].id, 'quantidade': 200})
+        with self.captureOnCommitCallbacks(execute=True):
+            ok, resultados = cenario.aplicar()
+        self.assertTrue(ok, resultados)
+        self.ops[1].refresh_from_db()
+        self.assertEqual(self.ops[1].quantity, 200)
+        agendamento = Agendamento.objects.get(pk=self.agendamentos[1].pk)
+        self.assertEqual(agendamento.end_datetime - agendamento.start_datetime, timedelta(hours=2))
+
+
+class CompatibilidadeTabelaTests(TestCase):
+
+    def _pares(self):
+        return set(CompatibilidadePnMaquina.objects.values_list('pn__pn_code', 'maquina__number'))
+
+    def test_migracao_preenche_os_cadastros_existentes(self):
+        # Cadastros gravados antes da tabela existir (bulk_create não passa pelos signals)
+        Maquina.objects.bulk_create([
+            Maquina(number='M-01', capacity_liters=10, mold_dim_c=20, mold_dim_a=20, mold_dim_l=20),
+            Maquina(number='M-02', capacity_liters=2, mold_dim_c=20, mold_dim_a=20, mold_dim_l=20),
+        ])
+        Pn.objects.bulk_create([Pn(
+            cliente='Cliente', pn_code='PN-1', description='Peça', type_piece='Tampa', property='Própria',
+            capacity_liters=5, min_weight_kg=1, max_weight_kg=2, sold_weight_kg=1.5,
+            cycle_time_seconds=36, cavity=1, dim_c=10, dim_a=10, dim_l=10,
+        )])
+        self.assertFalse(CompatibilidadePnMaquina.objects.exists())
+        migracao = importlib.import_module('meu_sistema_producao.producao.migrations.0029_preencher_compatibilidade')
+        migracao.preencher_compatibilidade(apps, None)
+        self.assertEqual(self._pares(), {('PN-1', 'M-01')})
+
+    def test_gravar_pn_ou_maquina_recalcula_depois_do_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            maquina = _criar_maquina()
+            pn = _criar_pn()
+        self.assertEqual(self._pares(), {('PN-1', 'M-01')})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pn.dim_c = 30
+            pn.save()
+        self.assertEqual(self._pares(), set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            maquina.mold_dim_c = 30
+            maquina.save()
+        self.assertEqual(self._pares(), {('PN-1', 'M-01')})
+
+    def test_importacao_do_pn_resource_recalcula(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _criar_maquina()
+        campos = PnResource._meta.fields
+        dataset = tablib.Dataset(headers=list(campos))
+        for codigo, dim_c in (('PN-A', 10), ('PN-B', 30)):
+            valores = {
+                'cliente': 'Cliente', 'pn_code': codigo, 'description': 'Peça', 'type_piece': 'Tampa',
+                'property': 'Própria', 'capacity_liters': 5, 'min_weight_kg': 1, 'max_weight_kg': 2,
+                'sold_weight_kg': 1.5, 'cycle_time_seconds': 36, 'cavity': 1, 'dim_c': dim_c, 'dim_a': 10, 'dim_l': 10,
+            }
+            dataset.append([valores[campo] for campo in campos])
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = PnResource().import_data(dataset, dry_run=False)
+        self.assertFalse(resultado.has_errors())
+        self.assertEqual(self._pares(), {('PN-A', 'M-01')})
+
+
+class OeeLoteApiTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('gerente', password='x'))
+
+    def test_fator_de_ciclo_fora_da_faixa_responde_400(self):
+        url = reverse('get_oee_lote_api')
+        periodo = {'inicio': '2026-03-01', 'fim': '2026-03-31'}
+        for fator in ('nan', 'inf', '-inf', '0', '-1', '1e6'):
+            with self.subTest(fator=fator):
+                self.assertEqual(self.client.get(url, {**periodo, 'fator_ciclo': fator}).status_code, 400)
+        resposta = self.client.get(url, {**periodo, 'fator_ciclo': '0.95'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['fator_ciclo'], 0.95)
+
+
+class ParetoAgendamentoTests(TestCase):
+    """Editar um agendamento só invalida o Pareto se a máquina mudar, e só nos dias dos eventos."""
+
+    def setUp(self):
+        # As invalidações do cadastro rodam aqui, antes de medir as versões
+        with self.captureOnCommitCallbacks(execute=True):
+            self.maquina = _criar_maquina()
+            self.outra_maquina = _criar_maquina('M-02')
+            op = OrdemProducao.objects.create(pn=_criar_pn(), quantity=100, delivery_date=date(2026, 3, 10), status='Em Produção')
+            inicio = timezone.make_aware(datetime(2026, 3, 2, 8))
+            self.agendamento = Agendamento.objects.create(
+                ordem_producao=op, maquina=self.maquina, lado='L',
+                start_datetime=inicio, end_datetime=inicio + timedelta(days=2),
+            )
+            tipo_parada = TipoParada.objects.create(codigo='N01', descricao='Quebra', classificacao_parada='NÃO PLANEJADA')
+            tipo_refugo = TipoRefugo.objects.create(codigo='R01', descricao='Rebarba')
+            Parada.objects.create(
+                agendamento=self.agendamento, tipo_parada=tipo_parada,
+                inicio_parada=inicio + timedelta(hours=1), fim_parada=inicio + timedelta(hours=2),
+            )
+            Refugo.objects.create(agendamento=self.agendamento, tipo_refugo=tipo_refugo, quantidade=2, data_apontamento=inicio + timedelta(days=1))
+
+    def _versoes(self):
+        return {chave: obter_versao(chave) for chave in (
+            'pareto', 'pareto:paradas:2026-03-02', 'pareto:refugos:2026-03-03', 'pareto:paradas:2026-03-03', 'pareto:refugos:2026-03-02',
+        )}
+
+    def test_edicao_sem_troca_de_maquina_nao_invalida(self):
+        antes = self._versoes()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agendamento.end_datetime += timedelta(hours=1)
+            self.agendamento.save()
+        self.assertEqual(self._versoes(), antes)
+
+    def test_troca_de_maquina_invalida_so_os_dias_dos_eventos(self):
+        antes = self._versoes()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agendamento.maquina = self.outra_maquina
+            self.agendamento.save()
+        depois = self._versoes()
+        self.assertEqual(depois['pareto'], antes['pareto'])
+        self.assertGreater(depois['pareto:paradas:2026-03-02'], antes['pareto:paradas:2026-03-02'])
+        self.assertGreater(depois['pareto:refugos:2026-03-03'], antes['pareto:refugos:2026-03-03'])
+        self.assertEqual(depois['pareto:paradas:2026-03-03'], antes['pareto:paradas:2026-03-03'])
+        self.assertEqual(depois['pareto:refugos:2026-03-02'], antes['pareto:refugos:2026-03-02'])
+
+
+class AutoAgendarApiTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('planejador', password='x'))
+        self.agora = timezone.make_aware(datetime(2030, 1, 7, 7, 30))
+        self.hora_cheia = timezone.make_aware(datetime(2030, 1, 7, 8, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.maquina = _criar_maquina()
+            pn = _criar_pn(cycle_time_seconds=36)
+            pn_grande = _criar_pn('PN-GRANDE')
+            pn_grande.dim_c = 50  # Maior que o molde de qualquer máquina
+            pn_grande.save()
+        # Os dois lados da máquina ocupados até as 10h
+        for lado in ('L', 'R'):
+            Agendamento.objects.create(
+                ordem_producao=OrdemProducao.objects.create(pn=pn, quantity=200, delivery_date=date(2030, 1, 8), status='Planejada'),
+                maquina=self.maquina, lado=lado,
+                start_datetime=self.hora_cheia, end_datetime=self.hora_cheia + timedelta(hours=2),
+            )
+        # 100 peças de 36 s: uma hora
+        self.op = OrdemProducao.objects.create(pn=pn, quantity=100, delivery_date=date(2030, 1, 9), status='Disponível')
+        self.op_sem_maquina = OrdemProducao.objects.create(pn=pn_grande, quantity=10, delivery_date=date(2030, 1, 9), status='Disponível')
+
+    def _agendar(self, dados):
+        # O relógio só do agendador: a sessão do login usa o relógio real
+        with mock.patch('meu_sistema_producao.producao.agendador.timezone', mock.Mock(now=lambda: self.agora)):
+            with self.captureOnCommitCallbacks(execute=True):
+                resposta = _post_json(self.client, 'auto_agendar_api', dados)
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        return resposta.json()
+
+    def test_simular_nao_grava(self):
+        dados = self._agendar({'simular': True})
+        self.assertEqual([item['op_id'] for item in dados['agendamentos']], [self.op.id])
+        self.assertEqual(dados['sem_maquina_compativel'], [self.op_sem_maquina.id])
+        self.assertFalse(Agendamento.objects.filter(ordem_producao=self.op).exists())
+        self.op.refresh_from_db()
+        self.assertEqual(self.op.status, 'Disponível')
+
+    def test_agenda_depois_da_reserva_existente(self):
+        dados = self._agendar({})
+        self.assertEqual(dados['sem_maquina_compativel'], [self.op_sem_maquina.id])
+
+        agendamento = Agendamento.objects.get(ordem_producao=self.op)
+        self.assertEqual(agendamento.maquina_id, self.maquina.id)
+        self.assertEqual(agendamento.start_datetime, self.hora_cheia + timedelta(hours=2))
+        self.assertEqual(agendamento.end_datetime, self.hora_cheia + timedelta(hours=3))
+        self.op.refresh_from_db()
+        self.assertEqual(self.op.status, 'Planejada')
+
+        self.assertFalse(Agendamento.objects.filter(ordem_producao=self.op_sem_maquina).exists())
+        self.op_sem_maquina.refresh_from_db()
+        self.assertEqual(self.op_sem_maquina.status, 'Disponível')
+
+        # Uma segunda rodada não tem mais o que agendar
+        self.assertEqual(self._agendar({})['agendamentos'], [])
+
+
+class ImportacaoOpsTests(TestCase):
+
+    ARQUIVO = (
+        'PN;Quantidade;Entrega\n'
+        'PN-1;100;05/11/2026\n'
+        'PN-1;1.500;06/11/2026\n'
+        'PN-2;50;2026-11-07\n'
+    ).encode('utf-8-sig')
+
+    def setUp(self):
+        _criar_pn('PN-1')
+        _criar_pn('PN-2')
+
+    def test_reimportar_o_mesmo_arquivo_nao_cria_nada(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            primeira = importar_ops(self.ARQUIVO, 'csv')
+        self.assertEqual((primeira.criados, primeira.total_erros), (3, 0))
+        ops = list(OrdemProducao.objects.order_by('id').values_list('id', 'pn__pn_code', 'quantity', 'delivery_date', 'status'))
+        self.assertEqual([op[1:] for op in ops], [
+            ('PN-1', 100, date(2026, 11, 5), 'Disponível'),
+            ('PN-1', 1500, date(2026, 11, 6), 'Disponível'),
+            ('PN-2', 50, date(2026, 11, 7), 'Disponível'),
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            segunda = importar_ops(self.ARQUIVO, 'csv')
+        self.assertEqual((segunda.linhas, segunda.criados, segunda.total_erros), (3, 0, 3))
+        self.assertEqual([erro['linha'] for erro in segunda.erros], [2, 3, 4])
+        for erro, op in zip(segunda.erros, ops):
+            self.assertEqual(erro['mensagens'], [f"Já existe a OP {op[0]} em aberto com este PN, quantidade e entrega."])
+        self.assertEqual(OrdemProducao.objects.count(), 3)
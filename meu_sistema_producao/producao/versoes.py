@@ -0,0 +1,104 @@
+# meu_sistema_producao/producao/versoes.py
+
+"""
+Contadores de versão gravados no banco (`ContadorVersao`).
+
+Cada assunto (ex: o dashboard de gerenciamento) tem um contador que é
+incrementado depois do commit de qualquer escrita que o afete. As APIs de
+leitura usam o valor atual como ETag: se o contador não mudou, o cliente
+recebe 304 sem que nada seja recalculado.
+
+O incremento roda depois do commit, numa transação própria e curta, mas
+ainda é um UPDATE na linha do contador. Um contador que recebe escritas de
+todas as máquinas ao mesmo tempo (o do dashboard) é dividido em partes
+('dashboard:0' ... 'dashboard:15'): cada incremento vai para uma parte
+sorteada, então escritores simultâneos quase nunca esperam pela mesma
+linha, e a versão lida é a soma das partes.
+"""
+
+import random
+import threading
+from datetime import timedelta
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import ContadorVersao
+
+
+VERSAO_DASHBOARD = 'dashboard'
+
+# chave -> número de partes do contador
+PARTES = {VERSAO_DASHBOARD: 16}
+
+_estado = threading.local()
+
+
+def _partes(chave):
+    # A própria chave entra na soma: é o contador de antes da divisão
+    return [chave] + [f'{chave}:{parte}' for parte in range(PARTES.get(chave, 0))]
+
+
+def _incrementar(chave):
+    if chave in PARTES:
+        chave = f'{chave}:{random.randrange(PARTES[chave])}'
+    atualizados = ContadorVersao.objects.filter(chave=chave).update(versao=F('versao') + 1)
+    if not atualizados:
+        try:
+            with transaction.atomic():
+                ContadorVersao.objects.create(chave=chave, versao=1)
+        except IntegrityError:
+            # Outro processo criou o contador ao mesmo tempo
+            ContadorVersao.objects.filter(chave=chave).update(versao=F('versao') + 1)
+
+
+def _incrementar_pendentes():
+    pendentes = getattr(_estado, 'chaves_pendentes', None)
+    if not pendentes:
+        return
+    chaves = list(pendentes)
+    pendentes.clear()
+    for chave in chaves:
+        _incrementar(chave)
+
+
+def incrementar_versao(chave):
+    """
+    Incrementa o contador quando a transação atual for confirmada. Várias
+    escritas na mesma transação resultam em um único incremento.
+    """
+    if not hasattr(_estado, 'chaves_pendentes'):
+        _estado.chaves_pendentes = set()
+    _estado.chaves_pendentes.add(chave)
+    transaction.on_commit(_incrementar_pendentes)
+
+
+def obter_versao(chave):
+    if chave in PARTES:
+        return obter_soma_versoes([chave])
+    versao = ContadorVersao.objects.filter(chave=chave).values_list('versao', flat=True).first()
+    return versao or 0
+
+
+def obter_soma_versoes(chaves):
+    """
+    Soma dos contadores das chaves. Como os contadores só crescem, a soma
+    muda sempre que qualquer uma delas for incrementada.
+    """
+    chaves = [parte for chave in chaves for parte in _partes(chave)]
+    soma = ContadorVersao.objects.filter(chave__in=chaves).aggregate(soma=Sum('versao'))['soma']
+    return soma or 0
+
+
+def chaves_por_dia(prefixo, inicio, fim):
+    """
+    Chaves '<prefixo>:AAAA-MM-DD' de cada dia local de [inicio, fim]. Usadas
+    para invalidar só os caches que cobrem os dias afetados por uma escrita.
+    """
+    # Datas sem fuso (gravadas por código antigo) são tratadas como locais
+    dia = (inicio if timezone.is_naive(inicio) else timezone.localtime(inicio)).date()
+    ultimo = (fim if timezone.is_naive(fim) else timezone.localtime(fim)).date()
+    chaves = []
+    while dia <= ultimo:
+        chaves.append(f'{prefixo}:{dia.isoformat()}')
+        dia += timedelta(days=1)
+    return chaves
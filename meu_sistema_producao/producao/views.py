@@ -3,15 +3,50 @@
 # Adicionado 'get_object_or_404' que estava faltando na importação
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods, require_POST
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse
+from django.views.decorators.http import require_http_methods, require_POST, condition
+from django.views.decorators.csrf import csrf_exempt
+import hmac
 import json
+import asyncio
+import logging
+import time
+import uuid
 from datetime import datetime, timedelta
 from django.utils import timezone
-from .models import Pn, Maquina, OrdemProducao, Agendamento, ApontamentoProducao, Parada, TipoParada, TipoRefugo, Refugo
+from django.utils.cache import patch_cache_control
+from .models import Pn, Maquina, OrdemProducao, Agendamento, ApontamentoProducao, Parada, TipoParada, TipoRefugo, Refugo, OeeRollupHora
+from .oee import calcular_kpis_maquinas
+from . import rollup, referencias, historico
+from .versoes import obter_versao, obter_soma_versoes, incrementar_versao, VERSAO_DASHBOARD
+from django.db import transaction, DatabaseError
+from django.db.models import Min
+from django.conf import settings
+from django.core.cache import cache, caches
+from .eventos import difusor, notificar_maquinas
+from .historico import serie_historica, GRANULARIDADES
+from .pareto import pareto, FONTES as FONTES_PARETO, DIMENSOES as DIMENSOES_PARETO
+from .oee_lote import (
+    carregar_insumos, calcular_kpis_lote, resumo_por_maquina, fator_ciclo_valido, FATOR_CICLO_MINIMO, FATOR_CICLO_MAXIMO,
+)
+from .planejamento import snapshot_quadro, aplicar_lote, semana, VERSAO_AGENDA
+from .chao_de_fabrica import estado_da_fabrica
+from .agendador import auto_agendar
+from .compatibilidade import maquinas_compativeis
+from .cenarios import Cenario, ErroCenario, ler_edicao
+from .cascata import reprogramar_maquina
+from .apontamentos import registrar_apontamento, ChaveReutilizada, TAMANHO_MAXIMO_CHAVE
+from .ingestao import ingerir_lote, EventoInvalido
+from .ciclos import agregador, ler_sinal, comparar_tempos_de_ciclo
+from .importacao import importar_ops, formato_do_arquivo, ErroImportacao
+from . import exportacao
+from .conflitos import conflitos_do_agendamento, conflitos_no_horizonte
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import date
-from django.db.models import Sum, F, ExpressionWrapper, fields, Case, When, Value
-from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
 
 
 @login_required(login_url='login')
@@ -25,56 +60,52 @@ def menu_view(request):
 @login_required(login_url='login')
 @permission_required('producao.can_view_planejamento', raise_exception=True)
 def planejamento_view(request):
-    maquinas = Maquina.objects.all()
-    
-    # Filtro para OPs relevantes para o planejamento
-    ordens_disponiveis_qs = OrdemProducao.objects.filter(
-        status__in=['Disponível', 'Planejada']
-    ).order_by('delivery_date')
-
-    ordens_disponiveis = []
-    for op in ordens_disponiveis_qs:
-        ordens_disponiveis.append({
-            'op': op,
-            'tempo_producao_horas': op.get_duracao_horas()
-        })
-    
-    agendamentos_qs = Agendamento.objects.select_related('ordem_producao__pn', 'maquina').all()
-    todos_ids_agendados = list(Agendamento.objects.values_list('ordem_producao_id', flat=True))
-    
-    agendamentos_iniciais_formatado = []
-    for agendamento in agendamentos_qs:
-        if agendamento.ordem_producao.status in ['Disponível', 'Planejada']:
-            
-            # =======================================================================
-            # CORREÇÃO FINAL DE HORA E DURAÇÃO
-            # =======================================================================
-            
-            # 1. Converte o datetime do banco (que está em UTC) para o fuso horário local
-            local_start_time = timezone.localtime(agendamento.start_datetime)
-            
-            agendamentos_iniciais_formatado.append({
-                'id': agendamento.id, # [CORREÇÃO] Envia o ID do agendamento
-                'opId': agendamento.ordem_producao.id,
-                'maquinaId': agendamento.maquina.id,
-                'day': local_start_time.weekday(), 
-                'hour': local_start_time.hour,
-                'duration': agendamento.ordem_producao.get_duracao_horas(), # [CORREÇÃO] Envia a duração
-                'lado': agendamento.lado # [CORREÇÃO] Envia o lado
-            })
-
-            todos_ids_agendados = list(Agendamento.objects.values_list('ordem_producao_id', flat=True))
-            # =======================================================================
+    # Máquinas, OPs em aberto e seus agendamentos em 3 queries
+    # (ver producao/planejamento.py).
+    quadro = snapshot_quadro()
 
     context = {
-        'maquinas': maquinas,
-        'ordens_disponiveis': ordens_disponiveis,
-        'agendamentos_iniciais': json.dumps(agendamentos_iniciais_formatado),
-        'todos_ids_agendados': json.dumps(todos_ids_agendados),
+        'maquinas': quadro['maquinas'],
+        'ordens_disponiveis': quadro['ordens'],
+        'agendamentos_iniciais': json.dumps(quadro['agendamentos']),
+        'todos_ids_agendados': json.dumps([agendamento['opId'] for agendamento in quadro['agendamentos']]),
+        'versoes_referencia': referencias.versoes(['pns']),
     }
     
     return render(request, 'producao/planejamento_view.html', context)
 
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+@require_http_methods(["GET"])
+def get_quadro_planejamento_api(request):
+    """Mesmo snapshot da página de planejamento, em JSON."""
+    return JsonResponse(snapshot_quadro())
+
+@require_POST
+@login_required
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+def auto_agendar_api(request):
+    """
+    Agenda todas as OPs 'Disponível' nas máquinas compatíveis, por data de
+    entrega (ver producao/agendador.py). Com {"simular": true} no corpo,
+    apenas retorna o plano, sem gravar.
+    """
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'JSON inválido.'}, status=400)
+
+    simular = bool(data.get('simular'))
+    planejados, sem_maquina = auto_agendar(simular=simular)
+    return JsonResponse({
+        'status': 'sucesso',
+        'mensagem': f"{len(planejados)} OPs {'seriam agendadas' if simular else 'agendadas'}.",
+        'agendamentos': planejados,
+        'sem_maquina_compativel': sem_maquina,
+    })
+
+
 # =========================================================================
 #                     VIEWS PARA A API DO PLANEJADOR
 # =========================================================================
@@ -94,22 +125,42 @@ def salvar_agendamento_api(request):
         maquina = get_object_or_404(Maquina, id=maquina_id)
 
         tempo_producao_horas = (op.quantity * op.pn.cycle_time_seconds) / 3600
-        start_datetime = datetime.strptime(start_date_str, '%Y-%m-%d').replace(hour=start_hour)
+        start_datetime = timezone.make_aware(datetime.strptime(start_date_str, '%Y-%m-%d').replace(hour=start_hour))
         end_datetime = start_datetime + timedelta(hours=tempo_producao_horas)
 
-        op.status = 'Planejada'
-        op.save()
+        with transaction.atomic():
+            # Trava a máquina: dois planejadores não conseguem reservar o
+            # mesmo horário ao mesmo tempo
+            Maquina.objects.select_for_update().filter(pk=maquina.pk).exists()
+            conflitos = conflitos_do_agendamento(
+                maquina.id,
+                lado_recebido,
+                start_datetime,
+                end_datetime,
+                ignorar_op_id=op.id,
+            )
+            if conflitos:
+                return JsonResponse({
+                    'status': 'erro',
+                    'mensagem': 'Horário em conflito com ' + ', '.join(f"OP-{c['ordem_producao_id']}" for c in conflitos) + '.',
+                    'conflitos': conflitos,
+                }, status=409)
+
+            op.status = 'Planejada'
+            op.save()
 
-        agendamento, created = Agendamento.objects.update_or_create(
-            ordem_producao=op,
-            defaults={
-                'maquina': maquina,
-                'start_datetime': start_datetime,
-                'end_datetime': end_datetime,
-                'lado': lado_recebido,
-                'real_start_datetime': None
-            }
-        )
+            agendamento, created = Agendamento.objects.update_or_create(
+                ordem_producao=op,
+                defaults={
+                    'maquina': maquina,
+                    'start_datetime': start_datetime,
+                    'end_datetime': end_datetime,
+                    'lado': lado_recebido,
+                    'real_start_datetime': None
+                }
+            )
+            # Mantém o consolidado de OEE apontando para a máquina atual
+            OeeRollupHora.objects.filter(agendamento=agendamento).exclude(maquina=maquina).update(maquina=maquina)
         
         agendamento_data = {
             'opId': op.id,
@@ -163,15 +214,227 @@ def remover_agendamento_api(request):
     except Exception as e:
         return JsonResponse({'status': 'erro', 'mensagem': str(e)}, status=400)
 
+@login_required(login_url='login')
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+@require_http_methods(["GET"])
+def get_conflitos_planejamento_api(request):
+    """
+    Todos os pares de agendamentos sobrepostos (mesma máquina e lado) no
+    horizonte. Parâmetros: inicio e fim (YYYY-MM-DD, fim inclusivo) e
+    maquina_id (opcional, pode ser repetido).
+    """
+    try:
+        inicio = datetime.strptime(request.GET.get('inicio', ''), '%Y-%m-%d')
+        fim = datetime.strptime(request.GET.get('fim', ''), '%Y-%m-%d') + timedelta(days=1)
+        maquina_ids = [int(v) for v in request.GET.getlist('maquina_id') if v] or None
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Informe inicio e fim no formato YYYY-MM-DD.'}, status=400)
+
+    pares = conflitos_no_horizonte(timezone.make_aware(inicio), timezone.make_aware(fim), maquina_ids)
+    return JsonResponse({
+        'total': len(pares),
+        'conflitos': [{'agendamento': primeiro, 'conflita_com': segundo} for primeiro, segundo in pares],
+    })
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+@require_http_methods(["GET"])
+def get_maquinas_compativeis_api(request):
+    """Ids das máquinas em que o PN da OP (op_id) ou o PN (pn_id) cabe."""
+    try:
+        op_id = request.GET.get('op_id')
+        pn_id = int(request.GET['pn_id']) if request.GET.get('pn_id') else None
+        if op_id:
+            pn_id = get_object_or_404(OrdemProducao, id=int(op_id)).pn_id
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Parâmetros inválidos.'}, status=400)
+    if pn_id is None:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Informe op_id ou pn_id.'}, status=400)
+
+    return JsonResponse({'pn_id': pn_id, 'maquinas': maquinas_compativeis(pn_id)})
+
+@require_POST
+@login_required
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+def reprogramar_maquina_api(request):
+    """
+    Projeta o fim das OPs em produção na máquina pela taxa real e empurra
+    os agendamentos seguintes (ver producao/cascata.py). Corpo:
+    {"maquina_id": ..., "tolerancia_minutos": opcional}.
+    """
+    try:
+        data = json.loads(request.body)
+        maquina_id = int(data.get('maquina_id'))
+        tolerancia = data.get('tolerancia_minutos')
+        tolerancia = timedelta(minutes=int(tolerancia)) if tolerancia is not None else None
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({'status': 'erro', 'mensagem': 'Informe maquina_id (e tolerancia_minutos em minutos).'}, status=400)
+    get_object_or_404(Maquina, pk=maquina_id)
+
+    resultado = reprogramar_maquina(maquina_id, tolerancia=tolerancia)
+    return JsonResponse({'status': 'sucesso', **resultado})
+
+MAX_OPERACOES_LOTE = 500
+
+@require_POST
+@login_required
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+def agendamentos_lote_api(request):
+    """
+    Aplica várias operações no quadro em uma única transação. Corpo:
+    {"operacoes": [{"acao": "criar" | "mover", "op_id", "maquina_id",
+    "start_date", "start_hour", "lado"} | {"acao": "remover",
+    "agendamento_id"}, ...]}. Se alguma operação for inválida ou conflitar,
+    nada é gravado e a resposta (409) traz o motivo de cada uma.
+    """
+    try:
+        operacoes = json.loads(request.body).get('operacoes')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'status': 'erro', 'mensagem': 'JSON inválido.'}, status=400)
+    if not isinstance(operacoes, list) or not operacoes:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Informe a lista de operações.'}, status=400)
+    if len(operacoes) > MAX_OPERACOES_LOTE:
+        return JsonResponse({'status': 'erro', 'mensagem': f'No máximo {MAX_OPERACOES_LOTE} operações por lote.'}, status=400)
+
+    ok, resultados = aplicar_lote(operacoes)
+    if not ok:
+        return JsonResponse({
+            'status': 'erro',
+            'mensagem': 'Nenhuma alteração foi gravada: corrija as operações com erro.',
+            'resultados': resultados,
+        }, status=409)
+    return JsonResponse({
+        'status': 'sucesso',
+        'mensagem': f'{len(operacoes)} operações aplicadas.',
+        'resultados': resultados,
+    })
+
+
+# =======================================================================
+# CENÁRIOS "E SE" DO PLANEJAMENTO (ver producao/cenarios.py)
+# O cenário fica no cache 'cenarios' (compartilhado entre os workers), por
+# usuário, até ser aplicado ou expirar.
+# =======================================================================
+
+def _chave_cenario(request, cenario_id):
+    return f"cenario:{request.user.pk}:{cenario_id}"
+
+
+def _resposta_cenario(cenario_id, cenario, somente_alterados, **extras):
+    return JsonResponse({
+        'status': 'sucesso',
+        'cenario_id': cenario_id,
+        'resumo': cenario.resumo(),
+        'agendamentos': cenario.agendamentos(somente_alterados=somente_alterados),
+        **extras,
+    })
+
+
+@require_POST
+@login_required
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+def criar_cenario_api(request):
+    """Carrega o quadro atual em um cenário novo e retorna o id dele."""
+    cenario = Cenario.do_banco()
+    cenario_id = uuid.uuid4().hex
+    caches['cenarios'].set(_chave_cenario(request, cenario_id), cenario, settings.CENARIO_CACHE_SEGUNDOS)
+    return _resposta_cenario(cenario_id, cenario, somente_alterados=False)
+
+
+@login_required
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+@require_http_methods(["GET", "POST"])
+def cenario_api(request, cenario_id):
+    """
+    GET: estado atual do cenário. POST {"edicoes": [...]}: aplica as
+    edições (ver cenarios.TIPOS_EDICAO) e retorna o resumo e os
+    agendamentos que mudaram em relação ao quadro real.
+    """
+    chave = _chave_cenario(request, cenario_id)
+    cenario = caches['cenarios'].get(chave)
+    if cenario is None:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Cenário não encontrado ou expirado.'}, status=404)
+    if request.method == 'GET':
+        return _resposta_cenario(cenario_id, cenario, somente_alterados=False)
+
+    try:
+        edicoes = json.loads(request.body).get('edicoes')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'status': 'erro', 'mensagem': 'JSON inválido.'}, status=400)
+    if not isinstance(edicoes, list) or not edicoes:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Informe a lista de edições.'}, status=400)
+
+    comeco = time.perf_counter()
+    try:
+        # As edições são validadas antes, para não deixar o cenário pela metade
+        edicoes = [ler_edicao(edicao) for edicao in edicoes]
+        for edicao in edicoes:
+            cenario.editar(edicao)
+    except ErroCenario as e:
+        return JsonResponse({'status': 'erro', 'mensagem': str(e)}, status=400)
+    recalculo_ms = round((time.perf_counter() - comeco) * 1000, 2)
+
+    caches['cenarios'].set(chave, cenario, settings.CENARIO_CACHE_SEGUNDOS)
+    return _resposta_cenario(cenario_id, cenario, somente_alterados=True, recalculo_ms=recalculo_ms)
+
+
+@require_POST
+@login_required
+@permission_required('producao.can_view_planejamento', raise_exception=True)
+def aplicar_cenario_api(request, cenario_id):
+    """Grava o cenário no quadro real, em uma única transação."""
+    chave = _chave_cenario(request, cenario_id)
+    cenario = caches['cenarios'].get(chave)
+    if cenario is None:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Cenário não encontrado ou expirado.'}, status=404)
+
+    try:
+        ok, resultados = cenario.aplicar()
+    except ErroCenario as e:
+        return JsonResponse({'status': 'erro', 'mensagem': f'{e} Crie um novo cenário.'}, status=409)
+    if not ok:
+        return JsonResponse({
+            'status': 'erro',
+            'mensagem': 'Nenhuma alteração foi gravada: o cenário conflita com o quadro atual.',
+            'resultados': resultados,
+        }, status=409)
+
+    caches['cenarios'].delete(chave)
+    return JsonResponse({
+        'status': 'sucesso',
+        'mensagem': f'Cenário aplicado: {len(resultados)} agendamentos remarcados.',
+        'resultados': resultados,
+    })
+
 # =========================================================================
 #                     VIEWS PARA A API DO MODAL
 # =========================================================================
 
+# Cadastros de referência (ver producao/referencias.py): ETag pela versão
+# do cadastro e, quando a URL traz a versão atual (?v=), cache do navegador
+# sem prazo; uma versão nova muda a URL.
+REFERENCIA_NAVEGADOR_SEGUNDOS = 365 * 24 * 3600
+
+def _etag_referencia(nome):
+    def etag(request):
+        request.versao_referencia = referencias.versao(nome)
+        return f"{nome}-{request.versao_referencia}"
+    return etag
+
+def _resposta_referencia(request, nome):
+    versao = request.versao_referencia
+    resposta = JsonResponse(referencias.lista(nome, versao), safe=False)
+    if request.GET.get('v') == str(versao):
+        patch_cache_control(resposta, private=True, max_age=REFERENCIA_NAVEGADOR_SEGUNDOS, immutable=True)
+    else:
+        patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
+
 @login_required(login_url='login')
 @require_http_methods(["GET"])
+@condition(etag_func=_etag_referencia('pns'))
 def get_pns_api(request):
-    pns = Pn.objects.all().values('id', 'pn_code', 'capacity_liters')
-    return JsonResponse(list(pns), safe=False)
+    return _resposta_referencia(request, 'pns')
 
 @login_required(login_url='login')
 @require_http_methods(["GET"])
@@ -247,40 +510,55 @@ def criar_op_api(request):
         return JsonResponse({'status': 'erro', 'mensagem': f'Ocorreu um erro no servidor: {str(e)}'}, status=500)
 
 
+@require_POST
+def importar_ops_api(request):
+    """
+    Importa as OPs da exportação do ERP: upload (multipart) do campo
+    'arquivo' em CSV ou XLSX, com as colunas PN, quantidade e data de
+    entrega. Com dry_run=1 só valida. Responde com as contagens e os erros
+    por linha (producao/importacao.py).
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Autenticação necessária.'}, status=401)
+    if not request.user.has_perm('producao.add_ordemproducao'):
+        return JsonResponse({'status': 'erro', 'mensagem': 'Você não tem permissão para criar OPs.'}, status=403)
+
+    arquivo = request.FILES.get('arquivo')
+    if arquivo is None:
+        return JsonResponse({'status': 'erro', 'mensagem': "Envie a planilha no campo 'arquivo'."}, status=400)
+    try:
+        relatorio = importar_ops(
+            arquivo.read(),
+            formato_do_arquivo(arquivo.name),
+            dry_run=request.POST.get('dry_run') in ('1', 'true', 'on'),
+            maximo_linhas=settings.IMPORTACAO_OP_MAXIMO_LINHAS,
+        )
+    except ErroImportacao as e:
+        return JsonResponse({'status': 'erro', 'mensagem': str(e)}, status=400)
+    return JsonResponse({'status': 'sucesso', **relatorio.como_dict()})
+
+
 # =======================================================================
 # NOVA API PARA BUSCAR DADOS DA SEMANA
 # =======================================================================
 def get_week_data_api(request):
+    """
+    Agendamentos que cruzam a semana (inclusive os que começaram na semana
+    anterior e ainda estão rodando). Opcionalmente filtra por `maquina_id`.
+    """
     # Pega a data de início da semana que veio do JavaScript
     start_date_str = request.GET.get('start_date')
     if not start_date_str:
         return JsonResponse({'status': 'erro', 'mensagem': 'Data de início não fornecida.'}, status=400)
 
-    # Converte a string de data (YYYY-MM-DD) para um objeto date do Python
-    start_of_week = timezone.datetime.strptime(start_date_str, '%Y-%m-%d').date()
-    # Calcula o fim da semana (início + 6 dias)
-    end_of_week = start_of_week + timedelta(days=6)
-
-    # Filtra os agendamentos que estão DENTRO do intervalo da semana
-    agendamentos_da_semana = Agendamento.objects.filter(
-        start_datetime__date__range=[start_of_week, end_of_week]
-    ).select_related('ordem_producao__pn', 'maquina')
-
-    # Formata os dados para enviar de volta ao JavaScript (mesmo formato de antes)
-    agendamentos_formatados = []
-    for agendamento in agendamentos_da_semana:
-        local_start_time = timezone.localtime(agendamento.start_datetime)
-        agendamentos_formatados.append({
-            'id': agendamento.id, # [CORREÇÃO] Envia o ID do agendamento
-            'opId': agendamento.ordem_producao.id,
-            'maquinaId': agendamento.maquina.id,
-            'day': local_start_time.weekday(),
-            'hour': local_start_time.hour,
-            'duration': agendamento.ordem_producao.get_duracao_horas(),
-            'lado': agendamento.lado # [CORREÇÃO] Envia o lado
-        })
+    try:
+        # Converte a string de data (YYYY-MM-DD) para um objeto date do Python
+        start_of_week = timezone.datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        maquina_id = int(request.GET['maquina_id']) if request.GET.get('maquina_id') else None
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Parâmetros inválidos (use start_date YYYY-MM-DD).'}, status=400)
 
-    return JsonResponse(agendamentos_formatados, safe=False)
+    return JsonResponse(semana(start_of_week, maquina_id), safe=False)
 
 # =======================================================================
 # NOVAS VIEWS E APIS PARA A TELA DE PRODUÇÃO
@@ -292,7 +570,8 @@ def view_producao(request):
     """Renderiza a página principal de produção para o operador."""
     maquinas = Maquina.objects.all()
     context = {
-        'maquinas': maquinas
+        'maquinas': maquinas,
+        'versoes_referencia': referencias.versoes(['tipos_parada', 'tipos_refugo']),
     }
     return render(request, 'producao/view_producao.html', context)
 
@@ -368,6 +647,34 @@ def get_dados_maquina_api(request):
     }
     return JsonResponse(dados)
 
+MAX_PROXIMAS_POR_LADO = 5
+
+def _etag_fabrica(request):
+    # Apontamentos, OPs e agendamentos incrementam a versão do dashboard;
+    # edições de PN, a da agenda. A data muda quais OPs são "próximas".
+    versao = obter_soma_versoes([VERSAO_DASHBOARD, VERSAO_AGENDA])
+    return f"{versao}-{timezone.localdate().isoformat()}"
+
+@login_required
+@require_http_methods(["GET"])
+@condition(etag_func=_etag_fabrica)
+def get_estado_fabrica_api(request):
+    """
+    OPs em produção e próximas de todas as máquinas (ou de ?maquinas=1,2,3)
+    em uma requisição, no formato de colunas de producao/chao_de_fabrica.py.
+    ?proximas=N traz as N próximas OPs de cada lado (padrão: 1).
+    """
+    try:
+        maquinas = request.GET.get('maquinas')
+        maquina_ids = [int(maquina_id) for maquina_id in maquinas.split(',') if maquina_id] if maquinas else None
+        proximas = int(request.GET.get('proximas', 1))
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Parâmetros inválidos.'}, status=400)
+    if not 0 <= proximas <= MAX_PROXIMAS_POR_LADO:
+        return JsonResponse({'status': 'erro', 'mensagem': f'proximas deve ficar entre 0 e {MAX_PROXIMAS_POR_LADO}.'}, status=400)
+
+    return JsonResponse(estado_da_fabrica(maquina_ids, proximas))
+
 @require_POST # Adicionado decorador de segurança
 @login_required
 def iniciar_op_api(request):
@@ -401,6 +708,8 @@ def iniciar_op_api(request):
         # 2. SEGUNDO, atualiza o status das OPs
         op_ids_para_iniciar = agendamentos_para_iniciar.values_list('ordem_producao_id', flat=True)
         OrdemProducao.objects.filter(id__in=op_ids_para_iniciar).update(status='Em Produção')
+        incrementar_versao(VERSAO_DASHBOARD) # .update() não dispara signals
+        notificar_maquinas([maquina_id])
         
         # =======================================================================
         # FIM DA CORREÇÃO DE LÓGICA
@@ -413,32 +722,59 @@ def iniciar_op_api(request):
 
 @login_required
 def apontar_producao_api(request):
+    """
+    Soma peças produzidas no agendamento (ver producao/apontamentos.py).
+    Aceita uma chave de idempotência no corpo ("chave_idempotencia") ou no
+    cabeçalho Idempotency-Key: reenviar o mesmo apontamento não soma duas vezes.
+    """
     data = json.loads(request.body)
-    agendamento = get_object_or_404(Agendamento, id=data.get('agendamento_id'))
-    quantidade = int(data.get('quantidade'))
-    
-    ApontamentoProducao.objects.create(
-        agendamento=agendamento,
-        quantidade=quantidade,
-        operador=request.user
+    agendamento = get_object_or_404(
+        Agendamento.objects.only('id', 'maquina_id', 'ordem_producao_id'), id=data.get('agendamento_id')
     )
-    
-    # Atualiza o total produzido na OP
-    op = agendamento.ordem_producao
-    op.quantidade_produzida += quantidade
-    op.save()
+    try:
+        quantidade = int(data.get('quantidade'))
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'erro', 'mensagem': 'Quantidade inválida.'}, status=400)
+    chave = data.get('chave_idempotencia') or request.headers.get('Idempotency-Key')
+    if chave is not None and not isinstance(chave, str):
+        return JsonResponse({'status': 'erro', 'mensagem': 'A chave de idempotência deve ser um texto.'}, status=400)
+    if chave and len(chave) > TAMANHO_MAXIMO_CHAVE:
+        return JsonResponse({'status': 'erro', 'mensagem': f'Chave de idempotência com mais de {TAMANHO_MAXIMO_CHAVE} caracteres.'}, status=400)
+
+    try:
+        apontamento, nova_quantidade, duplicado = registrar_apontamento(agendamento, quantidade, request.user, chave)
+    except ChaveReutilizada as e:
+        return JsonResponse({'status': 'erro', 'mensagem': str(e)}, status=409)
+    if duplicado:
+        return JsonResponse({
+            'status': 'sucesso',
+            'mensagem': 'Apontamento já registrado.',
+            'nova_quantidade_produzida': nova_quantidade,
+            'duplicado': True,
+        })
+
+    # Se a OP está mais lenta que o previsto, empurra os agendamentos seguintes
+    ops_atrasadas = []
+    if settings.REPROGRAMAR_AO_APONTAR:
+        try:
+            ops_atrasadas = reprogramar_maquina(agendamento.maquina_id)['atrasadas']
+        except DatabaseError:
+            # O apontamento já foi gravado; a cascata roda de novo no próximo
+            logger.exception("Falha ao reprogramar a máquina %s", agendamento.maquina_id)
     
     return JsonResponse({
         'status': 'sucesso', 
         'mensagem': 'Apontamento registrado!',
-        'nova_quantidade_produzida': op.quantidade_produzida
+        'nova_quantidade_produzida': nova_quantidade,
+        'ops_atrasadas': ops_atrasadas,
     })
 
 @login_required
+@require_http_methods(["GET"])
+@condition(etag_func=_etag_referencia('tipos_parada'))
 def get_tipos_parada_api(request):
     """Retorna uma lista de todos os tipos de parada cadastrados."""
-    tipos_parada = TipoParada.objects.all().values('id', 'codigo', 'descricao')
-    return JsonResponse(list(tipos_parada), safe=False) 
+    return _resposta_referencia(request, 'tipos_parada')
 
 # =======================================================================
 # API DE REGISTRAR PARADA ATUALIZADA PARA RECEBER DATAS MANUAIS
@@ -468,13 +804,16 @@ def registrar_parada_api(request):
                 return JsonResponse({'status': 'erro', 'mensagem': 'O horário de fim deve ser posterior ao de início.'}, status=400)
             
             # 5. Cria o objeto Parada com os dados fornecidos pelo usuário
-            Parada.objects.create(
-                agendamento=agendamento,
-                tipo_parada_id=tipo_parada_id,
-                inicio_parada=inicio_parada,
-                fim_parada=fim_parada,
-                operador=request.user
-            )
+            #    e soma a duração no consolidado de OEE
+            with transaction.atomic():
+                parada = Parada.objects.create(
+                    agendamento=agendamento,
+                    tipo_parada_id=tipo_parada_id,
+                    inicio_parada=inicio_parada,
+                    fim_parada=fim_parada,
+                    operador=request.user
+                )
+                rollup.registrar_parada(parada)
 
             return JsonResponse({'status': 'sucesso', 'mensagem': 'Parada registrada com sucesso!'})
 
@@ -493,15 +832,29 @@ def finalizar_op_api(request):
     # Finaliza paradas abertas para esta OP, se houver
     agendamento = Agendamento.objects.filter(ordem_producao=op).first()
     if agendamento:
-        Parada.objects.filter(agendamento=agendamento, fim_parada__isnull=True).update(fim_parada=timezone.now())
+        abertas = Parada.objects.filter(agendamento=agendamento, fim_parada__isnull=True)
+        inicio_abertas = abertas.aggregate(inicio=Min('inicio_parada'))['inicio']
+        abertas.update(fim_parada=timezone.now())
+        notificar_maquinas([agendamento.maquina_id])
+
+        # Fecha a janela real de execução. No histórico de OEE mudam só a hora
+        # do fim e as das paradas fechadas aqui; as horas sem eventos ficam
+        # com o backfill_oee_historico periódico.
+        agendamento.real_end_datetime = timezone.now()
+        agendamento.save(update_fields=['real_end_datetime'])
+        if agendamento.real_start_datetime:
+            historico.atualizar_periodo(
+                agendamento.maquina_id, inicio_abertas or agendamento.real_end_datetime, agendamento.real_end_datetime,
+            )
 
     return JsonResponse({'status': 'sucesso', 'mensagem': 'OP finalizada!'})
 
 @login_required
+@require_http_methods(["GET"])
+@condition(etag_func=_etag_referencia('tipos_refugo'))
 def get_tipos_refugo_api(request):
     """Retorna uma lista de todos os tipos de refugo cadastrados."""
-    tipos_refugo = TipoRefugo.objects.all().values('id', 'codigo', 'descricao')
-    return JsonResponse(list(tipos_refugo), safe=False)
+    return _resposta_referencia(request, 'tipos_refugo')
 
 @require_POST
 @login_required
@@ -528,13 +881,15 @@ def registrar_refugo_api(request):
         agendamento = get_object_or_404(Agendamento, id=agendamento_id)
         tipo_refugo = get_object_or_404(TipoRefugo, id=tipo_refugo_id)
 
-        # Cria o registro de Refugo
-        Refugo.objects.create(
-            agendamento=agendamento,
-            tipo_refugo=tipo_refugo,
-            quantidade=quantidade_int,
-            operador=request.user 
-        )
+        # Cria o registro de Refugo e soma no consolidado de OEE
+        with transaction.atomic():
+            refugo = Refugo.objects.create(
+                agendamento=agendamento,
+                tipo_refugo=tipo_refugo,
+                quantidade=quantidade_int,
+                operador=request.user 
+            )
+            rollup.registrar_refugo(refugo)
 
         return JsonResponse({'status': 'sucesso', 'mensagem': 'Refugo registrado com sucesso!'})
 
@@ -543,187 +898,402 @@ def registrar_refugo_api(request):
         print(f"Erro ao registrar refugo: {e}") 
         return JsonResponse({'status': 'erro', 'mensagem': 'Erro interno ao registrar refugo.'}, status=500)
 
+@require_POST
+@login_required
+def ingerir_eventos_api(request):
+    """
+    Recebe a fila offline de um terminal: {"eventos": [...]} com
+    apontamentos, paradas e refugos, cada um com UUID e horário próprios
+    (formato em producao/ingestao.py). Reenviar um evento já recebido não
+    o grava de novo; o terminal pode apagar da fila tudo que não voltar
+    com status 'erro'.
+    """
+    try:
+        eventos = json.loads(request.body).get('eventos')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'erro', 'mensagem': 'JSON inválido.'}, status=400)
+    if not isinstance(eventos, list):
+        return JsonResponse({'status': 'erro', 'mensagem': "Informe a lista 'eventos'."}, status=400)
+    if len(eventos) > settings.INGESTAO_LOTE_MAXIMO:
+        return JsonResponse({'status': 'erro', 'mensagem': f'Envie no máximo {settings.INGESTAO_LOTE_MAXIMO} eventos por lote.'}, status=400)
+
+    resultado = ingerir_lote(eventos, request.user)
+
+    ops_atrasadas = []
+    if settings.REPROGRAMAR_AO_APONTAR:
+        for maquina_id in resultado['maquinas_com_producao']:
+            try:
+                ops_atrasadas += reprogramar_maquina(maquina_id)['atrasadas']
+            except DatabaseError:
+                logger.exception("Falha ao reprogramar a máquina %s", maquina_id)
+
+    return JsonResponse({
+        'status': 'sucesso',
+        'resultados': resultado['resultados'],
+        'quantidades_produzidas': resultado['quantidades_produzidas'],
+        'ops_atrasadas': ops_atrasadas,
+    })
+
+@csrf_exempt
+@require_POST
+def registrar_ciclos_api(request):
+    """
+    Recebe os sinais de fim de ciclo do gateway das máquinas:
+    {"sinais": [{"maquina_id": 3, "momento": "...", "pecas": 1, "lado": "L"}]}
+    ("momento", "pecas" e "lado" são opcionais). Os ciclos são acumulados
+    e gravados em lote (producao/ciclos.py), por isso a resposta é 202.
+    O gateway não tem sessão: autentica pelo cabeçalho X-Token-Ciclos.
+    """
+    token = settings.CICLOS_TOKEN
+    if not token or not hmac.compare_digest(request.headers.get('X-Token-Ciclos', ''), token):
+        return JsonResponse({'status': 'erro', 'mensagem': 'Token inválido.'}, status=403)
+    try:
+        sinais = json.loads(request.body).get('sinais')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'erro', 'mensagem': 'JSON inválido.'}, status=400)
+    if not isinstance(sinais, list):
+        return JsonResponse({'status': 'erro', 'mensagem': "Informe a lista 'sinais'."}, status=400)
+    if len(sinais) > settings.INGESTAO_LOTE_MAXIMO:
+        return JsonResponse({'status': 'erro', 'mensagem': f'Envie no máximo {settings.INGESTAO_LOTE_MAXIMO} sinais por lote.'}, status=400)
+
+    agora = timezone.now()
+    lidos, ignorados = [], []
+    for indice, sinal in enumerate(sinais):
+        try:
+            lidos.append((indice, *ler_sinal(sinal, agora)))
+        except EventoInvalido as e:
+            ignorados.append({'indice': indice, 'mensagem': str(e)})
+
+    # Em ordem cronológica: o tempo de ciclo é a diferença entre sinais seguidos
+    lidos.sort(key=lambda sinal: sinal[2])
+    aceitos = 0
+    for (indice, *_), atingidos in zip(lidos, agregador.registrar_varios([sinal[1:] for sinal in lidos])):
+        if atingidos:
+            aceitos += 1
+        else:
+            ignorados.append({'indice': indice, 'mensagem': 'Nenhuma OP em produção na máquina.'})
+
+    return JsonResponse({'status': 'sucesso', 'aceitos': aceitos, 'ignorados': ignorados}, status=202)
+
+@login_required
+def tempos_de_ciclo_api(request):
+    """Ciclo nominal do PN x ciclo real medido pelos sinais, por agendamento (padrão: últimos 7 dias)."""
+    try:
+        dias = int(request.GET.get('dias', 7))
+        maquina_id = request.GET.get('maquina_id')
+        maquina_ids = [int(maquina_id)] if maquina_id else None
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Parâmetros inválidos.'}, status=400)
+    desde = timezone.now() - timedelta(days=dias)
+    return JsonResponse({'agendamentos': comparar_tempos_de_ciclo(maquina_ids, desde)})
+
 @login_required(login_url='login')
 @permission_required('producao.can_view_gerenciamento', raise_exception=True)
 def gerenciamento_view(request):
+    # Os KPIs de todas as máquinas são calculados pelo motor de OEE
+    # em um número fixo de queries agrupadas (ver producao/oee.py).
+    context = {
+        'maquinas_com_kpi': _kpis_dashboard(_etag_gerenciamento(request))
+    }
     
-    maquinas_ativas_set = set(Agendamento.objects.filter(
-        ordem_producao__status='Em Produção'
-    ).values_list('maquina_id', flat=True).distinct())
+    return render(request, 'producao/gerenciamento_view.html', context)
 
-    maquinas = Maquina.objects.all()
-    maquinas_com_kpi = []
-    agora = timezone.now()
 
-    for maquina in maquinas:
-        
-        if maquina.id in maquinas_ativas_set:
-            # --- MÁQUINA ATIVA ---
-            
-            agendamentos_da_maquina = Agendamento.objects.filter(
-                maquina=maquina,
-                ordem_producao__status='Em Produção'
-            ).select_related('ordem_producao__pn')
-
-            # --- VARIÁVEIS DE ACUMULAÇÃO PARA A MÁQUINA ---
-            total_pecas_boas = 0
-            total_pecas_ruins = 0
-            total_produzido_bruto = 0
-            total_pecas_teoricas = 0 # Denominador da Eficiência
-
-            # ===================================================================
-            # NOVAS VARIÁVEIS PARA DISPONIBILIDADE
-            # ===================================================================
-            total_tempo_bruto_maquina_segundos = 0
-            total_paradas_planejadas_maquina_segundos = 0
-            total_paradas_nao_planejadas_maquina_segundos = 0
-            # ===================================================================
-
-            for ag in agendamentos_da_maquina:
-                op = ag.ordem_producao
-                pn = op.pn
-
-                # --- 1. LÓGICA DE QUALIDADE (Peças) ---
-                pecas_boas_ag = op.quantidade_produzida
-                refugo_do_ag = Refugo.objects.filter(agendamento=ag).aggregate(
-                    total=Coalesce(Sum('quantidade'), 0)
-                )['total']
-                pecas_ruins_ag = refugo_do_ag
-
-                total_pecas_boas += pecas_boas_ag
-                total_pecas_ruins += pecas_ruins_ag
-                total_produzido_bruto += (pecas_boas_ag + pecas_ruins_ag)
-
-                # --- 2. LÓGICA DE TEMPO (Base para Disponibilidade e Eficiência) ---
-                
-                inicio_real_da_op = ag.real_start_datetime 
-                
-                if not inicio_real_da_op or not pn.cycle_time_seconds or pn.cycle_time_seconds <= 0:
-                    continue # Pula se não iniciou ou não tem ciclo
-
-                ciclo_teorico_segundos = pn.cycle_time_seconds
-
-                # 2.1. Tempo Bruto Medido (desde o início real)
-                duracao_bruta = agora - inicio_real_da_op
-                tempo_total_bruto_segundos = duracao_bruta.total_seconds()
-                if tempo_total_bruto_segundos < 0:
-                    tempo_total_bruto_segundos = 0
-                
-                # Acumula o tempo bruto total da máquina
-                total_tempo_bruto_maquina_segundos += tempo_total_bruto_segundos
-
-                # 2.2. Calcular Paradas (Classificadas)
-                # Esta query substitui a antiga 'soma_paradas'
-                duracao_parada_expr = ExpressionWrapper(
-                    F('fim_parada') - F('inicio_parada'), 
-                    output_field=fields.DurationField()
-                )
-                
-                somas_paradas_classificadas = Parada.objects.filter(
-                    agendamento=ag, 
-                    fim_parada__isnull=False,
-                    # Filtra paradas que ocorreram *dentro* do período medido
-                    inicio_parada__gte=inicio_real_da_op 
-                ).aggregate(
-                    soma_planejadas=Coalesce(
-                        Sum(
-                            Case(
-                                When(tipo_parada__classificacao_parada='PLANEJADA', then=duracao_parada_expr),
-                                default=Value(timedelta(0)),
-                                output_field=fields.DurationField()
-                            )
-                        ),
-                        timedelta(0)
-                    ),
-                    soma_nao_planejadas=Coalesce(
-                        Sum(
-                            Case(
-                                When(tipo_parada__classificacao_parada='NÃO PLANEJADA', then=duracao_parada_expr),
-                                default=Value(timedelta(0)),
-                                output_field=fields.DurationField()
-                            )
-                        ),
-                        timedelta(0)
-                    )
-                )
+# =======================================================================
+# API JSON DO DASHBOARD (com GET condicional)
+# =======================================================================
 
-                tempo_parado_planejado_segundos = somas_paradas_classificadas['soma_planejadas'].total_seconds()
-                tempo_parado_nao_planejado_segundos = somas_paradas_classificadas['soma_nao_planejadas'].total_seconds()
+def _etag_gerenciamento(request):
+    """
+    A ETag combina a versão dos dados (incrementada a cada escrita) com a
+    janela de tempo atual, já que disponibilidade e eficiência também
+    variam com o relógio enquanto a OP está rodando.
+    """
+    request.etag_gerenciamento = _etag_dashboard(obter_versao(VERSAO_DASHBOARD))
+    return request.etag_gerenciamento
 
-                # Acumula os tempos de parada da máquina
-                total_paradas_planejadas_maquina_segundos += tempo_parado_planejado_segundos
-                total_paradas_nao_planejadas_maquina_segundos += tempo_parado_nao_planejado_segundos
 
-                # --- 3. LÓGICA DE EFICIÊNCIA (Corrigida) ---
-                
-                # 3.1. TPP (Tempo Programado) deste agendamento
-                tpp_segundos_ag = tempo_total_bruto_segundos - tempo_parado_planejado_segundos
-                
-                # 3.2. TO (Tempo Operando) deste agendamento
-                tempo_operando_segundos_ag = tpp_segundos_ag - tempo_parado_nao_planejado_segundos
-                if tempo_operando_segundos_ag < 0:
-                    tempo_operando_segundos_ag = 0
+def _etag_dashboard(versao):
+    janela = int(timezone.now().timestamp()) // settings.OEE_DASHBOARD_JANELA_SEGUNDOS
+    return f"{versao}-{janela}"
 
-                # 3.3. Qtd Teórica = Tempo Operando / Ciclo Teórico
-                qtd_deveria_produzir_ag = tempo_operando_segundos_ag / ciclo_teorico_segundos
-                
-                total_pecas_teoricas += qtd_deveria_produzir_ag
 
-            # --- FIM DO LOOP DE AGENDAMENTOS DA MÁQUINA ---
+def _kpis_dashboard(etag):
+    """KPIs de todas as máquinas, calculados uma única vez por ETag."""
+    chave = f'gerenciamento:kpis:{etag}'
+    maquinas_com_kpi = cache.get(chave)
+    if maquinas_com_kpi is None:
+        maquinas_com_kpi = calcular_kpis_maquinas()
+        cache.set(chave, maquinas_com_kpi, settings.OEE_DASHBOARD_JANELA_SEGUNDOS * 2)
+    return maquinas_com_kpi
 
-            # --- CÁLCULO FINAL DOS KPIs DA MÁQUINA ---
-            
-            # A. QUALIDADE (Peças Boas / Peças Brutas)
-            if total_produzido_bruto > 0:
-                qualidade = (total_pecas_boas / total_produzido_bruto) * 100
-            else:
-                qualidade = 100.0
-
-            # B. DISPONIBILIDADE (Tempo Operando / Tempo Programado)
-            # TPP Total = Tempo Bruto Total - Paradas Planejadas Totais
-            tpp_maquina_segundos = total_tempo_bruto_maquina_segundos - total_paradas_planejadas_maquina_segundos
-            
-            # TO Total = TPP Total - Paradas Não Planejadas Totais
-            tempo_operando_maquina_segundos = tpp_maquina_segundos - total_paradas_nao_planejadas_maquina_segundos
-
-            if tpp_maquina_segundos > 0:
-                disponibilidade = (tempo_operando_maquina_segundos / tpp_maquina_segundos) * 100
-            else:
-                # Se o TPP foi 0 (ex: máquina ligada e imediatamente parada para almoço)
-                disponibilidade = 100.0 if tempo_operando_maquina_segundos >= 0 else 0.0
-
-            # C. EFICIÊNCIA (Peças Brutas / Peças Teóricas)
-            if total_pecas_teoricas > 0:
-                eficiencia = (total_produzido_bruto / total_pecas_teoricas) * 100
-            else:
-                # Se o tempo operando foi 0, a meta era 0 peças.
-                eficiencia = 100.0 if total_produzido_bruto == 0 else 200.0 # (Produziu sem tempo)
-            
-            # D. OEE
-            oee = (disponibilidade / 100) * (eficiencia / 100) * (qualidade / 100) * 100
-            
-            maquinas_com_kpi.append({
-                'status': 'Ativa',
-                'nome': maquina.number,
-                'oee': oee,
-                'disponibilidade': disponibilidade, # <-- SUBSTITUÍDO
-                'eficiencia': eficiencia,         # <-- CORRIGIDO
-                'qualidade': qualidade,
-            })
-            
-        else:
-            # --- MÁQUINA INATIVA ---
-            maquinas_com_kpi.append({
-                'status': 'Inativa',
-                'nome': maquina.number,
-                'oee': 0.0,
-                'disponibilidade': 0.0,
-                'eficiencia': 0.0,
-                'qualidade': 0.0,
-            })
-        
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_gerenciamento', raise_exception=True)
+@require_http_methods(["GET"])
+@condition(etag_func=_etag_gerenciamento)
+def get_gerenciamento_data_api(request):
+    """
+    Retorna os KPIs por máquina. Quando o cliente envia If-None-Match com a
+    ETag atual, o decorator `condition` responde 304 sem corpo.
+    """
+    etag = request.etag_gerenciamento
+    return JsonResponse({
+        'versao': etag,
+        'maquinas': _kpis_dashboard(etag),
+    })
+
+
+# =======================================================================
+# STREAM SSE DO DASHBOARD (somente quando servido pelo asgi.py)
+# =======================================================================
+
+def _kpis_se_mudou(versao):
+    """
+    (versão atual do dashboard, KPIs de todas as máquinas ou None se a
+    versão ainda é `versao`). Os KPIs saem do mesmo cache por ETag da API.
+    """
+    atual = obter_versao(VERSAO_DASHBOARD)
+    if atual == versao:
+        return atual, None
+    return atual, _kpis_dashboard(_etag_dashboard(atual))
+
+
+async def _stream_kpis(assinatura):
+    _, fila = assinatura
+    verificar = sync_to_async(_kpis_se_mudou)
+    try:
+        versao, _ = await verificar(None)
+        yield 'retry: 5000\n\n'
+        ultimo_envio = time.monotonic()
+        while True:
+            try:
+                mensagem = await asyncio.wait_for(fila.get(), timeout=settings.SSE_VERIFICACAO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                # Escritas de outros workers não passam pelo difusor deste processo
+                versao, maquinas = await verificar(versao)
+                if maquinas is None:
+                    if time.monotonic() - ultimo_envio >= settings.SSE_KEEPALIVE_SEGUNDOS:
+                        ultimo_envio = time.monotonic()
+                        yield ': keep-alive\n\n'
+                    continue
+                mensagem = {'maquinas': maquinas}
+            ultimo_envio = time.monotonic()
+            yield f"event: kpis\ndata: {json.dumps(mensagem, cls=DjangoJSONEncoder)}\n\n"
+    finally:
+        difusor.cancelar(assinatura)
+
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_gerenciamento', raise_exception=True)
+@require_http_methods(["GET"])
+async def stream_gerenciamento_api(request):
+    """
+    Envia (Server-Sent Events) os KPIs de cada máquina afetada por um
+    apontamento, parada ou refugo, inclusive os gravados por outros workers
+    (ver producao/eventos.py). Sob WSGI não há como manter a conexão
+    aberta, então responde 204 e o dashboard continua no polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(_stream_kpis(difusor.assinar()), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# =======================================================================
+# API DO HISTÓRICO DE OEE
+# =======================================================================
+
+# Por hora, 31 dias x 100 máquinas já são ~75 mil pontos
+MAX_DIAS_HISTORICO_HORARIO = 31
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_gerenciamento', raise_exception=True)
+@require_http_methods(["GET"])
+def get_oee_historico_api(request):
+    """
+    Série histórica de OEE, disponibilidade, eficiência e qualidade por
+    máquina. Parâmetros: inicio e fim (YYYY-MM-DD, fim inclusivo),
+    granularidade (hora, turno, dia ou semana) e maquina_id (opcional,
+    pode ser repetido).
+    """
+    try:
+        inicio = datetime.strptime(request.GET.get('inicio', ''), '%Y-%m-%d')
+        fim = datetime.strptime(request.GET.get('fim', ''), '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Informe inicio e fim no formato YYYY-MM-DD.'}, status=400)
+
+    granularidade = request.GET.get('granularidade', 'dia')
+    if granularidade not in GRANULARIDADES:
+        return JsonResponse({'status': 'erro', 'mensagem': f'Granularidade deve ser uma de: {", ".join(GRANULARIDADES)}.'}, status=400)
+
+    if granularidade == 'hora' and (fim - inicio).days > MAX_DIAS_HISTORICO_HORARIO:
+        return JsonResponse({'status': 'erro', 'mensagem': f'Para granularidade por hora, use no máximo {MAX_DIAS_HISTORICO_HORARIO} dias.'}, status=400)
+
+    try:
+        maquina_ids = [int(valor) for valor in request.GET.getlist('maquina_id')] or None
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'maquina_id deve ser um número inteiro.'}, status=400)
+    series = serie_historica(
+        timezone.make_aware(inicio),
+        timezone.make_aware(fim),
+        granularidade,
+        maquina_ids,
+    )
+
+    maquinas = dict(Maquina.objects.filter(id__in=series.keys()).values_list('id', 'number'))
+    return JsonResponse({
+        'granularidade': granularidade,
+        'series': [
+            {'maquina_id': maquina_id, 'maquina': maquinas.get(maquina_id), 'pontos': pontos}
+            for maquina_id, pontos in series.items()
+        ],
+    })
+
+
+# =======================================================================
+# RELATÓRIOS DE PARETO (PARADAS E REFUGO)
+# =======================================================================
+
+MAX_DIAS_PARETO = 366
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_gerenciamento', raise_exception=True)
+def pareto_view(request):
     context = {
-        'maquinas_com_kpi': maquinas_com_kpi
+        'maquinas': Maquina.objects.order_by('number').values('id', 'number'),
+        'clientes': Pn.objects.order_by('cliente').values_list('cliente', flat=True).distinct(),
+        'pns': Pn.objects.order_by('pn_code').values('id', 'pn_code'),
     }
-    
-    return render(request, 'producao/gerenciamento_view.html', context)
\ No newline at end of file
+    return render(request, 'producao/pareto_view.html', context)
+
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_gerenciamento', raise_exception=True)
+@require_http_methods(["GET"])
+def get_pareto_api(request):
+    """
+    Pareto de paradas (minutos por tipo) ou de refugo (peças por tipo).
+    Parâmetros: fonte (paradas ou refugos), inicio e fim (YYYY-MM-DD, fim
+    inclusivo), dimensao (tipo, maquina, pn ou cliente) e os filtros
+    opcionais maquina_id, cliente e pn_id (podem ser repetidos) e tipo_id
+    (para o drill-down de um tipo).
+    """
+    fonte = request.GET.get('fonte', 'paradas')
+    dimensao = request.GET.get('dimensao', 'tipo')
+    if fonte not in FONTES_PARETO or dimensao not in DIMENSOES_PARETO[fonte]:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Fonte ou dimensão inválida.'}, status=400)
+
+    try:
+        inicio = datetime.strptime(request.GET.get('inicio', ''), '%Y-%m-%d')
+        fim = datetime.strptime(request.GET.get('fim', ''), '%Y-%m-%d') + timedelta(days=1)
+        maquina_ids = [int(v) for v in request.GET.getlist('maquina_id') if v]
+        pn_ids = [int(v) for v in request.GET.getlist('pn_id') if v]
+        tipo_id = int(request.GET['tipo_id']) if request.GET.get('tipo_id') else None
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Parâmetros inválidos. Datas no formato YYYY-MM-DD.'}, status=400)
+
+    if fim <= inicio or (fim - inicio).days > MAX_DIAS_PARETO:
+        return JsonResponse({'status': 'erro', 'mensagem': f'Informe um período de até {MAX_DIAS_PARETO} dias.'}, status=400)
+
+    resultado = pareto(
+        fonte,
+        timezone.make_aware(inicio),
+        timezone.make_aware(fim),
+        dimensao=dimensao,
+        maquina_ids=maquina_ids,
+        clientes=[c for c in request.GET.getlist('cliente') if c],
+        pn_ids=pn_ids,
+        tipo_id=tipo_id,
+    )
+    return JsonResponse(resultado)
+
+
+# =======================================================================
+# EXPORTAÇÃO DO HISTÓRICO (producao/exportacao.py)
+# =======================================================================
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_gerenciamento', raise_exception=True)
+@require_http_methods(["GET"])
+def exportar_eventos_api(request, fonte):
+    """
+    Exporta os apontamentos ('producao'), paradas ou refugos do período em
+    CSV (padrão), XLSX ou Parquet, já com máquina, OP, PN e operador.
+    Parâmetros: inicio e fim (YYYY-MM-DD, fim inclusivo), formato e
+    maquina_id (opcional, pode ser repetido). CSV e Parquet são enviados
+    em streaming.
+    """
+    if fonte not in exportacao.FONTES:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Fonte inválida.'}, status=404)
+    formato = request.GET.get('formato', 'csv')
+    try:
+        inicio = datetime.strptime(request.GET.get('inicio', ''), '%Y-%m-%d')
+        fim = datetime.strptime(request.GET.get('fim', ''), '%Y-%m-%d') + timedelta(days=1)
+        maquina_ids = [int(v) for v in request.GET.getlist('maquina_id') if v]
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Parâmetros inválidos. Datas no formato YYYY-MM-DD.'}, status=400)
+    if fim <= inicio:
+        return JsonResponse({'status': 'erro', 'mensagem': 'O fim deve ser posterior ao início.'}, status=400)
+    try:
+        exportacao.verificar_formato(formato)
+    except exportacao.ErroExportacao as e:
+        return JsonResponse({'status': 'erro', 'mensagem': str(e)}, status=400)
+
+    inicio, fim = timezone.make_aware(inicio), timezone.make_aware(fim)
+    nome = f"{fonte}_{inicio:%Y%m%d}_{fim - timedelta(days=1):%Y%m%d}.{formato}"
+    linhas = exportacao.linhas(fonte, inicio, fim, maquina_ids)
+
+    if formato == 'xlsx':
+        if exportacao.consultar(fonte, inicio, fim, maquina_ids).count() > exportacao.MAX_LINHAS_XLSX:
+            return JsonResponse({'status': 'erro', 'mensagem': 'Período grande demais para o Excel; use CSV ou Parquet.'}, status=400)
+        return FileResponse(
+            exportacao.xlsx_em_arquivo(fonte, linhas), as_attachment=True, filename=nome,
+            content_type=exportacao.TIPOS_CONTEUDO[formato],
+        )
+
+    gerador = exportacao.csv_em_streaming if formato == 'csv' else exportacao.parquet_em_streaming
+    resposta = StreamingHttpResponse(gerador(fonte, linhas), content_type=exportacao.TIPOS_CONTEUDO[formato])
+    resposta['Content-Disposition'] = f'attachment; filename="{nome}"'
+    return resposta
+
+
+# =======================================================================
+# OEE EM LOTE / SIMULAÇÃO DE TEMPO DE CICLO
+# =======================================================================
+
+@login_required(login_url='login')
+@permission_required('producao.can_view_gerenciamento', raise_exception=True)
+@require_http_methods(["GET"])
+def get_oee_lote_api(request):
+    """
+    KPIs por máquina dos agendamentos iniciados no período, reais e com o
+    tempo de ciclo multiplicado por `fator_ciclo` (ex: 0.95). Parâmetros:
+    inicio e fim (YYYY-MM-DD, fim inclusivo), fator_ciclo, e os filtros
+    opcionais maquina_id e pn_id (o fator vale só para esses PNs).
+    """
+    try:
+        inicio = datetime.strptime(request.GET.get('inicio', ''), '%Y-%m-%d')
+        fim = datetime.strptime(request.GET.get('fim', ''), '%Y-%m-%d') + timedelta(days=1)
+        fator_ciclo = float(request.GET.get('fator_ciclo', 1))
+        maquina_ids = [int(v) for v in request.GET.getlist('maquina_id') if v] or None
+        pn_ids = [int(v) for v in request.GET.getlist('pn_id') if v]
+    except ValueError:
+        return JsonResponse({'status': 'erro', 'mensagem': 'Parâmetros inválidos. Datas no formato YYYY-MM-DD.'}, status=400)
+
+    if not fator_ciclo_valido(fator_ciclo):
+        return JsonResponse({
+            'status': 'erro',
+            'mensagem': f'O fator de ciclo deve estar entre {FATOR_CICLO_MINIMO} e {FATOR_CICLO_MAXIMO}.',
+        }, status=400)
+
+    insumos = carregar_insumos(timezone.make_aware(inicio), timezone.make_aware(fim), maquina_ids)
+    return JsonResponse({
+        'agendamentos': len(insumos['agendamento_id']),
+        'fator_ciclo': fator_ciclo,
+        'real': resumo_por_maquina(calcular_kpis_lote(insumos)),
+        'simulado': resumo_por_maquina(calcular_kpis_lote(insumos, fator_ciclo, pn_ids)),
+    })
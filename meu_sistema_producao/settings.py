@@ -129,4 +129,68 @@ LOGIN_URL = 'login'
 RECAPTCHA_PUBLIC_KEY = config('RECAPTCHA_PUBLIC_KEY')
 RECAPTCHA_PRIVATE_KEY = config('RECAPTCHA_PRIVATE_KEY')
 
-CAPTCHA_IMAGE_SIZE = (220, 70)
\ No newline at end of file
+CAPTCHA_IMAGE_SIZE = (220, 70)
+
+# Janela (em segundos) em que os KPIs do dashboard de gerenciamento são
+# reaproveitados quando nenhum dado mudou.
+OEE_DASHBOARD_JANELA_SEGUNDOS = config('OEE_DASHBOARD_JANELA_SEGUNDOS', default=30, cast=int)
+
+# Intervalo (em segundos) entre os comentários de keep-alive do stream SSE
+# do dashboard, para que proxies não encerrem a conexão ociosa.
+SSE_KEEPALIVE_SEGUNDOS = config('SSE_KEEPALIVE_SEGUNDOS', default=15, cast=int)
+# Intervalo (em segundos) em que cada stream SSE confere o contador de versão
+# do dashboard, para receber também as escritas atendidas por outros workers.
+SSE_VERIFICACAO_SEGUNDOS = config('SSE_VERIFICACAO_SEGUNDOS', default=5, cast=float)
+
+# Turnos de produção (hora local de início e de fim, em horas cheias),
+# usados nos baldes do histórico de OEE. Um turno pode virar a meia-noite.
+TURNOS_PRODUCAO = [
+    ('1º Turno', 6, 14),
+    ('2º Turno', 14, 22),
+    ('3º Turno', 22, 6),
+]
+# Tempo máximo (em segundos) que um relatório de Pareto fica em cache. Ele
+# também é invalidado quando chega um evento em algum dia do período.
+PARETO_CACHE_SEGUNDOS = config('PARETO_CACHE_SEGUNDOS', default=3600, cast=int)
+# Idem para a semana do quadro de planejamento, invalidada quando um
+# agendamento daquela semana muda.
+AGENDA_CACHE_SEGUNDOS = config('AGENDA_CACHE_SEGUNDOS', default=3600, cast=int)
+# Tempo que um cenário "e se" do planejamento fica guardado sem uso (no cache
+# 'cenarios', abaixo: a edição e a aplicação podem cair em outro worker).
+CENARIO_CACHE_SEGUNDOS = config('CENARIO_CACHE_SEGUNDOS', default=4 * 3600, cast=int)
+# Reprogramação em cascata (producao/cascata.py): roda a cada apontamento de
+# produção e só mexe no quadro se a OP projetar um atraso maior que a tolerância.
+REPROGRAMAR_AO_APONTAR = config('REPROGRAMAR_AO_APONTAR', default=True, cast=bool)
+REPROGRAMAR_TOLERANCIA_MINUTOS = config('REPROGRAMAR_TOLERANCIA_MINUTOS', default=15, cast=int)
+# Máximo de eventos por envio da fila offline dos terminais (producao/ingestao.py).
+INGESTAO_LOTE_MAXIMO = config('INGESTAO_LOTE_MAXIMO', default=1000, cast=int)
+# Máximo de linhas por arquivo na importação de OPs do ERP pela API (producao/importacao.py).
+IMPORTACAO_OP_MAXIMO_LINHAS = config('IMPORTACAO_OP_MAXIMO_LINHAS', default=5000, cast=int)
+# Listas de PNs e tipos de parada/refugo (producao/referencias.py). A versão vai
+# na chave, então uma alteração já invalida o cache; o prazo só limpa versões antigas.
+REFERENCIA_CACHE_SEGUNDOS = config('REFERENCIA_CACHE_SEGUNDOS', default=7 * 24 * 3600, cast=int)
+# Sinais de ciclo das máquinas (producao/ciclos.py): as peças ficam acumuladas em
+# memória e são gravadas a cada N segundos ou N ciclos pendentes, o que vier primeiro.
+CICLOS_DESCARGA_SEGUNDOS = config('CICLOS_DESCARGA_SEGUNDOS', default=10, cast=int)
+CICLOS_DESCARGA_MAXIMO = config('CICLOS_DESCARGA_MAXIMO', default=1000, cast=int)
+# O último sinal de cada agendamento (base do tempo de ciclo real) precisa ser
+# visto por todos os workers do gunicorn: fica no cache 'ciclos', por padrão uma
+# tabela do banco (criada pelo createcachetable no build.sh). Pode apontar para
+# um Redis/Memcached, mas nunca para um cache local do processo.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ciclos': {
+        'BACKEND': config('CICLOS_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CICLOS_CACHE_LOCATION', default='producao_cache_ciclos'),
+    },
+    # Cenários "e se" do planejamento: mesma regra, compartilhado entre os workers.
+    'cenarios': {
+        'BACKEND': config('CENARIO_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CENARIO_CACHE_LOCATION', default='producao_cache_cenarios'),
+    },
+}
+# Token enviado pelo gateway das máquinas no cabeçalho X-Token-Ciclos.
+# Vazio desliga a API de sinais de ciclo.
+CICLOS_TOKEN = config('CICLOS_TOKEN', default='')
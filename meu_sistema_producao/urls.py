@@ -14,12 +14,23 @@ urlpatterns = [
     path('menu/', views.menu_view, name='menu'),
     path('planejamento/', views.planejamento_view, name='planejamento'),
     path('producao/', views.view_producao, name='view_producao'),
+    path('api/planejamento/quadro/', views.get_quadro_planejamento_api, name='get_quadro_planejamento_api'),
+    path('api/planejamento/auto/', views.auto_agendar_api, name='auto_agendar_api'),
+    path('api/planejamento/conflitos/', views.get_conflitos_planejamento_api, name='get_conflitos_planejamento_api'),
+    path('api/planejamento/lote/', views.agendamentos_lote_api, name='agendamentos_lote_api'),
+    path('api/planejamento/compatibilidade/', views.get_maquinas_compativeis_api, name='get_maquinas_compativeis_api'),
+    path('api/planejamento/reprogramar/', views.reprogramar_maquina_api, name='reprogramar_maquina_api'),
+    path('api/planejamento/cenarios/', views.criar_cenario_api, name='criar_cenario_api'),
+    path('api/planejamento/cenarios/<str:cenario_id>/', views.cenario_api, name='cenario_api'),
+    path('api/planejamento/cenarios/<str:cenario_id>/aplicar/', views.aplicar_cenario_api, name='aplicar_cenario_api'),
     path('api/get-pns/', views.get_pns_api, name='get_pns_api'),
     path('api/criar-op/', views.criar_op_api, name='criar_op_api'),
+    path('api/importar-ops/', views.importar_ops_api, name='importar_ops_api'),
     path('api/salvar-agendamento/', views.salvar_agendamento_api, name='salvar_agendamento_api'),
     path('api/remover-agendamento/', views.remover_agendamento_api, name='remover_agendamento_api'),
     path('api/get_week_data/', views.get_week_data_api, name='get_week_data_api'),
     path('api/producao/dados_maquina/', views.get_dados_maquina_api, name='get_dados_maquina_api'),
+    path('api/producao/fabrica/', views.get_estado_fabrica_api, name='get_estado_fabrica_api'),
     path('api/producao/iniciar_op/', views.iniciar_op_api, name='iniciar_op_api'),
     path('api/producao/apontar/', views.apontar_producao_api, name='apontar_producao_api'),
     path('api/producao/registrar_parada/', views.registrar_parada_api, name='registrar_parada_api'),
@@ -27,6 +38,16 @@ urlpatterns = [
     path('api/producao/get_tipos_parada/', views.get_tipos_parada_api, name='get_tipos_parada_api'),
     path('api/get_tipos_refugo/', views.get_tipos_refugo_api, name='get_tipos_refugo_api'),
     path('api/registrar_refugo/', views.registrar_refugo_api, name='registrar_refugo_api'),
+    path('api/producao/eventos/', views.ingerir_eventos_api, name='ingerir_eventos_api'),
+    path('api/maquinas/ciclos/', views.registrar_ciclos_api, name='registrar_ciclos_api'),
+    path('api/maquinas/ciclos/comparativo/', views.tempos_de_ciclo_api, name='tempos_de_ciclo_api'),
     path('gerenciamento/', views.gerenciamento_view, name='gerenciamento_view'),
+    path('api/gerenciamento/dados/', views.get_gerenciamento_data_api, name='get_gerenciamento_data_api'),
+    path('api/gerenciamento/stream/', views.stream_gerenciamento_api, name='stream_gerenciamento_api'),
+    path('api/gerenciamento/historico/', views.get_oee_historico_api, name='get_oee_historico_api'),
+    path('gerenciamento/pareto/', views.pareto_view, name='pareto_view'),
+    path('api/gerenciamento/pareto/', views.get_pareto_api, name='get_pareto_api'),
+    path('api/gerenciamento/oee_lote/', views.get_oee_lote_api, name='get_oee_lote_api'),
+    path('api/gerenciamento/exportar/<str:fonte>/', views.exportar_eventos_api, name='exportar_eventos_api'),
     path('api/get_op_details/', views.get_op_details_api, name='get_op_details_api'),
 ]
\ No newline at end of file